@@ -1,9 +1,11 @@
 """
-Configuration for Oracle Database Integration
+Configuration for Oracle Database Integration, the local DuckDB engine, caching,
+prompt construction (context budget, few-shot examples) and LLM providers
 """
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -16,7 +18,34 @@ class OracleConfig:
     password: str
     dsn: str
     thick_mode: bool = False
+    pool_min: int = 1
+    # Sessions of the blocking pool. Chat queries in async mode use a second
+    # asyncio pool of pool_async_max sessions (0 = pool_max), so the database
+    # may see up to pool_max + pool_async_max sessions per server process.
+    pool_max: int = 8
+    pool_async_max: int = 0
+    pool_increment: int = 1
+    pool_ping_interval: int = 60
+    pool_wait_timeout: int = 5000
+    pool_idle_timeout: int = 300
+    fetch_arraysize: int = 1000
+    fetch_prefetchrows: int = 1001
+    fetch_max_rows: int = 100000
+    fetch_max_bytes: int = 256 * 1024 * 1024
+    fetch_arrow: bool = True
+    async_mode: bool = True
+    query_timeout: float = 120.0
     
+    @property
+    def async_pool_max(self) -> int:
+        """Size of the asyncio session pool."""
+        return self.pool_async_max or self.pool_max
+
+    @property
+    def session_limit(self) -> int:
+        """Most sessions one process can open: both pools when async mode is on."""
+        return self.pool_max + (self.async_pool_max if self.async_mode and not self.thick_mode else 0)
+
     def validate(self) -> bool:
         """Validate that all required fields are set."""
         return all([
@@ -30,5 +59,320 @@ oracle_config = OracleConfig(
     user=os.getenv("ORACLE_USER", ""),
     password=os.getenv("ORACLE_PASSWORD", ""),
     dsn=os.getenv("ORACLE_DSN", ""),
-    thick_mode=os.getenv("ORACLE_THICK_MODE", "false").lower() == "true"
+    thick_mode=os.getenv("ORACLE_THICK_MODE", "false").lower() == "true",
+    pool_min=int(os.getenv("ORACLE_POOL_MIN", "1")),
+    pool_max=int(os.getenv("ORACLE_POOL_MAX", "8")),
+    pool_async_max=int(os.getenv("ORACLE_POOL_ASYNC_MAX", "0")),
+    pool_increment=int(os.getenv("ORACLE_POOL_INCREMENT", "1")),
+    pool_ping_interval=int(os.getenv("ORACLE_POOL_PING_INTERVAL", "60")),
+    pool_wait_timeout=int(os.getenv("ORACLE_POOL_WAIT_TIMEOUT_MS", "5000")),
+    pool_idle_timeout=int(os.getenv("ORACLE_POOL_IDLE_TIMEOUT", "300")),
+    fetch_arraysize=int(os.getenv("ORACLE_FETCH_ARRAYSIZE", "1000")),
+    fetch_prefetchrows=int(os.getenv("ORACLE_FETCH_PREFETCHROWS", "1001")),
+    fetch_max_rows=int(os.getenv("ORACLE_FETCH_MAX_ROWS", "100000")),
+    fetch_max_bytes=int(os.getenv("ORACLE_FETCH_MAX_MB", "256")) * 1024 * 1024,
+    fetch_arrow=os.getenv("ORACLE_FETCH_ARROW", "true").lower() == "true",
+    async_mode=os.getenv("ORACLE_ASYNC", "true").lower() == "true",
+    query_timeout=float(os.getenv("ORACLE_QUERY_TIMEOUT", "120"))
+)
+
+@dataclass
+class DuckDBConfig:
+    """Local DuckDB engine configuration."""
+    memory_limit: str = ""
+    threads: int = 0
+    max_sessions: int = 64
+    query_timeout: float = 60.0
+
+    def connect_config(self, external_access: bool = False) -> dict:
+        """Settings passed to duckdb.connect (unset values keep DuckDB defaults).
+
+        File and network access is disabled unless external_access is set;
+        such connections must restrict it themselves (SET allowed_directories,
+        then SET enable_external_access = false) once set up.
+        """
+        settings = {"python_enable_replacements": False}
+        if not external_access:
+            settings["enable_external_access"] = False
+        if self.memory_limit:
+            settings["memory_limit"] = self.memory_limit
+        if self.threads > 0:
+            settings["threads"] = self.threads
+        return settings
+
+duckdb_config = DuckDBConfig(
+    memory_limit=os.getenv("DUCKDB_MEMORY_LIMIT", ""),
+    threads=int(os.getenv("DUCKDB_THREADS", "0")),
+    max_sessions=int(os.getenv("DUCKDB_MAX_SESSIONS", "64")),
+    query_timeout=float(os.getenv("DUCKDB_QUERY_TIMEOUT", "60"))
+)
+
+def _parse_ttl_overrides(value: str) -> Dict[str, int]:
+    """Parse 'TABLE=seconds,TABLE=seconds' into a dict keyed by upper-cased table name."""
+    overrides = {}
+    for item in value.split(","):
+        if "=" in item:
+            table, seconds = item.split("=", 1)
+            overrides[table.strip().upper()] = int(seconds)
+    return overrides
+
+@dataclass
+class CacheConfig:
+    """Query result and LLM response cache configuration."""
+    result_cache_max_bytes: int = 256 * 1024 * 1024
+    oracle_result_ttl: int = 300
+    oracle_table_ttls: Dict[str, int] = field(default_factory=dict)
+    response_cache_path: str = "data/cache/responses.sqlite"
+    response_cache_ttl: int = 7 * 24 * 3600
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+
+    def oracle_ttl_for(self, tables) -> int:
+        """TTL for a query reading the given tables: the shortest applicable TTL (0 = do not cache)."""
+        ttls = [self.oracle_table_ttls[t] for t in tables if t in self.oracle_table_ttls]
+        ttls += [self.oracle_table_ttls[t.split(".")[-1]] for t in tables
+                 if "." in t and t.split(".")[-1] in self.oracle_table_ttls]
+        return min(ttls) if ttls else self.oracle_result_ttl
+
+cache_config = CacheConfig(
+    result_cache_max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    oracle_result_ttl=int(os.getenv("ORACLE_RESULT_TTL", "300")),
+    oracle_table_ttls=_parse_ttl_overrides(os.getenv("ORACLE_RESULT_TTL_OVERRIDES", "")),
+    response_cache_path=os.getenv("RESPONSE_CACHE_PATH", "data/cache/responses.sqlite"),
+    response_cache_ttl=int(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600))),
+    response_cache_max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024
+)
+
+@dataclass
+class PromptContextConfig:
+    """Budget for the schema/business-dictionary context added to prompts."""
+    token_budget: int = 1200
+    top_k_mappings: int = 8
+    top_k_tables: int = 6
+    max_columns_per_table: int = 15
+
+prompt_context_config = PromptContextConfig(
+    token_budget=int(os.getenv("PROMPT_CONTEXT_TOKENS", "1200")),
+    top_k_mappings=int(os.getenv("PROMPT_TOP_MAPPINGS", "8")),
+    top_k_tables=int(os.getenv("PROMPT_TOP_TABLES", "6")),
+    max_columns_per_table=int(os.getenv("PROMPT_MAX_COLUMNS", "15"))
+)
+
+@dataclass
+class FewShotConfig:
+    """Embedding-based few-shot example retrieval."""
+    enabled: bool = False
+    embedding_provider: str = "bedrock"
+    examples_path: str = "data/cache/sql_examples.jsonl"
+    embedding_cache_path: str = "data/cache/embeddings.sqlite"
+    k: int = 3
+    min_similarity: float = 0.75
+    ivf_threshold: int = 5000
+    ivf_lists: int = 0
+    ivf_nprobe: int = 4
+    ivf_retrain_growth: float = 0.5
+    retry_after: float = 300.0
+
+few_shot_config = FewShotConfig(
+    enabled=os.getenv("FEW_SHOT_ENABLED", "false").lower() == "true",
+    embedding_provider=os.getenv("EMBEDDING_PROVIDER", "bedrock").lower(),
+    examples_path=os.getenv("FEW_SHOT_EXAMPLES_PATH", "data/cache/sql_examples.jsonl"),
+    embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH", "data/cache/embeddings.sqlite"),
+    k=int(os.getenv("FEW_SHOT_K", "3")),
+    min_similarity=float(os.getenv("FEW_SHOT_MIN_SIMILARITY", "0.75")),
+    ivf_threshold=int(os.getenv("FEW_SHOT_IVF_THRESHOLD", "5000")),
+    ivf_lists=int(os.getenv("FEW_SHOT_IVF_LISTS", "0")),
+    ivf_nprobe=int(os.getenv("FEW_SHOT_IVF_NPROBE", "4")),
+    ivf_retrain_growth=float(os.getenv("FEW_SHOT_IVF_RETRAIN_GROWTH", "0.5")),
+    retry_after=float(os.getenv("FEW_SHOT_RETRY_AFTER", "300"))
+)
+
+@dataclass
+class LLMConfig:
+    """LLM provider selection and HTTP connection pooling."""
+    provider: str = "openai"
+    openai_model: str = "gpt-4"
+    request_timeout: float = 120.0
+    http_max_connections: int = 20
+    http_max_keepalive: int = 10
+    http_keepalive_expiry: float = 60.0
+    bedrock_max_pool_connections: int = 20
+
+llm_config = LLMConfig(
+    provider=os.getenv("LLM_PROVIDER", "openai").lower(),
+    openai_model=os.getenv("OPENAI_MODEL", "gpt-4"),
+    request_timeout=float(os.getenv("LLM_REQUEST_TIMEOUT", "120")),
+    http_max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")),
+    http_max_keepalive=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10")),
+    http_keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60")),
+    bedrock_max_pool_connections=int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "20"))
+)
+
+@dataclass
+class PipelineConfig:
+    """Concurrency caps of the async question pipeline (0 = pool size for Oracle)."""
+    llm_concurrency: int = 8
+    duckdb_concurrency: int = 4
+    oracle_concurrency: int = 0
+
+pipeline_config = PipelineConfig(
+    llm_concurrency=int(os.getenv("PIPELINE_LLM_CONCURRENCY", "8")),
+    duckdb_concurrency=int(os.getenv("PIPELINE_DUCKDB_CONCURRENCY", "4")),
+    oracle_concurrency=int(os.getenv("PIPELINE_ORACLE_CONCURRENCY", "0"))
+)
+
+def _parse_rate_limits(value: str) -> Dict[str, Tuple[int, int]]:
+    """Parse 'provider:model=rpm/tpm,...' into {provider:model: (rpm, tpm)}."""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, rates = item.rsplit("=", 1)
+            rpm, _, tpm = rates.partition("/")
+            limits[key.strip()] = (int(rpm or 0), int(tpm or 0))
+    return limits
+
+@dataclass
+class RateLimitConfig:
+    """Client-side LLM rate limits (0 = learned from throttling) and retry policy."""
+    requests_per_minute: int = 0
+    tokens_per_minute: int = 0
+    model_limits: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    expected_output_tokens: int = 600
+    burst_seconds: float = 10.0
+    decrease_factor: float = 0.5
+    min_requests_per_minute: float = 2.0
+    max_retries: int = 4
+    backoff_base: float = 1.0
+    backoff_max: float = 30.0
+    queue_deadline: float = 45.0
+
+    def limits_for(self, provider: str, model_id: str) -> Tuple[int, int]:
+        """(rpm, tpm) for a provider/model; LLM_RATE_LIMITS entries override the defaults."""
+        return self.model_limits.get(
+            f"{provider}:{model_id}",
+            self.model_limits.get(provider, (self.requests_per_minute, self.tokens_per_minute))
+        )
+
+rate_limit_config = RateLimitConfig(
+    requests_per_minute=int(os.getenv("LLM_RPM", "0")),
+    tokens_per_minute=int(os.getenv("LLM_TPM", "0")),
+    model_limits=_parse_rate_limits(os.getenv("LLM_RATE_LIMITS", "")),
+    expected_output_tokens=int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "600")),
+    burst_seconds=float(os.getenv("LLM_BURST_SECONDS", "10")),
+    decrease_factor=float(os.getenv("LLM_DECREASE_FACTOR", "0.5")),
+    min_requests_per_minute=float(os.getenv("LLM_MIN_RPM", "2")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+    backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "1")),
+    backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "30")),
+    queue_deadline=float(os.getenv("LLM_QUEUE_DEADLINE", "45"))
+)
+
+@dataclass
+class TemplateConfig:
+    """Deterministic SQL templates for common questions (answered without the LLM)."""
+    enabled: bool = True
+    min_confidence: float = 0.85
+    default_top_n: int = 10
+    max_rows: int = 1000
+    max_filter_values: int = 5000
+    assumed_llm_seconds: float = 5.0
+
+template_config = TemplateConfig(
+    enabled=os.getenv("QUERY_TEMPLATES", "true").lower() == "true",
+    min_confidence=float(os.getenv("TEMPLATE_MIN_CONFIDENCE", "0.85")),
+    default_top_n=int(os.getenv("TEMPLATE_DEFAULT_TOP_N", "10")),
+    max_rows=int(os.getenv("TEMPLATE_MAX_ROWS", "1000")),
+    max_filter_values=int(os.getenv("TEMPLATE_MAX_FILTER_VALUES", "5000")),
+    assumed_llm_seconds=float(os.getenv("TEMPLATE_ASSUMED_LLM_SECONDS", "5.0"))
+)
+
+@dataclass
+class SQLGuardConfig:
+    """Pre-execution checks on generated SQL (read-only, plan estimates, row limit)."""
+    enabled: bool = True
+    explain: bool = True
+    row_limit: int = 100000
+    max_peak_rows: int = 50000000
+    max_cost: int = 1000000
+    cache_seconds: int = 300
+    cache_entries: int = 256
+
+sql_guard_config = SQLGuardConfig(
+    enabled=os.getenv("SQL_GUARD", "true").lower() == "true",
+    explain=os.getenv("SQL_GUARD_EXPLAIN", "true").lower() == "true",
+    row_limit=int(os.getenv("SQL_GUARD_ROW_LIMIT", "100000")),
+    max_peak_rows=int(os.getenv("SQL_GUARD_MAX_PEAK_ROWS", "50000000")),
+    max_cost=int(os.getenv("SQL_GUARD_MAX_COST", "1000000")),
+    cache_seconds=int(os.getenv("SQL_GUARD_CACHE_SECONDS", "300")),
+    cache_entries=int(os.getenv("SQL_GUARD_CACHE_ENTRIES", "256"))
+)
+
+@dataclass
+class JobQueueConfig:
+    """Background chat jobs: worker threads, optional DuckDB worker processes and retention."""
+    workers: int = 8
+    process_workers: int = 0
+    retention_seconds: int = 3600
+    max_jobs_per_session: int = 20
+    poll_seconds: float = 1.0
+
+job_queue_config = JobQueueConfig(
+    workers=int(os.getenv("JOB_WORKERS", "8")),
+    process_workers=int(os.getenv("JOB_PROCESS_WORKERS", "0")),
+    retention_seconds=int(os.getenv("JOB_RETENTION_SECONDS", "3600")),
+    max_jobs_per_session=int(os.getenv("JOB_MAX_PER_SESSION", "20")),
+    poll_seconds=float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+)
+
+def _parse_column_map(value: str) -> Dict[str, str]:
+    """Parse 'TABLE=COLUMN,TABLE=COLUMN' into a dict of upper-cased names."""
+    columns = {}
+    for item in value.split(","):
+        if "=" in item:
+            table, column = item.split("=", 1)
+            columns[table.strip().upper()] = column.strip().upper()
+    return columns
+
+@dataclass
+class ReplicaConfig:
+    """Local Parquet replica of dictionary-mapped Oracle tables and read routing."""
+    enabled: bool = False
+    path: str = "data/replica"
+    tables: Tuple[str, ...] = ()
+    change_columns: Dict[str, str] = field(default_factory=dict)
+    key_columns: Dict[str, str] = field(default_factory=dict)
+    refresh_seconds: int = 300
+    snapshot_seconds: int = 3600
+    max_staleness_seconds: int = 7200
+    max_rows: int = 2000000
+
+replica_config = ReplicaConfig(
+    enabled=os.getenv("REPLICA_ENABLED", "false").lower() == "true",
+    path=os.getenv("REPLICA_PATH", "data/replica"),
+    tables=tuple(t.strip().upper() for t in os.getenv("REPLICA_TABLES", "").split(",") if t.strip()),
+    change_columns=_parse_column_map(os.getenv("REPLICA_CHANGE_COLUMNS", "")),
+    key_columns=_parse_column_map(os.getenv("REPLICA_KEY_COLUMNS", "")),
+    refresh_seconds=int(os.getenv("REPLICA_REFRESH_SECONDS", "300")),
+    snapshot_seconds=int(os.getenv("REPLICA_SNAPSHOT_SECONDS", "3600")),
+    max_staleness_seconds=int(os.getenv("REPLICA_MAX_STALENESS_SECONDS", "7200")),
+    max_rows=int(os.getenv("REPLICA_MAX_ROWS", "2000000"))
+)
+
+@dataclass
+class FederationConfig:
+    """Federated queries joining the rate deck (DuckDB) with Oracle tables fetched on demand."""
+    enabled: bool = True
+    deck_keywords: Tuple[str, ...] = ("buy rate", "rate deck", "deck", "csv", "loaded data", "local data")
+    max_tables: int = 8
+    max_rows_per_table: int = 200000
+    max_in_list: int = 1000
+    schema_ttl: int = 3600
+
+federation_config = FederationConfig(
+    enabled=os.getenv("FEDERATED_QUERIES", "true").lower() == "true",
+    deck_keywords=tuple(k.strip().lower() for k in os.getenv(
+        "FEDERATION_DECK_KEYWORDS", "buy rate,rate deck,deck,csv,loaded data,local data").split(",") if k.strip()),
+    max_tables=int(os.getenv("FEDERATION_MAX_TABLES", "8")),
+    max_rows_per_table=int(os.getenv("FEDERATION_MAX_ROWS", "200000")),
+    max_in_list=int(os.getenv("FEDERATION_MAX_IN_LIST", "1000")),
+    schema_ttl=int(os.getenv("FEDERATION_SCHEMA_TTL", "3600"))
 )
@@ -1,14 +1,12 @@
 import streamlit as st
 from dotenv import load_dotenv
-from os import getenv
-from openai import OpenAI
 import re
-import pandas as pd
-import duckdb
-import json
+import hashlib
 import logging
-import boto3
-from botocore.exceptions import ClientError
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+from .llm_providers import get_llm_provider
+from .single_flight import flight_key, get_single_flight
 
 load_dotenv()
 
@@ -16,31 +14,8 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# =============================================================================
-# LLM PROVIDER SELECTION - Comment/Uncomment to switch between providers
-# =============================================================================
-# 
-# TO SWITCH PROVIDERS:
-# 1. For OpenAI: Keep lines 25-26 uncommented, comment out lines 29-31
-# 2. For Bedrock: Comment out lines 25-26, uncomment lines 29-31
-#
-# OpenAI uses: GPT-4 with streaming responses
-# Bedrock uses: Claude 3.5 Sonnet (configured in .env file)
-# =============================================================================
-
-# Option 1: OpenAI (Comment out these 2 lines to disable)
-USE_OPENAI = True
-client = OpenAI(api_key=getenv("OPENAI_API_KEY"))
-
-# Option 2: AWS Bedrock (Uncomment these 3 lines to enable)
-#USE_OPENAI = False
-#from config.aws_config import aws_config, bedrock_config
-#bedrock_client = aws_config.get_session().client('bedrock-runtime')
- 
-# Initialize OpenAI client placeholder; set when OpenAI is enabled
-client = None
-if USE_OPENAI:
-    client = OpenAI(api_key=getenv("OPENAI_API_KEY"))
+# LLM provider is selected with the LLM_PROVIDER environment variable
+# (openai, bedrock or fake); see src/llm_providers.py
 
 def extract_sql_query(text):
     """Extract SQL query from LLM response (strips trailing semicolons)."""
@@ -60,12 +35,20 @@ def extract_sql_query(text):
     
     return None
 
-def get_data_context():
-    """Get context about the current dataset (robust to non-Streamlit contexts)."""
+def _session_dataframe():
     try:
-        if hasattr(st.session_state, 'current_df') and st.session_state.current_df is not None:
-            columns = list(st.session_state.current_df.columns)
-            dtypes = st.session_state.current_df.dtypes.to_dict()
+        return getattr(st.session_state, 'current_df', None)
+    except Exception:
+        return None
+
+def get_data_context(dataframe=None):
+    """Get context about the given (default: the session's current) dataset (robust to non-Streamlit contexts)."""
+    try:
+        if dataframe is None:
+            dataframe = _session_dataframe()
+        if dataframe is not None:
+            columns = list(dataframe.columns)
+            dtypes = dataframe.dtypes.to_dict()
             
             column_info = []
             for col in columns:
@@ -74,9 +57,11 @@ def get_data_context():
                     column_info.append(f"- {col}: Integer values")
                 elif 'float' in dtype_str:
                     column_info.append(f"- {col}: Decimal/float values")
-                elif 'datetime' in dtype_str:
+                elif 'datetime' in dtype_str or 'timestamp' in dtype_str:
                     column_info.append(f"- {col}: Date/time values")
-                elif 'object' in dtype_str:
+                elif 'category' in dtype_str:
+                    column_info.append(f"- {col}: Text/string values (categorical)")
+                elif 'object' in dtype_str or dtype_str == 'str' or 'string' in dtype_str:
                     column_info.append(f"- {col}: Text/string values")
                 else:
                     column_info.append(f"- {col}: {dtype_str} values")
@@ -87,7 +72,7 @@ def get_data_context():
             Current dataset columns and types:
             {chr(10).join(column_info)}
             
-            Current dataset has {len(st.session_state.current_df)} rows.
+            Current dataset has {len(dataframe)} rows.
             
             Focus on buy rate analysis queries such as:
             - Rate comparisons and trends
@@ -113,85 +98,9 @@ def get_data_context():
         Focus on generating proper SQL queries for data analysis.
         """
 
-def get_bedrock_response(messages, model_id=None):
-    """Get response from AWS Bedrock Claude API"""
-    try:
-        from config.aws_config import bedrock_config
-        
-        # Use the LLM model ID from config (Claude 3.5 Sonnet)
-        model_id = model_id or bedrock_config.llm_model_id
-        
-        # Convert messages to Claude format
-        system_message = ""
-        conversation_messages = []
-        
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                conversation_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-        
-        # Prepare request body for Claude with optimized settings
-        body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 4000,
-            "temperature": 0.1,  # Lower temperature for more consistent SQL generation
-            "top_p": 0.9,        # Focused responses
-            "system": system_message,
-            "messages": conversation_messages
-        }
-        
-        # Get Bedrock client
-        session = boto3.Session(
-            profile_name=getenv('AWS_PROFILE', 'bedrock'),
-            region_name=getenv('AWS_REGION', 'us-east-1')
-        )
-        bedrock_client = session.client('bedrock-runtime')
-        
-        # Call Bedrock
-        response = bedrock_client.invoke_model(
-            modelId=model_id,
-            contentType='application/json',
-            accept='application/json',
-            body=json.dumps(body)
-        )
-        
-        # Parse response
-        response_body = json.loads(response['body'].read())
-        
-        # Extract text content
-        if 'content' in response_body and len(response_body['content']) > 0:
-            return response_body['content'][0]['text']
-        else:
-            return "Sorry, I couldn't generate a response."
-            
-    except Exception as e:
-        raise e
-
-def get_ai_response(messages, model="gpt-4"):
-    """Get response from configured LLM provider (OpenAI or Bedrock)"""
-    try:
-        if USE_OPENAI:
-            # OpenAI API call with streaming
-            stream = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                stream=True,
-            )
-            return stream
-        else:
-            # Bedrock API call (non-streaming for now)
-            response_text = get_bedrock_response(messages)
-            # Convert to generator for compatibility with Streamlit
-            def text_generator():
-                yield response_text
-            return text_generator()
-            
-    except Exception as e:
-        raise e
+def get_ai_response(messages, model=None):
+    """Stream a response from the configured LLM provider as text deltas"""
+    return get_llm_provider().stream(messages)
 
 def create_system_message():
     """Create the system message for the AI assistant"""
@@ -222,13 +131,32 @@ def prepare_messages_for_api(chat_messages):
 # Enhanced system/context and routing for local vs Oracle queries
 # -----------------------------------------------------------------------------
 
-def get_enhanced_system_message():
-    """Create enhanced system message for both CSV and Oracle queries"""
-    business_context = get_business_dictionary_context()
+def get_relevant_context(user_message: str):
+    """Schema/business-dictionary context relevant to the question (None if unavailable)"""
+    try:
+        from .schema_service import get_schema_service
+        from .context_retrieval import get_context_retriever
+        snapshot = get_schema_service().snapshot()
+        return get_context_retriever(snapshot).retrieve(user_message)
+    except Exception as e:
+        logger.error(f"Error retrieving prompt context: {e}")
+        return None
+
+def get_enhanced_system_message(user_message=None, few_shot="", dataframe=None):
+    """Create enhanced system message for both CSV and Oracle queries.
     
-    return {
+    With a user message, only the mappings and tables relevant to it are included.
+    Few-shot examples (already formatted) are appended to the business context.
+    The dataset described defaults to the session's current frame.
+    """
+    context = get_relevant_context(user_message) if user_message else None
+    business_context = context.text if context is not None else get_business_dictionary_context()
+    if few_shot:
+        business_context = f"{business_context}\n\n{few_shot}" if business_context else few_shot
+    
+    message = {
         "role": "system", 
-        "content": f"""You are a helpful data analyst specializing in buy rates analysis and database queries. {get_data_context()}
+        "content": f"""You are a helpful data analyst specializing in buy rates analysis and database queries. {get_data_context(dataframe)}
         
         You can help with Oracle database queries. When users ask about:
         - Database tables, schemas, or structure
@@ -265,14 +193,22 @@ def get_enhanced_system_message():
         Be helpful and focus on data-driven insights from both local CSV and Oracle database.
         """
     }
+    if context is not None:
+        from .context_retrieval import estimate_tokens
+        prompt_tokens = estimate_tokens(message["content"])
+        logger.info(
+            f"System prompt ~{prompt_tokens} tokens "
+            f"(~{prompt_tokens - context.tokens + context.full_tokens} unpruned); "
+            f"mappings {list(context.mappings)}, tables {list(context.tables)}"
+        )
+    return message
 
 
 def get_business_dictionary_context():
     """Get business dictionary context for AI consumption"""
     try:
-        from .schema_service import SchemaService
-        schema_service = SchemaService()
-        business_dict = schema_service.load_business_dictionary()
+        from .schema_service import get_schema_service
+        business_dict = get_schema_service().snapshot().business_dictionary
         
         mappings = business_dict.get("mappings", [])
         if not mappings:
@@ -304,87 +240,372 @@ def get_business_dictionary_context():
         return ""
 
 
-def get_ai_response_simple(user_message: str):
-    """Get AI response for a single user message"""
+def build_chat_messages(user_message: str, few_shot: str = "", dataframe=None):
+    """System message (with relevant context and examples) plus the user's question"""
+    return [
+        get_enhanced_system_message(user_message, few_shot, dataframe),
+        {"role": "user", "content": user_message}
+    ]
+
+
+def get_ai_response_simple(user_message: str, few_shot: str = ""):
+    """Get AI response for a single user message (identical concurrent questions share one call)"""
     try:
-        messages = [
-            get_enhanced_system_message(),
-            {"role": "user", "content": user_message}
-        ]
-        
-        if USE_OPENAI:
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                stream=False,
-            )
-            return response.choices[0].message.content
-        else:
-            response_text = get_bedrock_response(messages)
-            return response_text
-            
+        from .response_cache import normalize_question
+        provider = get_llm_provider()
+        key = flight_key(current_model_id(), normalize_question(user_message), few_shot, get_prompt_data_version())
+        return get_single_flight("llm").do(key, provider.complete, build_chat_messages(user_message, few_shot))
     except Exception as e:
         return f"Error getting AI response: {str(e)}"
 
 
-def execute_sql_query(query, dataframe):
-    """Execute SQL query on dataframe using DuckDB"""
+def current_model_id():
+    """Identifier of the model answering chat questions (part of response cache keys)"""
+    provider = get_llm_provider()
+    return f"{provider.name}:{provider.model_id}"
+
+
+def get_prompt_data_version(dataframe=None):
+    """Version of the dataset described in the prompt: CSV fingerprint plus the column context"""
+    if dataframe is None:
+        dataframe = _session_dataframe()
+    data_context = get_data_context(dataframe)
+    data_version = ""
+    if dataframe is not None:
+        data_version = dataframe.attrs.get("data_version", "")
+    digest = hashlib.blake2b(data_context.encode("utf-8"), digest_size=8).hexdigest()
+    return f"{data_version}:{digest}"
+
+
+def get_few_shot_examples(user_message: str, source: str):
+    """Nearest past successful question/SQL pairs for this source (empty list if unavailable)"""
     try:
-        conn = duckdb.connect()
-        conn.register('df', dataframe)
-        result = conn.execute(query).fetchdf()
-        conn.close()
+        from .example_store import get_example_store
+        store = get_example_store()
+        if store is None:
+            return []
+        return [example for example, _ in store.search(user_message, source=source)]
+    except Exception as e:
+        logger.error(f"Error retrieving few-shot examples: {e}")
+        return []
+
+
+def record_sql_outcome(user_message: str, sql_query: str, source: str, succeeded: bool, meta: dict):
+    """Track first-attempt SQL success and remember successful pairs as future examples"""
+    if meta.get("cached") or meta.get("template"):
+        return
+    try:
+        from .example_store import get_example_store
+        store = get_example_store()
+        if store is None:
+            return
+        store.record_outcome(succeeded, used_examples=meta.get("examples", 0) > 0)
+        if succeeded:
+            store.add(user_message, sql_query, source)
+    except Exception as e:
+        logger.error(f"Error recording SQL outcome: {e}")
+
+
+def execute_sql_query(query, dataframe, session_id=None, cancel_token=None):
+    """Execute SQL query on dataframe using the shared DuckDB engine
+    
+    Errors come back as strings; cancellation and timeouts (QueryCancelled) are raised.
+    """
+    from .cancellation import QueryCancelled
+    try:
+        from .duckdb_engine import get_duckdb_engine
+        from .result_cache import get_result_cache
+        engine = get_duckdb_engine()
+        cache = get_result_cache()
+        # Only results over the registered rate deck have a version to key on
+        version = engine.frame_version(dataframe)
+        if version is None:
+            return engine.execute(query, dataframe, session_id=session_id, cancel_token=cancel_token)
+        cached = cache.get("duckdb", version, query)
+        if cached is not None:
+            return cached
+        # Sessions running the same query on the same deck share one execution;
+        # it is interrupted only once every session waiting on it has cancelled
+        from .cancellation import CancelToken
+        from .sql_utils import normalize_sql
+        result = get_single_flight("duckdb").do(
+            flight_key(version, normalize_sql(query)), _execute_deck_query, engine, query, dataframe,
+            version, session_id, cancel_token=cancel_token or CancelToken()
+        )
+        cache.put("duckdb", version, query, result)
         return result
+    except QueryCancelled:
+        raise
     except Exception as e:
         return f"Error executing query: {str(e)}"
 
 
-def enhanced_query_handler(user_message: str, dataframe):
-    """Enhanced query handler that can use both local and Oracle data with business dictionary"""
+def _execute_deck_query(engine, query, dataframe, version, session_id, cancel_token):
+    """Run a query over the rate deck: in a job worker process when enabled, else on the shared engine"""
+    from config.config import duckdb_config, job_queue_config
+    if job_queue_config.process_workers > 0:
+        from .job_queue import get_job_queue, run_deck_query
+        try:
+            return get_job_queue().run_in_process(run_deck_query, query, version, cancel_token=cancel_token,
+                                                  timeout=duckdb_config.query_timeout)
+        except ValueError as e:
+            logger.info(f"Running deck query in the server process: {e}")
+    return engine.execute(query, dataframe, session_id=session_id, cancel_token=cancel_token)
+
+
+def execute_oracle_query(sql_query, cancel_token=None):
+    """Execute SQL on Oracle through the result cache (entries expire per table TTL)
+    
+    Queries that only read fresh replicated tables are served by the local replica.
+    """
+    from config.config import oracle_config
+    from .database_tools import get_db_manager
+    from .result_cache import get_result_cache
+
+    replicated = execute_replica_query(sql_query, cancel_token)
+    if replicated is not None:
+        return replicated
+    cache = get_result_cache()
+    cached = cache.get(_oracle_cache_source(), "ttl", sql_query)
+    if cached is not None:
+        return cached
+    result = get_db_manager().execute_query(sql_query, arrow=oracle_config.fetch_arrow, cancel_token=cancel_token)
+    _cache_oracle_result(sql_query, result)
+    return result
+
+
+async def execute_oracle_query_async(sql_query, cancel_token=None):
+    """Async execute_oracle_query: same result cache, oracledb's asyncio API for the query"""
+    from config.config import oracle_config
+    from .database_tools import get_db_manager
+    from .result_cache import get_result_cache
+
+    cached = get_result_cache().get(_oracle_cache_source(), "ttl", sql_query)
+    if cached is not None:
+        return cached
+    result = await get_db_manager().execute_query_async(sql_query, arrow=oracle_config.fetch_arrow,
+                                                        cancel_token=cancel_token)
+    _cache_oracle_result(sql_query, result)
+    return result
+
+
+def execute_federated_query(sql_query, dataframe, cancel_token=None):
+    """Run a federated query: the deck as `df` joined locally with Oracle tables fetched on demand"""
+    from .cancellation import QueryCancelled
+    from .federation import get_federated_engine
+    try:
+        return get_federated_engine().execute(sql_query, dataframe, cancel_token)
+    except QueryCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Federated query failed: {e}")
+        return f"Error executing federated query: {str(e)}"
+
+
+def replica_covers(sql_query):
+    """True when the local replica holds fresh copies of every table the query reads"""
+    from .oracle_replica import get_oracle_replica
+    replica = get_oracle_replica()
+    return replica is not None and replica.covers(sql_query) is not None
+
+
+def execute_replica_query(sql_query, cancel_token=None):
+    """Run an Oracle query on the local replica; None when it has to go to Oracle"""
+    from .oracle_replica import get_oracle_replica
+    replica = get_oracle_replica()
+    if replica is None:
+        return None
+    return replica.try_query(sql_query, cancel_token)
+
+
+def _oracle_cache_source():
+    from config.config import oracle_config
+    return f"oracle:{oracle_config.user}@{oracle_config.dsn}"
+
+
+def _cache_oracle_result(sql_query, result):
+    from config.config import cache_config
+    from .result_cache import get_result_cache
+    from .sql_utils import referenced_tables
+    get_result_cache().put(_oracle_cache_source(), "ttl", sql_query, result,
+                           ttl=cache_config.oracle_ttl_for(referenced_tables(sql_query)))
+
+
+def mentions_oracle(user_message: str):
+    """True when the question explicitly asks for the database (not just a business term)"""
     oracle_keywords = ['oracle', 'database', 'db', 'table', 'schema', 'sql server']
-    is_oracle_query = any(keyword in user_message.lower() for keyword in oracle_keywords)
+    return any(keyword in user_message.lower() for keyword in oracle_keywords)
+
+
+def is_oracle_question(user_message: str):
+    """Route a question to Oracle (keywords or business dictionary terms) or the local CSV"""
+    if mentions_oracle(user_message):
+        return True
+    try:
+        from .schema_service import get_schema_service
+        business_matches = get_schema_service().search_business_terms(user_message)
+        if business_matches:
+            logger.info(f"Found business dictionary matches: {[m['business_term'] for m in business_matches]}")
+            return True
+    except Exception as e:
+        logger.error(f"Error checking business dictionary: {e}")
+    return False
+
+
+def is_federated_question(user_message: str, dataframe):
+    """True when an Oracle question also asks about the loaded rate deck (answered by one federated query)"""
+    from config.config import federation_config
+    if not federation_config.enabled or dataframe is None:
+        return False
+    text = user_message.lower()
+    if not any(keyword in text for keyword in federation_config.deck_keywords):
+        return False
+    return is_oracle_question(user_message)
+
+
+@dataclass
+class PreparedQuestion:
+    """A routed question, ready for the LLM (or already answered when reply is set)."""
+    user_message: str
+    source: str
+    dataframe: Any = None
+    session_id: Optional[str] = None
+    messages: Optional[list] = None
+    reply: Optional[str] = None
+    cache_key: Optional[Tuple[str, ...]] = None
+    flight_key: Optional[str] = None
+    examples: int = 0
+    cached: bool = False
+    template: Optional[str] = None
+
+
+def match_query_template(user_message: str, dataframe, source: str):
+    """Try the deterministic query templates before the LLM; returns the match or None.
     
-    if not is_oracle_query:
-        try:
-            from .schema_service import SchemaService
-            schema_service = SchemaService()
-            business_matches = schema_service.search_business_terms(user_message)
-            if business_matches:
-                is_oracle_query = True
-                logger.info(f"Found business dictionary matches: {[m['business_term'] for m in business_matches]}")
-        except Exception as e:
-            logger.error(f"Error checking business dictionary: {e}")
+    The rate deck is tried first unless the question asks for the database
+    explicitly, because dictionary synonyms such as "suppliers" also name deck
+    columns; Oracle questions then try the table of their best dictionary mapping.
+    """
+    from .query_templates import get_template_engine, oracle_target
+    engine = get_template_engine()
+    if engine is None:
+        return None
+    try:
+        from .schema_service import get_schema_service
+        snapshot = get_schema_service().snapshot()
+        targets = []
+        if dataframe is not None and not mentions_oracle(user_message):
+            targets.append(engine.deck_target(dataframe, snapshot.business_dictionary, snapshot.version))
+        if source == "oracle":
+            for term_match in snapshot.matcher.best_matches(user_message)[:1]:
+                target = oracle_target(snapshot.matcher.mappings[term_match.mapping_index], snapshot.schema)
+                if target is not None:
+                    targets.append(target)
+        if not targets:
+            return None
+        from .llm_providers import llm_metrics
+        return engine.answer(user_message, targets, llm_metrics.summary().get("avg_total_seconds"))
+    except Exception as e:
+        logger.error(f"Error matching query templates: {e}")
+        return None
+
+
+def prepare_question(user_message: str, dataframe, session_id=None):
+    """Route a question and build its prompt: templates, Oracle connect, response cache, few-shot examples.
     
-    if is_oracle_query:
+    Cache keys include the schema/dictionary snapshot version, the prompt's data
+    version and the model id, so any change to those produces a fresh LLM call.
+    Template answers, cache hits and connection errors come back with reply set
+    and no messages. Questions about both the deck and Oracle are routed to the
+    "federated" source (src/federation.py).
+    """
+    if is_federated_question(user_message, dataframe):
+        # Deck and Oracle tables in one query: no single-source template applies
+        source, match = "federated", None
+    else:
+        source = "oracle" if is_oracle_question(user_message) else "local"
+        match = match_query_template(user_message, dataframe, source)
+    if match is not None:
+        from .query_templates import format_template_answer
+        source = "oracle" if match.dialect == "oracle" else "local"
+    question = PreparedQuestion(user_message, source, dataframe=dataframe, session_id=session_id)
+    if source in ("oracle", "federated"):
         try:
-            from .database_tools import get_db_status, set_db_status, init_database_connection, get_db_manager
-            if not get_db_status():
-                if init_database_connection():
+            from .database_tools import get_db_manager, init_database_connection, set_db_status
+            if not get_db_manager().connected:
+                if not init_database_connection():
+                    question.reply = "Oracle database is not connected. Please check your database configuration."
+                    return question
+                try:
                     set_db_status(True)
-            if get_db_status():
-                ai_response = get_ai_response_simple(user_message)
-                sql_query = extract_sql_query(ai_response)
-                if sql_query:
-                    db_manager = get_db_manager()
-                    query_result = db_manager.execute_query(sql_query)
-                    return ai_response, sql_query, query_result, "oracle"
-                else:
-                    return ai_response, None, None, "oracle"
-            else:
-                return "Oracle database is not connected. Please check your database configuration.", None, None, "oracle"
+                except Exception:
+                    pass  # Not in Streamlit context
         except Exception as e:
-            return f"Error with Oracle database: {str(e)}", None, None, "oracle"
-    else:
+            question.reply = f"Error with Oracle database: {str(e)}"
+            return question
+    if match is not None:
+        question.reply = format_template_answer(match)
+        question.template = match.intent
+        return question
+    
+    from .response_cache import get_response_cache, normalize_question
+    try:
+        from .schema_service import get_schema_service
+        version_key = (source, get_schema_service().version, get_prompt_data_version(dataframe), current_model_id())
+    except Exception as e:
+        logger.error(f"Error computing answer versions: {e}")
+        version_key = None
+    cache = get_response_cache()
+    if cache is not None and version_key is not None:
         try:
-            ai_response = get_ai_response_simple(user_message)
-            sql_query = extract_sql_query(ai_response)
-            if sql_query:
-                query_result = execute_sql_query(sql_query, dataframe)
-                return ai_response, sql_query, query_result, "local"
-            else:
-                return ai_response, None, None, "local"
+            question.cache_key = version_key
+            cached = cache.get(user_message, *question.cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for question ({source})")
+                question.reply = cached.response
+                question.cached = True
+                return question
         except Exception as e:
-            return f"Error processing query: {str(e)}", None, None, "local"
+            logger.error(f"Error reading response cache: {e}")
+            question.cache_key = None
+    
+    from .example_store import format_few_shot
+    examples = get_few_shot_examples(user_message, source)
+    question.examples = len(examples)
+    question.messages = build_chat_messages(user_message, format_few_shot(examples), dataframe)
+    if source == "federated":
+        from .federation import PROMPT_INSTRUCTIONS
+        question.messages[0]["content"] += PROMPT_INSTRUCTIONS
+    if version_key is not None:
+        # Identical concurrent questions share one LLM stream
+        question.flight_key = flight_key(version_key, normalize_question(user_message),
+                                         question.messages[0]["content"])
+    return question
+
+
+def stream_query_handler(user_message: str, dataframe):
+    """Start answering a question: stream the LLM response while its SQL runs.
+    
+    Synchronous front of the async pipeline (src/async_pipeline.py) for the
+    Streamlit script thread: iterate the returned answer for text deltas, then
+    call result() for (ai_response, sql_query, query_result, data_source).
+    """
+    from .async_pipeline import SyncAnswer
+    from .duckdb_engine import current_session_id
+    # Capture the session here: the query runs off the script thread
+    try:
+        question = prepare_question(user_message, dataframe, current_session_id())
+    except Exception as e:
+        question = PreparedQuestion(user_message, "local", reply=f"Error getting AI response: {str(e)}")
+    return SyncAnswer(question)
+
+
+def enhanced_query_handler(user_message: str, dataframe):
+    """Enhanced query handler that can use both local and Oracle data with business dictionary"""
+    try:
+        return stream_query_handler(user_message, dataframe).result()
+    except Exception as e:
+        return f"Error processing query: {str(e)}", None, None, "local"
 
 
 # Oracle database helper wrappers
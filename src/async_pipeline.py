@@ -0,0 +1,451 @@
+"""
+Asyncio question pipeline shared by all sessions.
+
+One event loop runs on a daemon thread for the whole process. Each answer
+streams its LLM response through the provider's async API (AsyncOpenAI;
+Bedrock and other blocking clients are pumped from worker threads) and starts
+the generated SQL as a task as soon as the first SQL block is complete: DuckDB
+on a worker thread, Oracle through oracledb's asyncio pool. Per-provider
+limiters cap how many LLM calls, DuckDB queries and Oracle queries are in
+flight, so a burst of sessions queues on the loop instead of exhausting
+connection pools or holding threads. Each query passes the SQL guard
+(src/sql_guard.py) right before it runs; Oracle queries that only read
+fresh replicated tables run on the local replica (src/oracle_replica.py)
+instead, and federated questions join the deck with Oracle tables fetched
+on demand (src/federation.py). An answer's CancelToken
+(src/cancellation.py) stops its LLM stream and interrupts its query, on
+timeout or from the chat panel's cancel button. SyncAnswer adapts an answer
+for the Streamlit script thread.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import pandas as pd
+
+from config.config import oracle_config, pipeline_config
+from . import ai_service
+from .ai_service import PreparedQuestion
+from .cancellation import CANCELLED, CancelToken, QueryCancelled, record_interruption
+from .llm_providers import get_llm_provider
+from .rate_limiter import RateLimitExceeded
+from .single_flight import get_single_flight
+from .sql_guard import GuardDecision, get_sql_guard
+from .sql_utils import SQLBlockExtractor
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide pipeline event loop, running on a daemon thread."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-pipeline", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the shared loop and wait for its result (not from the loop thread)."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result(timeout)
+
+
+async def _anext(agen: AsyncIterator):
+    return await agen.__anext__()
+
+
+async def _aclose(agen: AsyncIterator) -> None:
+    await agen.aclose()
+
+
+def iterate_sync(agen: AsyncIterator) -> Iterator:
+    """Iterate an async generator on the shared loop, one item per step."""
+    try:
+        while True:
+            try:
+                item = run_sync(_anext(agen))
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        run_sync(_aclose(agen))
+
+
+class ConcurrencyLimiter:
+    """Async semaphore with in-flight, queued and wait-time counters.
+
+    Only used on the shared loop, so the counters need no lock.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.peak_active = 0
+        self.completed = 0
+        self._wait_total = 0.0
+
+    async def __aenter__(self):
+        self.waiting += 1
+        start_time = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self._wait_total += time.perf_counter() - start_time
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.active -= 1
+        self.completed += 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        entered = self.completed + self.active
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "peak_active": self.peak_active,
+            "completed": self.completed,
+            "avg_wait_ms": self._wait_total / entered * 1000 if entered else 0.0,
+        }
+
+
+_limiters: Dict[str, ConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limit_for(name: str) -> int:
+    if name.startswith("llm:"):
+        return pipeline_config.llm_concurrency
+    if name == "oracle":
+        return pipeline_config.oracle_concurrency or oracle_config.pool_max
+    return pipeline_config.duckdb_concurrency
+
+
+def get_limiter(name: str) -> ConcurrencyLimiter:
+    """Limiter for 'llm:<provider>', 'duckdb' or 'oracle', sized from PipelineConfig."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = ConcurrencyLimiter(name, max(_limit_for(name), 1))
+        return limiter
+
+
+def pipeline_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters of every limiter used so far."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+class AsyncAnswer:
+    """A chat answer whose text streams while its SQL already runs.
+
+    stream() yields the response text deltas; as soon as the first complete
+    ```sql block has streamed in, the query starts as a task on the loop, so
+    the query and the rest of the prose overlap. result() returns the usual
+    (ai_response, sql_query, query_result, data_source) tuple once both are done.
+    """
+
+    def __init__(self, question: PreparedQuestion):
+        self.question = question
+        self.text: Optional[str] = None
+        self.sql_query: Optional[str] = None
+        self.query_task: Optional[asyncio.Task] = None
+        self.guard: Optional[GuardDecision] = None
+        self.cancel_token = CancelToken()
+        self._sql_started_at = None
+        self._meta = {"cached": question.cached, "examples": question.examples, "template": question.template}
+        self._stream_failed = False
+        self._result = None
+
+    @property
+    def source(self) -> str:
+        return self.question.source
+
+    async def _deltas(self) -> AsyncIterator[str]:
+        if self.question.messages is None:
+            yield self.question.reply or ""
+            return
+        provider = get_llm_provider()
+        messages = self.question.messages
+
+        async def upstream():
+            async with get_limiter(f"llm:{provider.name}"):
+                async for delta in provider.astream(messages):
+                    yield delta
+
+        if self.question.flight_key is None:
+            deltas = upstream()
+        else:
+            deltas = get_single_flight("llm").stream(self.question.flight_key, upstream)
+        async for delta in deltas:
+            yield delta
+
+    async def _guarded(self, sql_query: str, replica: bool = False) -> Optional[str]:
+        """Run the SQL guard; returns the statement to execute, or None if it was refused."""
+        guard = get_sql_guard()
+        if guard is None:
+            return sql_query
+        question = self.question
+        if replica:
+            decision = guard.check_replica(sql_query)
+        elif question.source == "federated":
+            decision = guard.check_without_plan(sql_query, "duckdb", "federated query")
+        elif question.source == "oracle":
+            decision = await guard.acheck_oracle(sql_query)
+        else:
+            decision = await asyncio.to_thread(guard.check_duckdb, sql_query, question.dataframe,
+                                               question.session_id)
+        self.guard = decision
+        if not decision.allowed:
+            return None
+        self.sql_query = decision.sql
+        return decision.sql
+
+    async def _run_query(self, sql_query: str):
+        question = self.question
+        if question.source == "oracle":
+            # Reads of fresh replicated tables stay local; the replica hands back anything DuckDB cannot run
+            if ai_service.replica_covers(sql_query):
+                async with get_limiter("duckdb"):
+                    replica_sql = await self._guarded(sql_query, replica=True)
+                    if replica_sql is None:
+                        return f"Query refused by the SQL guard: {self.guard.reason}"
+                    result = await asyncio.to_thread(ai_service.execute_replica_query, replica_sql,
+                                                     self.cancel_token)
+                if result is not None:
+                    return result
+            async with get_limiter("oracle"):
+                sql_query = await self._guarded(sql_query)
+                if sql_query is None:
+                    return f"Query refused by the SQL guard: {self.guard.reason}"
+                return await ai_service.execute_oracle_query_async(sql_query, self.cancel_token)
+        if question.source == "federated":
+            # Oracle fetches dominate: queue with the Oracle queries, join locally on the worker thread
+            async with get_limiter("oracle"):
+                sql_query = await self._guarded(sql_query)
+                if sql_query is None:
+                    return f"Query refused by the SQL guard: {self.guard.reason}"
+                return await asyncio.to_thread(ai_service.execute_federated_query, sql_query,
+                                               question.dataframe, self.cancel_token)
+        async with get_limiter("duckdb"):
+            sql_query = await self._guarded(sql_query)
+            if sql_query is None:
+                return f"Query refused by the SQL guard: {self.guard.reason}"
+            return await asyncio.to_thread(ai_service.execute_sql_query, sql_query,
+                                           question.dataframe, question.session_id, self.cancel_token)
+
+    async def _execute(self, sql_query: str):
+        """Run the query; cancellation and timeouts come back as the result text."""
+        try:
+            return await self._run_query(sql_query)
+        except QueryCancelled as e:
+            return str(e)
+
+    def cancel(self) -> bool:
+        """Stop the LLM stream and interrupt the query (False if the answer is already complete)."""
+        if self._result is not None or not self.cancel_token.cancel(CANCELLED):
+            return False
+        if self.text is None:
+            record_interruption("llm", CANCELLED)
+        return True
+
+    async def _until_cancelled(self, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Yield deltas until the token is cancelled, then raise QueryCancelled without waiting for the next one."""
+        loop = asyncio.get_running_loop()
+        cancelled = asyncio.Event()
+        with self.cancel_token.on_cancel(lambda: loop.call_soon_threadsafe(cancelled.set)):
+            waiter = asyncio.ensure_future(cancelled.wait())
+            try:
+                while True:
+                    step = asyncio.ensure_future(_anext(deltas))
+                    await asyncio.wait([step, waiter], return_when=asyncio.FIRST_COMPLETED)
+                    if not step.done():
+                        step.cancel()
+                        await asyncio.wait([step])  # let the generator unwind before closing it
+                        raise QueryCancelled("Answer cancelled", "llm")
+                    try:
+                        delta = step.result()
+                    except StopAsyncIteration:
+                        return
+                    yield delta
+            finally:
+                waiter.cancel()
+                await deltas.aclose()
+
+    def _start_query(self, sql_query: str) -> None:
+        self.sql_query = sql_query
+        self._sql_started_at = time.perf_counter()
+        self.query_task = asyncio.get_running_loop().create_task(self._execute(sql_query))
+
+    async def stream(self) -> AsyncIterator[str]:
+        if self.text is not None:
+            yield self.text
+            return
+        question = self.question
+        # Only LLM answers (fresh or cached) and template answers carry SQL; error replies do not
+        runs_sql = question.messages is not None or question.cached or question.template is not None
+        extractor = SQLBlockExtractor()
+        parts = []
+        failed = False
+        try:
+            async for delta in self._until_cancelled(self._deltas()):
+                parts.append(delta)
+                if self.query_task is None and runs_sql and extractor.feed(delta):
+                    self._start_query(extractor.sql)
+                yield delta
+        except QueryCancelled:
+            failed = True
+            parts.append("\n\n⏹ Cancelled.")
+            yield parts[-1]
+        except RateLimitExceeded as e:
+            failed = True
+            error_text = (f"The AI service is busy right now (rate limited). "
+                          f"Please try again in about {max(e.retry_after, 1.0):.0f}s.")
+            parts = [error_text]
+            yield error_text
+        except Exception as e:
+            failed = True
+            error_text = f"Error getting AI response: {str(e)}"
+            parts = [error_text]
+            yield error_text
+        self.text = "".join(parts)
+        self._stream_failed = failed
+        if self.query_task is not None:
+            logger.info(f"SQL started {time.perf_counter() - self._sql_started_at:.2f}s before the response finished")
+        elif not failed and runs_sql:
+            sql_query = ai_service.extract_sql_query(self.text)
+            if sql_query:
+                self._start_query(sql_query)
+        if not failed and self.query_task is None:
+            # Answers without SQL are cached now; answers with SQL once their query succeeds (see result)
+            await asyncio.to_thread(self._update_response_cache, True)
+
+    def _update_response_cache(self, succeeded: bool) -> None:
+        """Cache a fresh answer that worked; drop a cached answer whose SQL failed on replay."""
+        question = self.question
+        if question.cache_key is None or (question.cached if succeeded else not question.cached):
+            return
+        try:
+            from .response_cache import get_response_cache
+            cache = get_response_cache()
+            if cache is None:
+                return
+            if succeeded:
+                cache.put(question.user_message, *question.cache_key, response=self.text, sql_query=self.sql_query)
+            else:
+                cache.delete(question.user_message, *question.cache_key)
+        except Exception as e:
+            logger.error(f"Error updating response cache: {e}")
+
+    async def result(self):
+        """Wait for the response and the query; returns (ai_response, sql_query, query_result, data_source)."""
+        if self._result is not None:
+            return self._result
+        if self.text is None:
+            async for _ in self.stream():
+                pass
+        question = self.question
+        if self.query_task is None:
+            self._result = (self.text, None, None, question.source)
+            return self._result
+        try:
+            query_result = await self.query_task
+            if self.cancel_token.reason == CANCELLED:
+                # Nothing to learn about the SQL from a cancelled run
+                self._result = (self.text, self.sql_query, query_result, question.source)
+                return self._result
+        except Exception as e:
+            await asyncio.to_thread(ai_service.record_sql_outcome, question.user_message, self.sql_query,
+                                    question.source, False, self._meta)
+            await asyncio.to_thread(self._update_response_cache, False)
+            # Oracle failures replace the answer, as the non-streaming handler always did
+            self._result = (f"Error with Oracle database: {str(e)}", None, None, question.source)
+            return self._result
+        succeeded = isinstance(query_result, pd.DataFrame)
+        await asyncio.to_thread(ai_service.record_sql_outcome, question.user_message, self.sql_query,
+                                question.source, succeeded, self._meta)
+        if not self._stream_failed:
+            await asyncio.to_thread(self._update_response_cache, succeeded)
+        self._result = (self.text, self.sql_query, query_result, question.source)
+        return self._result
+
+
+async def answer_question_async(user_message: str, dataframe, session_id: Optional[str] = None) -> AsyncAnswer:
+    """Route and prepare a question (on a worker thread) and return its AsyncAnswer.
+
+    Must run on the shared loop (see run_sync), where the limiters live.
+    """
+    question = await asyncio.to_thread(ai_service.prepare_question, user_message, dataframe, session_id)
+    return AsyncAnswer(question)
+
+
+async def _settle(task: asyncio.Task, timeout: Optional[float] = None) -> bool:
+    await asyncio.wait([task], timeout=timeout)
+    return task.done()
+
+
+class SyncAnswer:
+    """Blocking view of an AsyncAnswer for the Streamlit script thread.
+
+    Iterating yields text deltas (suitable for st.write_stream) while the
+    answer runs on the shared loop; result() waits for the SQL result.
+    """
+
+    def __init__(self, question: PreparedQuestion):
+        self._answer = AsyncAnswer(question)
+
+    @property
+    def text(self) -> Optional[str]:
+        return self._answer.text
+
+    @property
+    def sql_query(self) -> Optional[str]:
+        return self._answer.sql_query
+
+    @property
+    def source(self) -> str:
+        return self._answer.source
+
+    @property
+    def guard(self) -> Optional[GuardDecision]:
+        """The SQL guard's decision for the query (None until it has run, or with the guard off)."""
+        return self._answer.guard
+
+    @property
+    def query_started(self) -> bool:
+        return self._answer.query_task is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iterate_sync(self._answer.stream())
+
+    def wait_query(self, timeout: Optional[float] = None) -> bool:
+        """Block until the already started SQL query finishes, at most timeout seconds.
+        
+        Returns True once it has finished (or if none has started).
+        """
+        task = self._answer.query_task
+        return task is None or run_sync(_settle(task, timeout))
+
+    def cancel(self) -> bool:
+        """Cancel the answer from any thread: stops the stream and interrupts the query."""
+        return self._answer.cancel()
+
+    def result(self):
+        return run_sync(self._answer.result())
@@ -0,0 +1,120 @@
+"""
+Deadlines and user cancellation for running chat answers.
+
+Each answer owns a CancelToken. While a query runs, its executor registers
+how to abort it: DuckDB's `interrupt()` on the session cursor, oracledb's
+`Connection.cancel()` on the pooled connection. A per-query timeout arms a
+timer that fires the same abort, so a runaway query releases its worker
+thread and connection instead of pinning them. The chat panel's cancel
+button cancels the token of the answer in flight, which also stops its LLM
+stream. Cancelled and timed-out work is counted per engine.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CANCELLED, TIMEOUT = "cancelled", "timeout"
+
+
+class QueryCancelled(Exception):
+    """The user cancelled the answer while this work was running."""
+
+    def __init__(self, message: str = "Query cancelled", engine: str = ""):
+        super().__init__(message)
+        self.engine = engine
+
+
+class QueryTimeout(QueryCancelled):
+    """The work ran past its deadline and was interrupted."""
+
+
+class CancelToken:
+    """Cancellation state of one answer, shared by every thread working on it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Any]] = []
+        self.reason: Optional[str] = None
+        self.timeout: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str = CANCELLED) -> bool:
+        """Cancel and abort whatever is registered; False if already cancelled."""
+        with self._lock:
+            if self.reason is not None:
+                return False
+            self.reason = reason
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Error aborting cancelled work: {e}")
+        return True
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], Any], timeout: Optional[float] = None):
+        """Run callback if the token is cancelled inside the block; timeout (seconds) cancels it too."""
+        with self._lock:
+            already = self.reason is not None
+            if not already:
+                self._callbacks.append(callback)
+        if already:
+            callback()
+        timer = None
+        if timeout:
+            self.timeout = timeout
+            timer = threading.Timer(timeout, self.cancel, (TIMEOUT,))
+            timer.daemon = True
+            timer.start()
+        try:
+            yield self
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+    def error(self, engine: str) -> QueryCancelled:
+        """The exception describing why the token fired, counted in the metrics."""
+        record_interruption(engine, self.reason or CANCELLED)
+        if self.reason == TIMEOUT:
+            return QueryTimeout(f"Query timed out after {self.timeout:g}s", engine)
+        return QueryCancelled("Query cancelled", engine)
+
+    def raise_if_cancelled(self, engine: str) -> None:
+        if self.cancelled:
+            raise self.error(engine)
+
+
+class InterruptionStats:
+    """Cancelled and timed-out work per engine ('duckdb', 'oracle', 'llm')."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, engine: str, reason: str) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(engine, {CANCELLED: 0, TIMEOUT: 0})
+            counts[reason] = counts.get(reason, 0) + 1
+        logger.info(f"{engine} work {'timed out' if reason == TIMEOUT else 'cancelled'}")
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {engine: dict(counts) for engine, counts in self._counts.items()}
+
+
+interruption_stats = InterruptionStats()
+
+
+def record_interruption(engine: str, reason: str) -> None:
+    interruption_stats.record(engine, reason)
@@ -0,0 +1,162 @@
+"""
+Persistent columnar cache for CSV data files.
+
+Parsed tables are written once as uncompressed Arrow IPC files and reopened
+with memory mapping, so every Streamlit worker process shares the same page
+cache instead of re-parsing the CSV. Cache entries are keyed by the source
+file's size, mtime and content hash and are rebuilt only when the CSV content
+actually changes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def file_content_hash(path: str) -> str:
+    """Return the BLAKE2b hex digest of a file's content."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: str, content_hash: bool = True) -> Dict[str, Any]:
+    """Return size, mtime and (optionally) content hash of a file."""
+    stat = os.stat(path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if content_hash:
+        fingerprint["hash"] = file_content_hash(path)
+    return fingerprint
+
+
+def fingerprint_version(fingerprint: Dict[str, Any]) -> str:
+    """Compact data version string derived from a fingerprint."""
+    return f"{fingerprint['size']}-{fingerprint['hash'][:16]}"
+
+
+class ColumnarCache:
+    """On-disk Arrow IPC cache of parsed CSV files."""
+
+    def __init__(self, cache_dir: str = "data/cache"):
+        self.cache_dir = cache_dir
+
+    def _paths(self, source_path: str) -> Tuple[str, str]:
+        """Cache file names: the CSV's stem plus a hash of its absolute path, so same-named files do not collide."""
+        stem = os.path.splitext(os.path.basename(source_path))[0].replace(" ", "_")
+        source_id = hashlib.blake2b(os.path.abspath(source_path).encode("utf-8"), digest_size=4).hexdigest()
+        base = os.path.join(self.cache_dir, f"{stem}-{source_id}")
+        return f"{base}.arrow", f"{base}.meta.json"
+
+    def _read_meta(self, meta_path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_atomic(self, path: str, write: Callable[[str], None]) -> None:
+        """Write via a temp file in the same directory and rename into place."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _write_meta(self, meta_path: str, meta: Dict[str, Any]) -> None:
+        def write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2)
+        self._write_atomic(meta_path, write)
+
+    def lookup(self, source_path: str, schema_id: str = "") -> Optional[Dict[str, Any]]:
+        """Return the cached fingerprint if the cache entry is valid for the source file.
+
+        Size and mtime are checked first; the content hash is only recomputed when
+        the size matches but the mtime moved (e.g. the file was touched or copied).
+        """
+        arrow_path, meta_path = self._paths(source_path)
+        meta = self._read_meta(meta_path)
+        if (not meta or meta.get("schema_id") != schema_id or not os.path.exists(arrow_path)
+                or meta.get("source") != os.path.abspath(source_path)):
+            return None
+
+        cached = meta["fingerprint"]
+        current = file_fingerprint(source_path, content_hash=False)
+        if current["size"] != cached["size"]:
+            return None
+        if current["mtime_ns"] == cached["mtime_ns"]:
+            return cached
+
+        current["hash"] = file_content_hash(source_path)
+        if current["hash"] != cached["hash"]:
+            return None
+
+        # Same content under a new mtime: remember it so the next lookup is a stat only
+        meta["fingerprint"] = current
+        self._write_meta(meta_path, meta)
+        return current
+
+    def open(self, source_path: str) -> pa.Table:
+        """Open the cached table with memory mapping (zero-copy for fixed-width columns)."""
+        arrow_path, _ = self._paths(source_path)
+        with pa.memory_map(arrow_path, "r") as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def store(self, source_path: str, table: pa.Table, schema_id: str = "",
+              fingerprint: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Write a parsed table and its source fingerprint to the cache."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        arrow_path, meta_path = self._paths(source_path)
+        fingerprint = fingerprint or file_fingerprint(source_path)
+
+        def write(tmp_path):
+            with pa.OSFile(tmp_path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+        self._write_atomic(arrow_path, write)
+        self._write_meta(meta_path, {
+            "source": os.path.abspath(source_path),
+            "schema_id": schema_id,
+            "fingerprint": fingerprint,
+            "rows": table.num_rows,
+            "created": time.time(),
+        })
+        return fingerprint
+
+    def load(self, source_path: str, reader: Callable[[str], pa.Table],
+             schema_id: str = "") -> Tuple[pa.Table, Dict[str, Any], bool]:
+        """Return (table, fingerprint, cache_hit), rebuilding the cache entry if stale."""
+        try:
+            fingerprint = self.lookup(source_path, schema_id)
+            if fingerprint is not None:
+                return self.open(source_path), fingerprint, True
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable columnar cache for {source_path}: {e}")
+
+        fingerprint = file_fingerprint(source_path)
+        table = reader(source_path)
+        try:
+            self.store(source_path, table, schema_id, fingerprint)
+            logger.info(f"Columnar cache rebuilt for {source_path} ({table.num_rows} rows)")
+            # Hand out the mapped copy so this process shares pages with other workers
+            table = self.open(source_path)
+        except OSError as e:
+            logger.warning(f"Could not write columnar cache for {source_path}: {e}")
+        return table, fingerprint, False
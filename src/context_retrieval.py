@@ -0,0 +1,275 @@
+"""
+Relevance-pruned schema context for LLM prompts.
+
+Instead of pasting the first N business-dictionary mappings into every prompt,
+the mappings and the extracted Oracle tables of a SchemaSnapshot are indexed
+with BM25 and only the entries relevant to the question are rendered, highest
+score first, until the prompt-context token budget is spent. Tables referenced
+by a selected mapping are always considered, and only their relevant columns
+(plus key columns) are listed.
+"""
+
+import logging
+import math
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from config.config import prompt_context_config, PromptContextConfig
+from .term_matcher import stem, tokenize
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _words(*texts: Any) -> List[str]:
+    words = []
+    for text in texts:
+        if isinstance(text, (list, tuple)):
+            words.extend(_words(*text))
+        elif text:
+            words.extend(stem(token) for token, _, _ in tokenize(str(text)))
+    return words
+
+
+class BM25Index:
+    """Okapi BM25 over pre-tokenized documents."""
+
+    def __init__(self, documents: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(document) for document in documents]
+        self._lengths = [len(document) for document in documents]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_freqs: Counter = Counter()
+        for freqs in self._term_freqs:
+            document_freqs.update(freqs.keys())
+        count = len(self._term_freqs)
+        self._idf = {
+            term: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_freqs.items()
+        }
+
+    def scores(self, query_tokens: Sequence[str]) -> List[float]:
+        """BM25 score of every document for the query (0.0 when nothing matches)."""
+        terms = [term for term in set(query_tokens) if term in self._idf]
+        results = []
+        for freqs, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_length) if self._avg_length else self.k1
+            for term in terms:
+                freq = freqs.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            results.append(score)
+        return results
+
+
+@dataclass(frozen=True)
+class RetrievedContext:
+    """Schema context selected for one question."""
+    text: str
+    mappings: Tuple[str, ...]
+    tables: Tuple[str, ...]
+    tokens: int
+    full_tokens: int
+
+
+class ContextRetriever:
+    """Scores mappings, tables and columns of one snapshot against questions."""
+
+    def __init__(self, schema: Mapping[str, Any], business_dictionary: Mapping[str, Any],
+                 config: PromptContextConfig = prompt_context_config):
+        self.config = config
+        self.mappings = list(business_dictionary.get("mappings", []))
+        self.tables = dict(schema.get("tables", {}))
+        self.relationships = list(schema.get("relationships", []))
+        self._table_names = list(self.tables)
+        # Short (unqualified) name -> qualified names, for resolving mapping tables
+        self._by_short_name: Dict[str, List[str]] = {}
+        for name in self._table_names:
+            self._by_short_name.setdefault(name.split(".")[-1].upper(), []).append(name)
+
+        self._mapping_index = BM25Index([
+            _words(m.get("business_term"), m.get("synonyms") or [], m.get("description"),
+                   m.get("table_name"), m.get("column_name"), m.get("category"))
+            for m in self.mappings
+        ])
+        self._table_index = BM25Index([
+            _words(name.split(".")[-1], table.get("description"),
+                   [c.get("column_name") for c in table.get("columns", [])],
+                   [c.get("description") for c in table.get("columns", [])])
+            for name, table in self.tables.items()
+        ])
+        self._full_tokens: Optional[int] = None
+
+    @property
+    def full_tokens(self) -> int:
+        """Token estimate of the unpruned context (every mapping and table)."""
+        if self._full_tokens is None:
+            blocks = [self._render_mapping(m) for m in self.mappings]
+            blocks += [self._render_table(name, None) for name in self._table_names]
+            self._full_tokens = estimate_tokens(self._join(blocks, []))
+        return self._full_tokens
+
+    def _resolve_table(self, table_name: str) -> List[str]:
+        table_name = (table_name or "").upper()
+        if table_name in self.tables:
+            return [table_name]
+        return self._by_short_name.get(table_name.split(".")[-1], [])
+
+    def _relevant_columns(self, table: Mapping[str, Any], query_tokens: set,
+                          keep: set) -> List[Mapping[str, Any]]:
+        """Columns ordered by relevance: mapped/key columns, then word overlap, then table order."""
+        columns = list(table.get("columns", []))
+        ranked = []
+        for position, column in enumerate(columns):
+            name = column.get("column_name", "")
+            overlap = len(query_tokens.intersection(_words(name, column.get("description"))))
+            priority = 2 if name.upper() in keep else 1 if (column.get("primary_key") or column.get("foreign_key")) else 0
+            ranked.append((-priority, -overlap, position, column))
+        ranked.sort(key=lambda item: item[:3])
+        return [item[3] for item in ranked[:self.config.max_columns_per_table]]
+
+    @staticmethod
+    def _render_mapping(mapping: Mapping[str, Any]) -> str:
+        term = mapping.get("business_term", "")
+        target = f"{mapping.get('table_name', '')}.{mapping.get('column_name', '')}"
+        lines = [f"  - '{term}' -> {target}"]
+        if mapping.get("filter_condition"):
+            lines[0] += f" WHERE {mapping['filter_condition']}"
+        if mapping.get("display_columns"):
+            lines.append(f"    DISPLAY COLUMNS: {', '.join(mapping['display_columns'])}")
+        if mapping.get("join_instructions"):
+            lines.append(f"    JOIN: {mapping['join_instructions']}")
+        return "\n".join(lines)
+
+    def _render_table(self, name: str, columns: Optional[List[Mapping[str, Any]]]) -> str:
+        table = self.tables[name]
+        all_columns = list(table.get("columns", []))
+        columns = all_columns if columns is None else columns
+        header = f"  - {name}"
+        if table.get("description"):
+            header += f": {table['description']}"
+        described = []
+        for column in columns:
+            text = f"{column.get('column_name')} {column.get('data_type', '')}".strip()
+            if column.get("primary_key"):
+                text += " PK"
+            if column.get("foreign_key") and column.get("referenced_table"):
+                text += f" -> {column['referenced_table']}.{column.get('referenced_column')}"
+            described.append(text)
+        line = f"    COLUMNS: {', '.join(described)}"
+        if len(columns) < len(all_columns):
+            line += f" (+{len(all_columns) - len(columns)} more)"
+        return f"{header}\n{line}"
+
+    @staticmethod
+    def _join(mapping_blocks: List[str], table_blocks: List[str], extra: Sequence[str] = ()) -> str:
+        parts = []
+        if mapping_blocks:
+            parts.append("Business Dictionary Mappings:")
+            parts.extend(mapping_blocks)
+        if table_blocks:
+            parts.append("Relevant Oracle Tables:")
+            parts.extend(table_blocks)
+        parts.extend(extra)
+        return "\n".join(parts)
+
+    def retrieve(self, question: str, token_budget: Optional[int] = None) -> RetrievedContext:
+        """Select and render the context relevant to the question within the token budget."""
+        budget = self.config.token_budget if token_budget is None else token_budget
+        query_tokens = _words(question)
+        query_set = set(query_tokens)
+
+        mapping_scores = self._mapping_index.scores(query_tokens)
+        ranked_mappings = sorted(
+            (i for i, score in enumerate(mapping_scores) if score > 0),
+            key=lambda i: -mapping_scores[i] * float(self.mappings[i].get("confidence", 1.0)),
+        )[:self.config.top_k_mappings]
+
+        # Tables: those behind the selected mappings first, then the best lexical matches
+        table_scores = dict(zip(self._table_names, self._table_index.scores(query_tokens)))
+        mapped_columns: Dict[str, set] = {}
+        ordered_tables: List[str] = []
+        for i in ranked_mappings:
+            mapping = self.mappings[i]
+            for name in self._resolve_table(mapping.get("table_name")):
+                keep = mapped_columns.setdefault(name, set())
+                keep.add(str(mapping.get("column_name", "")).upper())
+                keep.update(str(c).upper() for c in mapping.get("display_columns") or [])
+                if name not in ordered_tables:
+                    ordered_tables.append(name)
+        for name in sorted(self._table_names, key=lambda n: -table_scores[n]):
+            if table_scores[name] <= 0:
+                break
+            if name not in ordered_tables:
+                ordered_tables.append(name)
+        ordered_tables = ordered_tables[:self.config.top_k_tables]
+
+        # Fill the budget in priority order: mappings, then tables
+        mapping_blocks, table_blocks = [], []
+        selected_mappings, selected_tables = [], []
+        used = 0
+        for i in ranked_mappings:
+            block = self._render_mapping(self.mappings[i])
+            cost = estimate_tokens(block) + 1
+            if used + cost > budget:
+                continue
+            mapping_blocks.append(block)
+            selected_mappings.append(self.mappings[i].get("business_term", ""))
+            used += cost
+        for name in ordered_tables:
+            columns = self._relevant_columns(self.tables[name], query_set, mapped_columns.get(name, set()))
+            block = self._render_table(name, columns)
+            cost = estimate_tokens(block) + 1
+            if used + cost > budget:
+                continue
+            table_blocks.append(block)
+            selected_tables.append(name)
+            used += cost
+
+        extra = []
+        if selected_tables:
+            related = [
+                f"  - {r['from_table']}.{r['from_column']} = {r['to_table']}.{r['to_column']}"
+                for r in self.relationships
+                if r.get("from_table") in selected_tables and r.get("to_table") in selected_tables
+            ]
+            cost = estimate_tokens("\n".join(["Join Keys:"] + related)) + 1
+            if related and used + cost <= budget:
+                extra = ["Join Keys:"] + related
+                used += cost
+        other_terms = [m.get("business_term", "") for m in self.mappings
+                       if m.get("business_term", "") not in selected_mappings]
+        if other_terms:
+            line = f"Other business terms: {', '.join(other_terms)}"
+            if used + estimate_tokens(line) <= budget:
+                extra.append(line)
+
+        text = self._join(mapping_blocks, table_blocks, extra)
+        return RetrievedContext(
+            text=text,
+            mappings=tuple(selected_mappings),
+            tables=tuple(selected_tables),
+            tokens=estimate_tokens(text),
+            full_tokens=self.full_tokens,
+        )
+
+
+_retriever: Optional[Tuple[str, ContextRetriever]] = None
+_retriever_lock = threading.Lock()
+
+
+def get_context_retriever(snapshot) -> ContextRetriever:
+    """Retriever for a SchemaSnapshot, rebuilt only when the snapshot version changes."""
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None or _retriever[0] != snapshot.version:
+            _retriever = (snapshot.version, ContextRetriever(snapshot.schema, snapshot.business_dictionary))
+        return _retriever[1]
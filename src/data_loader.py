@@ -1,35 +1,184 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import streamlit as st
+import hashlib
+import logging
 import os
+import time
+from .columnar_cache import ColumnarCache, fingerprint_version
 
-@st.cache_data
+logger = logging.getLogger(__name__)
+
+RATES_CSV_FILE = "data/csv/Buy Rates Analysis.csv"
+
+# Declared column schema for the buy rates deck. Low-cardinality text columns are
+# dictionary encoded (pandas categoricals), rates are float32 and the validity
+# dates are parsed by the reader itself, so no conversion pass is needed later.
+_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+RATES_SCHEMA = {
+    "Destination": _CATEGORY,
+    "Supplier": _CATEGORY,
+    "Supplier Product": pa.string(),
+    "Product": _CATEGORY,
+    "Proportion": pa.float32(),
+    "Sequence": pa.float32(),
+    "Floor Price": pa.float32(),
+    "Rate": pa.float32(),
+    "Next Rate": pa.float32(),
+    "Next Rate Diff": pa.float32(),
+    "FP Diff": pa.float32(),
+    "NID": _CATEGORY,
+    "Next Valid From": pa.timestamp("s"),
+    "Next Valid Until": pa.timestamp("s"),
+    "Destination Responsible": _CATEGORY,
+}
+RATES_DATE_FORMATS = ["%m/%d/%Y"]
+# Identifies the parsing rules above; a change invalidates cached decks
+RATES_SCHEMA_ID = hashlib.blake2b(
+    repr((sorted((k, str(v)) for k, v in RATES_SCHEMA.items()), RATES_DATE_FORMATS)).encode(),
+    digest_size=8,
+).hexdigest()
+
+# Persistent Arrow IPC cache shared by all server processes (empty value disables it)
+RATES_CACHE_DIR = os.getenv("RATES_CACHE_DIR", "data/cache")
+
+
+def _resident_memory_bytes():
+    """Return the resident set size of the current process in bytes (None if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak RSS, reported in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+def _format_bytes(num_bytes):
+    """Format a byte count for display."""
+    if num_bytes is None:
+        return "n/a"
+    if num_bytes < 1024:
+        return f"{num_bytes} B"
+    for unit in ("KB", "MB", "GB"):
+        num_bytes /= 1024
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.1f} {unit}"
+
+
+def read_rates_csv(csv_file=RATES_CSV_FILE):
+    """Read the rates CSV with the multithreaded Arrow reader and the declared schema.
+
+    Returns a pyarrow Table; columns not listed in RATES_SCHEMA are inferred.
+    """
+    return pa_csv.read_csv(
+        csv_file,
+        read_options=pa_csv.ReadOptions(use_threads=True),
+        parse_options=pa_csv.ParseOptions(delimiter=";"),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=RATES_SCHEMA,
+            timestamp_parsers=RATES_DATE_FORMATS,
+            strings_can_be_null=True,
+        ),
+    )
+
+
+def _rates_dtype(arrow_type):
+    """pandas dtype for a deck column: Arrow-backed, except dictionary columns (categoricals)."""
+    if pa.types.is_dictionary(arrow_type):
+        return None
+    return pd.ArrowDtype(arrow_type)
+
+
+def rates_frame(table):
+    """DataFrame over the deck's Arrow table without copying its columns.
+
+    Numeric, text and date columns stay Arrow-backed, so a memory-mapped
+    cache file remains the only copy and its pages are shared between server
+    processes through the page cache. Dictionary columns become categoricals,
+    which allocates only their int32 codes.
+    """
+    return table.to_pandas(types_mapper=_rates_dtype)
+
+
+@st.cache_resource
+def load_rates_table(csv_file=RATES_CSV_FILE):
+    """Return (table, fingerprint, cache_hit) for the deck, loaded once per process.
+
+    With the columnar cache enabled the table is memory-mapped from the IPC
+    file; st.cache_resource hands every session this same object instead of
+    an unpickled copy, so the mapped pages are the only copy of the deck.
+    """
+    if RATES_CACHE_DIR:
+        return ColumnarCache(RATES_CACHE_DIR).load(csv_file, read_rates_csv, RATES_SCHEMA_ID)
+    return read_rates_csv(csv_file), None, False
+
+
+@st.cache_resource
 def load_rates_data():
-    """Load buy rates analysis data from CSV file"""
-    csv_file = "data/csv/Buy Rates Analysis.csv"
-    
+    """Load buy rates analysis data from CSV file
+
+    The frame is shared by all sessions of the process (it views the mapped
+    Arrow buffers); callers must derive new frames rather than modify it.
+    """
+    csv_file = RATES_CSV_FILE
+
     try:
         # Try to load from CSV file
         if os.path.exists(csv_file):
-            df = pd.read_csv(csv_file,   sep=";", engine="python")
-            # Ensure hire_date is datetime if it exists
-            #if 'hire_date' in df.columns:
-                #df['hire_date'] = pd.to_datetime(df['hire_date'])
+            start_time = time.perf_counter()
+            table, fingerprint, cache_hit = load_rates_table(csv_file)
+            allocated_before = pa.total_allocated_bytes()
+            df = rates_frame(table)
+            converted_bytes = pa.total_allocated_bytes() - allocated_before
+            load_seconds = time.perf_counter() - start_time
+
+            if fingerprint is not None:
+                df.attrs["data_version"] = fingerprint_version(fingerprint)
+            df.attrs["load_stats"] = {
+                "load_seconds": load_seconds,
+                "cache_hit": cache_hit,
+                "frame_bytes": int(df.memory_usage(deep=True).sum()),
+                # Arrow memory the pandas conversion allocated (categorical codes only)
+                "converted_bytes": converted_bytes,
+                "resident_bytes": _resident_memory_bytes(),
+            }
+            logger.info(
+                f"Loaded {len(df)} rows from {csv_file} in {load_seconds:.3f}s "
+                f"({'columnar cache hit' if cache_hit else 'parsed CSV'}, "
+                f"frame {_format_bytes(df.attrs['load_stats']['frame_bytes'])}, "
+                f"{_format_bytes(converted_bytes)} copied by the conversion, "
+                f"process RSS {_format_bytes(df.attrs['load_stats']['resident_bytes'])})"
+            )
             return df, None
         else:
             return None, f"CSV file '{csv_file}' not found. Please ensure the file exists in the application directory."
-            
+
     except Exception as e:
         return None, f"Error loading CSV file: {str(e)}"
 
 
-@st.cache_data
+@st.cache_resource
 def load_data():
     """Main data loading function for buy rates analysis"""
     # Try to load from CSV
     df, error = load_rates_data()
-    
+
     if df is not None:
-        return df, f"✅ Loaded data from 'data/csv/Buy Rates Analysis.csv' ({len(df)} rows)", None
+        message = f"✅ Loaded data from '{RATES_CSV_FILE}' ({len(df)} rows)"
+        stats = df.attrs.get("load_stats")
+        if stats:
+            message += (
+                f" in {stats['load_seconds']:.2f}s{' (cached)' if stats.get('cache_hit') else ''}"
+                f" · {_format_bytes(stats['frame_bytes'])} in memory"
+                f" · process RSS {_format_bytes(stats['resident_bytes'])}"
+            )
+        return df, message, None
     else:
         # Return error state - no fallback data
         return None, None, error
@@ -5,22 +5,102 @@ Simpler approach than MCP server - direct database connection
 
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 import oracledb
-from typing import Dict, Any, Optional, List
+import asyncio
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Any, Optional, List, Iterator
 from config.config import oracle_config
+from .cancellation import CancelToken, TIMEOUT
+from .single_flight import flight_key, get_single_flight
+from .sql_utils import normalize_sql
 import logging
 
 logger = logging.getLogger(__name__)
 
+_ARROW_DATETIME_TYPES = (
+    oracledb.DB_TYPE_DATE,
+    oracledb.DB_TYPE_TIMESTAMP,
+    oracledb.DB_TYPE_TIMESTAMP_LTZ,
+    oracledb.DB_TYPE_TIMESTAMP_TZ,
+)
+_ARROW_STRING_TYPES = (
+    oracledb.DB_TYPE_VARCHAR,
+    oracledb.DB_TYPE_NVARCHAR,
+    oracledb.DB_TYPE_CHAR,
+    oracledb.DB_TYPE_NCHAR,
+    oracledb.DB_TYPE_LONG,
+)
+
+_PLAN_QUERY = """
+    SELECT id, parent_id, operation, options, object_name, cardinality, cost
+    FROM plan_table
+    WHERE statement_id = :statement_id
+    ORDER BY id
+"""
+# Round trip exceeded call_timeout (thin, thick); the connection is dropped from the pool
+_CALL_TIMEOUT_ERRORS = ("DPY-4024", "DPI-1067")
+_PLAN_COLUMNS = ("id", "parent_id", "operation", "options", "object_name", "cardinality", "cost")
+
+def _arrow_type_for(description) -> Optional[pa.DataType]:
+    """Arrow type for a cursor.description entry (None lets pyarrow infer)."""
+    type_code, precision, scale = description[1], description[4], description[5]
+    if type_code is oracledb.DB_TYPE_NUMBER:
+        # NUMBER(p, 0) fits int64 up to 18 digits; everything else becomes float64
+        if scale == 0 and precision and precision <= 18:
+            return pa.int64()
+        return pa.float64()
+    if type_code in (oracledb.DB_TYPE_BINARY_DOUBLE, oracledb.DB_TYPE_BINARY_FLOAT):
+        return pa.float64()
+    if type_code is oracledb.DB_TYPE_BINARY_INTEGER:
+        return pa.int64()
+    if type_code in _ARROW_DATETIME_TYPES:
+        return pa.timestamp("us")
+    if type_code in _ARROW_STRING_TYPES:
+        return pa.string()
+    return None
+
+def _rows_to_arrow_frame(rows: List[tuple], description) -> pd.DataFrame:
+    """Build an Arrow-backed DataFrame column by column from fetched row tuples."""
+    columns = list(zip(*rows)) if rows else [()] * len(description)
+    arrays = []
+    for values, desc in zip(columns, description):
+        arrow_type = _arrow_type_for(desc)
+        try:
+            arrays.append(pa.array(values, type=arrow_type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            # e.g. NUMBER without precision holding integers beyond int64 or mixed values
+            arrays.append(pa.array(values, type=pa.float64()) if arrow_type == pa.int64()
+                          else pa.array(values))
+    table = pa.Table.from_arrays(arrays, names=[desc[0] for desc in description])
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
 class DatabaseManager:
-    """Direct Oracle database connection manager."""
+    """Oracle database manager backed by an oracledb session pool.
+    
+    Every operation acquires its own pooled connection and releases it when done,
+    so concurrent Streamlit sessions never share a connection.
+    """
     
     def __init__(self):
-        self.connection = None
+        self.pool = None
+        self.async_pool = None
         self.connected = False
+        self._async_pool_loop = None
+        self._async_pool_lock = None
+        self._pool_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._acquires = 0
+        self._acquire_wait_total = 0.0
+        self._acquire_wait_max = 0.0
+        self._acquire_failures = 0
+        self._dropped_connections = 0
     
     def connect(self) -> bool:
-        """Connect to Oracle database."""
+        """Create the Oracle connection pool (no-op if it already exists)."""
         try:
             if not oracle_config.validate():
                 error_msg = "Oracle configuration is incomplete. Please check your environment variables."
@@ -31,18 +111,50 @@ class DatabaseManager:
                     pass  # Not in Streamlit context
                 return False
             
-            # Initialize Oracle client if needed
-            if oracle_config.thick_mode:
-                oracledb.init_oracle_client()
-            
-            # Create connection
-            self.connection = oracledb.connect(
-                user=oracle_config.user,
-                password=oracle_config.password,
-                dsn=oracle_config.dsn
+            with self._pool_lock:
+                if self.pool is not None:
+                    return True
+                
+                # Initialize Oracle client if needed
+                if oracle_config.thick_mode:
+                    oracledb.init_oracle_client()
+                
+                # Create session pool; ping_interval makes acquire() check idle
+                # sessions and transparently replace dead ones
+                pool = oracledb.create_pool(
+                    user=oracle_config.user,
+                    password=oracle_config.password,
+                    dsn=oracle_config.dsn,
+                    min=oracle_config.pool_min,
+                    max=oracle_config.pool_max,
+                    increment=oracle_config.pool_increment,
+                    ping_interval=oracle_config.pool_ping_interval,
+                    getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                    wait_timeout=oracle_config.pool_wait_timeout,
+                    timeout=oracle_config.pool_idle_timeout
+                )
+                
+                # Verify that a session can actually be opened before reporting success
+                try:
+                    connection = pool.acquire()
+                    try:
+                        connection.ping()
+                    finally:
+                        pool.release(connection)
+                except Exception:
+                    # Close the unused pool so each failed retry does not leave its sessions open
+                    try:
+                        pool.close(force=True)
+                    except Exception as close_error:
+                        logger.warning(f"Error closing unverified Oracle pool: {close_error}")
+                    raise
+                
+                self.pool = pool
+                self.connected = True
+            logger.info(
+                f"Created Oracle connection pool (min={oracle_config.pool_min}, "
+                f"max={oracle_config.pool_max}, increment={oracle_config.pool_increment})"
             )
-            self.connected = True
-            logger.info("Connected to Oracle database successfully")
             return True
             
         except Exception as e:
@@ -55,64 +167,507 @@ class DatabaseManager:
             return False
     
     def disconnect(self):
-        """Disconnect from Oracle database."""
-        if self.connection:
-            self.connection.close()
-            self.connected = False
-            logger.info("Disconnected from Oracle database")
-    
-    def execute_query(self, sql: str, parameters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
-        """Execute SQL query and return results as DataFrame."""
-        if not self.connected:
+        """Close the Oracle connection pool."""
+        with self._pool_lock:
+            if self.async_pool is not None:
+                # The async pool belongs to the loop it was created on
+                asyncio.run_coroutine_threadsafe(self.async_pool.close(force=True), self._async_pool_loop)
+                self.async_pool = None
+            if self.pool:
+                self.pool.close(force=True)
+                self.pool = None
+                self.connected = False
+                logger.info("Disconnected from Oracle database")
+    
+    @contextmanager
+    def acquire(self):
+        """Acquire a pooled connection for one request and release it afterwards.
+        
+        Connections that turn out to be unusable are dropped from the pool instead
+        of being released, so the pool opens a fresh session in their place.
+        """
+        pool = self.pool
+        if not self.connected or pool is None:
             raise RuntimeError("Not connected to Oracle database")
         
+        start_time = time.perf_counter()
         try:
-            cursor = self.connection.cursor()
-            
-            if parameters:
-                cursor.execute(sql, parameters)
+            connection = pool.acquire()
+        except Exception:
+            with self._metrics_lock:
+                self._acquire_failures += 1
+            raise
+        self._record_acquire(time.perf_counter() - start_time)
+        
+        try:
+            yield connection
+        finally:
+            if connection.is_healthy():
+                pool.release(connection)
             else:
-                cursor.execute(sql)
+                logger.warning("Dropping unhealthy Oracle connection from pool")
+                pool.drop(connection)
+                self._record_drop()
+    
+    @asynccontextmanager
+    async def _aacquire(self):
+        """Async counterpart of acquire() on the asyncio pool, with the same drop handling."""
+        pool = await self._get_async_pool()
+        start_time = time.perf_counter()
+        try:
+            connection = await pool.acquire()
+        except Exception:
+            with self._metrics_lock:
+                self._acquire_failures += 1
+            raise
+        self._record_acquire(time.perf_counter() - start_time)
+        
+        try:
+            yield connection
+        finally:
+            if connection.is_healthy():
+                await pool.release(connection)
+            else:
+                logger.warning("Dropping unhealthy Oracle connection from asyncio pool")
+                await pool.drop(connection)
+                self._record_drop()
+    
+    def _record_acquire(self, wait: float) -> None:
+        with self._metrics_lock:
+            self._acquires += 1
+            self._acquire_wait_total += wait
+            self._acquire_wait_max = max(self._acquire_wait_max, wait)
+    
+    def _record_drop(self) -> None:
+        with self._metrics_lock:
+            self._dropped_connections += 1
+    
+    def pool_metrics(self) -> Dict[str, Any]:
+        """Pool utilization and acquire wait statistics.
+        
+        opened/busy/max cover both the blocking and the asyncio pool (the
+        latter once created), so max is the process's session limit; the
+        async_* keys break out the asyncio pool.
+        """
+        pool = self.pool
+        async_pool = self.async_pool
+        with self._metrics_lock:
+            metrics = {
+                "acquires": self._acquires,
+                "acquire_failures": self._acquire_failures,
+                "avg_wait_ms": (self._acquire_wait_total / self._acquires * 1000) if self._acquires else 0.0,
+                "max_wait_ms": self._acquire_wait_max * 1000,
+                "dropped_connections": self._dropped_connections,
+            }
+        opened = busy = size = 0
+        if pool is not None:
+            opened, busy, size = pool.opened, pool.busy, pool.max
+        if async_pool is not None:
+            metrics.update({
+                "async_opened": async_pool.opened,
+                "async_busy": async_pool.busy,
+                "async_max": async_pool.max,
+            })
+            opened += async_pool.opened
+            busy += async_pool.busy
+            size += async_pool.max
+        if pool is not None or async_pool is not None:
+            metrics.update({
+                "opened": opened,
+                "busy": busy,
+                "max": size,
+                "utilization": busy / size if size else 0.0,
+            })
+        return metrics
+    
+    def _open_cursor(self, connection, sql: str, parameters: Optional[Dict[str, Any]], arraysize: int):
+        """Create a cursor with tuned fetch sizes and execute the statement."""
+        cursor = connection.cursor()
+        cursor.arraysize = arraysize
+        # One row more than arraysize lets small results finish in a single round trip
+        cursor.prefetchrows = max(oracle_config.fetch_prefetchrows, arraysize + 1)
+        if parameters:
+            cursor.execute(sql, parameters)
+        else:
+            cursor.execute(sql)
+        return cursor
+    
+    def _fetch_frames(self, cursor, chunk_size: int, max_rows: int, max_bytes: int,
+                      arrow: bool = False) -> Iterator[pd.DataFrame]:
+        """Stream a cursor as DataFrame chunks, stopping at the row/byte caps.
+        
+        A cap of 0 disables it. When a cap cuts the result short, the last chunk
+        carries attrs["truncated"] = True; an empty result yields one empty chunk. With arrow=True chunks are built column-wise
+        as Arrow-backed frames typed from cursor.description.
+        """
+        description = cursor.description
+        columns = [desc[0] for desc in description]
+        total_rows = 0
+        total_bytes = 0
+        while True:
+            fetch_size = chunk_size
+            if max_rows:
+                fetch_size = min(chunk_size, max_rows - total_rows)
+            rows = cursor.fetchmany(fetch_size) if fetch_size > 0 else []
+            if not rows:
+                # Row cap reached exactly: peek once to tell "done" from "truncated"
+                if max_rows and total_rows >= max_rows and cursor.fetchone() is not None:
+                    yield self._truncated_marker(columns)
+                elif total_rows == 0:
+                    # Empty result: one empty chunk so consumers still see the columns
+                    yield _rows_to_arrow_frame([], description) if arrow else pd.DataFrame(columns=columns)
+                return
             
-            # Get column names
-            columns = [desc[0] for desc in cursor.description]
+            if arrow:
+                frame = _rows_to_arrow_frame(rows, description)
+            else:
+                frame = pd.DataFrame(rows, columns=columns)
+            total_rows += len(frame)
+            total_bytes += int(frame.memory_usage(index=False, deep=True).sum())
             
-            # Fetch all results
-            results = cursor.fetchall()
+            if max_bytes and total_bytes >= max_bytes:
+                truncated = len(rows) == fetch_size and cursor.fetchone() is not None
+                frame.attrs["truncated"] = truncated
+                yield frame
+                if truncated:
+                    logger.warning(f"Oracle result truncated at byte cap ({total_rows} rows, {total_bytes} bytes)")
+                return
+            yield frame
+    
+    @staticmethod
+    def _truncated_marker(columns: List[str]) -> pd.DataFrame:
+        frame = pd.DataFrame(columns=columns)
+        frame.attrs["truncated"] = True
+        return frame
+    
+    def _fetch_native_arrow_frames(self, connection, sql: str, parameters: Optional[Dict[str, Any]],
+                                   chunk_size: int, max_rows: int, max_bytes: int) -> Iterator[pd.DataFrame]:
+        """Stream results through oracledb's DataFrame API straight into Arrow.
+        
+        No Python tuples are materialized; caps behave like _fetch_frames, and an
+        empty result yields one empty chunk with the query's columns.
+        """
+        total_rows = 0
+        total_bytes = 0
+        empty_frame = None
+        batches = iter(connection.fetch_df_batches(sql, parameters, size=chunk_size))
+        for batch in batches:
+            table = pa.table(batch)
+            if table.num_rows == 0:
+                if empty_frame is None:
+                    empty_frame = table.to_pandas(types_mapper=pd.ArrowDtype)
+                continue
             
-            # Convert to DataFrame
-            df = pd.DataFrame(results, columns=columns)
+            capped = truncated = False
+            if max_rows and total_rows + table.num_rows >= max_rows:
+                truncated = total_rows + table.num_rows > max_rows
+                table = table.slice(0, max_rows - total_rows)
+                capped = True
+            total_rows += table.num_rows
+            total_bytes += table.nbytes
+            if max_bytes and total_bytes >= max_bytes:
+                capped = True
             
+            frame = table.to_pandas(types_mapper=pd.ArrowDtype)
+            if capped:
+                if not truncated:
+                    next_batch = next(batches, None)
+                    truncated = next_batch is not None and pa.table(next_batch).num_rows > 0
+                frame.attrs["truncated"] = truncated
+                if truncated:
+                    logger.warning(f"Oracle result truncated at fetch cap ({total_rows} rows, {total_bytes} bytes)")
+                yield frame
+                return
+            yield frame
+        
+        if total_rows == 0:
+            if empty_frame is None:
+                # The driver yields no batch at all for some empty results: describe the query instead
+                cursor = self._open_cursor(connection, sql, parameters, 1)
+                try:
+                    empty_frame = _rows_to_arrow_frame([], cursor.description)
+                finally:
+                    cursor.close()
+            yield empty_frame
+    
+    def _iter_frames(self, connection, sql: str, parameters: Optional[Dict[str, Any]],
+                     chunk_size: int, max_rows: int, max_bytes: int, arrow: bool) -> Iterator[pd.DataFrame]:
+        """Pick the native Arrow fetch when available, else the cursor-based fetch."""
+        if arrow and hasattr(connection, "fetch_df_batches"):
+            yield from self._fetch_native_arrow_frames(connection, sql, parameters, chunk_size, max_rows, max_bytes)
+            return
+        cursor = self._open_cursor(connection, sql, parameters, chunk_size)
+        try:
+            yield from self._fetch_frames(cursor, chunk_size, max_rows, max_bytes, arrow=arrow)
+        finally:
             cursor.close()
+    
+    def iter_query_chunks(self, sql: str, parameters: Optional[Dict[str, Any]] = None,
+                          chunk_size: Optional[int] = None, max_rows: Optional[int] = None,
+                          max_bytes: Optional[int] = None, arrow: bool = False) -> Iterator[pd.DataFrame]:
+        """Execute SQL and yield results as DataFrame chunks.
+        
+        The pooled connection is held until the generator is exhausted or closed.
+        Caps default to ORACLE_FETCH_MAX_ROWS / ORACLE_FETCH_MAX_MB (0 disables).
+        """
+        chunk_size = chunk_size or oracle_config.fetch_arraysize
+        max_rows = oracle_config.fetch_max_rows if max_rows is None else max_rows
+        max_bytes = oracle_config.fetch_max_bytes if max_bytes is None else max_bytes
+        with self.acquire() as connection:
+            yield from self._iter_frames(connection, sql, parameters, chunk_size, max_rows, max_bytes, arrow)
+    
+    @staticmethod
+    def _flight_key(sql: str, parameters: Optional[Dict[str, Any]], max_rows: Optional[int],
+                    max_bytes: Optional[int], arrow: bool) -> str:
+        return flight_key(oracle_config.user, oracle_config.dsn, normalize_sql(sql), parameters,
+                          max_rows, max_bytes, arrow)
+    
+    def execute_query(self, sql: str, parameters: Optional[Dict[str, Any]] = None,
+                      max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                      arrow: bool = False, cancel_token: Optional[CancelToken] = None) -> pd.DataFrame:
+        """Execute SQL query and return results as DataFrame.
+        
+        Rows are fetched in arraysize chunks up to the configured row/byte caps
+        (pass 0 to disable a cap). result.attrs["truncated"] tells whether a cap
+        cut the result short. With arrow=True the result is an Arrow-backed
+        DataFrame fetched via oracledb's DataFrame API when the driver supports it,
+        otherwise built column-wise; NUMBER and DATE columns get numeric and
+        datetime dtypes either way. Identical concurrent queries (sync or async)
+        share one execution and its result.
+        
+        Each round trip is bounded by call_timeout and the whole query by
+        ORACLE_QUERY_TIMEOUT (QueryTimeout). Cancelling cancel_token ends this
+        caller's wait with QueryCancelled; the running call is cancelled once
+        every caller sharing it has cancelled.
+        """
+        return get_single_flight("oracle").do(
+            self._flight_key(sql, parameters, max_rows, max_bytes, arrow),
+            self._execute_query, sql, parameters, max_rows, max_bytes, arrow,
+            cancel_token=cancel_token or CancelToken()
+        )
+    
+    @staticmethod
+    def _interrupted(error: Exception, token: CancelToken) -> Optional[Exception]:
+        """QueryCancelled/QueryTimeout for an error caused by cancel() or call_timeout, else None."""
+        if not token.cancelled and any(code in str(error) for code in _CALL_TIMEOUT_ERRORS):
+            token.cancel(TIMEOUT)
+        return token.error("oracle") if token.cancelled else None
+    
+    def _execute_query(self, sql: str, parameters: Optional[Dict[str, Any]], max_rows: Optional[int],
+                       max_bytes: Optional[int], arrow: bool,
+                       cancel_token: Optional[CancelToken] = None) -> pd.DataFrame:
+        chunk_size = oracle_config.fetch_arraysize
+        max_rows = oracle_config.fetch_max_rows if max_rows is None else max_rows
+        max_bytes = oracle_config.fetch_max_bytes if max_bytes is None else max_bytes
+        token = cancel_token or CancelToken()
+        token.raise_if_cancelled("oracle")
+        timeout = oracle_config.query_timeout
+        
+        try:
+            with self.acquire() as connection:
+                connection.call_timeout = int(timeout * 1000)
+                try:
+                    with token.on_cancel(connection.cancel, timeout=timeout):
+                        frames = list(self._iter_frames(connection, sql, parameters, chunk_size,
+                                                        max_rows, max_bytes, arrow))
+                finally:
+                    connection.call_timeout = 0
+            
+            truncated = any(frame.attrs.get("truncated") for frame in frames)
+            non_empty = [frame for frame in frames if not frame.empty]
+            if len(non_empty) > 1:
+                df = pd.concat(non_empty, ignore_index=True)
+            elif non_empty:
+                df = non_empty[0]
+            else:
+                df = frames[0] if frames else pd.DataFrame()
+            df.attrs["truncated"] = truncated
+            if truncated:
+                df.attrs["row_limit"] = len(df)
             return df
             
         except Exception as e:
+            interrupted = self._interrupted(e, token)
+            if interrupted is not None:
+                raise interrupted from e
+            logger.error(f"Error executing query: {e}")
+            raise
+    
+    def async_supported(self) -> bool:
+        """True if queries can use oracledb's asyncio API (thin mode only)."""
+        return oracle_config.async_mode and not oracle_config.thick_mode and hasattr(oracledb, "create_pool_async")
+    
+    async def _get_async_pool(self):
+        """Asyncio session pool, created on first use on the running event loop."""
+        if self.async_pool is None:
+            if self._async_pool_lock is None:
+                self._async_pool_lock = asyncio.Lock()
+            async with self._async_pool_lock:
+                if self.async_pool is None:
+                    self.async_pool = oracledb.create_pool_async(
+                        user=oracle_config.user,
+                        password=oracle_config.password,
+                        dsn=oracle_config.dsn,
+                        min=oracle_config.pool_min,
+                        max=oracle_config.async_pool_max,
+                        increment=oracle_config.pool_increment,
+                        ping_interval=oracle_config.pool_ping_interval,
+                        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                        wait_timeout=oracle_config.pool_wait_timeout,
+                        timeout=oracle_config.pool_idle_timeout
+                    )
+                    self._async_pool_loop = asyncio.get_running_loop()
+                    logger.info(
+                        f"Created asyncio Oracle connection pool (max={oracle_config.async_pool_max}; "
+                        f"up to {oracle_config.session_limit} sessions with the blocking pool)"
+                    )
+        return self.async_pool
+    
+    async def _afetch_frame(self, cursor, chunk_size: int, max_rows: int, max_bytes: int,
+                            arrow: bool) -> pd.DataFrame:
+        """Async counterpart of _fetch_frames, returning the concatenated frame."""
+        description = cursor.description
+        columns = [desc[0] for desc in description]
+        frames = []
+        total_rows = 0
+        total_bytes = 0
+        truncated = False
+        while True:
+            fetch_size = min(chunk_size, max_rows - total_rows) if max_rows else chunk_size
+            rows = await cursor.fetchmany(fetch_size) if fetch_size > 0 else []
+            if not rows:
+                truncated = bool(max_rows and total_rows >= max_rows and await cursor.fetchone() is not None)
+                break
+            frame = _rows_to_arrow_frame(rows, description) if arrow else pd.DataFrame(rows, columns=columns)
+            frames.append(frame)
+            total_rows += len(frame)
+            total_bytes += int(frame.memory_usage(index=False, deep=True).sum())
+            if max_bytes and total_bytes >= max_bytes:
+                truncated = len(rows) == fetch_size and await cursor.fetchone() is not None
+                break
+        
+        if len(frames) > 1:
+            df = pd.concat(frames, ignore_index=True)
+        elif frames:
+            df = frames[0]
+        else:
+            df = _rows_to_arrow_frame([], description) if arrow else pd.DataFrame(columns=columns)
+        df.attrs["truncated"] = truncated
+        if truncated:
+            df.attrs["row_limit"] = len(df)
+            logger.warning(f"Oracle result truncated at {total_rows} rows / {total_bytes} bytes")
+        return df
+    
+    async def execute_query_async(self, sql: str, parameters: Optional[Dict[str, Any]] = None,
+                                  max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                                  arrow: bool = False, cancel_token: Optional[CancelToken] = None) -> pd.DataFrame:
+        """Asyncio version of execute_query.
+        
+        Uses oracledb's async thin-mode pool so waiting on the database does not
+        hold a thread; in thick mode (no asyncio support) the blocking
+        execute_query runs on a worker thread instead.
+        """
+        return await get_single_flight("oracle").ado(
+            self._flight_key(sql, parameters, max_rows, max_bytes, arrow),
+            self._execute_query_async, sql, parameters, max_rows, max_bytes, arrow,
+            cancel_token=cancel_token or CancelToken()
+        )
+    
+    async def _execute_query_async(self, sql: str, parameters: Optional[Dict[str, Any]], max_rows: Optional[int],
+                                   max_bytes: Optional[int], arrow: bool,
+                                   cancel_token: Optional[CancelToken] = None) -> pd.DataFrame:
+        if not self.async_supported():
+            return await asyncio.to_thread(self._execute_query, sql, parameters, max_rows, max_bytes, arrow,
+                                           cancel_token)
+        
+        chunk_size = oracle_config.fetch_arraysize
+        max_rows = oracle_config.fetch_max_rows if max_rows is None else max_rows
+        max_bytes = oracle_config.fetch_max_bytes if max_bytes is None else max_bytes
+        token = cancel_token or CancelToken()
+        token.raise_if_cancelled("oracle")
+        timeout = oracle_config.query_timeout
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._aacquire() as connection:
+                connection.call_timeout = int(timeout * 1000)
+                cursor = connection.cursor()
+                try:
+                    cursor.arraysize = chunk_size
+                    cursor.prefetchrows = max(oracle_config.fetch_prefetchrows, chunk_size + 1)
+                    # The token fires from other threads; the connection belongs to the loop
+                    with token.on_cancel(lambda: loop.call_soon_threadsafe(connection.cancel), timeout=timeout):
+                        if parameters:
+                            await cursor.execute(sql, parameters)
+                        else:
+                            await cursor.execute(sql)
+                        return await self._afetch_frame(cursor, chunk_size, max_rows, max_bytes, arrow)
+                finally:
+                    cursor.close()
+                    connection.call_timeout = 0
+        except Exception as e:
+            interrupted = self._interrupted(e, token)
+            if interrupted is not None:
+                raise interrupted from e
             logger.error(f"Error executing query: {e}")
             raise
     
+    @staticmethod
+    def _explain_statement(sql: str) -> tuple:
+        statement_id = f"guard_{uuid.uuid4().hex[:20]}"
+        return statement_id, f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}"
+    
+    def explain_plan(self, sql: str) -> List[Dict[str, Any]]:
+        """Optimizer plan rows (operation, cardinality, cost) of a statement, without running it.
+        
+        The plan is written to PLAN_TABLE and rolled back after it has been read.
+        """
+        statement_id, explain_sql = self._explain_statement(sql)
+        with self.acquire() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(explain_sql)
+                cursor.execute(_PLAN_QUERY, {"statement_id": statement_id})
+                return [dict(zip(_PLAN_COLUMNS, row)) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+                connection.rollback()
+    
+    async def explain_plan_async(self, sql: str) -> List[Dict[str, Any]]:
+        """Asyncio version of explain_plan."""
+        if not self.async_supported():
+            return await asyncio.to_thread(self.explain_plan, sql)
+        statement_id, explain_sql = self._explain_statement(sql)
+        async with self._aacquire() as connection:
+            cursor = connection.cursor()
+            try:
+                await cursor.execute(explain_sql)
+                await cursor.execute(_PLAN_QUERY, {"statement_id": statement_id})
+                return [dict(zip(_PLAN_COLUMNS, row)) for row in await cursor.fetchall()]
+            finally:
+                cursor.close()
+                await connection.rollback()
+    
     def get_tables_list(self) -> List[Dict[str, Any]]:
         """Get list of tables in current schema."""
-        if not self.connected:
-            raise RuntimeError("Not connected to Oracle database")
-        
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                SELECT table_name, num_rows, last_analyzed 
-                FROM user_tables 
-                ORDER BY table_name
-            """)
-            
-            tables = []
-            for row in cursor.fetchall():
-                tables.append({
-                    "table_name": row[0],
-                    "num_rows": row[1],
-                    "last_analyzed": str(row[2]) if row[2] else None
-                })
-            
-            cursor.close()
-            return tables
+            with self.acquire() as connection:
+                cursor = connection.cursor()
+                cursor.execute("""
+                    SELECT table_name, num_rows, last_analyzed 
+                    FROM user_tables 
+                    ORDER BY table_name
+                """)
+                
+                tables = []
+                for row in cursor.fetchall():
+                    tables.append({
+                        "table_name": row[0],
+                        "num_rows": row[1],
+                        "last_analyzed": str(row[2]) if row[2] else None
+                    })
+                
+                cursor.close()
+                return tables
             
         except Exception as e:
             logger.error(f"Error getting tables list: {e}")
@@ -120,29 +675,28 @@ class DatabaseManager:
     
     def describe_table(self, table_name: str, schema_name: Optional[str] = None) -> Dict[str, Any]:
         """Get table structure information."""
-        if not self.connected:
-            raise RuntimeError("Not connected to Oracle database")
-        
         try:
-            cursor = self.connection.cursor()
-            
-            # Get column information
-            if schema_name:
-                cursor.execute("""
-                    SELECT column_name, data_type, data_length, nullable, data_default
-                    FROM all_tab_columns 
-                    WHERE table_name = :table_name AND owner = :schema_name
-                    ORDER BY column_id
-                """, {"table_name": table_name.upper(), "schema_name": schema_name.upper()})
-            else:
-                cursor.execute("""
-                    SELECT column_name, data_type, data_length, nullable, data_default
-                    FROM user_tab_columns 
-                    WHERE table_name = :table_name
-                    ORDER BY column_id
-                """, {"table_name": table_name.upper()})
-            
-            columns = cursor.fetchall()
+            with self.acquire() as connection:
+                cursor = connection.cursor()
+                
+                # Get column information
+                if schema_name:
+                    cursor.execute("""
+                        SELECT column_name, data_type, data_length, nullable, data_default
+                        FROM all_tab_columns 
+                        WHERE table_name = :table_name AND owner = :schema_name
+                        ORDER BY column_id
+                    """, {"table_name": table_name.upper(), "schema_name": schema_name.upper()})
+                else:
+                    cursor.execute("""
+                        SELECT column_name, data_type, data_length, nullable, data_default
+                        FROM user_tab_columns 
+                        WHERE table_name = :table_name
+                        ORDER BY column_id
+                    """, {"table_name": table_name.upper()})
+                
+                columns = cursor.fetchall()
+                cursor.close()
             
             if not columns:
                 return {"error": f"Table {table_name} not found"}
@@ -158,7 +712,6 @@ class DatabaseManager:
                     "data_default": str(col[4]) if col[4] else None
                 })
             
-            cursor.close()
             return {
                 "table_name": table_name,
                 "schema_name": schema_name,
@@ -171,9 +724,6 @@ class DatabaseManager:
     
     def get_table_sample(self, table_name: str, limit: int = 10, schema_name: Optional[str] = None) -> pd.DataFrame:
         """Get sample data from table."""
-        if not self.connected:
-            raise RuntimeError("Not connected to Oracle database")
-        
         try:
             # Build query with proper schema qualification
             if schema_name:
@@ -190,11 +740,12 @@ class DatabaseManager:
     def test_connection(self) -> str:
         """Test database connection."""
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT 'Connected to Oracle Database' as status FROM DUAL")
-            result = cursor.fetchone()
-            cursor.close()
-            return result[0]
+            with self.acquire() as connection:
+                cursor = connection.cursor()
+                cursor.execute("SELECT 'Connected to Oracle Database' as status FROM DUAL")
+                result = cursor.fetchone()
+                cursor.close()
+                return result[0]
         except Exception as e:
             return f"Connection Error: {str(e)}"
 
@@ -206,11 +757,11 @@ def get_db_manager() -> DatabaseManager:
     return db_manager
 
 def init_database_connection() -> bool:
-    """Initialize database connection."""
+    """Initialize the database connection pool (reused if already created)."""
     return db_manager.connect()
 
 def close_database_connection():
-    """Close database connection."""
+    """Close the database connection pool."""
     db_manager.disconnect()
 
 # Streamlit session state helpers
@@ -0,0 +1,250 @@
+"""
+Process-wide DuckDB engine for local CSV queries.
+
+A single DuckDB database is kept alive for the whole server process so its
+catalog, statistics and thread pool are reused across chat questions. The rate
+deck is exposed once as the `rates` view over a zero-copy Arrow table of the
+loaded frame, so DuckDB scans the same (memory-mapped) buffers instead of a
+copy of its own; every Streamlit session gets its own cursor in which `df` is
+a view bound to that session's current DataFrame (the full deck or the
+result of an earlier query).
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from config.config import duckdb_config, DuckDBConfig
+from .cancellation import CancelToken
+
+logger = logging.getLogger(__name__)
+
+BASE_TABLE = "rates"
+SESSION_VIEW = "df"
+# Rows hashed to tell the deck from a reordered frame of the same shape
+_SAMPLE_ROWS = 64
+
+
+def current_session_id() -> str:
+    """Return the Streamlit session id, or a per-thread id outside Streamlit."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is not None:
+            return ctx.session_id
+    except Exception:
+        pass
+    return f"thread-{threading.get_ident()}"
+
+
+@dataclass
+class _SessionCursor:
+    """DuckDB cursor owned by one session plus what its `df` view points at."""
+    cursor: Any
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    bound_frame: Optional[pd.DataFrame] = None
+    bound_base_version: Optional[str] = None
+    closed: bool = False
+
+
+class DuckDBEngine:
+    """Long-lived, thread-safe DuckDB database shared by all sessions."""
+
+    def __init__(self, config: DuckDBConfig = duckdb_config):
+        self.config = config
+        self.connection = duckdb.connect(database=":memory:", config=config.connect_config())
+        self._lock = threading.RLock()
+        self._sessions: "OrderedDict[str, _SessionCursor]" = OrderedDict()
+        self.base_version: Optional[str] = None
+        self.base_rows: Optional[int] = None
+        self.base_columns: Optional[List[str]] = None
+        self._base_sample: Optional[str] = None
+        self._base_table: Optional[pa.Table] = None
+        # Frames already checked against the deck, by id (entries go away with the frame)
+        self._verified: "weakref.WeakValueDictionary[int, pd.DataFrame]" = weakref.WeakValueDictionary()
+
+    def register_base_frame(self, frame: pd.DataFrame, version: Optional[str] = None,
+                            table: Optional[pa.Table] = None) -> bool:
+        """Expose the rate deck as the `rates` view (no-op if already registered).
+
+        Pass the deck's loaded Arrow table (the memory-mapped one from the
+        columnar cache) as `table` so the view scans those buffers directly;
+        without it the frame is wrapped with Table.from_pandas. Nothing is
+        copied into DuckDB. Returns True if the view was (re)registered.
+        """
+        version = version or frame.attrs.get("data_version")
+        if version is None:
+            return False
+        with self._lock:
+            if version == self.base_version:
+                return False
+            start_time = time.perf_counter()
+            if table is None or table.num_rows != len(frame) or table.column_names != list(frame.columns):
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+            self.connection.register(BASE_TABLE, table)
+            self._base_table = table
+            self.base_version = version
+            self.base_rows = len(frame)
+            self.base_columns = list(frame.columns)
+            self._base_sample = self._sample_hash(frame)
+            self._verified.clear()
+            self._verified[id(frame)] = frame
+            logger.info(
+                f"Registered rate deck as DuckDB view '{BASE_TABLE}' "
+                f"({len(frame)} rows, version {version}) in {time.perf_counter() - start_time:.3f}s"
+            )
+            return True
+
+    @staticmethod
+    def _sample_hash(frame: pd.DataFrame) -> str:
+        """Hash of evenly spaced rows: sorted or rewritten frames of the deck's shape differ in it."""
+        positions = np.unique(np.linspace(0, len(frame) - 1, min(len(frame), _SAMPLE_ROWS)).astype(int))
+        hashed = pd.util.hash_pandas_object(frame.iloc[positions], index=False).to_numpy()
+        return hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest()
+
+    def is_base_frame(self, frame: pd.DataFrame) -> bool:
+        """True if the frame is the registered rate deck.
+
+        Derived frames (sorted, filtered or projected) keep the deck's attrs, so
+        version and row count are not enough: columns and a sample of rows must
+        match too. Frames that passed are remembered by identity.
+        """
+        with self._lock:
+            if (self.base_version is None or frame.attrs.get("data_version") != self.base_version
+                    or len(frame) != self.base_rows or list(frame.columns) != self.base_columns):
+                return False
+            if self._verified.get(id(frame)) is frame:
+                return True
+            try:
+                matches = self._sample_hash(frame) == self._base_sample
+            except Exception as e:
+                logger.warning(f"Could not compare frame with the rate deck: {e}")
+                matches = False
+            if matches:
+                self._verified[id(frame)] = frame
+            return matches
+
+    def frame_version(self, frame: pd.DataFrame) -> Optional[str]:
+        """Data version of a frame if it is the registered rate deck, else None."""
+        return self.base_version if self.is_base_frame(frame) else None
+
+    def _session(self, session_id: str) -> _SessionCursor:
+        evicted = []
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = _SessionCursor(cursor=self.connection.cursor())
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.config.max_sessions:
+                    evicted.append(self._sessions.popitem(last=False)[1])
+            else:
+                self._sessions.move_to_end(session_id)
+        for old in evicted:
+            self._close(old)
+        return session
+
+    @staticmethod
+    def _close(session: _SessionCursor) -> None:
+        """Close a forgotten session's cursor once no query is using it."""
+        with session.lock:
+            session.closed = True
+            session.cursor.close()
+
+    @contextmanager
+    def _locked_session(self, session_id: str):
+        """The session's cursor under its lock (a fresh one if it was evicted while we waited)."""
+        while True:
+            session = self._session(session_id)
+            session.lock.acquire()
+            if not session.closed:
+                break
+            session.lock.release()
+        try:
+            yield session
+        finally:
+            session.lock.release()
+
+    def _bind_frame(self, session: _SessionCursor, frame: pd.DataFrame) -> None:
+        """Point the session's `df` view at the frame, rebinding only when it changed."""
+        cursor = session.cursor
+        if self.is_base_frame(frame):
+            with self._lock:
+                version, table = self.base_version, self._base_table
+            if session.bound_base_version == version:
+                return
+            self._unbind(session)
+            # Registered views are per connection, so each cursor registers the shared Arrow table
+            cursor.register(SESSION_VIEW, table)
+            session.bound_base_version = version
+        else:
+            if session.bound_frame is frame:
+                return
+            self._unbind(session)
+            cursor.register(SESSION_VIEW, frame)
+            session.bound_frame = frame
+
+    def _unbind(self, session: _SessionCursor) -> None:
+        if session.bound_frame is not None or session.bound_base_version is not None:
+            session.cursor.unregister(SESSION_VIEW)
+            session.bound_frame = None
+            session.bound_base_version = None
+
+    def execute(self, query: str, frame: pd.DataFrame, session_id: Optional[str] = None,
+                cancel_token: Optional[CancelToken] = None) -> pd.DataFrame:
+        """Run a query against `df` (bound to the given frame) on the session's cursor.
+
+        The query is interrupted when cancel_token is cancelled or after
+        DUCKDB_QUERY_TIMEOUT seconds (QueryCancelled / QueryTimeout).
+        """
+        token = cancel_token or CancelToken()
+        token.raise_if_cancelled("duckdb")
+        with self._locked_session(session_id or current_session_id()) as session:
+            self._bind_frame(session, frame)
+            start_time = time.perf_counter()
+            try:
+                with token.on_cancel(session.cursor.interrupt, timeout=self.config.query_timeout):
+                    result = session.cursor.execute(query).fetchdf()
+            except duckdb.InterruptException as e:
+                raise token.error("duckdb") from e
+            logger.info(f"DuckDB query returned {len(result)} rows in {time.perf_counter() - start_time:.3f}s")
+            return result
+
+    def explain(self, query: str, frame: pd.DataFrame, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Physical plan of a query against `df` as DuckDB's JSON operator tree (nothing is executed)."""
+        with self._locked_session(session_id or current_session_id()) as session:
+            self._bind_frame(session, frame)
+            rows = session.cursor.execute(f"EXPLAIN (FORMAT JSON) {query}").fetchall()
+        return json.loads(rows[0][1]) if rows else []
+
+    def close_session(self, session_id: str) -> None:
+        """Close and forget a session's cursor."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._close(session)
+
+
+_engine: Optional[DuckDBEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_duckdb_engine() -> DuckDBEngine:
+    """Get the process-wide DuckDB engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = DuckDBEngine()
+    return _engine
@@ -0,0 +1,423 @@
+"""
+Few-shot example store of past successful question -> SQL pairs.
+
+Questions whose generated SQL ran successfully are embedded (Bedrock Titan by
+default) and kept in a local vector index; for a new question the nearest
+examples are added to the prompt. Embeddings are requested in batches of
+AppConfig.batch_size and cached on disk by model and text, so restarts and
+repeated texts never pay for an embedding twice. The index is a brute-force
+NumPy matrix product, switching to an inverted-file (IVF) index once the store
+grows past a configurable size.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.config import few_shot_config, FewShotConfig
+from .term_matcher import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class Embedder(ABC):
+    """Turns texts into fixed-size vectors."""
+
+    model_id: str
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Return a (len(texts), dimension) float32 matrix."""
+
+
+class TitanEmbedder(Embedder):
+    """Amazon Titan text embeddings through Bedrock.
+
+    Titan embeds one text per request, so a batch of AppConfig.batch_size texts
+    is sent as concurrent requests over one reused client.
+    """
+
+    def __init__(self, model_id: Optional[str] = None, batch_size: Optional[int] = None, client=None):
+        from config.aws_config import app_config, bedrock_config
+        self.model_id = model_id or bedrock_config.model_id
+        self.batch_size = max(1, batch_size or app_config.batch_size)
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from .llm_providers import get_bedrock_runtime_client
+                    self._client = get_bedrock_runtime_client()
+        return self._client
+
+    def _embed_one(self, text: str) -> List[float]:
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            contentType='application/json',
+            accept='application/json',
+            body=json.dumps({"inputText": text})
+        )
+        return json.loads(response['body'].read())['embedding']
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors: List[List[float]] = []
+        with ThreadPoolExecutor(max_workers=self.batch_size) as executor:
+            for start in range(0, len(texts), self.batch_size):
+                vectors.extend(executor.map(self._embed_one, texts[start:start + self.batch_size]))
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic local embedder: hashed word and word-bigram counts.
+
+    Needs no network or model and gives stable vectors, so it serves as the
+    offline provider and as the stand-in for Titan in tests.
+    """
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+        self.model_id = f"local-hashing-{dimension}"
+
+    def _bucket(self, feature: str) -> int:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.dimension
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [token for token, _, _ in tokenize(text)]
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                vectors[row, self._bucket(feature)] += 1.0
+        return vectors
+
+
+class EmbeddingCache:
+    """On-disk vector cache keyed by (model id, text hash)."""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_id: str, text: str) -> str:
+        return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = list(keys[start:start + 500])
+                placeholders = ",".join("?" * len(chunk))
+                for key, blob in self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+            )
+
+
+class CachedEmbedder(Embedder):
+    """Embedder wrapper that only sends texts missing from the disk cache."""
+
+    def __init__(self, embedder: Embedder, cache: EmbeddingCache):
+        self.embedder = embedder
+        self.cache = cache
+        self.model_id = embedder.model_id
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        keys = [EmbeddingCache.make_key(self.model_id, text) for text in texts]
+        found = self.cache.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        self.cache_hits += len(texts) - len(missing)
+        self.cache_misses += len(missing)
+        if missing:
+            vectors = self.embedder.embed(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return np.vstack([found[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+
+class VectorIndex:
+    """Exact cosine-similarity search over normalized vectors."""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = _normalize_rows(vectors) if len(vectors) else vectors
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Append vectors (indexed after the existing ones)."""
+        vectors = _normalize_rows(vectors)
+        self.vectors = vectors if not len(self.vectors) else np.vstack([self.vectors, vectors])
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not len(self.vectors):
+            return []
+        query = _normalize_rows(query.reshape(1, -1))[0]
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: spherical k-means lists, searching only the nearest `nprobe` lists.
+
+    Vectors added after training join the list of their nearest centroid;
+    `trained_size` lets the owner decide when the lists are stale enough to retrain.
+    """
+
+    def __init__(self, vectors: np.ndarray, n_lists: int, nprobe: int = 4, iterations: int = 10, seed: int = 0):
+        super().__init__(vectors)
+        self.nprobe = nprobe
+        n_lists = max(1, min(n_lists, len(self.vectors)))
+        rng = np.random.default_rng(seed)
+        self.centroids = self.vectors[rng.choice(len(self.vectors), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(self.vectors @ self.centroids.T, axis=1)
+            for c in range(n_lists):
+                members = self.vectors[assignment == c]
+                if len(members):
+                    self.centroids[c] = members.sum(axis=0)
+            self.centroids = _normalize_rows(self.centroids)
+        assignment = np.argmax(self.vectors @ self.centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignment == c) for c in range(n_lists)]
+        self.trained_size = len(self.vectors)
+
+    def add(self, vectors: np.ndarray) -> None:
+        start = len(self.vectors)
+        super().add(vectors)
+        assignment = np.argmax(self.vectors[start:] @ self.centroids.T, axis=1)
+        for c in np.unique(assignment):
+            self.lists[c] = np.concatenate([self.lists[c], start + np.flatnonzero(assignment == c)])
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        query = _normalize_rows(query.reshape(1, -1))[0]
+        probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        candidates = np.concatenate([self.lists[c] for c in probes])
+        if not len(candidates):
+            return []
+        scores = self.vectors[candidates] @ query
+        order = np.argsort(-scores)[:k]
+        return [(int(candidates[i]), float(scores[i])) for i in order]
+
+
+@dataclass(frozen=True)
+class Example:
+    """A question whose generated SQL ran successfully."""
+    question: str
+    sql: str
+    source: str
+    created_at: float
+
+
+def format_few_shot(examples: Sequence[Example]) -> str:
+    """Render examples as prompt text."""
+    if not examples:
+        return ""
+    parts = ["Examples of similar questions answered successfully before:"]
+    for example in examples:
+        parts.append(f"Question: {example.question}\n```sql\n{example.sql}\n```")
+    return "\n".join(parts)
+
+
+class ExampleStore:
+    """Persistent question -> SQL examples with nearest-neighbour retrieval."""
+
+    def __init__(self, embedder: Embedder, path: Optional[str] = None,
+                 config: FewShotConfig = few_shot_config):
+        self.embedder = embedder
+        self.path = path
+        self.config = config
+        self.examples: List[Example] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._index: Optional[VectorIndex] = None
+        self._seen = set()
+        self._lock = threading.RLock()
+        self._unavailable_until = 0.0
+        self._search_ms: List[float] = []
+        self.searches = 0
+        self.outcomes = {"with_examples": [0, 0], "without_examples": [0, 0]}
+        self._loaded = not (path and os.path.exists(path))
+        self._ensure_loaded()
+
+    def _ensure_loaded(self) -> None:
+        """Embed the examples saved on disk (retried later if embedding is unavailable)."""
+        if self._loaded or not self._embedding_available():
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                examples = [Example(**json.loads(line)) for line in f if line.strip()]
+            try:
+                if examples:
+                    self._append(examples)
+            except Exception as e:
+                self._embedding_failed(e)
+                return
+            self._loaded = True
+        logger.info(f"Loaded {len(examples)} few-shot examples from {self.path}")
+
+    def _append(self, examples: List[Example]) -> None:
+        vectors = self.embedder.embed([example.question for example in examples])
+        with self._lock:
+            self._vectors = vectors if not len(self._vectors) else np.vstack([self._vectors, vectors])
+            self.examples.extend(examples)
+            self._seen.update((e.source, e.question.strip().lower(), e.sql) for e in examples)
+            if self._index is not None and not self._needs_training():
+                self._index.add(vectors)
+            else:
+                self._index = None
+
+    def _needs_training(self) -> bool:
+        """Whether the index should be rebuilt rather than extended with new vectors."""
+        threshold = self.config.ivf_threshold
+        if not threshold or len(self.examples) < threshold:
+            return False
+        if not isinstance(self._index, IVFIndex):
+            return True
+        return len(self.examples) > self._index.trained_size * (1 + self.config.ivf_retrain_growth)
+
+    def _get_index(self) -> VectorIndex:
+        if self._index is None:
+            if self.config.ivf_threshold and len(self.examples) >= self.config.ivf_threshold:
+                n_lists = self.config.ivf_lists or int(np.sqrt(len(self.examples)))
+                self._index = IVFIndex(self._vectors, n_lists, self.config.ivf_nprobe)
+            else:
+                self._index = VectorIndex(self._vectors)
+        return self._index
+
+    def _embedding_available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+
+    def _embedding_failed(self, error: Exception) -> None:
+        logger.error(f"Embedding request failed, few-shot examples paused: {error}")
+        self._unavailable_until = time.monotonic() + self.config.retry_after
+
+    def add(self, question: str, sql: str, source: str) -> bool:
+        """Store a successful pair (duplicates are ignored). Returns True if added."""
+        self._ensure_loaded()
+        if not self._loaded or (source, question.strip().lower(), sql) in self._seen:
+            return False
+        example = Example(question=question, sql=sql, source=source, created_at=time.time())
+        try:
+            self._append([example])
+        except Exception as e:
+            self._embedding_failed(e)
+            return False
+        if self.path:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(example)) + "\n")
+        return True
+
+    def search(self, question: str, k: Optional[int] = None, source: Optional[str] = None,
+               min_similarity: Optional[float] = None) -> List[Tuple[Example, float]]:
+        """Nearest stored examples for the question, most similar first."""
+        k = self.config.k if k is None else k
+        min_similarity = self.config.min_similarity if min_similarity is None else min_similarity
+        self._ensure_loaded()
+        if not self.examples or k <= 0 or not self._embedding_available():
+            return []
+        start_time = time.perf_counter()
+        try:
+            query = self.embedder.embed([question])[0]
+        except Exception as e:
+            self._embedding_failed(e)
+            return []
+        with self._lock:
+            # Over-fetch so filtering by source still leaves k candidates
+            hits = self._get_index().search(query, k * 4 if source else k)
+            results = [
+                (self.examples[i], score) for i, score in hits
+                if score >= min_similarity and (source is None or self.examples[i].source == source)
+            ][:k]
+            self.searches += 1
+            self._search_ms.append((time.perf_counter() - start_time) * 1000)
+            del self._search_ms[:-1000]
+        return results
+
+    def record_outcome(self, success: bool, used_examples: bool) -> None:
+        """Record whether a freshly generated query ran on the first attempt."""
+        with self._lock:
+            bucket = self.outcomes["with_examples" if used_examples else "without_examples"]
+            bucket[0] += int(success)
+            bucket[1] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Store size, retrieval latency and first-attempt SQL success rates."""
+        with self._lock:
+            latencies = np.asarray(self._search_ms) if self._search_ms else None
+            stats: Dict[str, Any] = {
+                "examples": len(self.examples),
+                "index": type(self._index).__name__ if self._index is not None else "not built",
+                "searches": self.searches,
+                "avg_search_ms": float(latencies.mean()) if latencies is not None else 0.0,
+                "p95_search_ms": float(np.percentile(latencies, 95)) if latencies is not None else 0.0,
+            }
+            for name, (successes, attempts) in self.outcomes.items():
+                stats[f"success_rate_{name}"] = successes / attempts if attempts else None
+                stats[f"attempts_{name}"] = attempts
+        if isinstance(self.embedder, CachedEmbedder):
+            stats["embedding_cache_hits"] = self.embedder.cache_hits
+            stats["embedding_cache_misses"] = self.embedder.cache_misses
+        return stats
+
+
+def create_embedder(provider: str) -> Embedder:
+    """Embedder for the configured provider ('bedrock' or 'local')."""
+    if provider == "local":
+        return HashingEmbedder()
+    return TitanEmbedder()
+
+
+_example_store: Optional[ExampleStore] = None
+_example_store_lock = threading.Lock()
+
+
+def get_example_store() -> Optional[ExampleStore]:
+    """Get the process-wide example store (None when few-shot retrieval is disabled)."""
+    global _example_store
+    if _example_store is None and few_shot_config.enabled:
+        with _example_store_lock:
+            if _example_store is None:
+                embedder = create_embedder(few_shot_config.embedding_provider)
+                if few_shot_config.embedding_cache_path:
+                    embedder = CachedEmbedder(embedder, EmbeddingCache(few_shot_config.embedding_cache_path))
+                _example_store = ExampleStore(embedder, few_shot_config.examples_path)
+    return _example_store
@@ -0,0 +1,467 @@
+"""
+Federated queries: the rate deck in DuckDB joined with Oracle tables fetched on demand.
+
+The LLM writes one DuckDB query over `df` and plain Oracle table names. The
+tables are discovered from DuckDB's binder (each unknown table becomes an
+empty placeholder with the Oracle table's columns) and the query is planned
+with EXPLAIN. The optimizer's table scans tell which columns and which
+filters each Oracle table needs: those columns and the filters that
+translate to Oracle SQL (comparisons, IN lists, IS [NOT] NULL with plain
+literals) are pushed down. Equi-joins between a deck column and an Oracle
+column also push `column IN (<deck values>)` when the deck has at most
+FEDERATION_MAX_IN_LIST distinct values. The reduced tables are fetched in
+parallel (from the local replica when it holds a fresh copy) and the
+original query runs locally, so every predicate is applied again and a
+filter that could not be pushed costs transfer, not correctness.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from config.config import duckdb_config, federation_config, FederationConfig
+from .cancellation import CancelToken, QueryCancelled
+from .duckdb_engine import SESSION_VIEW
+
+logger = logging.getLogger(__name__)
+
+PROMPT_INSTRUCTIONS = """
+        FEDERATED QUERY MODE: this question combines the loaded rate deck with Oracle tables.
+        Write ONE DuckDB SQL query:
+        1. The rate deck is the table 'df' (columns as listed above)
+        2. Refer to Oracle tables by their plain table name (e.g. CARRIER, not SCHEMA.CARRIER)
+        3. Oracle tables are fetched on demand: filter them in WHERE with simple comparisons,
+           IN lists, BETWEEN or IS NULL on their own columns so only the needed rows are fetched
+        4. Join the deck and Oracle tables on equal columns where possible
+        5. Use DuckDB functions (coalesce, current_date), not Oracle ones (NVL, SYSDATE)
+        """
+
+_MISSING_TABLE = re.compile(r'Table with name (?:"([^"]+)"|(\S+)) does not exist')
+_NAME = re.compile(r"^[A-Za-z_][\w$#]*(\.[A-Za-z_][\w$#]*)?$")
+_COLUMN = r'(?P<column>"[^"]+"|[A-Za-z_][\w$#]*)'
+_COMPARISON = re.compile(rf"^{_COLUMN}\s*(?P<op>=|!=|<>|<=|>=|<|>)\s*(?P<value>.+)$", re.DOTALL)
+_NULL_CHECK = re.compile(rf"^{_COLUMN}\s+IS\s+(?P<negated>NOT\s+)?NULL$", re.IGNORECASE)
+_IN_LIST = re.compile(rf"^{_COLUMN}\s+IN\s*\((?P<values>.*)\)$", re.IGNORECASE | re.DOTALL)
+_NUMBER = re.compile(r"^-?\d+(\.\d+)?([eE][-+]?\d+)?$")
+_STRING = re.compile(r"^'(?:[^']|'')*'$")
+_TYPED = re.compile(r"^('(?:[^']|'')*')::(DATE|TIMESTAMP)$", re.IGNORECASE)
+# Plan nodes a join input may pass through and still be the plain columns of one table
+_PASS_THROUGH = ("FILTER", "PROJECTION")
+_PUSHABLE_JOINS = ("INNER", "SEMI")
+# How the registered deck frame shows up in plans
+_FRAME_SCANS = ("PANDAS_SCAN", "ARROW_SCAN")
+
+
+@dataclass
+class RemoteScan:
+    """One Oracle table as the query needs it: columns, pushed filters and what the fetch returned."""
+    table: str
+    columns: List[str] = field(default_factory=list)
+    filters: List[str] = field(default_factory=list)
+    join_filters: List[str] = field(default_factory=list)
+    unpushed: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    source: str = "oracle"
+    truncated: bool = False
+
+    def sql(self, with_filters: bool = True) -> str:
+        columns = ", ".join(f'"{column}"' for column in self.columns) or '1 AS "ROW_PRESENT"'
+        predicates = self.filters + self.join_filters if with_filters else []
+        where = f" WHERE {' AND '.join(predicates)}" if predicates else ""
+        return f"SELECT {columns} FROM {self.table}{where}"
+
+
+def _split_top_level(text: str, separator: str) -> List[str]:
+    """Split on separator outside quotes and parentheses."""
+    parts, depth, quote, start, i = [], 0, None, 0, 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0 and text.startswith(separator, i):
+            parts.append(text[start:i])
+            i += len(separator)
+            start = i
+            continue
+        i += 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _as_list(value) -> List[str]:
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _oracle_literal(value: str) -> Optional[str]:
+    """A DuckDB-printed literal in Oracle syntax, or None when it has no safe equivalent."""
+    value = value.strip()
+    if _NUMBER.match(value) or _STRING.match(value):
+        return value
+    typed = _TYPED.match(value)
+    if typed:
+        return f"{typed.group(2).upper()} {typed.group(1)}"
+    return None
+
+
+def _unquote(column: str) -> str:
+    return column[1:-1] if column.startswith('"') else column
+
+
+def to_oracle_predicate(condition: str, columns: List[str]) -> Optional[str]:
+    """Translate one DuckDB scan filter on the given columns to Oracle SQL (None if it cannot be)."""
+    condition = condition.strip()
+    if condition.lower().startswith("optional:"):
+        condition = condition.split(":", 1)[1].strip()
+    match = _NULL_CHECK.match(condition)
+    if match and _unquote(match.group("column")) in columns:
+        return f'"{_unquote(match.group("column"))}" IS {"NOT " if match.group("negated") else ""}NULL'
+    match = _IN_LIST.match(condition)
+    if match and _unquote(match.group("column")) in columns:
+        values = [_oracle_literal(value) for value in _split_top_level(match.group("values"), ",")]
+        if values and None not in values and len(values) <= federation_config.max_in_list:
+            return f'"{_unquote(match.group("column"))}" IN ({", ".join(values)})'
+        return None
+    match = _COMPARISON.match(condition)
+    if match and _unquote(match.group("column")) in columns:
+        value = _oracle_literal(match.group("value"))
+        if value is not None:
+            operator = "<>" if match.group("op") == "!=" else match.group("op")
+            return f'"{_unquote(match.group("column"))}" {operator} {value}'
+    return None
+
+
+def _in_list_literal(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)) and value == value:
+        return repr(value)
+    return None
+
+
+class FederatedEngine:
+    """Plans, fetches and runs federated queries; keeps Oracle column lists cached."""
+
+    def __init__(self, config: FederationConfig = federation_config, db_manager=None):
+        self.config = config
+        self._db_manager = db_manager
+        self._schemas: Dict[str, Tuple[float, pa.Schema]] = {}
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.failures = 0
+        self.remote_rows = 0
+        self.pushed_filters = 0
+        self.join_filters = 0
+        self.unpushed_filters = 0
+        self._fetch_seconds = 0.0
+        self._local_seconds = 0.0
+
+    @property
+    def db_manager(self):
+        if self._db_manager is None:
+            from .database_tools import get_db_manager
+            self._db_manager = get_db_manager()
+        return self._db_manager
+
+    def _remote_frame(self, sql: str, token: CancelToken) -> Tuple[pd.DataFrame, str]:
+        """Run SQL for Oracle data: on the local replica when it can serve it, else on Oracle."""
+        from .oracle_replica import get_oracle_replica
+        replica = get_oracle_replica()
+        if replica is not None:
+            result = replica.try_query(sql, token)
+            if result is not None:
+                return result, "replica"
+        result = self.db_manager.execute_query(sql, max_rows=self.config.max_rows_per_table, arrow=True,
+                                               cancel_token=token)
+        return result, "oracle"
+
+    def describe(self, table: str, token: CancelToken) -> pa.Schema:
+        """Column names and types of an Oracle table (cached for FEDERATION_SCHEMA_TTL seconds)."""
+        with self._lock:
+            cached = self._schemas.get(table)
+        if cached is not None and time.monotonic() - cached[0] < self.config.schema_ttl:
+            return cached[1]
+        frame, _ = self._remote_frame(f"SELECT * FROM {table} WHERE 1 = 0", token)
+        schema = pa.Schema.from_pandas(frame, preserve_index=False)
+        # Untyped (all-null object) columns would bind as INTEGER: plan them as text
+        schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                            for field in schema])
+        with self._lock:
+            self._schemas[table] = (time.monotonic(), schema)
+        return schema
+
+    @staticmethod
+    def _connection(dataframe) -> duckdb.DuckDBPyConnection:
+        connection = duckdb.connect(database=":memory:", config=duckdb_config.connect_config())
+        if dataframe is not None:
+            connection.register(SESSION_VIEW, dataframe)
+        return connection
+
+    @staticmethod
+    def _create_table(connection, table: str, data) -> None:
+        """Create a (possibly schema-qualified) table named like the Oracle table from an Arrow table or frame."""
+        parts = table.split(".")
+        if len(parts) == 2:
+            connection.execute(f'CREATE SCHEMA IF NOT EXISTS "{parts[0]}"')
+        name = ".".join(f'"{part}"' for part in parts)
+        connection.register("_remote_data", data)
+        try:
+            connection.execute(f"CREATE TABLE {name} AS SELECT * FROM _remote_data")
+        finally:
+            connection.unregister("_remote_data")
+
+    def plan(self, sql: str, dataframe, token: CancelToken) -> List[RemoteScan]:
+        """Find the Oracle tables a query reads and what to fetch from each."""
+        planner = self._connection(dataframe)
+        try:
+            # Placeholders are empty: keep the optimizer from folding their scans away
+            planner.execute("SET disabled_optimizers = 'statistics_propagation,empty_result_pullup'")
+        except duckdb.Error as e:
+            logger.warning(f"Federated planning without disabled optimizers: {e}")
+        schemas: Dict[str, pa.Schema] = {}
+        try:
+            while True:
+                try:
+                    rows = planner.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall()
+                    break
+                except duckdb.CatalogException as e:
+                    # Every table DuckDB does not know is taken to be an Oracle table
+                    match = _MISSING_TABLE.search(str(e))
+                    table = (match.group(1) or match.group(2)).upper() if match else None
+                    if table is None or not _NAME.match(table) or table in schemas:
+                        raise
+                    if len(schemas) >= self.config.max_tables:
+                        raise ValueError(f"the query reads more than {self.config.max_tables} Oracle tables")
+                    schemas[table] = self.describe(table, token)
+                    self._create_table(planner, table, schemas[table].empty_table())
+        finally:
+            planner.close()
+        plan = json.loads(rows[0][1]) if rows else []
+        scans = {table: RemoteScan(table) for table in schemas}
+        single_scans = self._collect(plan, scans, schemas)
+        deck_columns = set(dataframe.columns) if dataframe is not None else set()
+        for node in self._nodes(plan):
+            if node.get("name") == "HASH_JOIN":
+                self._push_join(node, sql, scans, deck_columns, dataframe, single_scans)
+        return list(scans.values())
+
+    @classmethod
+    def _nodes(cls, plan: List[Dict[str, Any]]):
+        for node in plan:
+            yield node
+            yield from cls._nodes(node.get("children", []))
+
+    @staticmethod
+    def _scan_table(node: Dict[str, Any]) -> str:
+        """Table name of a SEQ_SCAN as the query wrote it ('memory.main.X' -> 'X', 'memory.S.X' -> 'S.X')."""
+        parts = [_unquote(part) for part in node.get("extra_info", {}).get("Table", "").split(".")]
+        if len(parts) == 3:
+            parts = parts[1:]
+        if parts and parts[0] == "main":
+            parts = parts[1:]
+        return ".".join(parts).upper()
+
+    def _collect(self, plan, scans: Dict[str, RemoteScan], schemas: Dict[str, pa.Schema]) -> List[str]:
+        """Columns and translatable filters per remote table (filters only when every scan agrees).
+
+        Returns the tables the plan scans exactly once.
+        """
+        seen: Dict[str, List[List[str]]] = {}
+        for node in self._nodes(plan):
+            if node.get("name") != "SEQ_SCAN":
+                continue
+            table = self._scan_table(node)
+            if table not in scans:
+                continue
+            info = node.get("extra_info", {})
+            names = schemas[table].names
+            conditions = [part for text in _as_list(info.get("Filters")) for part in _split_top_level(text, " AND ")]
+            columns = scans[table].columns
+            for column in _as_list(info.get("Projections")):
+                if column in names and column not in columns:
+                    columns.append(column)
+            for condition in conditions:
+                # Filter columns are needed locally too: the whole query runs again on the fetched rows
+                for column in names:
+                    if re.search(rf'(?<![\w"]){re.escape(column)}(?![\w"])|"{re.escape(column)}"', condition) \
+                            and column not in columns:
+                        columns.append(column)
+            seen.setdefault(table, []).append(conditions)
+        for table, scan in scans.items():
+            if table not in seen:
+                # No scan in the plan (unexpected): fetch every column, unfiltered
+                scan.columns = list(schemas[table].names)
+                continue
+            common = [c for c in seen[table][0] if all(c in other for other in seen[table][1:])]
+            predicates = [to_oracle_predicate(condition, schemas[table].names) for condition in common]
+            scan.filters = [p for p in predicates if p is not None]
+            scan.unpushed = sum(len(conditions) for conditions in seen[table]) - len(scan.filters) * len(seen[table])
+        return [table for table, conditions in seen.items() if len(conditions) == 1]
+
+    def _join_inputs(self, node: Dict[str, Any]) -> List[Tuple[str, List[str]]]:
+        """(table, projected columns) of the scans whose rows a join input passes through unchanged.
+
+        Filters, projections and inner joins are followed (semi joins only into
+        their left input); anything else, such as an aggregate, ends the walk.
+        """
+        name = node.get("name")
+        info = node.get("extra_info", {})
+        if name in _FRAME_SCANS:
+            return [(SESSION_VIEW, _as_list(info.get("Projections")))]
+        if name == "SEQ_SCAN":
+            return [(self._scan_table(node), _as_list(info.get("Projections")))]
+        children = node.get("children", [])
+        if name in _PASS_THROUGH and len(children) == 1:
+            return self._join_inputs(children[0])
+        if name == "HASH_JOIN" and len(children) == 2 and info.get("Join Type") in _PUSHABLE_JOINS:
+            followed = children if info["Join Type"] == "INNER" else children[:1]
+            return [scan for child in followed for scan in self._join_inputs(child)]
+        return []
+
+    def _push_join(self, node, sql, scans, deck_columns, dataframe, single_scans) -> None:
+        """Push `column IN (<deck values>)` into Oracle tables equi-joined with the deck.
+
+        Only tables scanned once qualify (the fetched rows serve every scan of a
+        table), and only columns the query never uses as an alias: plans show a
+        renamed column under its new name.
+        """
+        info = node.get("extra_info", {})
+        if info.get("Join Type") not in _PUSHABLE_JOINS or len(node.get("children", [])) != 2:
+            return
+        inputs = [self._join_inputs(child) for child in node["children"]]
+        for condition in (part for text in _as_list(info.get("Conditions")) for part in _split_top_level(text, " AND ")):
+            sides = [_unquote(side.strip()) for side in condition.split(" = ")]
+            if len(sides) != 2:
+                continue
+            for deck_side, remote_side in ((0, 1), (1, 0)):
+                deck_column, remote_column = sides[deck_side], sides[remote_side]
+                from_deck = [table for table, columns in inputs[deck_side] if deck_column in columns]
+                from_remote = [table for table, columns in inputs[remote_side] if remote_column in columns]
+                if (from_deck != [SESSION_VIEW] or len(from_remote) != 1 or from_remote[0] not in single_scans
+                        or deck_column not in deck_columns
+                        or re.search(rf'\bAS\s+"?{re.escape(remote_column)}\b', sql, re.IGNORECASE)):
+                    continue
+                values = pd.unique(dataframe[deck_column].dropna())
+                literals = [_in_list_literal(value.item() if hasattr(value, "item") else value) for value in values]
+                if not literals or len(literals) > self.config.max_in_list or None in literals:
+                    continue
+                predicate = f'"{remote_column}" IN ({", ".join(literals)})'
+                if predicate not in scans[from_remote[0]].join_filters:
+                    scans[from_remote[0]].join_filters.append(predicate)
+
+    def _fetch(self, scan: RemoteScan, token: CancelToken) -> pd.DataFrame:
+        start_time = time.perf_counter()
+        try:
+            frame, scan.source = self._remote_frame(scan.sql(), token)
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            if not (scan.filters or scan.join_filters):
+                raise
+            # A pushed predicate Oracle rejects (e.g. a type mismatch) only costs transfer: drop them
+            logger.warning(f"Fetching {scan.table} without pushed filters: {e}")
+            scan.unpushed += len(scan.filters)
+            scan.filters, scan.join_filters = [], []
+            frame, scan.source = self._remote_frame(scan.sql(with_filters=False), token)
+        scan.rows = len(frame)
+        scan.truncated = bool(frame.attrs.get("truncated"))
+        scan.seconds = time.perf_counter() - start_time
+        logger.info(f"Federated fetch of {scan.table}: {scan.rows} rows from {scan.source} in {scan.seconds:.3f}s "
+                    f"({len(scan.filters)} filters, {len(scan.join_filters)} join filters pushed)")
+        return frame
+
+    def execute(self, sql: str, dataframe, cancel_token: Optional[CancelToken] = None) -> pd.DataFrame:
+        """Plan, fetch the Oracle rows the query needs and run it locally with the deck as `df`."""
+        token = cancel_token or CancelToken()
+        token.raise_if_cancelled("duckdb")
+        try:
+            scans = self.plan(sql, dataframe, token)
+            fetch_start = time.perf_counter()
+            frames = []
+            if scans:
+                with ThreadPoolExecutor(max_workers=len(scans), thread_name_prefix="federated-fetch") as pool:
+                    frames = list(pool.map(lambda scan: self._fetch(scan, token), scans))
+            fetch_seconds = time.perf_counter() - fetch_start
+
+            local_start = time.perf_counter()
+            connection = self._connection(dataframe)
+            try:
+                for scan, frame in zip(scans, frames):
+                    self._create_table(connection, scan.table, frame)
+                with token.on_cancel(connection.interrupt, timeout=duckdb_config.query_timeout):
+                    result = connection.execute(sql).fetchdf()
+            except duckdb.InterruptException as e:
+                raise token.error("duckdb") from e
+            finally:
+                connection.close()
+            local_seconds = time.perf_counter() - local_start
+        except QueryCancelled:
+            raise
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+
+        result.attrs["federated"] = {
+            "tables": [asdict(scan) for scan in scans],
+            "fetch_seconds": fetch_seconds,
+            "local_seconds": local_seconds,
+        }
+        with self._lock:
+            self.queries += 1
+            self.remote_rows += sum(scan.rows for scan in scans)
+            self.pushed_filters += sum(len(scan.filters) for scan in scans)
+            self.join_filters += sum(len(scan.join_filters) for scan in scans)
+            self.unpushed_filters += sum(scan.unpushed for scan in scans)
+            self._fetch_seconds += fetch_seconds
+            self._local_seconds += local_seconds
+        logger.info(f"Federated query: {len(scans)} Oracle tables, {sum(scan.rows for scan in scans)} rows fetched "
+                    f"in {fetch_seconds:.3f}s, {len(result)} rows joined locally in {local_seconds:.3f}s")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "failures": self.failures,
+                "remote_rows": self.remote_rows,
+                "pushed_filters": self.pushed_filters,
+                "join_filters": self.join_filters,
+                "unpushed_filters": self.unpushed_filters,
+                "avg_fetch_ms": self._fetch_seconds / self.queries * 1000 if self.queries else 0.0,
+                "avg_local_ms": self._local_seconds / self.queries * 1000 if self.queries else 0.0,
+            }
+
+
+_engine: Optional[FederatedEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_federated_engine() -> FederatedEngine:
+    """Process-wide federated query engine, created on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = FederatedEngine()
+    return _engine
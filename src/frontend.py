@@ -4,8 +4,15 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import numpy as np
-from .data_loader import load_data
-from .ai_service import USE_OPENAI, enhanced_query_handler
+from .data_loader import load_data, load_rates_table
+from .llm_providers import get_llm_provider, llm_metrics
+from .duckdb_engine import current_session_id, get_duckdb_engine
+from .job_queue import get_job_queue
+from .oracle_replica import get_oracle_replica
+from .result_cache import get_result_cache
+from .response_cache import get_response_cache
+from .example_store import get_example_store
+from config.config import job_queue_config
 from .database_tools import (
     get_db_manager,
     get_db_status,
@@ -20,15 +27,16 @@ def enhance_data_processing(df):
         return df
     
     # Convert date columns to datetime if they exist
+    # (columns already typed by the loader's declared schema are left untouched)
     date_columns = ['Next Valid From', 'Next Valid Until']
     for col in date_columns:
-        if col in df.columns:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
             df[col] = pd.to_datetime(df[col], errors='coerce')
     
     # Ensure numeric columns are properly formatted
     numeric_columns = ['Rate', 'Next Rate', 'Next Rate Diff', 'FP Diff', 'Proportion', 'Floor Price']
     for col in numeric_columns:
-        if col in df.columns:
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
             df[col] = pd.to_numeric(df[col], errors='coerce')
     
     return df
@@ -205,6 +213,207 @@ def create_visualizations(data):
         else:
             st.info("Floor Price or Destination column not available for comparison")
 
+def render_performance_metrics():
+    """Show cache and engine counters in a collapsed sidebar section"""
+    with st.expander("⚙️ Performance", expanded=False):
+        cache_stats = get_result_cache().stats()
+        st.caption(
+            f"**Result cache:** {cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+            f"{cache_stats['evictions']} evictions · {cache_stats['entries']} entries "
+            f"({cache_stats['bytes'] / (1024 * 1024):.1f} MB)"
+        )
+        llm_stats = llm_metrics.summary()
+        if llm_stats["calls"]:
+            ttft = llm_stats["avg_ttft_seconds"]
+            st.caption(
+                f"**LLM:** {llm_stats['calls']} streamed calls · avg first token "
+                f"{'n/a' if ttft is None else f'{ttft:.2f}s'} · avg total {llm_stats['avg_total_seconds']:.2f}s"
+            )
+        from .rate_limiter import rate_limit_stats
+        for name, limit_stats in rate_limit_stats().items():
+            rpm_limit = limit_stats["rpm_limit"]
+            st.caption(
+                f"**Rate limit {name}:** {limit_stats['requests']} requests · {limit_stats['throttles']} throttled · "
+                f"{limit_stats['retries']} retried · {limit_stats['deadline_failures']} timed out in queue · "
+                f"limit {'none' if rpm_limit is None else f'{rpm_limit:.0f} rpm'} · "
+                f"avg queue wait {limit_stats['avg_wait_seconds']:.2f}s"
+            )
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            response_stats = response_cache.stats()
+            st.caption(
+                f"**Answer cache:** {response_stats['hits']} hits · {response_stats['misses']} misses "
+                f"({response_stats['hit_rate']:.0%}) · {response_stats['entries']} answers stored"
+            )
+        from .cancellation import interruption_stats
+        interruptions = interruption_stats.summary()
+        if interruptions:
+            st.caption("**Interrupted:** " + " · ".join(
+                f"{engine} {counts['cancelled']} cancelled, {counts['timeout']} timed out"
+                for engine, counts in interruptions.items()
+            ))
+        job_stats = get_job_queue().stats()
+        if job_stats["submitted"]:
+            st.caption(
+                f"**Jobs:** {job_stats['running']} running · {job_stats['queued']} queued · "
+                f"{job_stats['completed']} done · {job_stats['failed']} failed · {job_stats['cancelled']} cancelled · "
+                f"avg wait {job_stats['avg_queue_seconds']:.1f}s, run {job_stats['avg_run_seconds']:.1f}s"
+            )
+        from .sql_guard import get_sql_guard
+        sql_guard = get_sql_guard()
+        if sql_guard is not None:
+            guard_stats = sql_guard.stats()
+            st.caption(
+                f"**SQL guard:** {guard_stats['checked']} checked · {guard_stats['limited']} limited · "
+                f"{guard_stats['rejected']} refused · {guard_stats['explain_failures']} plans unavailable · "
+                f"explain avg {guard_stats['avg_explain_ms']:.1f} ms"
+            )
+        replica = get_oracle_replica()
+        if replica is not None:
+            replica_stats = replica.stats()
+            oldest = replica_stats["oldest_age_seconds"]
+            st.caption(
+                f"**Replica:** {replica_stats['synced']}/{replica_stats['tables']} tables · "
+                f"{replica_stats['rows']:,} rows · oldest sync "
+                f"{'never' if oldest is None else f'{oldest / 60:.0f} min ago'} · "
+                f"{replica_stats['served']} queries served · {replica_stats['fallbacks']} sent to Oracle · "
+                f"{replica_stats['sync_errors']} sync errors"
+            )
+        from .federation import get_federated_engine
+        federation_stats = get_federated_engine().stats()
+        if federation_stats["queries"] or federation_stats["failures"]:
+            st.caption(
+                f"**Federated:** {federation_stats['queries']} queries · {federation_stats['failures']} failed · "
+                f"{federation_stats['remote_rows']:,} Oracle rows fetched · "
+                f"{federation_stats['pushed_filters'] + federation_stats['join_filters']} filters pushed down "
+                f"({federation_stats['join_filters']} from deck joins), {federation_stats['unpushed_filters']} "
+                f"applied locally · fetch avg {federation_stats['avg_fetch_ms']:.0f} ms, "
+                f"join avg {federation_stats['avg_local_ms']:.0f} ms"
+            )
+        from .query_templates import get_template_engine
+        template_engine = get_template_engine()
+        if template_engine is not None:
+            template_stats = template_engine.stats.summary()
+            st.caption(
+                f"**Templates:** {template_stats['hits']} of {template_stats['questions']} questions "
+                f"({template_stats['hit_rate']:.0%}) · {template_stats['low_confidence']} sent to the LLM "
+                f"on low confidence · match avg {template_stats['avg_match_ms']:.1f} ms · "
+                f"~{template_stats['saved_seconds']:.0f}s of LLM time saved"
+            )
+        example_store = get_example_store()
+        if example_store is not None:
+            example_stats = example_store.stats()
+            success_with = example_stats["success_rate_with_examples"]
+            success_without = example_stats["success_rate_without_examples"]
+            st.caption(
+                f"**Few-shot examples:** {example_stats['examples']} stored ({example_stats['index']}) · "
+                f"search avg {example_stats['avg_search_ms']:.1f} ms, p95 {example_stats['p95_search_ms']:.1f} ms · "
+                f"first-attempt SQL success {'n/a' if success_with is None else f'{success_with:.0%}'} with examples, "
+                f"{'n/a' if success_without is None else f'{success_without:.0%}'} without"
+            )
+        from .single_flight import coalescing_stats
+        flight_stats = coalescing_stats()
+        if flight_stats:
+            st.caption("**Coalesced requests:** " + " · ".join(
+                f"{name} {group['coalesced']} of {group['executed'] + group['coalesced']} "
+                f"({group['coalesced_rate']:.0%})"
+                for name, group in flight_stats.items()
+            ))
+        from .async_pipeline import pipeline_stats
+        for name, limiter_stats in pipeline_stats().items():
+            st.caption(
+                f"**Pipeline {name}:** {limiter_stats['active']}/{limiter_stats['limit']} in flight · "
+                f"{limiter_stats['waiting']} queued · peak {limiter_stats['peak_active']} · "
+                f"{limiter_stats['completed']} done · avg queue wait {limiter_stats['avg_wait_ms']:.1f} ms"
+            )
+        db_manager = get_db_manager()
+        if db_manager.connected:
+            pool_stats = db_manager.pool_metrics()
+            st.caption(
+                f"**Oracle pool:** {pool_stats.get('busy', 0)}/{pool_stats.get('max', 0)} busy "
+                f"({pool_stats.get('utilization', 0.0):.0%}) · {pool_stats.get('opened', 0)} open · "
+                f"avg wait {pool_stats['avg_wait_ms']:.1f} ms · max wait {pool_stats['max_wait_ms']:.1f} ms · "
+                f"{pool_stats['dropped_connections']} dropped"
+            )
+
+def apply_job_result(job):
+    """Fold a finished chat job into the chat history and the data view"""
+    if job.status == "cancelled":
+        st.session_state.messages.append({"role": "assistant", "content": "⏹ Cancelled."})
+        return
+    if job.status == "failed":
+        st.session_state.messages.append({"role": "assistant", "content": f"Error processing your request: {job.error}"})
+        return
+    ai_response, sql_query, query_result, data_source = job.result
+
+    # Keep the SQL guard's limits and refusals in the chat history
+    guard = job.guard
+    if guard is not None and guard.action != "allow":
+        ai_response = f"{ai_response}\n\n🛡️ SQL guard: {guard.summary()}"
+
+    # Failed, cancelled and timed-out queries come back as text
+    if sql_query and isinstance(query_result, str) and not (guard and guard.action == "reject"):
+        ai_response = f"{ai_response}\n\n⚠️ {query_result}"
+
+    # If a SQL query produced results, apply them to the data view
+    if sql_query and query_result is not None and not isinstance(query_result, str):
+        st.session_state.current_df = query_result
+        source_label = {"local": "Local", "federated": "Federated"}.get(data_source, "Oracle")
+        ai_response = (f"{ai_response}\n\n✅ {source_label} query executed! "
+                       f"Updated table with {len(query_result)} rows.")
+        replica = query_result.attrs.get("replica")
+        if replica:
+            ai_response = (f"{ai_response}\n\n📦 Served from the local replica of "
+                           f"{', '.join(replica['tables'])} (synced {replica['age_seconds'] / 60:.0f} min ago, "
+                           f"{replica['synced_at']}).")
+        federated = query_result.attrs.get("federated")
+        if federated:
+            fetched = ", ".join(
+                f"{table['table']} ({table['rows']:,} rows, "
+                f"{len(table['filters']) + len(table['join_filters'])} filters pushed"
+                f"{', replica' if table['source'] == 'replica' else ''})"
+                for table in federated["tables"]
+            )
+            ai_response = (f"{ai_response}\n\n🔗 Joined the rate deck with {fetched or 'no Oracle tables'}: "
+                           f"fetched in {federated['fetch_seconds']:.1f}s, joined locally in "
+                           f"{federated['local_seconds']:.1f}s.")
+            capped = [table["table"] for table in federated["tables"] if table["truncated"]]
+            if capped:
+                ai_response = (f"{ai_response}\n\n⚠️ {', '.join(capped)} hit the per-table row cap: the join may be "
+                               "missing rows. Filter those tables further in the question.")
+        if query_result.attrs.get("truncated"):
+            ai_response = (f"{ai_response}\n\n⚠️ Result truncated to the first {len(query_result):,} rows "
+                           "(row/size cap). Refine the question to narrow it down.")
+
+    st.session_state.messages.append({"role": "assistant", "content": ai_response})
+
+@st.fragment(run_every=job_queue_config.poll_seconds)
+def render_chat_jobs():
+    """Poll this session's background chat jobs: partial answers, status and cancel buttons"""
+    queue = get_job_queue()
+    finished = False
+    for job_id in list(st.session_state.pending_jobs):
+        job = queue.get(job_id)
+        if job is None:
+            # Expired before this session came back for it
+            st.session_state.pending_jobs.remove(job_id)
+            continue
+        if job.finished:
+            apply_job_result(job)
+            queue.forget(job_id)
+            st.session_state.pending_jobs.remove(job_id)
+            finished = True
+            continue
+        with st.chat_message("assistant"):
+            st.markdown(job.partial_text or "…")
+            timings = job.timings()
+            status = {"queued": "Queued", "streaming": "Answering", "querying": "Running query"}.get(job.status, job.status)
+            st.caption(f"⏳ {status} · {timings['total']:.1f}s — _{job.question}_")
+            st.button("⏹ Cancel", key=f"cancel_{job_id}", on_click=queue.cancel, args=(job_id,))
+    if finished:
+        # Redraw the whole page: chat history, visualizations and the data table
+        st.rerun(scope="app")
+
 def ensure_oracle_connection():
     """Automatically connect to Oracle if not already connected"""
     if not get_db_status():
@@ -212,6 +421,8 @@ def ensure_oracle_connection():
             if init_database_connection():
                 set_db_status(True)
                 st.success("✅ Connected to Oracle database")
+                # Start syncing the local replica of the dictionary-mapped tables (if enabled)
+                get_oracle_replica()
                 return True
         except Exception as e:
             st.error(f"❌ Failed to connect to Oracle: {str(e)}")
@@ -238,6 +449,8 @@ def run_app():
     if df is not None:
         # Enhance data processing
         df = enhance_data_processing(df)
+        # Expose the mapped deck table in the shared DuckDB engine (no-op once registered)
+        get_duckdb_engine().register_base_frame(df, table=load_rates_table()[0])
         # Initialize session state for current dataframe
         if 'current_df' not in st.session_state:
             st.session_state.current_df = df
@@ -286,6 +499,10 @@ def run_app():
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
+    # Ids of this session's chat jobs still in flight; they survive reruns
+    if "pending_jobs" not in st.session_state:
+        st.session_state.pending_jobs = []
+
     # Sidebar - Chat Interface (Hideable)
     with st.sidebar:
         # Add logo if it exists
@@ -297,13 +514,16 @@ def run_app():
         st.subheader("💬 CSG Digital Wholesale Data Chat")
         
         # Show current LLM provider
-        provider_name = "🤖 OpenAI GPT-4" if USE_OPENAI else "🧠 AWS Bedrock Claude 3.5 Sonnet"
-        st.info(f"**LLM Provider:** {provider_name}")
+        st.info(f"**LLM Provider:** {get_llm_provider().display_name}")
         
         st.write("Ask questions about your wholesale data - trends, comparisons, and insights!")
         
         # Clear chat button at top
         if st.button("🗑️ Clear Chat", use_container_width=True):
+            for job_id in st.session_state.pending_jobs:
+                get_job_queue().cancel(job_id)
+                get_job_queue().forget(job_id)
+            st.session_state.pending_jobs = []
             st.session_state.messages = []
             st.rerun()
 
@@ -323,43 +543,26 @@ def run_app():
             # Add user message to chat history
             st.session_state.messages.append({"role": "user", "content": prompt})
             
-            # Show user message in sidebar
+            # Queue the question; the jobs fragment below streams its answer in the background
             with chat_container:
-                # Show user message
                 with st.chat_message("user"):
                     st.markdown(prompt)
+                try:
+                    # Ensure Oracle connection is available for database queries
+                    ensure_oracle_connection()
+                    job_id = get_job_queue().submit(prompt, st.session_state.current_df, current_session_id())
+                    st.session_state.pending_jobs.append(job_id)
+                except Exception as e:
+                    error_msg = f"Error processing your request: {str(e)}"
+                    st.error(error_msg)
+                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
 
-                # Generate assistant response using enhanced handler (routes local vs Oracle)
-                with st.chat_message("assistant"):
-                    try:
-                        # Ensure Oracle connection is available for database queries
-                        ensure_oracle_connection()
-
-                        # Use enhanced query handler (intelligent routing behind the scenes)
-                        ai_response, sql_query, query_result, data_source = enhanced_query_handler(
-                            prompt, st.session_state.current_df
-                        )
-
-                        # Display AI response
-                        st.markdown(ai_response)
-
-                        # If a SQL query produced results, show and apply them
-                        if sql_query and query_result is not None and not isinstance(query_result, str):
-                            st.code(sql_query, language="sql")
-                            st.session_state.current_df = query_result
-                            if data_source == "local":
-                                st.success(f"✅ Local query executed! Updated table with {len(query_result)} rows.")
-                            else:
-                                st.success(f"✅ Oracle query executed! Updated table with {len(query_result)} rows.")
-                            st.rerun()
-
-                        # Persist assistant message
-                        st.session_state.messages.append({"role": "assistant", "content": ai_response})
+        # Answers still in flight, polled so several questions can run at once
+        if st.session_state.pending_jobs:
+            with chat_container:
+                render_chat_jobs()
 
-                    except Exception as e:
-                        error_msg = f"Error processing your request: {str(e)}"
-                        st.error(error_msg)
-                        st.session_state.messages.append({"role": "assistant", "content": error_msg})
+        render_performance_metrics()
 
     # Main content area - Visualizations and Data Display
     st.subheader("📊 Interactive Visualizations")
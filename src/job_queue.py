@@ -0,0 +1,356 @@
+"""
+Background job queue for chat questions.
+
+Submitting a question returns a job id at once; a process-wide pool of worker
+threads answers it through the async pipeline while the page stays
+responsive. Each Job keeps its status, the answer text streamed so far, the
+SQL, the final result and timings, so the UI can poll jobs from a fragment,
+pick them up again after a rerun and show several in-flight questions at
+once. With JOB_PROCESS_WORKERS > 0, DuckDB queries over the rate deck run in
+worker processes that load the deck from the columnar cache, keeping
+CPU-heavy scans off the server process's GIL; a cancelled or timed-out query
+is interrupted inside its worker so it does not keep holding a process.
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from config.config import duckdb_config, job_queue_config, JobQueueConfig
+from .cancellation import CancelToken
+
+logger = logging.getLogger(__name__)
+
+QUEUED, STREAMING, QUERYING, DONE, FAILED, CANCELLED = (
+    "queued", "streaming", "querying", "done", "failed", "cancelled"
+)
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Recently cancelled worker-process task ids, shared with the workers as a ring buffer
+_CANCELLED_SLOTS = 64
+
+
+@dataclass
+class Job:
+    """One submitted question: status, partial answer, result and timings."""
+    id: str
+    session_id: str
+    question: str
+    dataframe: Any = field(default=None, repr=False)
+    status: str = QUEUED
+    partial_text: str = ""
+    sql_query: Optional[str] = None
+    result: Optional[tuple] = field(default=None, repr=False)
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    first_delta_at: Optional[float] = None
+    query_started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_requested: bool = False
+    guard: Any = None
+    answer: Any = field(default=None, repr=False)
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        """Seconds spent queued, to the first streamed text, streaming and in total (so far)."""
+        now = self.finished_at or time.time()
+
+        def span(start, end):
+            return None if start is None or end is None else end - start
+
+        return {
+            "queued": span(self.submitted_at, self.started_at or now),
+            "first_text": span(self.started_at, self.first_delta_at),
+            "query": span(self.query_started_at, now) if self.query_started_at else None,
+            "total": span(self.submitted_at, now),
+        }
+
+
+class JobQueue:
+    """Process-wide worker pool for chat jobs, keyed by job id and session."""
+
+    def __init__(self, config: JobQueueConfig = job_queue_config):
+        self.config = config
+        self._executor = ThreadPoolExecutor(max_workers=max(config.workers, 1), thread_name_prefix="chat-job")
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._cancelled_tasks = None
+        self._cancel_slot = 0
+        self._task_ids = 0
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self._queue_total = 0.0
+        self._run_total = 0.0
+
+    def submit(self, question: str, dataframe, session_id: str) -> str:
+        """Queue a question and return its job id."""
+        self._expire()
+        with self._lock:
+            active = [job for job in self._jobs.values() if job.session_id == session_id and not job.finished]
+            if len(active) >= self.config.max_jobs_per_session:
+                raise RuntimeError(f"Too many questions in flight ({len(active)}); wait for one to finish")
+            job = Job(uuid.uuid4().hex[:12], session_id, question, dataframe)
+            self._jobs[job.id] = job
+            self.submitted += 1
+        job.future = self._executor.submit(self._run, job)
+        logger.info(f"Queued chat job {job.id} for session {session_id}")
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def session_jobs(self, session_id: str) -> List[Job]:
+        """The session's jobs in submission order."""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.session_id == session_id]
+        return sorted(jobs, key=lambda job: job.submitted_at)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it had already finished."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_requested = True
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED)
+            return True
+        answer = job.answer
+        if answer is not None:
+            answer.cancel()
+        return True
+
+    def forget(self, job_id: str) -> None:
+        """Drop a finished job once the UI has consumed its result."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.finished:
+                del self._jobs[job_id]
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.config.retention_seconds
+        with self._lock:
+            for job_id in [job.id for job in self._jobs.values() if job.finished and job.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        job.error = error
+        job.finished_at = time.time()
+        job.status = status
+        job.dataframe = None
+        job.answer = None
+        with self._lock:
+            if status == DONE:
+                self.completed += 1
+            elif status == FAILED:
+                self.failed += 1
+            else:
+                self.cancelled += 1
+            if job.started_at is not None:
+                self._queue_total += job.started_at - job.submitted_at
+                self._run_total += job.finished_at - job.started_at
+
+    def _run(self, job: Job) -> None:
+        from .ai_service import PreparedQuestion, prepare_question
+        from .async_pipeline import SyncAnswer
+        job.started_at = time.time()
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+            return
+        try:
+            try:
+                question = prepare_question(job.question, job.dataframe, job.session_id)
+            except Exception as e:
+                question = PreparedQuestion(job.question, "local", reply=f"Error getting AI response: {str(e)}")
+            answer = job.answer = SyncAnswer(question)
+            if job.cancel_requested:
+                answer.cancel()
+            job.status = STREAMING
+            for delta in answer:
+                if job.first_delta_at is None:
+                    job.first_delta_at = time.time()
+                job.partial_text += delta
+                if answer.query_started and job.query_started_at is None:
+                    job.query_started_at = time.time()
+                    job.sql_query = answer.sql_query
+                    job.status = QUERYING
+            if answer.query_started and job.query_started_at is None:
+                job.query_started_at = time.time()
+                job.status = QUERYING
+            job.result = answer.result()
+            job.sql_query = job.result[1]
+            job.guard = answer.guard
+            self._finish(job, CANCELLED if job.cancel_requested else DONE)
+        except Exception as e:
+            logger.error(f"Chat job {job.id} failed: {e}")
+            self._finish(job, FAILED, error=str(e))
+
+    def run_in_process(self, fn, *args, cancel_token: Optional[CancelToken] = None,
+                       timeout: Optional[float] = None, engine: str = "duckdb") -> Any:
+        """Run fn(*args) in a worker process (requires JOB_PROCESS_WORKERS > 0) and wait for it.
+
+        On cancel or timeout the caller stops waiting (QueryCancelled /
+        QueryTimeout) and the worker interrupts what fn registered with
+        interrupt_on_cancel, freeing the process; the late result is dropped.
+        """
+        with self._lock:
+            if self._processes is None:
+                # spawn: forking a process that runs DuckDB and threads is not safe
+                context = multiprocessing.get_context("spawn")
+                self._cancelled_tasks = context.Array("q", _CANCELLED_SLOTS)
+                self._processes = ProcessPoolExecutor(max_workers=self.config.process_workers, mp_context=context,
+                                                      initializer=_init_worker, initargs=(self._cancelled_tasks,))
+            processes = self._processes
+            self._task_ids += 1
+            task_id = self._task_ids
+        token = cancel_token or CancelToken()
+        future = processes.submit(_run_task, task_id, fn, *args)
+
+        def cancel():
+            if not future.cancel():
+                self._cancel_task(task_id)
+
+        with token.on_cancel(cancel, timeout=timeout):
+            while True:
+                try:
+                    return future.result(timeout=0.1)
+                except FutureTimeoutError:
+                    if token.cancelled:
+                        raise token.error(engine)
+                except CancelledError:
+                    raise token.error(engine)
+
+    def _cancel_task(self, task_id: int) -> None:
+        with self._cancelled_tasks.get_lock():
+            self._cancelled_tasks[self._cancel_slot] = task_id
+            self._cancel_slot = (self._cancel_slot + 1) % _CANCELLED_SLOTS
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.config.process_workers > 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            finished = self.completed + self.failed + self.cancelled
+            return {
+                "submitted": self.submitted,
+                "queued": sum(job.status == QUEUED for job in jobs),
+                "running": sum(job.status in (STREAMING, QUERYING) for job in jobs),
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "workers": self.config.workers,
+                "process_workers": self.config.process_workers,
+                "avg_queue_seconds": self._queue_total / finished if finished else 0.0,
+                "avg_run_seconds": self._run_total / finished if finished else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue, created on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+
+# Worker process state: the deck and a DuckDB connection with it registered, per data version
+_process_deck: Dict[str, Any] = {}
+# Worker process state: the running task and how to interrupt it
+_worker_task: Dict[str, Any] = {}
+_worker_task_lock = threading.Lock()
+
+
+def _init_worker(cancelled_tasks) -> None:
+    threading.Thread(target=_watch_cancellations, args=(cancelled_tasks,), daemon=True,
+                     name="cancel-watcher").start()
+
+
+def _watch_cancellations(cancelled_tasks) -> None:
+    """Interrupt the running task once its id shows up among the cancelled ones."""
+    while True:
+        time.sleep(0.05)
+        with _worker_task_lock:
+            task_id, interrupt = _worker_task.get("id"), _worker_task.get("interrupt")
+            if interrupt is None or task_id not in cancelled_tasks[:]:
+                continue
+            _worker_task["interrupt"] = None
+        interrupt()
+
+
+def _run_task(task_id: int, fn, *args):
+    with _worker_task_lock:
+        _worker_task.update(id=task_id, interrupt=None)
+    try:
+        return fn(*args)
+    finally:
+        with _worker_task_lock:
+            _worker_task.clear()
+
+
+@contextmanager
+def interrupt_on_cancel(interrupt: Callable[[], None]):
+    """In a worker task: call interrupt if the task is cancelled or times out while inside the block."""
+    with _worker_task_lock:
+        _worker_task["interrupt"] = interrupt
+    try:
+        yield
+    finally:
+        with _worker_task_lock:
+            _worker_task["interrupt"] = None
+
+
+def run_deck_query(sql: str, data_version: str) -> pd.DataFrame:
+    """Run a query over the rate deck inside a worker process.
+
+    The deck is loaded once per process from the columnar cache and must
+    match data_version (ValueError otherwise, so the caller can run the query
+    in-process instead).
+    """
+    import duckdb
+    from .columnar_cache import ColumnarCache, fingerprint_version
+    from .data_loader import RATES_CACHE_DIR, RATES_CSV_FILE, RATES_SCHEMA_ID, read_rates_csv
+    from .duckdb_engine import SESSION_VIEW
+
+    if _process_deck.get("version") != data_version:
+        if not RATES_CACHE_DIR:
+            raise ValueError("worker processes need the columnar cache (RATES_CACHE_DIR)")
+        table, fingerprint, _ = ColumnarCache(RATES_CACHE_DIR).load(RATES_CSV_FILE, read_rates_csv, RATES_SCHEMA_ID)
+        if fingerprint is None or fingerprint_version(fingerprint) != data_version:
+            raise ValueError("the deck changed since the query was submitted")
+        connection = duckdb.connect(database=":memory:", config=duckdb_config.connect_config())
+        connection.register(SESSION_VIEW, table)
+        _process_deck.clear()
+        _process_deck.update(version=data_version, connection=connection)
+    connection = _process_deck["connection"]
+    with interrupt_on_cancel(connection.interrupt):
+        return connection.execute(sql).fetchdf()
@@ -0,0 +1,552 @@
+"""
+LLM provider registry.
+
+Each provider turns chat messages into text, either streamed as deltas or as
+one completion. Network clients are created lazily on first use and then
+shared by every call and session, with connection pools sized by LLMConfig so
+keep-alive connections are reused instead of re-negotiated per question. Every
+call goes through the provider/model's adaptive rate limiter and is retried
+with backoff when the provider throttles it before any text has streamed. The
+active provider is chosen with the LLM_PROVIDER environment variable.
+"""
+
+import asyncio
+import email.utils
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+import httpx
+
+from config.config import llm_config, LLMConfig
+from .rate_limiter import get_rate_limiter, RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, str]]
+
+
+class LLMCallMetrics:
+    """Rolling time-to-first-token and total latency of recent LLM calls."""
+
+    def __init__(self, window: int = 200):
+        self._calls = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, ttft: Optional[float], total: float, chunks: int) -> None:
+        with self._lock:
+            self._calls.append((provider, ttft, total, chunks))
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self._calls)
+        if not calls:
+            return {"calls": 0}
+        ttfts = [c[1] for c in calls if c[1] is not None]
+        return {
+            "calls": len(calls),
+            "avg_ttft_seconds": sum(ttfts) / len(ttfts) if ttfts else None,
+            "avg_total_seconds": sum(c[2] for c in calls) / len(calls),
+            "last_provider": calls[-1][0],
+        }
+
+
+llm_metrics = LLMCallMetrics()
+
+
+class _StreamTimer:
+    """Measures one streamed call: time to first token, total latency and chunk count."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.start_time = time.perf_counter()
+        self.ttft: Optional[float] = None
+        self.chunks = 0
+
+    def observe(self, delta: str) -> None:
+        if self.ttft is None and delta:
+            self.ttft = time.perf_counter() - self.start_time
+        self.chunks += 1
+
+    def finish(self) -> None:
+        total = time.perf_counter() - self.start_time
+        llm_metrics.record(self.provider, self.ttft, total, self.chunks)
+        ttft_text = f"{self.ttft:.2f}s" if self.ttft is not None else "n/a"
+        logger.info(f"{self.provider} response: first token {ttft_text}, total {total:.2f}s, {self.chunks} chunks")
+
+
+def timed_stream(deltas: Iterable[str], provider: str) -> Iterator[str]:
+    """Pass text deltas through, logging and recording TTFT and total latency of the call."""
+    timer = _StreamTimer(provider)
+    try:
+        for delta in deltas:
+            timer.observe(delta)
+            yield delta
+    finally:
+        timer.finish()
+
+
+async def atimed_stream(deltas: AsyncIterator[str], provider: str) -> AsyncIterator[str]:
+    """Async counterpart of timed_stream."""
+    timer = _StreamTimer(provider)
+    try:
+        async for delta in deltas:
+            timer.observe(delta)
+            yield delta
+    finally:
+        timer.finish()
+
+
+class _StreamFailure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_STREAM_DONE = object()
+
+
+def parse_retry_after(headers: Any) -> float:
+    """Seconds from retry-after-ms / retry-after (delta or HTTP date) headers; 0.0 if absent."""
+    if not headers:
+        return 0.0
+    headers = {str(k).lower(): v for k, v in dict(headers).items()}
+    try:
+        if headers.get("retry-after-ms"):
+            return max(float(headers["retry-after-ms"]) / 1000.0, 0.0)
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                when = email.utils.parsedate_to_datetime(value)
+                return max(when.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        pass
+    return 0.0
+
+
+class LLMProvider(ABC):
+    """A chat model behind a lazily created, reused client."""
+
+    name = "base"
+    display_name = "LLM"
+
+    def __init__(self, config: LLMConfig = llm_config):
+        self.config = config
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    @abstractmethod
+    def model_id(self) -> str:
+        """Model identifier (part of response cache keys)."""
+
+    @abstractmethod
+    def _create_client(self):
+        """Build the network client; called once."""
+
+    @abstractmethod
+    def _stream_deltas(self, messages: Messages) -> Iterator[str]:
+        """Yield response text deltas."""
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def throttle_retry_after(self, error: BaseException) -> Optional[float]:
+        """If error is a throttling response, the seconds the provider asked to wait (0.0 if unspecified); else None."""
+        return None
+
+    @property
+    def rate_limiter(self):
+        return get_rate_limiter(self.name, self.model_id)
+
+    def _retry_delay(self, error: BaseException, attempt: int, deadline: float, started: bool) -> Optional[float]:
+        """Backoff before retrying a failed call, or None if the error is not throttling.
+
+        Raises RateLimitExceeded when a throttled call cannot be retried: text
+        has already streamed, retries are used up or the deadline would pass.
+        """
+        retry_after = self.throttle_retry_after(error)
+        if retry_after is None:
+            return None
+        limiter = self.rate_limiter
+        limiter.on_throttle()
+        delay = limiter.backoff(attempt, retry_after)
+        if started or attempt >= limiter.config.max_retries or time.monotonic() + delay > deadline:
+            raise RateLimitExceeded(f"{self.name} is throttling requests: {error}", retry_after=delay) from error
+        limiter.on_retry()
+        logger.warning(f"{self.name}:{self.model_id} throttled (attempt {attempt + 1}); retrying in {delay:.1f}s")
+        return delay
+
+    def _limited_deltas(self, messages: Messages,
+                        source: Optional[Callable[[Messages], Iterator[str]]] = None) -> Iterator[str]:
+        """Deltas of source (default _stream_deltas) under the rate limiter, retrying throttled calls."""
+        source = source or self._stream_deltas
+        limiter = self.rate_limiter
+        prompt_tokens = limiter.estimate_tokens(messages)
+        estimated = prompt_tokens + limiter.config.expected_output_tokens
+        deadline = time.monotonic() + limiter.config.queue_deadline
+        attempt = 0
+        while True:
+            limiter.acquire(estimated, deadline)
+            produced = 0
+            try:
+                for delta in source(messages):
+                    produced += len(delta)
+                    yield delta
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline, produced > 0)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            limiter.on_success(estimated, prompt_tokens + produced / 4)
+            return
+
+    async def _alimited_deltas(self, messages: Messages) -> AsyncIterator[str]:
+        """Async _limited_deltas over _astream_deltas."""
+        limiter = self.rate_limiter
+        prompt_tokens = limiter.estimate_tokens(messages)
+        estimated = prompt_tokens + limiter.config.expected_output_tokens
+        deadline = time.monotonic() + limiter.config.queue_deadline
+        attempt = 0
+        while True:
+            await limiter.aacquire(estimated, deadline)
+            produced = 0
+            try:
+                async for delta in self._astream_deltas(messages):
+                    produced += len(delta)
+                    yield delta
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline, produced > 0)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            limiter.on_success(estimated, prompt_tokens + produced / 4)
+            return
+
+    def stream(self, messages: Messages) -> Iterator[str]:
+        """Stream the response as text deltas (rate limited; TTFT and latency are recorded)."""
+        return timed_stream(self._limited_deltas(messages), f"{self.name}:{self.model_id}")
+
+    def complete(self, messages: Messages) -> str:
+        """Return the complete response text."""
+        return "".join(self.stream(messages))
+
+    async def _astream_deltas(self, messages: Messages) -> AsyncIterator[str]:
+        """Async deltas; by default the blocking stream runs on a worker thread.
+
+        When this generator is closed (a cancelled answer) the worker stops
+        at the next delta and closes the blocking stream, ending the upstream call.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def post(item):
+            if stop.is_set():
+                return
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # the loop closed after the consumer went away
+
+        def pump():
+            deltas = self._stream_deltas(messages)
+            try:
+                for delta in deltas:
+                    if stop.is_set():
+                        break
+                    post(delta)
+            except BaseException as e:
+                post(_StreamFailure(e))
+            finally:
+                deltas.close()
+                post(_STREAM_DONE)
+
+        worker = loop.run_in_executor(None, pump)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, _StreamFailure):
+                    raise item.error
+                yield item
+            await worker
+        finally:
+            stop.set()
+
+    def astream(self, messages: Messages) -> AsyncIterator[str]:
+        """Async stream of text deltas (rate limited; TTFT and latency are recorded)."""
+        return atimed_stream(self._alimited_deltas(messages), f"{self.name}:{self.model_id}")
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions over a pooled keep-alive HTTP client."""
+
+    name = "openai"
+
+    def __init__(self, config: LLMConfig = llm_config):
+        super().__init__(config)
+        self._async_client = None
+
+    @property
+    def model_id(self) -> str:
+        return self.config.openai_model
+
+    @property
+    def display_name(self) -> str:
+        return f"🤖 OpenAI {self.model_id.upper()}"
+
+    def _http_options(self) -> Dict[str, Any]:
+        return {
+            "limits": httpx.Limits(
+                max_connections=self.config.http_max_connections,
+                max_keepalive_connections=self.config.http_max_keepalive,
+                keepalive_expiry=self.config.http_keepalive_expiry,
+            ),
+            "timeout": self.config.request_timeout,
+        }
+
+    def _create_client(self):
+        from os import getenv
+        import openai
+        http_client = openai.DefaultHttpxClient(**self._http_options())
+        # Throttling is retried by the rate limiter, which also adapts to it
+        return openai.OpenAI(api_key=getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+
+    @property
+    def async_client(self):
+        """AsyncOpenAI client; bound to the event loop it is first used on (the shared pipeline loop)."""
+        if self._async_client is None:
+            with self._client_lock:
+                if self._async_client is None:
+                    from os import getenv
+                    import openai
+                    http_client = openai.DefaultAsyncHttpxClient(**self._http_options())
+                    self._async_client = openai.AsyncOpenAI(api_key=getenv("OPENAI_API_KEY"),
+                                                            http_client=http_client, max_retries=0)
+        return self._async_client
+
+    async def _astream_deltas(self, messages: Messages) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(model=self.model_id, messages=messages, stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _stream_deltas(self, messages: Messages) -> Iterator[str]:
+        stream = self.client.chat.completions.create(model=self.model_id, messages=messages, stream=True)
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def throttle_retry_after(self, error: BaseException) -> Optional[float]:
+        import openai
+        if not isinstance(error, openai.RateLimitError) and getattr(error, "status_code", None) not in (429, 529):
+            return None
+        return parse_retry_after(getattr(getattr(error, "response", None), "headers", None))
+
+    def _complete_deltas(self, messages: Messages) -> Iterator[str]:
+        response = self.client.chat.completions.create(model=self.model_id, messages=messages, stream=False)
+        yield response.choices[0].message.content
+
+    def complete(self, messages: Messages) -> str:
+        start_time = time.perf_counter()
+        text = "".join(self._limited_deltas(messages, self._complete_deltas))
+        llm_metrics.record(f"{self.name}:{self.model_id}", None, time.perf_counter() - start_time, 1)
+        return text
+
+
+def bedrock_request_body(messages: Messages) -> Dict[str, Any]:
+    """Convert chat messages to the Claude-on-Bedrock request body."""
+    system_message = ""
+    conversation_messages = []
+    for msg in messages:
+        if msg["role"] == "system":
+            system_message = msg["content"]
+        else:
+            conversation_messages.append({"role": msg["role"], "content": msg["content"]})
+    return {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 4000,
+        "temperature": 0.1,  # Lower temperature for more consistent SQL generation
+        "top_p": 0.9,        # Focused responses
+        "system": system_message,
+        "messages": conversation_messages,
+    }
+
+
+_bedrock_client = None
+_bedrock_client_lock = threading.Lock()
+
+
+def get_bedrock_runtime_client(config: LLMConfig = llm_config):
+    """Process-wide bedrock-runtime client with a sized, keep-alive connection pool."""
+    global _bedrock_client
+    if _bedrock_client is None:
+        with _bedrock_client_lock:
+            if _bedrock_client is None:
+                from botocore.config import Config
+                from config.aws_config import aws_config
+                _bedrock_client = aws_config.get_session().client(
+                    'bedrock-runtime',
+                    config=Config(
+                        max_pool_connections=config.bedrock_max_pool_connections,
+                        tcp_keepalive=True,
+                        read_timeout=config.request_timeout,
+                        # Throttling is retried by the rate limiter, which also adapts to it
+                        retries={"total_max_attempts": 1, "mode": "standard"},
+                    ),
+                )
+    return _bedrock_client
+
+
+class BedrockProvider(LLMProvider):
+    """Claude on AWS Bedrock, streamed with invoke_model_with_response_stream."""
+
+    name = "bedrock"
+    THROTTLE_CODES = frozenset({
+        "ThrottlingException", "TooManyRequestsException",
+        "ServiceUnavailableException", "ModelNotReadyException",
+    })
+
+    def __init__(self, config: LLMConfig = llm_config, model_id: Optional[str] = None):
+        super().__init__(config)
+        self._model_id = model_id
+
+    @property
+    def model_id(self) -> str:
+        if self._model_id is None:
+            from config.aws_config import bedrock_config
+            self._model_id = bedrock_config.llm_model_id
+        return self._model_id
+
+    @property
+    def display_name(self) -> str:
+        return f"🧠 AWS Bedrock {self.model_id}"
+
+    def _create_client(self):
+        return get_bedrock_runtime_client(self.config)
+
+    def throttle_retry_after(self, error: BaseException) -> Optional[float]:
+        # botocore ClientError (including EventStreamError raised mid-stream)
+        response = getattr(error, "response", None)
+        if not isinstance(response, dict) or response.get("Error", {}).get("Code") not in self.THROTTLE_CODES:
+            return None
+        return parse_retry_after(response.get("ResponseMetadata", {}).get("HTTPHeaders"))
+
+    def _stream_deltas(self, messages: Messages) -> Iterator[str]:
+        response = self.client.invoke_model_with_response_stream(
+            modelId=self.model_id,
+            contentType='application/json',
+            accept='application/json',
+            body=json.dumps(bedrock_request_body(messages))
+        )
+        body = response['body']
+        try:
+            for event in body:
+                chunk = event.get('chunk')
+                if chunk is None:
+                    continue
+                payload = json.loads(chunk['bytes'])
+                if payload.get('type') == 'content_block_delta':
+                    text = payload.get('delta', {}).get('text')
+                    if text:
+                        yield text
+        finally:
+            # Drops the HTTP stream when the consumer stops early (cancelled answers)
+            body.close()
+
+
+class FakeProvider(LLMProvider):
+    """Offline provider returning canned responses, for tests and local development."""
+
+    name = "fake"
+    display_name = "🧪 Fake LLM (offline)"
+    DEFAULT_RESPONSE = (
+        "Here are the first rows of the data.\n\n"
+        "```sql\nSELECT * FROM df LIMIT 5\n```\n\n"
+        "This query returns a small sample of the dataset."
+    )
+
+    def __init__(self, config: LLMConfig = llm_config,
+                 responder: Optional[Callable[[Messages], str]] = None,
+                 chunk_size: int = 16, delay: float = 0.0):
+        super().__init__(config)
+        self.responder = responder or (lambda messages: self.DEFAULT_RESPONSE)
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.calls: List[Messages] = []
+
+    @property
+    def model_id(self) -> str:
+        return "fake"
+
+    def _create_client(self):
+        return None
+
+    def _stream_deltas(self, messages: Messages) -> Iterator[str]:
+        self.calls.append(messages)
+        text = self.responder(messages)
+        for start in range(0, len(text), self.chunk_size):
+            if self.delay:
+                time.sleep(self.delay)
+            yield text[start:start + self.chunk_size]
+
+    async def _astream_deltas(self, messages: Messages) -> AsyncIterator[str]:
+        self.calls.append(messages)
+        text = self.responder(messages)
+        for start in range(0, len(text), self.chunk_size):
+            await asyncio.sleep(self.delay)
+            yield text[start:start + self.chunk_size]
+
+
+PROVIDERS: Dict[str, Callable[[], LLMProvider]] = {
+    "openai": OpenAIProvider,
+    "bedrock": BedrockProvider,
+    "fake": FakeProvider,
+}
+
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+
+def register_provider(name: str, factory: Callable[[], LLMProvider]) -> None:
+    """Make a provider selectable through LLM_PROVIDER."""
+    PROVIDERS[name] = factory
+
+
+def get_llm_provider() -> LLMProvider:
+    """Get the process-wide provider selected by LLM_PROVIDER."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                factory = PROVIDERS.get(llm_config.provider)
+                if factory is None:
+                    raise ValueError(
+                        f"Unknown LLM_PROVIDER '{llm_config.provider}' (choose from {', '.join(PROVIDERS)})"
+                    )
+                _provider = factory()
+                logger.info(f"Using LLM provider {_provider.name} ({_provider.model_id})")
+    return _provider
+
+
+def set_llm_provider(provider: Optional[LLMProvider]) -> None:
+    """Replace the process-wide provider (None re-reads LLM_PROVIDER on next use)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,424 @@
+"""
+Local Parquet replica of the Oracle tables mapped in the business dictionary.
+
+A background thread snapshots each mapped table (CARRIER, PPM_PRODUCT,
+AGREEMENT, ...) into one Parquet file under REPLICA_PATH. Tables with a
+change column (REPLICA_CHANGE_COLUMNS) are synced incrementally every
+REPLICA_REFRESH_SECONDS: rows changed since the stored watermark are merged
+in by key, and a full snapshot every REPLICA_SNAPSHOT_SECONDS drops deleted
+rows. Other tables are re-snapshotted on that schedule. A manifest next to
+the files records row counts, watermarks and sync times.
+
+Oracle queries that only read replicated tables synced within
+REPLICA_MAX_STALENESS_SECONDS run on a DuckDB connection over the Parquet
+files instead, with common Oracle functions (NVL, NVL2, TRUNC, SYSDATE,
+DUAL) mapped to DuckDB equivalents. Anything DuckDB cannot run falls back
+to Oracle. Results carry attrs["replica"] with the replica's freshness.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config.config import duckdb_config, oracle_config, replica_config, ReplicaConfig
+from .cancellation import CancelToken, QueryCancelled
+from .sql_utils import referenced_tables, replace_words, strip_literals
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][\w$#]*$")
+
+# Bare Oracle words rewritten before a query runs on the replica
+_ORACLE_WORDS = {
+    "SYSDATE": "localtimestamp",
+    "SYSTIMESTAMP": "current_timestamp",
+    "TRUNC": "ora_trunc",
+}
+
+# Oracle functions, objects and NULL ordering (NULLs sort high) set up on the replica connection
+_COMPATIBILITY_SQL = [
+    "SET default_null_order = 'nulls_last_on_asc_first_on_desc'",
+    "CREATE MACRO nvl(value, fallback) AS coalesce(value, fallback)",
+    "CREATE MACRO nvl2(value, if_set, if_null) AS CASE WHEN value IS NOT NULL THEN if_set ELSE if_null END",
+    "CREATE MACRO ora_trunc(value) AS date_trunc('day', value), (value, digits) AS trunc(value, digits)",
+    "CREATE TABLE dual AS SELECT 'X' AS dummy",
+]
+
+
+@dataclass
+class ReplicaTable:
+    """Sync state of one replicated table, as stored in the manifest."""
+    name: str
+    key_column: Optional[str] = None
+    change_column: Optional[str] = None
+    rows: int = 0
+    synced_at: Optional[float] = None
+    snapshot_at: Optional[float] = None
+    watermark: Optional[str] = None
+    error: Optional[str] = None
+    failed_at: Optional[float] = None
+
+    @property
+    def incremental(self) -> bool:
+        return bool(self.key_column and self.change_column)
+
+
+def to_duckdb_sql(sql: str) -> str:
+    """Rewrite the Oracle-only words the replica connection does not know."""
+    return replace_words(sql, _ORACLE_WORDS)
+
+
+def _quote_path(path: str) -> str:
+    return "'" + path.replace("'", "''") + "'"
+
+
+class OracleReplica:
+    """Parquet snapshots of dictionary-mapped Oracle tables and a DuckDB connection over them."""
+
+    def __init__(self, config: ReplicaConfig = replica_config, db_manager=None):
+        self.config = config
+        self._db_manager = db_manager
+        self.tables: Dict[str, ReplicaTable] = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.connection = duckdb.connect(database=":memory:", config=duckdb_config.connect_config(external_access=True))
+        for statement in _COMPATIBILITY_SQL:
+            self.connection.execute(statement)
+        # Queries may read the replica's own Parquet files and nothing else
+        self.connection.execute(f"SET allowed_directories = [{_quote_path(os.path.abspath(config.path))}]")
+        self.connection.execute("SET enable_external_access = false")
+        self.schema = oracle_config.user.upper() if _IDENTIFIER.match(oracle_config.user or "") else None
+        if self.schema:
+            self.connection.execute(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"')
+        self.served = 0
+        self.fallbacks = 0
+        self.syncs = 0
+        self.sync_errors = 0
+        os.makedirs(config.path, exist_ok=True)
+        stored = self._load_manifest()
+        keys = self._dictionary_keys()
+        for name in self._table_names(keys):
+            table = self.tables[name] = stored.get(name) or ReplicaTable(name)
+            table.change_column = config.change_columns.get(name)
+            table.key_column = config.key_columns.get(name) or keys.get(name)
+            if table.synced_at is not None and os.path.exists(self._file(name)):
+                self._publish(name)
+
+    @property
+    def db_manager(self):
+        if self._db_manager is None:
+            from .database_tools import get_db_manager
+            self._db_manager = get_db_manager()
+        return self._db_manager
+
+    @staticmethod
+    def _dictionary_keys() -> Dict[str, str]:
+        """Tables mapped in the business dictionary and their mapped (key) column."""
+        keys = {}
+        try:
+            from .schema_service import get_schema_service
+            for mapping in get_schema_service().load_business_dictionary().get("mappings", []):
+                name = (mapping.get("table_name") or "").upper()
+                if name and mapping.get("column_name"):
+                    keys.setdefault(name, mapping["column_name"].upper())
+        except Exception as e:
+            logger.error(f"Error reading the business dictionary for the replica: {e}")
+        return keys
+
+    def _table_names(self, keys: Dict[str, str]) -> List[str]:
+        """REPLICA_TABLES, or every table mapped in the business dictionary."""
+        names = self.config.tables or tuple(keys)
+        valid = [name for name in names if _IDENTIFIER.match(name)]
+        if len(valid) < len(names):
+            logger.warning(f"Skipping replica tables with unsupported names: {sorted(set(names) - set(valid))}")
+        return valid
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.config.path, f"{name}.parquet")
+
+    def _load_manifest(self) -> Dict[str, ReplicaTable]:
+        try:
+            with open(os.path.join(self.config.path, MANIFEST_FILE), encoding="utf-8") as f:
+                return {name: ReplicaTable(**state) for name, state in json.load(f).get("tables", {}).items()}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable replica manifest: {e}")
+            return {}
+
+    def _save_manifest(self) -> None:
+        path = os.path.join(self.config.path, MANIFEST_FILE)
+        with self._lock:
+            tables = {name: asdict(table) for name, table in self.tables.items()}
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"tables": tables}, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _publish(self, name: str) -> None:
+        """Point the table's views (unqualified and schema-qualified) at its Parquet file."""
+        source = f"SELECT * FROM read_parquet({_quote_path(self._file(name))})"
+        with self._lock:
+            self.connection.execute(f'CREATE OR REPLACE VIEW "{name}" AS {source}')
+            if self.schema:
+                self.connection.execute(f'CREATE OR REPLACE VIEW "{self.schema}"."{name}" AS {source}')
+
+    def _due(self, table: ReplicaTable, now: float) -> Optional[str]:
+        """'snapshot', 'incremental' or None when the table is up to date (failures wait for the next snapshot)."""
+        if table.failed_at is not None and now - table.failed_at < self.config.snapshot_seconds:
+            return None
+        if table.snapshot_at is None or not os.path.exists(self._file(table.name)):
+            return "snapshot"
+        if now - table.snapshot_at >= self.config.snapshot_seconds:
+            return "snapshot"
+        if table.incremental and table.synced_at is not None and now - table.synced_at >= self.config.refresh_seconds:
+            return "incremental"
+        return None
+
+    def sync(self, force: bool = False) -> Dict[str, str]:
+        """Sync every table that is due (all of them with force); returns what was done per table."""
+        done = {}
+        with self._sync_lock:
+            now = time.time()
+            for table in list(self.tables.values()):
+                mode = "snapshot" if force else self._due(table, now)
+                if mode is None:
+                    continue
+                try:
+                    if mode == "snapshot":
+                        self._snapshot(table)
+                    else:
+                        self._incremental(table)
+                    table.error = table.failed_at = None
+                    done[table.name] = mode
+                    self.syncs += 1
+                except Exception as e:
+                    logger.error(f"Replica {mode} of {table.name} failed: {e}")
+                    table.error = str(e)
+                    table.failed_at = time.time()
+                    done[table.name] = "failed"
+                    self.sync_errors += 1
+            if done:
+                self._save_manifest()
+        return done
+
+    def _fetch(self, sql: str, parameters: Optional[Dict[str, Any]], path: str) -> int:
+        """Stream a query into a Parquet file; returns its row count (ValueError over REPLICA_MAX_ROWS)."""
+        writer = None
+        rows = 0
+        try:
+            for chunk in self.db_manager.iter_query_chunks(sql, parameters, max_rows=self.config.max_rows,
+                                                           max_bytes=0, arrow=True):
+                if chunk.attrs.get("truncated"):
+                    raise ValueError(f"more than REPLICA_MAX_ROWS ({self.config.max_rows:,}) rows")
+                batch = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, batch.schema)
+                elif batch.schema != writer.schema:
+                    batch = batch.cast(writer.schema)
+                writer.write_table(batch)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    def _watermark(self, table: ReplicaTable, path: str) -> Optional[str]:
+        if not table.change_column:
+            return None
+        with duckdb.connect() as con:
+            value = con.execute(
+                f'SELECT max("{table.change_column}") FROM read_parquet({_quote_path(path)})').fetchone()[0]
+        return value.isoformat() if hasattr(value, "isoformat") else value
+
+    def _snapshot(self, table: ReplicaTable) -> None:
+        start_time = time.perf_counter()
+        path = self._file(table.name)
+        rows = self._fetch(f"SELECT * FROM {table.name}", None, path + ".tmp")
+        table.watermark = self._watermark(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        table.rows = rows
+        table.synced_at = table.snapshot_at = time.time()
+        self._publish(table.name)
+        logger.info(f"Replica snapshot of {table.name}: {rows} rows in {time.perf_counter() - start_time:.2f}s")
+
+    def _incremental(self, table: ReplicaTable) -> None:
+        """Merge rows changed since the watermark (>=, so rows sharing it are not missed) by key."""
+        start_time = time.perf_counter()
+        path = self._file(table.name)
+        since = table.watermark
+        if isinstance(since, str):
+            try:
+                since = datetime.fromisoformat(since)
+            except ValueError:
+                pass
+        changes = path + ".delta"
+        changed = self._fetch(f'SELECT * FROM {table.name} WHERE {table.change_column} >= :since',
+                              {"since": since}, changes)
+        if changed:
+            key = table.key_column
+            with duckdb.connect() as merge:
+                merge.execute(
+                    f"COPY (SELECT o.* FROM read_parquet({_quote_path(path)}) o "
+                    f"ANTI JOIN read_parquet({_quote_path(changes)}) d USING (\"{key}\") "
+                    f"UNION ALL BY NAME SELECT * FROM read_parquet({_quote_path(changes)})) "
+                    f"TO {_quote_path(path + '.tmp')} (FORMAT PARQUET)"
+                )
+                table.rows = merge.execute(
+                    f"SELECT count(*) FROM read_parquet({_quote_path(path + '.tmp')})").fetchone()[0]
+            table.watermark = self._watermark(table, path + ".tmp") or table.watermark
+            os.replace(path + ".tmp", path)
+            self._publish(table.name)
+        if os.path.exists(changes):
+            os.remove(changes)
+        table.synced_at = time.time()
+        logger.info(f"Replica sync of {table.name}: {changed} changed rows in {time.perf_counter() - start_time:.2f}s")
+
+    def start(self) -> None:
+        """Sync in a background thread while the Oracle pool is connected."""
+        if self._thread is not None:
+            return
+        interval = max(min(self.config.refresh_seconds, self.config.snapshot_seconds), 1)
+
+        def loop():
+            while not self._stop.is_set():
+                if getattr(self.db_manager, "connected", False):
+                    self.sync()
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="oracle-replica", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def covers(self, sql: str) -> Optional[List[str]]:
+        """Replicated tables the query reads when all of them are fresh enough, else None.
+
+        Oracle's || skips NULLs ('a' || NULL is 'a') while DuckDB's returns
+        NULL, so queries that concatenate with it always go to Oracle.
+        """
+        if "||" in strip_literals(sql):
+            return None
+        names = []
+        for name in referenced_tables(sql):
+            parts = name.split(".")
+            if len(parts) == 2 and parts[0] == self.schema:
+                name = parts[1]
+            table = self.tables.get(name)
+            if table is None or table.synced_at is None or self.age(table) > self.config.max_staleness_seconds:
+                return None
+            names.append(name)
+        return names or None
+
+    @staticmethod
+    def age(table: ReplicaTable) -> float:
+        return time.time() - table.synced_at
+
+    def freshness(self, names: List[str]) -> Dict[str, Any]:
+        """Sync times of the given tables; synced_at is the oldest of them."""
+        synced = {name: self.tables[name].synced_at for name in names}
+        oldest = min(synced.values())
+        return {
+            "tables": {name: datetime.fromtimestamp(at).isoformat(timespec="seconds") for name, at in synced.items()},
+            "synced_at": datetime.fromtimestamp(oldest).isoformat(timespec="seconds"),
+            "age_seconds": time.time() - oldest,
+        }
+
+    def query(self, sql: str, cancel_token: Optional[CancelToken] = None) -> pd.DataFrame:
+        """Run an Oracle query on the replica (DuckDB errors propagate; caps as ORACLE_FETCH_MAX_ROWS)."""
+        token = cancel_token or CancelToken()
+        token.raise_if_cancelled("duckdb")
+        with self._lock:
+            cursor = self.connection.cursor()
+        start_time = time.perf_counter()
+        try:
+            with token.on_cancel(cursor.interrupt, timeout=duckdb_config.query_timeout):
+                results = cursor.execute(to_duckdb_sql(sql))
+                # Newer DuckDB releases renamed fetch_record_batch() to to_arrow_reader()
+                reader = (getattr(results, "to_arrow_reader", None) or results.fetch_record_batch)()
+                batches, rows = [], 0
+                max_rows = oracle_config.fetch_max_rows
+                truncated = False
+                for batch in reader:
+                    if max_rows and rows + batch.num_rows > max_rows:
+                        batches.append(batch.slice(0, max_rows - rows))
+                        truncated = True
+                        break
+                    batches.append(batch)
+                    rows += batch.num_rows
+                result = pa.Table.from_batches(batches, schema=reader.schema).to_pandas(types_mapper=pd.ArrowDtype)
+        except duckdb.InterruptException as e:
+            raise token.error("duckdb") from e
+        finally:
+            cursor.close()
+        if truncated:
+            result.attrs["truncated"] = True
+        logger.info(f"Replica query returned {len(result)} rows in {time.perf_counter() - start_time:.3f}s")
+        return result
+
+    def try_query(self, sql: str, cancel_token: Optional[CancelToken] = None) -> Optional[pd.DataFrame]:
+        """Serve a query from the replica; None when it has to go to Oracle."""
+        names = self.covers(sql)
+        if names is None:
+            return None
+        try:
+            result = self.query(sql, cancel_token)
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            logger.info(f"Replica cannot run the query, using Oracle: {e}")
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        result.attrs["replica"] = self.freshness(names)
+        with self._lock:
+            self.served += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            synced = [table for table in self.tables.values() if table.synced_at is not None]
+            return {
+                "tables": len(self.tables),
+                "synced": len(synced),
+                "rows": sum(table.rows for table in synced),
+                "oldest_age_seconds": max((self.age(table) for table in synced), default=None),
+                "errors": [table.name for table in self.tables.values() if table.error],
+                "served": self.served,
+                "fallbacks": self.fallbacks,
+                "syncs": self.syncs,
+                "sync_errors": self.sync_errors,
+            }
+
+
+_replica: Optional[OracleReplica] = None
+_replica_lock = threading.Lock()
+
+
+def get_oracle_replica() -> Optional[OracleReplica]:
+    """Process-wide replica with its sync thread running, or None when REPLICA_ENABLED is off."""
+    global _replica
+    if not replica_config.enabled:
+        return None
+    if _replica is None:
+        with _replica_lock:
+            if _replica is None:
+                replica = OracleReplica()
+                replica.start()
+                _replica = replica
+    return _replica
@@ -0,0 +1,459 @@
+"""
+Deterministic fast path for common rate-analysis questions.
+
+A handful of question shapes make up much of the chat traffic: top-N
+suppliers by rate, average rate by destination, rows where a rate is above
+(or below) a threshold and rows priced below the floor price. TemplateEngine
+recognizes them with parameter slots (N, the ranked entity, the measure, the
+threshold and optional value filters such as a destination) resolved against
+the columns of the target, either the rate deck or a dictionary-mapped Oracle
+table, and the business dictionary's terms and synonyms. It then renders the
+DuckDB or Oracle SQL directly. A question is only answered this way when the
+template covers it completely; anything else (low confidence) goes to the LLM.
+"""
+
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from config.config import template_config, TemplateConfig
+from .term_matcher import TermMatcher, tokenize
+
+logger = logging.getLogger(__name__)
+
+MEASURE, ENTITY, VALUE = "MEASURE", "ENTITY", "VALUE"
+
+
+@dataclass(frozen=True)
+class Slot:
+    """What a phrase of the question refers to: a numeric column, a grouping column or a column value."""
+    kind: str
+    column: str
+    value: Optional[str] = None
+
+
+@dataclass
+class TemplateTarget:
+    """Where template SQL runs: the table, its dialect and the phrases naming its columns and values."""
+    table: str
+    dialect: str
+    phrases: Dict[str, List[Slot]]
+    base_filter: str = ""
+    label_columns: Tuple[str, ...] = ()
+    version: Optional[str] = None
+    _matcher: Optional[Tuple[TermMatcher, List[str]]] = field(default=None, repr=False)
+
+    @property
+    def grouped(self) -> bool:
+        """Deck rows repeat entities (aggregate per entity); mapped Oracle tables hold one row per entity."""
+        return self.dialect == "duckdb"
+
+    def matcher(self) -> Tuple[TermMatcher, List[str]]:
+        if self._matcher is None:
+            phrases = list(self.phrases)
+            self._matcher = (TermMatcher([{"business_term": p} for p in phrases], include_descriptions=False),
+                             phrases)
+        return self._matcher
+
+
+@dataclass(frozen=True)
+class TemplateMatch:
+    """SQL generated for a recognized question."""
+    intent: str
+    sql: str
+    description: str
+    confidence: float
+    params: Mapping[str, Any]
+    dialect: str = "duckdb"
+
+
+def _phrase(text: str) -> str:
+    return " ".join(token for token, _, _ in tokenize(text))
+
+
+def _plural(phrase: str) -> str:
+    return phrase if phrase.endswith("s") else phrase + "s"
+
+
+def _add(phrases: Dict[str, List[Slot]], phrase: str, slot: Slot) -> None:
+    if phrase and slot not in phrases.setdefault(phrase, []):
+        phrases[phrase].append(slot)
+
+
+def deck_target(dataframe: pd.DataFrame, business_dictionary: Optional[Mapping[str, Any]] = None,
+                config: TemplateConfig = template_config) -> TemplateTarget:
+    """Target over the local rate deck (table df), with dictionary synonyms mapped onto its columns."""
+    phrases: Dict[str, List[Slot]] = {}
+    column_phrases: Dict[str, List[str]] = {}
+    for column in dataframe.columns:
+        dtype = dataframe[column].dtype
+        if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype):
+            continue
+        kind = MEASURE if pd.api.types.is_numeric_dtype(dtype) else ENTITY
+        phrase = _phrase(str(column))
+        for variant in (phrase, _plural(phrase)):
+            _add(phrases, variant, Slot(kind, str(column)))
+            column_phrases.setdefault(variant, []).append(str(column))
+        if kind == ENTITY:
+            values = dataframe[column].dropna().unique()
+            if len(values) > config.max_filter_values:
+                continue
+            for value in values:
+                value_tokens = [token for token, _, _ in tokenize(str(value))]
+                # "Albania x" is asked about as "Albania": drop one-letter suffix tokens
+                while len(value_tokens) > 1 and len(value_tokens[-1]) == 1:
+                    value_tokens.pop()
+                if value_tokens and " ".join(value_tokens) not in column_phrases:
+                    _add(phrases, " ".join(value_tokens), Slot(VALUE, str(column), str(value)))
+
+    # Business terms and synonyms that name a deck column ("carriers" -> Supplier)
+    for mapping in (business_dictionary or {}).get("mappings", []):
+        names = [_phrase(p) for p in [mapping.get("business_term", "")] + list(mapping.get("synonyms") or [])]
+        columns = sorted({column for name in names for column in column_phrases.get(name, [])})
+        if not columns:
+            continue
+        for name in names:
+            if name in column_phrases:
+                continue
+            for column in columns:
+                kind = next(slot.kind for slot in phrases[_phrase(column)] if slot.value is None)
+                _add(phrases, name, Slot(kind, column))
+    return TemplateTarget(table="df", dialect="duckdb", phrases=phrases,
+                          version=dataframe.attrs.get("data_version"))
+
+
+_NUMERIC_TYPES = ("NUMBER", "FLOAT", "INTEGER", "BINARY_DOUBLE", "BINARY_FLOAT", "DECIMAL")
+_TEXT_TYPES = ("VARCHAR2", "NVARCHAR2", "CHAR", "NCHAR", "VARCHAR")
+
+
+def oracle_target(mapping: Mapping[str, Any], schema: Mapping[str, Any]) -> Optional[TemplateTarget]:
+    """Target over the Oracle table behind a dictionary mapping (None if its columns are unknown)."""
+    tables = schema.get("tables", {})
+    table_name = str(mapping.get("table_name", "")).upper()
+    qualified = next((name for name in tables if name == table_name or name.split(".")[-1] == table_name), None)
+    if qualified is None:
+        return None
+    columns = tables[qualified].get("columns", [])
+    phrases: Dict[str, List[Slot]] = {}
+    labels = [c for c in (mapping.get("display_columns") or []) if "." not in c]
+    for column in columns:
+        name = str(column.get("column_name", ""))
+        data_type = str(column.get("data_type", "")).upper()
+        if data_type.startswith(_NUMERIC_TYPES) and not name.upper().endswith("ID"):
+            for variant in (_phrase(name), _plural(_phrase(name))):
+                _add(phrases, variant, Slot(MEASURE, name))
+        elif data_type.startswith(_TEXT_TYPES) and not labels and name.upper().endswith("_NAME"):
+            labels.append(name)
+    if not labels:
+        return None
+    for name in [mapping.get("business_term", "")] + list(mapping.get("synonyms") or []):
+        _add(phrases, _phrase(name), Slot(ENTITY, labels[0]))
+    return TemplateTarget(table=qualified, dialect="oracle", phrases=phrases,
+                          base_filter=mapping.get("filter_condition") or "", label_columns=tuple(labels))
+
+
+_FILLERS = re.compile(
+    r"^(?:please\s+|can you\s+|could you\s+)?(?:show(?: me)?|list|give me|get|find|display|return|"
+    r"what are|which are|what is|what's|which)?\s*(?:all\s+|the\s+)*"
+)
+# Templates only render positive filters; negated questions are left to the LLM
+_NEGATIONS = re.compile(r"\b(?:not|no|never|except|excluding|exclude|other than|outside|without|"
+                        r"apart from|besides|but)\b|n't\b")
+_NUMBER = r"\d+(?:\.\d+)?"
+_AGGREGATES = {"average": "AVG", "avg": "AVG", "mean": "AVG", "total": "SUM", "sum of": "SUM",
+               "max": "MAX", "maximum": "MAX", "min": "MIN", "minimum": "MIN"}
+_AGG = r"(?:(?P<agg>average|avg|mean|total|sum of|maximum|max|minimum|min)\s+)?"
+_AGGREGATE_LABELS = {"AVG": "Average", "SUM": "Total", "MAX": "Max", "MIN": "Min"}
+_DESCENDING = {"top", "highest", "most expensive", "largest", "biggest", "best"}
+_OPERATORS = {"above": ">", "over": ">", "greater than": ">", "more than": ">", "higher than": ">",
+              "exceeds": ">", "exceed": ">", "exceeding": ">", ">": ">", ">=": ">=",
+              "below": "<", "under": "<", "less than": "<", "lower than": "<", "<": "<", "<=": "<="}
+_OP = r"(?:is\s+|are\s+)?(?P<op>above|over|greater than|more than|higher than|exceeds|exceed|exceeding|>=|>|" \
+      r"below|under|less than|lower than|<=|<)\s*"
+_ROWS = r"(?:(?:rows|records|entries|routes|rates|ENTITY\d+)\s+)?(?:(?:are|is|that are)\s+)?" \
+        r"(?:(?:where|with|whose|that have|having|priced)\s+)?"
+
+_PATTERNS = [
+    ("top_n", re.compile(
+        r"(?P<dir>top|highest|bottom|lowest|cheapest|most expensive|largest|biggest|best|worst)\s*"
+        r"(?P<n>\d+)?\s*(?P<entity>ENTITY\d+)\s+(?:by|ranked by|in terms of|on)\s+" + _AGG + r"(?P<measure>MEASURE\d+)"
+    )),
+    ("top_n", re.compile(
+        r"(?:(?P<n>\d+)\s+)?(?P<entity>ENTITY\d+)\s+with\s+the\s+(?P<dir>highest|lowest)\s+" + _AGG +
+        r"(?P<measure>MEASURE\d+)"
+    )),
+    ("average_by", re.compile(
+        r"(?P<agg>average|avg|mean)\s+(?P<measure>MEASURE\d+)\s+"
+        r"(?:by|per|for each|for every|across|grouped by|broken down by)\s+(?P<entity>ENTITY\d+)"
+    )),
+    ("threshold", re.compile(_ROWS + r"(?P<measure>MEASURE\d+)\s+" + _OP + r"(?P<x>" + _NUMBER + r")")),
+    ("compare", re.compile(
+        _ROWS + r"(?:(?P<measure>MEASURE\d+)\s+)?" + _OP + r"(?:the\s+)?(?P<other>MEASURE\d+)"
+    )),
+]
+
+
+class TemplateStats:
+    """Hit rate and estimated LLM latency saved by the template fast path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.questions = 0
+        self.hits = 0
+        self.low_confidence = 0
+        self.by_intent: Dict[str, int] = {}
+        self.match_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def record(self, match: Optional["TemplateMatch"], elapsed: float, near_miss: bool,
+               llm_seconds: float) -> None:
+        with self._lock:
+            self.questions += 1
+            self.match_seconds += elapsed
+            if match is not None:
+                self.hits += 1
+                self.by_intent[match.intent] = self.by_intent.get(match.intent, 0) + 1
+                self.saved_seconds += max(llm_seconds - elapsed, 0.0)
+            elif near_miss:
+                self.low_confidence += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "questions": self.questions,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.questions if self.questions else 0.0,
+                "low_confidence": self.low_confidence,
+                "by_intent": dict(self.by_intent),
+                "avg_match_ms": self.match_seconds / self.questions * 1000 if self.questions else 0.0,
+                "saved_seconds": self.saved_seconds,
+            }
+
+
+class TemplateEngine:
+    """Recognizes common question shapes and renders their SQL for a target."""
+
+    def __init__(self, config: TemplateConfig = template_config):
+        self.config = config
+        self.stats = TemplateStats()
+        self._targets: Dict[Tuple[str, str], TemplateTarget] = {}
+        self._lock = threading.Lock()
+
+    def deck_target(self, dataframe: pd.DataFrame, business_dictionary: Optional[Mapping[str, Any]] = None,
+                    schema_version: str = "") -> TemplateTarget:
+        """Deck target, reused while the deck and dictionary versions are unchanged."""
+        data_version = dataframe.attrs.get("data_version")
+        if not data_version:
+            return deck_target(dataframe, business_dictionary, self.config)
+        key = (data_version, schema_version)
+        with self._lock:
+            target = self._targets.get(key)
+        if target is None:
+            target = deck_target(dataframe, business_dictionary, self.config)
+            with self._lock:
+                self._targets = {key: target}
+        return target
+
+    def _slot_question(self, question: str, target: TemplateTarget) -> Tuple[str, List[Slot], float]:
+        """Lower-cased question with phrases replaced by KIND<n> placeholders; confidence from ambiguity."""
+        matcher, phrases = target.matcher()
+        text = question.lower()
+        spans: Dict[Tuple[int, int], List[Slot]] = {}
+        for match in matcher.find(question):
+            spans.setdefault((match.start, match.end), []).extend(target.phrases[phrases[match.mapping_index]])
+        parts, slots, position, confidence = [], [], 0, 1.0
+        for (start, end), candidates in sorted(spans.items()):
+            columns = [slot for slot in candidates if slot.value is None]
+            chosen = columns or candidates
+            if chosen[0].kind == VALUE:
+                # One phrase may name several values ("Albania" -> "Albania x", "Albania Mobile")
+                chosen = [slot for slot in chosen if slot.column == chosen[0].column]
+                slot = Slot(VALUE, chosen[0].column, "\x1f".join(sorted(s.value for s in chosen)))
+            else:
+                if len({s.column for s in chosen}) > 1:
+                    confidence *= 0.5  # e.g. "carrier product": Product or Supplier Product?
+                slot = chosen[0]
+            parts.append(text[position:start])
+            parts.append(f" {slot.kind}{len(slots)} ")
+            slots.append(slot)
+            position = end
+        parts.append(text[position:])
+        return "".join(parts), slots, confidence
+
+    def match(self, question: str, target: TemplateTarget) -> Tuple[Optional[TemplateMatch], float]:
+        """Best template match and its confidence (match is None below min_confidence)."""
+        slotted, slots, confidence = self._slot_question(question, target)
+        if _NEGATIONS.search(slotted):
+            return None, 0.0
+        filters: Dict[str, List[str]] = {}
+
+        def take_value(found):
+            slot = slots[int(found.group(1))]
+            filters.setdefault(slot.column, []).extend(slot.value.split("\x1f"))
+            return " "
+
+        slotted = re.sub(r"(?:\b(?:for|in|to|from|of|at|with)\s+)?VALUE(\d+)", take_value, slotted)
+        text = re.sub(r"[?!,;]+|\.(?!\d)", " ", slotted)
+        text = re.sub(r"\s+", " ", text).strip()
+        text = _FILLERS.sub("", text).strip()
+        if not text:
+            return None, 0.0
+
+        best: Optional[Tuple[float, str, re.Match]] = None
+        for intent, pattern in _PATTERNS:
+            found = pattern.fullmatch(text) or pattern.search(text)
+            if found is None:
+                continue
+            coverage = (found.end() - found.start()) / len(text)
+            if best is None or coverage > best[0]:
+                best = (coverage, intent, found)
+        if best is None:
+            return None, 0.0
+        coverage, intent, found = best
+        confidence *= coverage
+        if confidence < self.config.min_confidence:
+            return None, confidence
+        sql_match = self._render(intent, found, slots, filters, target)
+        if sql_match is None:
+            return None, 0.0
+        sql, description, params = sql_match
+        return TemplateMatch(intent, sql, description, confidence, params, target.dialect), confidence
+
+    def _quote(self, target: TemplateTarget, name: str) -> str:
+        if target.dialect == "oracle":
+            return name
+        return '"' + name.replace('"', '""') + '"'
+
+    def _where(self, target: TemplateTarget, conditions: List[str], filters: Dict[str, List[str]]) -> str:
+        clauses = [f"({target.base_filter})"] if target.base_filter else []
+        clauses += conditions
+        for column, values in filters.items():
+            literals = ", ".join("'" + value.replace("'", "''") + "'" for value in dict.fromkeys(values))
+            clauses.append(f"{self._quote(target, column)} IN ({literals})")
+        return f"\nWHERE {' AND '.join(clauses)}" if clauses else ""
+
+    def _limit(self, target: TemplateTarget, n: int) -> str:
+        return f"\nFETCH FIRST {n} ROWS ONLY" if target.dialect == "oracle" else f"\nLIMIT {n}"
+
+    def _render(self, intent: str, found: re.Match, slots: Sequence[Slot], filters: Dict[str, List[str]],
+                target: TemplateTarget) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        groups = found.groupdict()
+
+        def slot(name: str) -> Optional[Slot]:
+            placeholder = groups.get(name)
+            return slots[int(re.sub(r"\D", "", placeholder))] if placeholder else None
+
+        q = lambda name: self._quote(target, name)
+        measure, entity = slot("measure"), slot("entity")
+        params: Dict[str, Any] = {"filters": {c: list(dict.fromkeys(v)) for c, v in filters.items()}}
+        filter_text = "".join(f" for {', '.join(dict.fromkeys(v))}" for v in filters.values())
+
+        if intent == "top_n":
+            n = int(groups.get("n") or self.config.default_top_n)
+            n = min(n, self.config.max_rows)
+            descending = groups["dir"] in _DESCENDING
+            if groups["dir"] in ("best", "worst", "cheapest") and "rate" in measure.column.lower():
+                descending = groups["dir"] == "worst"  # for buy rates, best means cheapest
+            order = "DESC" if descending else "ASC"
+            params.update(n=n, entity=entity.column, measure=measure.column, order=order)
+            if target.grouped:
+                aggregate = _AGGREGATES.get(groups.get("agg") or "average", "AVG")
+                alias = f"{_AGGREGATE_LABELS[aggregate]} {measure.column}"
+                params["aggregate"] = aggregate
+                sql = (f"SELECT {q(entity.column)}, {aggregate}({q(measure.column)}) AS {q(alias)}, COUNT(*) AS \"Rows\"\n"
+                       f"FROM {target.table}"
+                       + self._where(target, [f"{q(measure.column)} IS NOT NULL"], filters)
+                       + f"\nGROUP BY {q(entity.column)}\nORDER BY {q(alias)} {order}" + self._limit(target, n))
+                description = f"{'Top' if descending else 'Bottom'} {n} {entity.column} by {alias}"
+            else:
+                columns = ", ".join(dict.fromkeys(list(target.label_columns) + [measure.column]))
+                sql = (f"SELECT {columns}\nFROM {target.table}"
+                       + self._where(target, [f"{measure.column} IS NOT NULL"], filters)
+                       + f"\nORDER BY {measure.column} {order}" + self._limit(target, n))
+                description = f"{'Top' if descending else 'Bottom'} {n} by {measure.column}"
+            return sql, description + filter_text, params
+
+        if intent == "average_by":
+            if not target.grouped:
+                return None
+            alias = f"Average {measure.column}"
+            params.update(entity=entity.column, measure=measure.column)
+            sql = (f"SELECT {q(entity.column)}, AVG({q(measure.column)}) AS {q(alias)}, COUNT(*) AS \"Rows\"\n"
+                   f"FROM {target.table}" + self._where(target, [], filters)
+                   + f"\nGROUP BY {q(entity.column)}\nORDER BY {q(entity.column)}")
+            return sql, f"Average {measure.column} by {entity.column}" + filter_text, params
+
+        op = _OPERATORS[groups["op"]]
+        order = "DESC" if op.startswith(">") else "ASC"
+        select = "*" if target.grouped else ", ".join(target.label_columns + ((measure.column,) if measure else ()))
+
+        if intent == "threshold":
+            threshold = float(groups["x"])
+            params.update(measure=measure.column, op=op, threshold=threshold)
+            sql = (f"SELECT {select}\nFROM {target.table}"
+                   + self._where(target, [f"{q(measure.column)} {op} {groups['x']}"], filters)
+                   + f"\nORDER BY {q(measure.column)} {order}" + self._limit(target, self.config.max_rows))
+            return sql, f"Rows where {measure.column} {op} {groups['x']}" + filter_text, params
+
+        # compare: one measure against another ("rate below floor price")
+        other = slot("other")
+        if measure is None:
+            # "rows below floor price" compares the deck's rate column
+            measure = next((Slot(MEASURE, s.column) for s in target.phrases.get("rate", [])
+                            if s.kind == MEASURE), None)
+        if measure is None or measure.column == other.column or not target.grouped:
+            return None
+        params.update(measure=measure.column, op=op, other=other.column)
+        difference = f"{measure.column} - {other.column}"
+        sql = (f"SELECT *, {q(measure.column)} - {q(other.column)} AS {q(difference)}\nFROM {target.table}"
+               + self._where(target, [f"{q(measure.column)} {op} {q(other.column)}"], filters)
+               + f"\nORDER BY {q(difference)} {order}" + self._limit(target, self.config.max_rows))
+        return sql, f"Rows where {measure.column} {op} {other.column}" + filter_text, params
+
+    def answer(self, question: str, targets: Sequence[TemplateTarget],
+               llm_seconds: Optional[float] = None) -> Optional[TemplateMatch]:
+        """First confident match over the targets (in order); records hit rate and latency saved."""
+        start_time = time.perf_counter()
+        result, best_confidence = None, 0.0
+        for target in targets:
+            try:
+                match, confidence = self.match(question, target)
+            except Exception as e:
+                logger.error(f"Error matching query templates: {e}")
+                continue
+            best_confidence = max(best_confidence, confidence)
+            if match is not None:
+                result = match
+                break
+        elapsed = time.perf_counter() - start_time
+        self.stats.record(result, elapsed, near_miss=best_confidence > 0,
+                          llm_seconds=llm_seconds if llm_seconds is not None else self.config.assumed_llm_seconds)
+        if result is not None:
+            logger.info(f"Template {result.intent} answered question in {elapsed * 1000:.1f} ms "
+                        f"(confidence {result.confidence:.2f})")
+        return result
+
+
+_engine: Optional[TemplateEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_template_engine() -> Optional[TemplateEngine]:
+    """Process-wide template engine (None when QUERY_TEMPLATES is off)."""
+    global _engine
+    if _engine is None and template_config.enabled:
+        with _engine_lock:
+            if _engine is None:
+                _engine = TemplateEngine()
+    return _engine
+
+
+def format_template_answer(match: TemplateMatch) -> str:
+    """Chat answer for a template match; the SQL block is executed like an LLM answer's."""
+    return (f"{match.description} (answered from a query template, no LLM call).\n\n"
+            f"```sql\n{match.sql}\n```")
@@ -0,0 +1,224 @@
+"""
+Adaptive client-side rate limiting for LLM providers.
+
+Each provider/model pair gets a limiter with two token buckets: requests per
+minute and (estimated) tokens per minute. Calls reserve capacity before they
+are sent and wait their turn, but never past their queue deadline; a caller
+whose turn would come too late fails fast with QueueDeadlineExceeded. The
+limits follow AIMD: every throttling response (HTTP 429, Bedrock
+ThrottlingException) halves them, every success adds a little back up to the
+configured ceiling. Without configured limits a throttle seen at a
+meaningful rate seeds them from the rate observed over the last minute, and
+they are lifted again once they have doubled (below that rate backoff alone
+spaces out the retries). Retry delays use full-jitter exponential backoff and never
+undercut the provider's retry-after.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.config import rate_limit_config, RateLimitConfig
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """The provider kept throttling, or the wait would pass the deadline."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueDeadlineExceeded(RateLimitExceeded):
+    """A request could not be scheduled before its queue deadline."""
+
+
+class TokenBucket:
+    """Continuously refilled bucket; reservations may drive the level negative (a queue)."""
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.burst_seconds = burst_seconds
+        self.per_minute = per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return max(self.per_minute * self.burst_seconds / 60.0, 1.0)
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def set_rate(self, per_minute: float, now: float) -> None:
+        self._refill(now)
+        self.per_minute = per_minute
+        self.level = min(self.level, self.capacity)
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount and return the seconds until it is actually available."""
+        self._refill(now)
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level * 60.0 / self.per_minute
+
+    def refund(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class AdaptiveRateLimiter:
+    """RPM/TPM limiter for one provider/model with AIMD adjustment."""
+
+    def __init__(self, name: str, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 config: RateLimitConfig = rate_limit_config):
+        self.name = name
+        self.config = config
+        self._lock = threading.Lock()
+        # [requests, tokens]: configured ceilings, current ceilings and buckets (None = unlimited)
+        self._configured = [float(requests_per_minute) or None, float(tokens_per_minute) or None]
+        self._ceilings = list(self._configured)
+        self._buckets: List[Optional[TokenBucket]] = [
+            TokenBucket(limit, config.burst_seconds) if limit else None for limit in self._configured
+        ]
+        self._recent: deque = deque()  # (time, tokens) of calls in the last minute
+        self.requests = 0
+        self.throttles = 0
+        self.retries = 0
+        self.deadline_failures = 0
+        self._wait_total = 0.0
+
+    @staticmethod
+    def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+        from .context_retrieval import estimate_tokens
+        return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
+
+    def _observed(self, now: float) -> Tuple[float, float]:
+        while self._recent and self._recent[0][0] < now - 60.0:
+            self._recent.popleft()
+        return float(len(self._recent)), float(sum(tokens for _, tokens in self._recent))
+
+    def _reserve(self, tokens: float, deadline: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            amounts = (1, tokens)
+            waits = [bucket.reserve(amount, now) for bucket, amount in zip(self._buckets, amounts)
+                     if bucket is not None]
+            wait = max(waits, default=0.0)
+            if now + wait > deadline:
+                for bucket, amount in zip(self._buckets, amounts):
+                    if bucket is not None:
+                        bucket.refund(amount, now)
+                self.deadline_failures += 1
+                raise QueueDeadlineExceeded(
+                    f"{self.name} is rate limited; the request would wait {wait:.0f}s", retry_after=wait
+                )
+            self.requests += 1
+            self._wait_total += wait
+            self._recent.append((now + wait, tokens))
+        if wait:
+            logger.info(f"{self.name}: waiting {wait:.2f}s for rate limit capacity")
+        return wait
+
+    def acquire(self, tokens: float, deadline: float) -> None:
+        """Block until the request may be sent (raises QueueDeadlineExceeded)."""
+        wait = self._reserve(tokens, deadline)
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: float, deadline: float) -> None:
+        wait = self._reserve(tokens, deadline)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def on_success(self, estimated_tokens: float, actual_tokens: float) -> None:
+        """Additive increase, and correct the token bucket by the real usage."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._buckets[1]
+            if tokens is not None and actual_tokens > estimated_tokens:
+                tokens.reserve(actual_tokens - estimated_tokens, now)
+            elif tokens is not None:
+                tokens.refund(estimated_tokens - actual_tokens, now)
+            for index, bucket in enumerate(self._buckets):
+                if bucket is None:
+                    continue
+                ceiling = self._ceilings[index]
+                rate = bucket.per_minute + ceiling * 0.02
+                if rate < ceiling:
+                    bucket.set_rate(rate, now)
+                elif self._configured[index]:
+                    bucket.set_rate(ceiling, now)
+                else:
+                    self._buckets[index] = None  # learned limit has recovered: lift it
+
+    def on_throttle(self) -> None:
+        """Multiplicative decrease (seeded from the observed rate when no limit is configured)."""
+        now = time.monotonic()
+        with self._lock:
+            self.throttles += 1
+            floor = self.config.min_requests_per_minute
+            floors = (floor, floor * self.config.expected_output_tokens)
+            observed = self._observed(now)
+            for index, bucket in enumerate(self._buckets):
+                if bucket is None:
+                    if observed[0] < 2 * floor:
+                        continue
+                    seed = max(observed[index], floors[index])
+                    self._ceilings[index] = seed * 2
+                    bucket = self._buckets[index] = TokenBucket(seed, self.config.burst_seconds)
+                bucket.set_rate(max(bucket.per_minute * self.config.decrease_factor, floors[index]), now)
+            requests, tokens = self._buckets
+            if requests is not None:
+                logger.warning(
+                    f"{self.name} throttled; limiting to {requests.per_minute:.1f} rpm"
+                    + (f", {tokens.per_minute:.0f} tpm" if tokens is not None else "")
+                )
+
+    def on_retry(self) -> None:
+        """Count a throttled call that is about to be retried."""
+        with self._lock:
+            self.retries += 1
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, at least the provider's retry-after."""
+        cap = min(self.config.backoff_max, self.config.backoff_base * (2 ** attempt))
+        return max(retry_after or 0.0, random.uniform(0, cap))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "throttles": self.throttles,
+                "retries": self.retries,
+                "deadline_failures": self.deadline_failures,
+                "rpm_limit": self._buckets[0].per_minute if self._buckets[0] is not None else None,
+                "tpm_limit": self._buckets[1].per_minute if self._buckets[1] is not None else None,
+                "avg_wait_seconds": self._wait_total / self.requests if self.requests else 0.0,
+            }
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model_id: str) -> AdaptiveRateLimiter:
+    """Process-wide limiter of a provider/model, sized from LLM_RPM / LLM_TPM / LLM_RATE_LIMITS."""
+    name = f"{provider}:{model_id}"
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            rpm, tpm = rate_limit_config.limits_for(provider, model_id)
+            limiter = _limiters[name] = AdaptiveRateLimiter(name, rpm, tpm)
+        return limiter
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
@@ -0,0 +1,179 @@
+"""
+Persistent exact-match cache of LLM answers to chat questions.
+
+Answers (the full LLM response plus the SQL extracted from it) are stored in a
+local SQLite database keyed by the normalized question, the data source, the
+schema/dictionary snapshot version, the data version of the frame the prompt
+described and the model id. Any change to the dictionary, schema or CSV
+therefore yields a different key, and stale rows age out through the TTL and
+the byte budget. Lookups are a single primary-key read.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from config.config import cache_config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    source TEXT NOT NULL,
+    response TEXT NOT NULL,
+    sql_query TEXT,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    last_access REAL NOT NULL,
+    size_bytes INTEGER NOT NULL
+)
+"""
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, without trailing punctuation."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!.").strip().lower()
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A stored LLM answer."""
+    response: str
+    sql_query: Optional[str]
+    created_at: float
+
+
+class ResponseCache:
+    """SQLite-backed question -> LLM response cache with TTL and byte-budget eviction."""
+
+    def __init__(self, path: str = cache_config.response_cache_path,
+                 ttl: Optional[float] = cache_config.response_cache_ttl,
+                 max_bytes: int = cache_config.response_cache_max_bytes):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(_SCHEMA)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(question: str, source: str, schema_version: str, data_version: str, model_id: str) -> str:
+        payload = json.dumps([normalize_question(question), source, schema_version, data_version, model_id])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, question: str, source: str, schema_version: str, data_version: str,
+            model_id: str) -> Optional[CachedResponse]:
+        """Return the cached answer, or None if absent or expired."""
+        key = self.make_key(question, source, schema_version, data_version, model_id)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, sql_query, created_at, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[3] is not None and row[3] <= now:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.expirations += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return CachedResponse(response=row[0], sql_query=row[1], created_at=row[2])
+
+    def put(self, question: str, source: str, schema_version: str, data_version: str, model_id: str,
+            response: str, sql_query: Optional[str]) -> None:
+        """Store an answer and evict expired / least recently used rows beyond the byte budget.
+
+        A ttl of 0 or less stores nothing; None keeps entries until evicted.
+        """
+        if self.ttl is not None and self.ttl <= 0:
+            return
+        key = self.make_key(question, source, schema_version, data_version, model_id)
+        now = time.time()
+        size = len(response.encode("utf-8")) + len((sql_query or "").encode("utf-8"))
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_question(question), source, response, sql_query, now,
+                 now + self.ttl if self.ttl is not None else None, now, size),
+            )
+            self._evict(now)
+
+    def delete(self, question: str, source: str, schema_version: str, data_version: str, model_id: str) -> None:
+        """Forget a stored answer (e.g. one whose SQL no longer runs)."""
+        key = self.make_key(question, source, schema_version, data_version, model_id)
+        with self._lock:
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def _evict(self, now: float) -> None:
+        expired = self._connection.execute(
+            "DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).rowcount
+        self.expirations += max(expired, 0)
+        total = self._connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._connection.execute(
+            "SELECT key, size_bytes FROM responses ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self.evictions += evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters plus current usage."""
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM responses"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": size,
+            }
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the process-wide response cache (None when RESPONSE_CACHE_PATH is empty or RESPONSE_CACHE_TTL is 0)."""
+    global _response_cache
+    if _response_cache is None and cache_config.response_cache_path and cache_config.response_cache_ttl > 0:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
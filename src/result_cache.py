@@ -0,0 +1,197 @@
+"""
+Versioned query result cache for local (DuckDB) and Oracle queries.
+
+Results are keyed by data source, data version and normalized SQL text. Local
+queries use the rate deck's fingerprint as version, so a new CSV invalidates
+them automatically; Oracle results expire after a per-table TTL. The default
+backend is an in-process LRU bounded by total bytes; other backends (e.g.
+Redis) can be plugged in by implementing CacheBackend.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from config.config import cache_config
+from .sql_utils import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    """A cached result with its size and optional expiry (epoch seconds)."""
+    value: Any
+    size_bytes: int
+    expires_at: Optional[float] = None
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return self.expires_at is not None and (now or time.time()) >= self.expires_at
+
+
+class CacheBackend(ABC):
+    """Storage backend for ResultCache."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry for key, or None."""
+
+    @abstractmethod
+    def put(self, key: str, entry: CacheEntry) -> int:
+        """Store an entry; returns the number of entries evicted to make room."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove an entry if present."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all entries."""
+
+    @abstractmethod
+    def usage(self) -> Dict[str, int]:
+        """Return {'entries': ..., 'bytes': ...}."""
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU backend that evicts by total bytes rather than entry count."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CacheEntry) -> int:
+        if entry.size_bytes > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size_bytes
+            while self._entries and self._bytes + entry.size_bytes > self.max_bytes:
+                _, oldest = self._entries.popitem(last=False)
+                self._bytes -= oldest.size_bytes
+                evicted += 1
+            self._entries[key] = entry
+            self._bytes += entry.size_bytes
+        return evicted
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size_bytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+def result_size_bytes(result: pd.DataFrame) -> int:
+    """Approximate in-memory size of a result frame."""
+    return int(result.memory_usage(index=True, deep=True).sum())
+
+
+class ResultCache:
+    """Query result cache keyed by (source, data version, normalized SQL, parameters)."""
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend or MemoryBackend(cache_config.result_cache_max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(source: str, version: str, sql: str, parameters: Optional[Dict[str, Any]] = None) -> str:
+        payload = json.dumps(
+            [source, version, normalize_sql(sql), parameters or {}], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, source: str, version: str, sql: str,
+            parameters: Optional[Dict[str, Any]] = None) -> Optional[pd.DataFrame]:
+        """Return a cached result (shallow copy) or None."""
+        key = self.make_key(source, version, sql, parameters)
+        entry = self.backend.get(key)
+        if entry is not None and entry.expired():
+            self.backend.delete(key)
+            with self._lock:
+                self.expirations += 1
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry.value.copy(deep=False)
+
+    def put(self, source: str, version: str, sql: str, result: pd.DataFrame,
+            parameters: Optional[Dict[str, Any]] = None, ttl: Optional[float] = None) -> None:
+        """Cache a result frame, optionally expiring after ttl seconds (ttl <= 0: not cached)."""
+        if ttl is not None and ttl <= 0:
+            return
+        key = self.make_key(source, version, sql, parameters)
+        entry = CacheEntry(
+            value=result,
+            size_bytes=result_size_bytes(result),
+            expires_at=time.time() + ttl if ttl is not None else None,
+        )
+        evicted = self.backend.put(key, entry)
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters plus current usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+        stats.update(self.backend.usage())
+        return stats
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Get the process-wide result cache."""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
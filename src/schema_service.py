@@ -4,18 +4,79 @@ Provides schema extraction, business dictionary management, and API endpoints
 for natural language to SQL generation.
 """
 
+import hashlib
 import json
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+import tempfile
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, List, Optional, Any, Tuple, Mapping
 from dataclasses import dataclass, asdict
 from datetime import datetime
 import os
+import pandas as pd
 from .database_tools import get_db_manager, get_db_status
+from .term_matcher import TermMatcher, TermMatch
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Maximum number of bind variables per IN-list when re-reading changed tables
+TABLE_FILTER_BATCH_SIZE = 500
+
+TABLES_QUERY = """
+SELECT 
+    t.TABLE_NAME,
+    t.NUM_ROWS,
+    o.LAST_DDL_TIME,
+    tc.COMMENTS AS TABLE_COMMENT
+FROM USER_TABLES t
+JOIN USER_OBJECTS o ON o.OBJECT_NAME = t.TABLE_NAME AND o.OBJECT_TYPE = 'TABLE'
+LEFT JOIN USER_TAB_COMMENTS tc ON tc.TABLE_NAME = t.TABLE_NAME
+ORDER BY t.TABLE_NAME
+"""
+
+COLUMNS_QUERY = """
+SELECT 
+    c.TABLE_NAME,
+    c.COLUMN_NAME,
+    c.DATA_TYPE,
+    c.DATA_LENGTH,
+    c.DATA_PRECISION,
+    c.DATA_SCALE,
+    c.NULLABLE,
+    cc.COMMENTS AS COLUMN_COMMENT
+FROM USER_TAB_COLUMNS c
+LEFT JOIN USER_COL_COMMENTS cc 
+    ON cc.TABLE_NAME = c.TABLE_NAME AND cc.COLUMN_NAME = c.COLUMN_NAME
+{table_filter}
+ORDER BY c.TABLE_NAME, c.COLUMN_ID
+"""
+
+# Primary keys and foreign keys (with the referenced column) in one pass.
+# ALL_* views are used only for the referenced side so cross-schema FKs resolve.
+CONSTRAINTS_QUERY = """
+SELECT 
+    c.TABLE_NAME,
+    c.CONSTRAINT_NAME,
+    c.CONSTRAINT_TYPE,
+    cc.COLUMN_NAME,
+    r.OWNER AS R_OWNER,
+    r.TABLE_NAME AS R_TABLE_NAME,
+    rc.COLUMN_NAME AS R_COLUMN_NAME
+FROM USER_CONSTRAINTS c
+JOIN USER_CONS_COLUMNS cc ON cc.CONSTRAINT_NAME = c.CONSTRAINT_NAME
+LEFT JOIN ALL_CONSTRAINTS r 
+    ON r.OWNER = c.R_OWNER AND r.CONSTRAINT_NAME = c.R_CONSTRAINT_NAME
+LEFT JOIN ALL_CONS_COLUMNS rc 
+    ON rc.OWNER = r.OWNER AND rc.CONSTRAINT_NAME = r.CONSTRAINT_NAME AND rc.POSITION = cc.POSITION
+WHERE c.CONSTRAINT_TYPE IN ('P', 'R')
+{table_filter}
+ORDER BY c.TABLE_NAME, c.CONSTRAINT_NAME, cc.POSITION
+"""
+
 @dataclass
 class ColumnInfo:
     """Information about a database column."""
@@ -36,6 +97,7 @@ class TableInfo:
     columns: List[ColumnInfo]
     description: Optional[str] = None
     row_count: Optional[int] = None
+    last_ddl_time: Optional[str] = None
 
 @dataclass
 class BusinessMapping:
@@ -48,6 +110,38 @@ class BusinessMapping:
     category: str = "general"
     confidence: float = 1.0
 
+def _freeze(value: Any) -> Any:
+    """Deep read-only copy: dicts become mapping proxies and lists become tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _content_hash(content: bytes) -> str:
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+def _file_state(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+@dataclass(frozen=True)
+class SchemaSnapshot:
+    """Immutable view of the schema metadata and business dictionary at one version.
+    
+    The version id changes whenever either file's content changes, so downstream
+    caches (prompts, matchers, results) can use it as part of their keys.
+    """
+    version: str
+    schema: Mapping[str, Any]
+    business_dictionary: Mapping[str, Any]
+    matcher: TermMatcher
+    created_at: float
+
 class SchemaService:
     """Service for managing Oracle schema and business dictionary."""
     
@@ -58,9 +152,56 @@ class SchemaService:
         self.schema_cache: Optional[Dict[str, Any]] = None
         self.business_dict_cache: Optional[Dict[str, Any]] = None
         self.last_schema_update: Optional[datetime] = None
+        # File state (mtime_ns, size) and content hash behind each cache, for hot reload
+        self._schema_state: Optional[Tuple[int, int]] = None
+        self._schema_hash = _content_hash(b"{}")
+        self._business_dict_state: Optional[Tuple[int, int]] = None
+        self._business_dict_hash = _content_hash(b"{}")
+        self._snapshot: Optional[SchemaSnapshot] = None
+        self._lock = threading.RLock()
+        
+    @staticmethod
+    def _table_filter(column: str, table_names: List[str], keyword: str) -> Tuple[str, Dict[str, str]]:
+        """Build an IN-list filter with bind variables for the given table names."""
+        binds = {f"t{i}": name for i, name in enumerate(table_names)}
+        placeholders = ", ".join(f":{name}" for name in binds)
+        return f"{keyword} {column} IN ({placeholders})", binds
+    
+    def _query_for_tables(self, db_manager, query_template: str, column: str, keyword: str,
+                          table_names: Optional[List[str]]):
+        """Run a set-based metadata query for all tables, or for the given tables in batches."""
+        if table_names is None:
+            return [db_manager.execute_query(query_template.format(table_filter=""), max_rows=0, max_bytes=0)]
+        frames = []
+        for start in range(0, len(table_names), TABLE_FILTER_BATCH_SIZE):
+            table_filter, binds = self._table_filter(
+                column, table_names[start:start + TABLE_FILTER_BATCH_SIZE], keyword
+            )
+            frames.append(db_manager.execute_query(
+                query_template.format(table_filter=table_filter), binds, max_rows=0, max_bytes=0
+            ))
+        return frames
+    
+    @staticmethod
+    def _value(value) -> Any:
+        """Normalize NULLs coming back from pandas (None/NaN/NaT) to None."""
+        if value is None or (not isinstance(value, (str, list, dict)) and pd.isna(value)):
+            return None
+        return value
+    
+    @classmethod
+    def _ddl_time_str(cls, value) -> Optional[str]:
+        value = cls._value(value)
+        return pd.Timestamp(value).isoformat() if value is not None else None
+    
+    def extract_oracle_schema(self, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Extract complete schema metadata from Oracle database.
         
-    def extract_oracle_schema(self) -> Dict[str, Any]:
-        """Extract complete schema metadata from Oracle database."""
+        Columns, comments and PK/FK constraints are read with a handful of set-based
+        queries instead of one query per table. When a previous snapshot is given,
+        only tables whose LAST_DDL_TIME changed (or that are new) are re-read; the
+        rest are carried over from the snapshot.
+        """
         if not get_db_status():
             raise ConnectionError("Oracle database is not connected")
         
@@ -75,102 +216,126 @@ class SchemaService:
         }
         
         try:
-            # Get database information
+            # Get database information and the current user's schema in one round trip
             db_info_query = """
             SELECT 
                 SYS_CONTEXT('USERENV', 'DB_NAME') as db_name,
                 SYS_CONTEXT('USERENV', 'DB_DOMAIN') as db_domain,
-                SYS_CONTEXT('USERENV', 'INSTANCE_NAME') as instance_name
+                SYS_CONTEXT('USERENV', 'INSTANCE_NAME') as instance_name,
+                USER as schema_name
             FROM DUAL
             """
             db_info = db_manager.execute_query(db_info_query)
+            schema_name = "USER"
             if not db_info.empty:
-                schema_metadata["database_info"] = db_info.iloc[0].to_dict()
+                info = db_info.iloc[0].to_dict()
+                schema_name = info.pop("SCHEMA_NAME", None) or "USER"
+                schema_metadata["database_info"] = info
+            schema_metadata["schemas"] = [{"schema_name": schema_name}]
             
-            # Get current user's schema (simplified approach)
-            try:
-                current_user_query = "SELECT USER as schema_name FROM DUAL"
-                current_user = db_manager.execute_query(current_user_query)
-                if not current_user.empty:
-                    schema_metadata["schemas"] = [{"schema_name": current_user.iloc[0]['SCHEMA_NAME']}]
-                else:
-                    schema_metadata["schemas"] = [{"schema_name": "USER"}]
-            except Exception as e:
-                logger.warning(f"Could not get current user: {e}")
-                schema_metadata["schemas"] = [{"schema_name": "USER"}]
+            tables = db_manager.execute_query(TABLES_QUERY, max_rows=0, max_bytes=0)
+            current_ddl_times = {
+                row["TABLE_NAME"]: self._ddl_time_str(row["LAST_DDL_TIME"])
+                for _, row in tables.iterrows()
+            }
             
-            # Get tables from current user's schema (simplified approach)
-            tables_query = """
-            SELECT 
-                USER as schema_name,
-                TABLE_NAME,
-                NUM_ROWS
-            FROM USER_TABLES
-            ORDER BY TABLE_NAME
-            """
-            tables = db_manager.execute_query(tables_query)
+            # Decide which tables need to be re-read
+            previous_tables = (previous or {}).get("tables", {})
+            changed_tables = []
+            for table_name, ddl_time in current_ddl_times.items():
+                cached = previous_tables.get(f"{schema_name}.{table_name}")
+                if cached is None or cached.get("last_ddl_time") is None or cached.get("last_ddl_time") != ddl_time:
+                    changed_tables.append(table_name)
+            incremental = previous is not None and bool(previous_tables)
+            table_scope = changed_tables if incremental else None
+            
+            columns_by_table: Dict[str, List[Dict[str, Any]]] = {}
+            primary_keys: Dict[str, set] = {}
+            foreign_keys: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            new_relationships = []
             
+            if not incremental or changed_tables:
+                for frame in self._query_for_tables(db_manager, COLUMNS_QUERY, "c.TABLE_NAME", "WHERE", table_scope):
+                    for row in frame.to_dict("records"):
+                        columns_by_table.setdefault(row["TABLE_NAME"], []).append(row)
+                
+                for frame in self._query_for_tables(db_manager, CONSTRAINTS_QUERY, "c.TABLE_NAME", "AND", table_scope):
+                    for row in frame.to_dict("records"):
+                        table_name = row["TABLE_NAME"]
+                        if row["CONSTRAINT_TYPE"] == "P":
+                            primary_keys.setdefault(table_name, set()).add(row["COLUMN_NAME"])
+                        elif row["CONSTRAINT_TYPE"] == "R":
+                            referenced_name = self._value(row.get("R_TABLE_NAME"))
+                            referenced_table = f"{row['R_OWNER']}.{referenced_name}" if referenced_name else None
+                            referenced_column = self._value(row.get("R_COLUMN_NAME"))
+                            foreign_keys[(table_name, row["COLUMN_NAME"])] = {
+                                "referenced_table": referenced_table,
+                                "referenced_column": referenced_column,
+                            }
+                            new_relationships.append({
+                                "constraint_name": row["CONSTRAINT_NAME"],
+                                "from_table": f"{schema_name}.{table_name}",
+                                "from_column": row["COLUMN_NAME"],
+                                "to_table": referenced_table,
+                                "to_column": referenced_column
+                            })
+            
+            changed_set = set(changed_tables)
             for _, table_row in tables.iterrows():
                 table_info = table_row.to_dict()
-                schema_name = table_info['SCHEMA_NAME']
                 table_name = table_info['TABLE_NAME']
                 full_table_name = f"{schema_name}.{table_name}"
                 
-                # Get columns for this table (simplified approach)
-                columns_query = """
-                SELECT 
-                    COLUMN_NAME,
-                    DATA_TYPE,
-                    DATA_LENGTH,
-                    DATA_PRECISION,
-                    DATA_SCALE,
-                    NULLABLE,
-                    DATA_DEFAULT
-                FROM USER_TAB_COLUMNS
-                WHERE TABLE_NAME = :table_name
-                ORDER BY COLUMN_ID
-                """
-                
-                columns = db_manager.execute_query(columns_query, {
-                    'table_name': table_name
-                })
+                if incremental and table_name not in changed_set:
+                    schema_metadata["tables"][full_table_name] = previous_tables[full_table_name]
+                    continue
                 
                 table_columns = []
-                for _, col_row in columns.iterrows():
-                    col_info = col_row.to_dict()
+                for col_info in columns_by_table.get(table_name, []):
+                    fk = foreign_keys.get((table_name, col_info['COLUMN_NAME']))
                     column = ColumnInfo(
                         column_name=col_info['COLUMN_NAME'],
                         data_type=col_info['DATA_TYPE'],
                         nullable=col_info['NULLABLE'] == 'Y',
-                        primary_key=False,  # Simplified - no primary key detection
-                        description=None    # Simplified - no comments
+                        primary_key=col_info['COLUMN_NAME'] in primary_keys.get(table_name, ()),
+                        foreign_key=fk is not None,
+                        referenced_table=fk["referenced_table"] if fk else None,
+                        referenced_column=fk["referenced_column"] if fk else None,
+                        description=self._value(col_info.get('COLUMN_COMMENT'))
                     )
                     table_columns.append(asdict(column))
                 
-                # Skip foreign key relationships for now (simplified approach)
-                # This requires ALL_* views which the user may not have access to
-                
-                # Store table information
+                row_count = self._value(table_info.get('NUM_ROWS'))
                 table_info_obj = TableInfo(
                     table_name=table_name,
                     schema_name=schema_name,
                     columns=table_columns,
-                    description=table_info.get('TABLE_COMMENT'),
-                    row_count=table_info.get('NUM_ROWS')
+                    description=self._value(table_info.get('TABLE_COMMENT')),
+                    row_count=int(row_count) if row_count is not None else None,
+                    last_ddl_time=current_ddl_times[table_name]
                 )
                 
                 schema_metadata["tables"][full_table_name] = asdict(table_info_obj)
             
-            # Skip table relationships for now (simplified approach)
-            # This requires ALL_* views which the user may not have access to
-            schema_metadata["relationships"] = []
+            # Relationships of unchanged tables are carried over; changed tables were re-read
+            if incremental:
+                changed_full_names = {f"{schema_name}.{name}" for name in changed_tables}
+                schema_metadata["relationships"] = [
+                    rel for rel in (previous or {}).get("relationships", [])
+                    if rel.get("from_table") in schema_metadata["tables"]
+                    and rel.get("from_table") not in changed_full_names
+                ] + new_relationships
+            else:
+                schema_metadata["relationships"] = new_relationships
             
             # Calculate statistics
             schema_metadata["statistics"] = {
                 "total_schemas": len(schema_metadata["schemas"]),
                 "total_tables": len(schema_metadata["tables"]),
                 "total_relationships": len(schema_metadata["relationships"]),
-                "total_columns": sum(len(table["columns"]) for table in schema_metadata["tables"].values())
+                "total_columns": sum(len(table["columns"]) for table in schema_metadata["tables"].values()),
+                "extraction_mode": "incremental" if incremental else "full",
+                "refreshed_tables": len(changed_tables) if incremental else len(schema_metadata["tables"])
             }
             
             logger.info(f"Successfully extracted schema metadata: {schema_metadata['statistics']}")
@@ -180,36 +345,63 @@ class SchemaService:
             logger.error(f"Error extracting Oracle schema: {e}")
             raise
     
+    def _write_json(self, path: str, data: Dict[str, Any]) -> str:
+        """Write JSON to path and return the content hash of what was written.
+        
+        The file is written beside the target and renamed into place, so services
+        hot-reloading it in other processes never read a half-written snapshot.
+        """
+        content = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return _content_hash(content)
+    
+    def _read_json(self, path: str) -> Tuple[Dict[str, Any], str]:
+        """Read JSON from path; returns (data, content hash)."""
+        with open(path, 'rb') as f:
+            content = f.read()
+        return json.loads(content.decode('utf-8')), _content_hash(content)
+    
     def save_schema(self, schema_data: Dict[str, Any]) -> None:
         """Save schema metadata to JSON file."""
         try:
-            with open(self.schema_file, 'w', encoding='utf-8') as f:
-                json.dump(schema_data, f, indent=2, ensure_ascii=False)
-            self.schema_cache = schema_data
-            self.last_schema_update = datetime.now()
+            with self._lock:
+                self._schema_hash = self._write_json(self.schema_file, schema_data)
+                self._schema_state = _file_state(self.schema_file)
+                self.schema_cache = schema_data
+                self.last_schema_update = datetime.now()
             logger.info(f"Schema metadata saved to {self.schema_file}")
         except Exception as e:
             logger.error(f"Error saving schema: {e}")
             raise
     
     def load_schema(self) -> Dict[str, Any]:
-        """Load schema metadata from JSON file."""
-        if self.schema_cache:
-            return self.schema_cache
+        """Load schema metadata from JSON file (re-read only when the file changed)."""
+        with self._lock:
+            state = _file_state(self.schema_file)
+            if self.schema_cache is not None and state == self._schema_state:
+                return self.schema_cache
             
-        try:
-            if os.path.exists(self.schema_file):
-                with open(self.schema_file, 'r', encoding='utf-8') as f:
-                    schema_data = json.load(f)
+            try:
+                if state is not None:
+                    schema_data, self._schema_hash = self._read_json(self.schema_file)
+                    logger.info(f"Schema metadata loaded from {self.schema_file}")
+                else:
+                    logger.warning(f"Schema file {self.schema_file} not found")
+                    schema_data, self._schema_hash = {}, _content_hash(b"{}")
                 self.schema_cache = schema_data
-                logger.info(f"Schema metadata loaded from {self.schema_file}")
+                self._schema_state = state
                 return schema_data
-            else:
-                logger.warning(f"Schema file {self.schema_file} not found")
+            except Exception as e:
+                logger.error(f"Error loading schema: {e}")
                 return {}
-        except Exception as e:
-            logger.error(f"Error loading schema: {e}")
-            return {}
     
     def create_business_dictionary_template(self) -> Dict[str, Any]:
         """Create a template business dictionary with common mappings."""
@@ -278,37 +470,68 @@ class SchemaService:
         return template
     
     def load_business_dictionary(self) -> Dict[str, Any]:
-        """Load business dictionary from JSON file."""
-        if self.business_dict_cache:
-            return self.business_dict_cache
+        """Load business dictionary from JSON file (re-read only when the file changed)."""
+        with self._lock:
+            state = _file_state(self.business_dict_file)
+            if self.business_dict_cache is not None and state == self._business_dict_state:
+                return self.business_dict_cache
             
-        try:
-            if os.path.exists(self.business_dict_file):
-                with open(self.business_dict_file, 'r', encoding='utf-8') as f:
-                    business_dict = json.load(f)
-                self.business_dict_cache = business_dict
-                logger.info(f"Business dictionary loaded from {self.business_dict_file}")
-                return business_dict
-            else:
-                # Create template if file doesn't exist
-                template = self.create_business_dictionary_template()
-                self.save_business_dictionary(template)
-                return template
-        except Exception as e:
-            logger.error(f"Error loading business dictionary: {e}")
-            return self.create_business_dictionary_template()
+            try:
+                if state is not None:
+                    business_dict, self._business_dict_hash = self._read_json(self.business_dict_file)
+                    self.business_dict_cache = business_dict
+                    self._business_dict_state = state
+                    logger.info(f"Business dictionary loaded from {self.business_dict_file}")
+                    return business_dict
+                else:
+                    # Create template if file doesn't exist
+                    template = self.create_business_dictionary_template()
+                    self.save_business_dictionary(template)
+                    return template
+            except Exception as e:
+                logger.error(f"Error loading business dictionary: {e}")
+                return self.create_business_dictionary_template()
     
     def save_business_dictionary(self, business_dict: Dict[str, Any]) -> None:
         """Save business dictionary to JSON file."""
         try:
-            with open(self.business_dict_file, 'w', encoding='utf-8') as f:
-                json.dump(business_dict, f, indent=2, ensure_ascii=False)
-            self.business_dict_cache = business_dict
+            with self._lock:
+                self._business_dict_hash = self._write_json(self.business_dict_file, business_dict)
+                self._business_dict_state = _file_state(self.business_dict_file)
+                self.business_dict_cache = business_dict
             logger.info(f"Business dictionary saved to {self.business_dict_file}")
         except Exception as e:
             logger.error(f"Error saving business dictionary: {e}")
             raise
     
+    def snapshot(self) -> SchemaSnapshot:
+        """Return the current immutable snapshot, hot-reloading files whose mtime/size changed.
+        
+        Unchanged files cost two stat() calls; the snapshot object (and its compiled
+        matcher) is reused until the content of either file changes.
+        """
+        with self._lock:
+            schema = self.load_schema()
+            business_dict = self.load_business_dictionary()
+            version = hashlib.blake2b(
+                f"{self._schema_hash}:{self._business_dict_hash}".encode(), digest_size=8
+            ).hexdigest()
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = SchemaSnapshot(
+                    version=version,
+                    schema=_freeze(schema),
+                    business_dictionary=_freeze(business_dict),
+                    matcher=TermMatcher(business_dict.get("mappings", [])),
+                    created_at=time.time()
+                )
+                logger.info(f"Schema snapshot {version} published")
+            return self._snapshot
+    
+    @property
+    def version(self) -> str:
+        """Version id of the current schema/dictionary snapshot."""
+        return self.snapshot().version
+    
     def add_business_mapping(self, mapping: BusinessMapping) -> None:
         """Add a new business mapping to the dictionary."""
         business_dict = self.load_business_dictionary()
@@ -382,10 +605,14 @@ class SchemaService:
         
         return combined
     
-    def refresh_schema(self) -> Dict[str, Any]:
-        """Extract fresh schema from Oracle and update cache."""
+    def refresh_schema(self, incremental: bool = True) -> Dict[str, Any]:
+        """Extract fresh schema from Oracle and update cache.
+        
+        With incremental=True only tables changed since the saved snapshot are re-read.
+        """
         try:
-            schema_data = self.extract_oracle_schema()
+            previous = self.load_schema() if incremental else None
+            schema_data = self.extract_oracle_schema(previous=previous or None)
             self.save_schema(schema_data)
             logger.info("Schema refreshed successfully")
             return schema_data
@@ -393,34 +620,22 @@ class SchemaService:
             logger.error(f"Error refreshing schema: {e}")
             raise
     
+    def get_term_matcher(self) -> TermMatcher:
+        """Get the compiled matcher for the current business dictionary (built once per version)."""
+        return self.snapshot().matcher
+    
+    def match_business_terms(self, query: str) -> List[TermMatch]:
+        """Return scored business-term matches (with character spans) for the query."""
+        return self.get_term_matcher().best_matches(query)
+    
     def search_business_terms(self, query: str) -> List[Dict[str, Any]]:
-        """Search business dictionary for terms matching the query."""
-        business_dict = self.load_business_dictionary()
-        query_lower = query.lower()
-        
-        matches = []
-        for mapping in business_dict.get("mappings", []):
-            business_term = mapping["business_term"].lower()
-            
-            # Check if business term is in the query (bidirectional search)
-            if business_term in query_lower or query_lower in business_term:
-                matches.append(mapping)
-                continue
-            
-            # Check synonyms
-            for synonym in mapping.get("synonyms", []):
-                synonym_lower = synonym.lower()
-                if synonym_lower in query_lower or query_lower in synonym_lower:
-                    matches.append(mapping)
-                    break
-            
-            # Check description
-            if mapping.get("description"):
-                desc_lower = mapping["description"].lower()
-                if desc_lower in query_lower or query_lower in desc_lower:
-                    matches.append(mapping)
+        """Search business dictionary for terms matching the query.
         
-        return matches
+        Terms, synonyms and descriptions match on whole words; mappings are
+        returned best match first.
+        """
+        matcher = self.get_term_matcher()
+        return [matcher.mappings[match.mapping_index] for match in matcher.best_matches(query)]
     
     def get_table_suggestions(self, business_term: str) -> List[Dict[str, Any]]:
         """Get table suggestions based on business term."""
@@ -449,3 +664,16 @@ class SchemaService:
                 })
         
         return suggestions
+
+# Process-wide schema registry shared by all sessions
+_schema_service: Optional[SchemaService] = None
+_schema_service_lock = threading.Lock()
+
+def get_schema_service() -> SchemaService:
+    """Get the shared SchemaService instance for this process."""
+    global _schema_service
+    if _schema_service is None:
+        with _schema_service_lock:
+            if _schema_service is None:
+                _schema_service = SchemaService()
+    return _schema_service
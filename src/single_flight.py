@@ -0,0 +1,328 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When several sessions ask for the same thing at the same time (the same
+question against the same data, the same SQL against the same data version),
+only the first caller does the work; the others wait on its in-flight future
+and share the result, or the exception. Nothing is kept once the call
+finishes; repeated requests are the job of the result and response caches.
+Each group counts executed and coalesced calls so the saved load is visible.
+
+Cancellable calls (a cancel_token is passed) run on their own thread or task
+under a token shared by the flight. Every caller waits on its own token: a
+caller that cancels stops waiting at once, and the shared call is only
+interrupted once every caller has cancelled.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+from .cancellation import CANCELLED, CancelToken
+
+logger = logging.getLogger(__name__)
+
+
+def flight_key(*parts: Any) -> str:
+    """Stable digest of the parts identifying a request."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _Broadcast:
+    """Deltas of one in-flight stream, replayable by every caller sharing it (loop thread only)."""
+
+    def __init__(self):
+        self.deltas: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, delta: str) -> None:
+        self.deltas.append(delta)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def replay(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            while position < len(self.deltas):
+                yield self.deltas[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class _Flight:
+    """One in-flight call: its future and, for cancellable calls, the token its waiters share."""
+
+    def __init__(self, token: Optional[CancelToken] = None):
+        self.future: Future = Future()
+        self.token = token
+        self.waiters = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one execution.
+
+    do() serves threads, ado() coroutines and stream() async text streams;
+    calls and streams keep separate in-flight tables.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Flight] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def _join(self, key: Hashable, cancellable: bool = False):
+        """Return (flight, leader) for key, registering a new call if none is in flight.
+
+        A call whose waiters have all cancelled is being interrupted, so it is
+        not joined; the caller starts a new one.
+        """
+        with self._lock:
+            flight = self._calls.get(key)
+            if flight is not None and not (flight.token is not None and flight.token.cancelled):
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._calls[key] = _Flight(CancelToken() if cancellable else None)
+                self.executed += 1
+                leader = True
+            if cancellable:
+                flight.waiters += 1
+            return flight, leader
+
+    def _leave(self, key: Hashable, flight: _Flight) -> bool:
+        """Drop one waiter; the last one to leave an unfinished call interrupts it (returns True)."""
+        with self._lock:
+            flight.waiters -= 1
+            abandoned = flight.waiters == 0 and flight.token is not None and not flight.future.done()
+            if abandoned and self._calls.get(key) is flight:
+                del self._calls[key]
+        if abandoned:
+            logger.info(f"Cancelling abandoned {self.name} call")
+            flight.token.cancel(CANCELLED)
+        return abandoned
+
+    def _settle(self, key: Hashable, flight: _Flight, result: Any = None,
+                error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if self._calls.get(key) is flight:
+                del self._calls[key]
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def _run(self, key: Hashable, flight: _Flight, fn: Callable[..., Any], args, kwargs) -> None:
+        try:
+            result = fn(*args, cancel_token=flight.token, **kwargs)
+        except BaseException as e:
+            self._settle(key, flight, error=e)
+            return
+        self._settle(key, flight, result)
+
+    async def _arun(self, key: Hashable, flight: _Flight, fn: Callable[..., Any], args, kwargs) -> None:
+        try:
+            result = await fn(*args, cancel_token=flight.token, **kwargs)
+        except BaseException as e:
+            self._settle(key, flight, error=e)
+            return
+        self._settle(key, flight, result)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args,
+           cancel_token: Optional[CancelToken] = None, **kwargs) -> Any:
+        """Run fn(*args, **kwargs), or wait for the identical call already in flight.
+
+        With cancel_token, fn runs on its own thread and receives the flight's
+        shared token as cancel_token; this caller raises QueryCancelled as
+        soon as its own token is cancelled.
+        """
+        if cancel_token is not None:
+            return self._do_cancellable(key, fn, args, kwargs, cancel_token)
+        flight, leader = self._join(key)
+        if not leader:
+            logger.info(f"Coalesced {self.name} request onto an in-flight call")
+            return flight.future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._settle(key, flight, error=e)
+            raise
+        self._settle(key, flight, result)
+        return result
+
+    def _do_cancellable(self, key: Hashable, fn: Callable[..., Any], args, kwargs,
+                        cancel_token: CancelToken) -> Any:
+        flight, leader = self._join(key, cancellable=True)
+        if leader:
+            threading.Thread(target=self._run, args=(key, flight, fn, args, kwargs),
+                             name=f"single-flight-{self.name}", daemon=True).start()
+        else:
+            logger.info(f"Coalesced {self.name} request onto an in-flight call")
+        wake = threading.Event()
+        flight.future.add_done_callback(lambda _: wake.set())
+        try:
+            with cancel_token.on_cancel(wake.set):
+                wake.wait()
+        except BaseException:
+            self._leave(key, flight)
+            raise
+        if flight.future.done():
+            self._leave(key, flight)
+        elif not self._leave(key, flight):
+            raise cancel_token.error(self.name)
+        # Done, or interrupted because this was its last waiter: let the call unwind
+        return flight.future.result()
+
+    async def ado(self, key: Hashable, fn: Callable[..., Any], *args,
+                  cancel_token: Optional[CancelToken] = None, **kwargs) -> Any:
+        """Async do(): await fn(*args, **kwargs) or the identical call in flight (from any thread).
+
+        With cancel_token, fn runs as its own task on this loop and receives
+        the flight's shared token; cancellation works as in do().
+        """
+        if cancel_token is not None:
+            return await self._ado_cancellable(key, fn, args, kwargs, cancel_token)
+        flight, leader = self._join(key)
+        if not leader:
+            logger.info(f"Coalesced {self.name} request onto an in-flight call")
+            return await asyncio.wrap_future(flight.future)
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._settle(key, flight, error=e)
+            raise
+        self._settle(key, flight, result)
+        return result
+
+    async def _ado_cancellable(self, key: Hashable, fn: Callable[..., Any], args, kwargs,
+                               cancel_token: CancelToken) -> Any:
+        loop = asyncio.get_running_loop()
+        flight, leader = self._join(key, cancellable=True)
+        if leader:
+            flight.task = loop.create_task(self._arun(key, flight, fn, args, kwargs))
+        else:
+            logger.info(f"Coalesced {self.name} request onto an in-flight call")
+        wake = asyncio.Event()
+
+        def notify(*_):
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # the waiter's loop is gone; it no longer needs waking
+
+        flight.future.add_done_callback(notify)
+        try:
+            with cancel_token.on_cancel(notify):
+                await wake.wait()
+        except BaseException:
+            self._leave(key, flight)
+            raise
+        if flight.future.done():
+            self._leave(key, flight)
+        elif not self._leave(key, flight):
+            raise cancel_token.error(self.name)
+        # Done, or interrupted because this was its last waiter: let the call unwind
+        return await asyncio.shield(asyncio.wrap_future(flight.future))
+
+    async def _pump(self, key: Hashable, deltas: AsyncIterator[str], broadcast: _Broadcast) -> None:
+        error = None
+        try:
+            async for delta in deltas:
+                broadcast.publish(delta)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            broadcast.finish(error)
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Stream factory()'s deltas, sharing one upstream stream among identical concurrent callers.
+
+        The upstream runs as its own task, so a caller that stops reading
+        early does not cut the stream short for the others; once the last
+        reader has gone, the upstream is cancelled. Callers must share one
+        event loop.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                broadcast = self._streams[key] = _Broadcast()
+                self.executed += 1
+                leader = True
+            broadcast.readers += 1
+        if leader:
+            broadcast.task = asyncio.get_running_loop().create_task(self._pump(key, factory(), broadcast))
+        else:
+            logger.info(f"Coalesced {self.name} stream onto an in-flight call")
+        try:
+            async for delta in broadcast.replay():
+                yield delta
+        finally:
+            with self._lock:
+                broadcast.readers -= 1
+                abandoned = broadcast.readers == 0 and not broadcast.done
+                if abandoned and self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            if abandoned:
+                logger.info(f"Cancelling abandoned {self.name} stream")
+                broadcast.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls) + len(self._streams)
+            requests = self.executed + self.coalesced
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": in_flight,
+                "coalesced_rate": self.coalesced / requests if requests else 0.0,
+            }
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Process-wide coalescing group ('llm', 'duckdb', 'oracle')."""
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight(name)
+        return group
+
+
+def coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters of every group used so far."""
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
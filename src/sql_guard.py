@@ -0,0 +1,372 @@
+"""
+Pre-execution guard for generated SQL.
+
+Every query the chat is about to run passes SQLGuard first. The statement
+must be a single read-only query (SELECT/WITH, no DML, DDL, session or
+file-access statements). Its plan is then estimated without running it:
+`EXPLAIN (FORMAT JSON)` on the session's DuckDB cursor, or `EXPLAIN PLAN`
+into PLAN_TABLE on Oracle. Queries whose plan exceeds the peak-row or cost
+thresholds (a cartesian join over production tables, say) are refused;
+queries expected to return more than the row limit are rewritten with
+`LIMIT n` / `FETCH FIRST n ROWS ONLY`. The GuardDecision, with a one-line
+plan summary, is handed back to the UI.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.config import oracle_config, sql_guard_config, SQLGuardConfig
+from .single_flight import flight_key
+from .sql_utils import normalize_sql, split_statements, sql_keywords, strip_comments, strip_literals
+
+logger = logging.getLogger(__name__)
+
+ALLOW, LIMIT, REJECT = "allow", "limit", "reject"
+
+_READ_STATEMENTS = {"SELECT", "WITH"}
+_WRITE_KEYWORDS = {
+    "INSERT", "UPDATE", "DELETE", "MERGE", "UPSERT", "CREATE", "DROP", "ALTER", "TRUNCATE", "RENAME",
+    "GRANT", "REVOKE", "COMMIT", "ROLLBACK", "SAVEPOINT", "CALL", "EXEC", "EXECUTE", "BEGIN", "DECLARE",
+    "LOCK", "COPY", "ATTACH", "DETACH", "PRAGMA", "INSTALL", "LOAD", "EXPORT", "IMPORT", "CHECKPOINT",
+    "VACUUM",
+}
+# DuckDB table functions that read the server's files
+_FILE_FUNCTIONS = {
+    "READ_CSV", "READ_CSV_AUTO", "READ_PARQUET", "PARQUET_SCAN", "READ_JSON", "READ_JSON_AUTO",
+    "READ_NDJSON", "READ_TEXT", "READ_BLOB", "GLOB", "SNIFF_CSV",
+}
+# DuckDB scans a file named by a string (or path-like quoted name) in table position
+_FILE_REFERENCE = re.compile(r"""\b(?:FROM|JOIN)\s*\(?\s*('|"[^"]*[./\\][^"]*")""", re.IGNORECASE)
+# Oracle packages with side effects (network, files, jobs)
+_ORACLE_PACKAGE_PREFIXES = ("DBMS_", "UTL_")
+_CARTESIAN_OPERATORS = ("CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN", "CARTESIAN")
+
+_LIMIT_TAIL = re.compile(r"\bLIMIT\s+(\d+)(\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE)
+_FETCH_TAIL = re.compile(r"\bFETCH\s+(?:FIRST|NEXT)\s+(\d+)\s+ROWS?\s+(?:ONLY|WITH\s+TIES)\s*$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class GuardDecision:
+    """What the guard decided for a statement, and the plan estimates behind it."""
+    action: str
+    sql: str
+    dialect: str
+    reason: str = ""
+    estimated_rows: Optional[float] = None
+    peak_rows: Optional[float] = None
+    estimated_cost: Optional[float] = None
+    operators: Tuple[str, ...] = ()
+    explained: bool = False
+
+    @property
+    def allowed(self) -> bool:
+        return self.action != REJECT
+
+    def summary(self) -> str:
+        """One line for the UI: the decision, its reason and the plan estimates."""
+        parts = {ALLOW: ["Allowed"], LIMIT: ["Row limit added"], REJECT: ["Refused"]}[self.action]
+        if self.reason:
+            parts.append(self.reason)
+        if self.explained:
+            plan = []
+            if self.estimated_rows is not None:
+                plan.append(f"~{self.estimated_rows:,.0f} rows")
+            if self.peak_rows is not None and self.peak_rows != self.estimated_rows:
+                plan.append(f"peak ~{self.peak_rows:,.0f} rows")
+            if self.estimated_cost is not None:
+                plan.append(f"cost {self.estimated_cost:,.0f}")
+            if self.operators:
+                plan.append(", ".join(self.operators))
+            if plan:
+                parts.append("plan: " + " · ".join(plan))
+        return " — ".join(parts)
+
+
+def check_read_only(sql: str, dialect: str) -> Optional[str]:
+    """Reason the statement is not a single read-only query, or None if it is."""
+    statements = split_statements(sql)
+    if len(statements) != 1:
+        return "only a single statement can be run" if statements else "the statement is empty"
+    keywords = sql_keywords(statements[0])
+    if not keywords or keywords[0] not in _READ_STATEMENTS:
+        return f"only SELECT queries can be run (got {keywords[0] if keywords else 'nothing'})"
+    writes = sorted(_WRITE_KEYWORDS.intersection(keywords))
+    if writes:
+        return f"the statement is not read-only ({', '.join(writes)})"
+    if dialect == "duckdb":
+        files = sorted(_FILE_FUNCTIONS.intersection(keywords))
+        if files:
+            return f"reading files is not allowed ({', '.join(name.lower() for name in files)})"
+        if _FILE_REFERENCE.search(strip_literals(statements[0])):
+            return "reading files is not allowed (file path used as a table)"
+    else:
+        packages = sorted({word for word in keywords if word.startswith(_ORACLE_PACKAGE_PREFIXES)})
+        if packages:
+            return f"calls to {', '.join(packages)} are not allowed"
+    return None
+
+
+def apply_row_limit(sql: str, dialect: str, limit: int) -> Tuple[str, bool]:
+    """Cap a statement's result at limit rows; returns (sql, changed).
+
+    An existing top-level LIMIT / FETCH FIRST is kept when it is already
+    within the limit and lowered otherwise; without one, LIMIT n (DuckDB) or
+    FETCH FIRST n ROWS ONLY (Oracle) is appended.
+    """
+    statement = strip_comments(sql).rstrip().rstrip(";").rstrip()
+    tail = _LIMIT_TAIL.search(statement) or _FETCH_TAIL.search(statement)
+    if tail is not None:
+        if int(tail.group(1)) <= limit:
+            return statement, False
+        return statement[:tail.start(1)] + str(limit) + statement[tail.end(1):], True
+    if dialect == "oracle":
+        return f"{statement}\nFETCH FIRST {limit} ROWS ONLY", True
+    return f"{statement}\nLIMIT {limit}", True
+
+
+def summarize_duckdb_plan(plan: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Output rows, peak rows and notable operators of a DuckDB JSON plan.
+
+    Operators without an estimate (DuckDB leaves some, such as CROSS_PRODUCT,
+    blank) are estimated from their children: the product for cartesian
+    operators, the largest child otherwise.
+    """
+    peak: List[float] = []
+    operators: List[str] = []
+
+    def visit(node: Dict[str, Any]) -> Optional[float]:
+        name = str(node.get("name", ""))
+        cartesian = name.startswith(_CARTESIAN_OPERATORS)
+        if cartesian and name not in operators:
+            operators.append(name)
+        children = [visit(child) for child in node.get("children") or []]
+        known = [rows for rows in children if rows is not None]
+        estimate = (node.get("extra_info") or {}).get("Estimated Cardinality")
+        rows = None
+        if estimate is not None:
+            try:
+                rows = float(str(estimate).replace(",", ""))
+            except ValueError:
+                pass
+        if rows is None and known:
+            rows = max(known)
+            if cartesian:
+                rows = 1.0
+                for child_rows in known:
+                    rows *= child_rows
+        if rows is not None:
+            peak.append(rows)
+        return rows
+
+    estimates = [visit(root) for root in plan]
+    rows = next((estimate for estimate in estimates if estimate is not None), None)
+    return {"rows": rows, "peak": max(peak) if peak else None, "cost": None, "operators": tuple(operators)}
+
+
+def summarize_oracle_plan(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Output rows and cost (plan root), peak cardinality and cartesian steps of PLAN_TABLE rows."""
+    if not rows:
+        return {"rows": None, "peak": None, "cost": None, "operators": ()}
+    root = next((row for row in rows if row.get("id") == 0), rows[0])
+    cardinalities = [float(row["cardinality"]) for row in rows if row.get("cardinality") is not None]
+    operators = []
+    for row in rows:
+        step = " ".join(part for part in (row.get("operation"), row.get("options")) if part)
+        if "CARTESIAN" in step.upper() and step not in operators:
+            operators.append(step)
+    return {
+        "rows": float(root["cardinality"]) if root.get("cardinality") is not None else None,
+        "peak": max(cardinalities) if cardinalities else None,
+        "cost": float(root["cost"]) if root.get("cost") is not None else None,
+        "operators": tuple(operators),
+    }
+
+
+class SQLGuard:
+    """Read-only check, plan estimate and row limit for statements about to run.
+
+    Decisions are cached briefly per data version and normalized statement,
+    so re-running a question does not EXPLAIN it again.
+    """
+
+    def __init__(self, config: SQLGuardConfig = sql_guard_config):
+        self.config = config
+        self._decisions: "OrderedDict[str, Tuple[float, GuardDecision]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.allowed = 0
+        self.limited = 0
+        self.rejected = 0
+        self.explains = 0
+        self.explain_failures = 0
+        self._explain_seconds = 0.0
+
+    def _cached(self, key: Optional[str]) -> Optional[GuardDecision]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._decisions.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.config.cache_seconds:
+                return None
+            self._decisions.move_to_end(key)
+            return entry[1]
+
+    def _remember(self, key: Optional[str], decision: GuardDecision) -> GuardDecision:
+        with self._lock:
+            self.checked += 1
+            if decision.action == REJECT:
+                self.rejected += 1
+            elif decision.action == LIMIT:
+                self.limited += 1
+            else:
+                self.allowed += 1
+            if key is not None:
+                self._decisions[key] = (time.monotonic(), decision)
+                while len(self._decisions) > self.config.cache_entries:
+                    self._decisions.popitem(last=False)
+        if decision.action != ALLOW:
+            logger.warning(f"SQL guard ({decision.dialect}): {decision.summary()}")
+        return decision
+
+    def precheck(self, sql: str, dialect: str) -> Optional[GuardDecision]:
+        """Decision reached without a plan: a refusal of non read-only SQL, else None."""
+        reason = check_read_only(sql, dialect)
+        if reason is not None:
+            return GuardDecision(REJECT, sql, dialect, reason=reason)
+        return None
+
+    def decide(self, sql: str, dialect: str, plan: Optional[Dict[str, Any]]) -> GuardDecision:
+        """Apply the thresholds to a plan summary (None when no plan could be had)."""
+        if plan is None:
+            return GuardDecision(ALLOW, sql, dialect, reason="plan unavailable")
+        estimates = dict(estimated_rows=plan["rows"], peak_rows=plan["peak"], estimated_cost=plan["cost"],
+                         operators=plan["operators"], explained=True)
+        config = self.config
+        if config.max_peak_rows and plan["peak"] is not None and plan["peak"] > config.max_peak_rows:
+            return GuardDecision(REJECT, sql, dialect, reason=(
+                f"the plan processes ~{plan['peak']:,.0f} rows at its peak "
+                f"(limit {config.max_peak_rows:,}); add filters or join conditions"), **estimates)
+        if config.max_cost and plan["cost"] is not None and plan["cost"] > config.max_cost:
+            return GuardDecision(REJECT, sql, dialect, reason=(
+                f"estimated cost {plan['cost']:,.0f} is over the limit of {config.max_cost:,}"), **estimates)
+        if config.row_limit and plan["rows"] is not None and plan["rows"] > config.row_limit:
+            limited_sql, changed = apply_row_limit(sql, dialect, config.row_limit)
+            if changed:
+                return GuardDecision(LIMIT, limited_sql, dialect, reason=(
+                    f"~{plan['rows']:,.0f} estimated rows, capped at {config.row_limit:,}"), **estimates)
+        return GuardDecision(ALLOW, sql, dialect, **estimates)
+
+    def _record_explain(self, start_time: float, error: Optional[Exception]) -> None:
+        with self._lock:
+            self.explains += 1
+            self._explain_seconds += time.perf_counter() - start_time
+            if error is not None:
+                self.explain_failures += 1
+        if error is not None:
+            logger.warning(f"SQL guard could not explain the statement: {error}")
+
+    def _explained(self, summarize, explain, *args) -> Optional[Dict[str, Any]]:
+        start_time = time.perf_counter()
+        try:
+            plan = summarize(explain(*args))
+        except Exception as e:
+            self._record_explain(start_time, e)
+            return None
+        self._record_explain(start_time, None)
+        return plan
+
+    def check_duckdb(self, sql: str, dataframe, session_id: Optional[str] = None) -> GuardDecision:
+        """Guard a query against the session's `df` (the rate deck or an earlier result)."""
+        from .duckdb_engine import get_duckdb_engine
+        engine = get_duckdb_engine()
+        refused = self.precheck(sql, "duckdb")
+        if refused is not None:
+            return self._remember(None, refused)
+        version = engine.frame_version(dataframe)
+        key = flight_key("duckdb", version, normalize_sql(sql)) if version is not None else None
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        plan = None
+        if self.config.explain:
+            plan = self._explained(summarize_duckdb_plan, engine.explain, sql, dataframe, session_id)
+        return self._remember(key, self.decide(sql, "duckdb", plan))
+
+    def _oracle_key(self, sql: str) -> str:
+        return flight_key("oracle", oracle_config.user, oracle_config.dsn, normalize_sql(sql))
+
+    def check_oracle(self, sql: str) -> GuardDecision:
+        """Guard an Oracle query using EXPLAIN PLAN."""
+        from .database_tools import get_db_manager
+        refused = self.precheck(sql, "oracle")
+        if refused is not None:
+            return self._remember(None, refused)
+        key = self._oracle_key(sql)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        plan = None
+        if self.config.explain:
+            plan = self._explained(summarize_oracle_plan, get_db_manager().explain_plan, sql)
+        return self._remember(key, self.decide(sql, "oracle", plan))
+
+    def check_without_plan(self, sql: str, dialect: str, reason: str) -> GuardDecision:
+        """Read-only check only, for queries no single EXPLAIN describes (federated joins)."""
+        refused = self.precheck(sql, dialect)
+        return self._remember(None, refused or GuardDecision(ALLOW, sql, dialect, reason=reason))
+
+    def check_replica(self, sql: str) -> GuardDecision:
+        """Read-only check for Oracle SQL served by the local replica, which runs it on DuckDB."""
+        refused = self.precheck(sql, "oracle") or self.precheck(sql, "duckdb")
+        return self._remember(None, refused or GuardDecision(ALLOW, sql, "oracle", reason="local replica"))
+
+    async def acheck_oracle(self, sql: str) -> GuardDecision:
+        """check_oracle through oracledb's asyncio API."""
+        from .database_tools import get_db_manager
+        refused = self.precheck(sql, "oracle")
+        if refused is not None:
+            return self._remember(None, refused)
+        key = self._oracle_key(sql)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        plan = None
+        if self.config.explain:
+            start_time = time.perf_counter()
+            try:
+                plan = summarize_oracle_plan(await get_db_manager().explain_plan_async(sql))
+            except Exception as e:
+                self._record_explain(start_time, e)
+            else:
+                self._record_explain(start_time, None)
+        return self._remember(key, self.decide(sql, "oracle", plan))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "allowed": self.allowed,
+                "limited": self.limited,
+                "rejected": self.rejected,
+                "explain_failures": self.explain_failures,
+                "avg_explain_ms": self._explain_seconds / self.explains * 1000 if self.explains else 0.0,
+            }
+
+
+_guard: Optional[SQLGuard] = None
+_guard_lock = threading.Lock()
+
+
+def get_sql_guard() -> Optional[SQLGuard]:
+    """Process-wide SQL guard (None when SQL_GUARD is off)."""
+    global _guard
+    if _guard is None and sql_guard_config.enabled:
+        with _guard_lock:
+            if _guard is None:
+                _guard = SQLGuard()
+    return _guard
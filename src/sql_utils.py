@@ -0,0 +1,189 @@
+"""
+Lightweight SQL text helpers shared by the caches and query routing.
+
+These are lexical helpers, not a full parser: they understand string
+literals, quoted identifiers and comments well enough to normalize
+statements and find the tables they read from.
+"""
+
+import re
+from typing import Dict, List
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<space>\s+)
+  | (?P<other>[^\s'"/-]+|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_TABLE_PATTERN = re.compile(
+    r'\b(?:FROM|JOIN)\s+((?:"[^"]+"|[A-Za-z_][\w$#]*)(?:\s*\.\s*(?:"[^"]+"|[A-Za-z_][\w$#]*))?)',
+    re.IGNORECASE,
+)
+_NAME = r'(?:"[^"]+"|[A-Za-z_][\w$#]*)(?:\s*\.\s*(?:"[^"]+"|[A-Za-z_][\w$#]*))?'
+_FROM_ITEM_PATTERN = re.compile(r"\s*(" + _NAME + ")")
+_FROM_TOKEN_PATTERN = re.compile(r'"[^"]*"|[A-Za-z_][\w$#]*|\S')
+# Keywords that end a FROM clause
+_FROM_END = {
+    "WHERE", "GROUP", "HAVING", "ORDER", "UNION", "INTERSECT", "MINUS", "EXCEPT", "FETCH", "LIMIT",
+    "OFFSET", "CONNECT", "START", "WINDOW", "QUALIFY", "FOR", "MODEL", "SELECT",
+}
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical form of a statement for cache keys.
+
+    Comments are dropped, whitespace runs collapse to one space, unquoted text
+    is lowercased and trailing semicolons are removed. String literals and
+    quoted identifiers are kept verbatim.
+    """
+    parts = []
+    for match in _TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        text = match.group()
+        if kind in ("comment", "space"):
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        elif kind in ("string", "quoted"):
+            parts.append(text)
+        else:
+            parts.append(text.lower())
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+
+def strip_literals(sql: str) -> str:
+    """Replace comments and string literals with blanks, keeping identifiers."""
+    parts = []
+    for match in _TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind == "comment":
+            parts.append(" ")
+        elif kind == "string":
+            parts.append("''")
+        else:
+            parts.append(match.group())
+    return "".join(parts)
+
+
+def strip_comments(sql: str) -> str:
+    """Remove comments (each becomes one space), keeping literals and identifiers."""
+    return "".join(" " if match.lastgroup == "comment" else match.group()
+                   for match in _TOKEN_PATTERN.finditer(sql)).strip()
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split on semicolons outside literals and comments; empty statements are dropped."""
+    statements, current = [], []
+    for match in _TOKEN_PATTERN.finditer(sql):
+        if match.lastgroup == "other":
+            pieces = match.group().split(";")
+            for piece in pieces[:-1]:
+                statements.append("".join(current) + piece)
+                current = []
+            current.append(pieces[-1])
+        elif match.lastgroup != "comment":
+            current.append(match.group())
+    statements.append("".join(current))
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def sql_keywords(sql: str) -> List[str]:
+    """Upper-cased bare words of a statement, outside literals, quoted identifiers and comments."""
+    words = []
+    for match in _TOKEN_PATTERN.finditer(sql):
+        if match.lastgroup == "other":
+            words.extend(word.upper() for word in re.findall(r"[A-Za-z_][\w$#]*", match.group()))
+    return words
+
+
+def replace_words(sql: str, replacements: Dict[str, str]) -> str:
+    """Replace bare words (matched case-insensitively by their upper-cased form) outside literals and comments."""
+    parts = []
+    for match in _TOKEN_PATTERN.finditer(sql):
+        text = match.group()
+        if match.lastgroup == "other":
+            text = re.sub(r"[A-Za-z_][\w$#]*", lambda word: replacements.get(word.group().upper(), word.group()), text)
+        parts.append(text)
+    return "".join(parts)
+
+
+def _comma_joined(text: str, start: int) -> List[str]:
+    """Names after the top-level commas of the FROM clause that continues at start."""
+    names, depth = [], 0
+    for token in _FROM_TOKEN_PATTERN.finditer(text, start):
+        value = token.group()
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+            if depth < 0:
+                break
+        elif depth == 0 and (value == ";" or value.upper() in _FROM_END):
+            break
+        elif depth == 0 and value == ",":
+            item = _FROM_ITEM_PATTERN.match(text, token.end())
+            if item is not None:
+                names.append(item.group(1))
+    return names
+
+
+def referenced_tables(sql: str) -> List[str]:
+    """Return the upper-cased table names a statement reads from.
+
+    These are the FROM/JOIN targets, including every item of a comma-separated
+    FROM list. Schema-qualified names are returned as SCHEMA.TABLE; quoted names
+    keep their case. Subqueries are skipped; a table function counts under its name.
+    """
+    text = strip_literals(sql)
+    tables = []
+    for match in _TABLE_PATTERN.finditer(text):
+        found = [match.group(1)]
+        if match.group().upper().startswith("FROM"):
+            found += _comma_joined(text, match.end())
+        for target in found:
+            parts = [part.strip() for part in target.split(".")]
+            name = ".".join(part[1:-1] if part.startswith('"') else part.upper() for part in parts)
+            if name not in tables:
+                tables.append(name)
+    return tables
+
+
+_SQL_FENCE_OPEN = re.compile(r"```sql[ \t]*\r?\n?", re.IGNORECASE)
+
+
+class SQLBlockExtractor:
+    """Finds the first complete ```sql block in text that arrives in pieces.
+
+    feed() is called with each streamed delta and returns the SQL (trailing
+    semicolons stripped) as soon as the block's closing fence has arrived;
+    only the unseen tail of the buffer is scanned on each call.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._scan_from = 0
+        self._body_start = None
+        self.sql = None
+
+    def feed(self, delta: str):
+        """Add a delta; returns the SQL the first time a block completes, else None."""
+        if self.sql is not None or not delta:
+            return None
+        self._buffer += delta
+        if self._body_start is None:
+            match = _SQL_FENCE_OPEN.search(self._buffer, self._scan_from)
+            if match is None:
+                # The opening fence may still be arriving: rescan its possible prefix next time
+                self._scan_from = max(0, len(self._buffer) - len("```sql\r\n"))
+                return None
+            self._body_start = self._scan_from = match.end()
+        end = self._buffer.find("```", self._scan_from)
+        if end == -1:
+            self._scan_from = max(self._body_start, len(self._buffer) - 2)
+            return None
+        self.sql = self._buffer[self._body_start:end].strip().rstrip(";").rstrip() or None
+        return self.sql
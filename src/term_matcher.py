@@ -0,0 +1,119 @@
+"""
+Compiled business-term matcher for routing chat questions.
+
+Business terms, synonyms and descriptions from the business dictionary are
+compiled once into a token trie. Matching walks the question's tokens in a
+single left-to-right pass and reports the longest phrase starting at each
+position, so cost depends on the question length rather than on the number
+of mappings, and phrases only match on whole words ("carrier" no longer
+matches inside "multicarrier"). Phrase and question tokens get the same
+plural folding, so "agreements" still matches "agreement".
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+
+# Relative weight of the phrase that matched
+KIND_WEIGHTS = {"term": 1.0, "synonym": 0.9, "description": 0.6}
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Split text into lower-cased word tokens with their character spans."""
+    return [(m.group().lower(), m.start(), m.end()) for m in _TOKEN_PATTERN.finditer(text)]
+
+
+def stem(token: str) -> str:
+    """Crude plural folding so 'agreements' matches 'agreement'."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+@dataclass(frozen=True)
+class TermMatch:
+    """A dictionary phrase found in a question."""
+    mapping_index: int
+    business_term: str
+    phrase: str
+    kind: str
+    start: int
+    end: int
+    score: float
+
+
+class TermMatcher:
+    """Token trie over all business terms, synonyms and descriptions."""
+
+    _TERMINAL = ""
+
+    def __init__(self, mappings: List[Dict[str, Any]], include_descriptions: bool = True):
+        self.mappings = list(mappings)
+        self._root: Dict[str, Any] = {}
+        self.phrase_count = 0
+        for index, mapping in enumerate(self.mappings):
+            self._add(mapping.get("business_term", ""), index, "term")
+            for synonym in mapping.get("synonyms") or []:
+                self._add(synonym, index, "synonym")
+            if include_descriptions and mapping.get("description"):
+                self._add(mapping["description"], index, "description")
+
+    def _add(self, phrase: str, mapping_index: int, kind: str) -> None:
+        tokens = [stem(token) for token, _, _ in tokenize(phrase)]
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        payloads = node.setdefault(self._TERMINAL, {})
+        # Keep the strongest kind when the same phrase is listed twice for a mapping
+        previous = payloads.get(mapping_index)
+        if previous is None or KIND_WEIGHTS[kind] > KIND_WEIGHTS[previous[0]]:
+            payloads[mapping_index] = (kind, phrase.lower())
+        self.phrase_count += 1
+
+    def find(self, query: str) -> List[TermMatch]:
+        """Return leftmost-longest phrase matches in order of appearance."""
+        tokens = [(stem(token), start, end) for token, start, end in tokenize(query)]
+        matches: List[TermMatch] = []
+        i = 0
+        while i < len(tokens):
+            node = self._root
+            best_end: Optional[int] = None
+            best_payloads = None
+            j = i
+            while j < len(tokens):
+                node = node.get(tokens[j][0])
+                if node is None:
+                    break
+                j += 1
+                if self._TERMINAL in node:
+                    best_end, best_payloads = j, node[self._TERMINAL]
+            if best_end is None:
+                i += 1
+                continue
+            start, end = tokens[i][1], tokens[best_end - 1][2]
+            for mapping_index, (kind, phrase) in best_payloads.items():
+                mapping = self.mappings[mapping_index]
+                matches.append(TermMatch(
+                    mapping_index=mapping_index,
+                    business_term=mapping.get("business_term", ""),
+                    phrase=phrase,
+                    kind=kind,
+                    start=start,
+                    end=end,
+                    score=KIND_WEIGHTS[kind] * float(mapping.get("confidence", 1.0)),
+                ))
+            i = best_end
+        return matches
+
+    def best_matches(self, query: str) -> List[TermMatch]:
+        """Best match per mapping, highest score first (ties keep question order)."""
+        best: Dict[int, TermMatch] = {}
+        for match in self.find(query):
+            current = best.get(match.mapping_index)
+            if current is None or match.score > current.score:
+                best[match.mapping_index] = match
+        return sorted(best.values(), key=lambda m: (-m.score, m.start))
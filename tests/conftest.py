@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Install a FakeProvider as the active LLM: fake_llm(responder, chunk_size=..., delay=...).
+
+    The response cache and few-shot store are switched off and the pipeline
+    limiters reset; the provider is removed again after the test.
+    """
+    import src.async_pipeline as async_pipeline
+    import src.example_store as example_store
+    import src.llm_providers as llm_providers
+    import src.response_cache as response_cache
+
+    monkeypatch.setattr(response_cache, "get_response_cache", lambda: None)
+    monkeypatch.setattr(example_store, "get_example_store", lambda: None)
+    monkeypatch.setattr(async_pipeline, "_limiters", {})
+
+    def install(responder=None, chunk_size=16, delay=0.0):
+        provider = llm_providers.FakeProvider(responder=responder, chunk_size=chunk_size, delay=delay)
+        llm_providers.set_llm_provider(provider)
+        return provider
+
+    yield install
+    llm_providers.set_llm_provider(None)
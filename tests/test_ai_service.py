@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.ai_service as ai_service
+
+
+@pytest.fixture
+def count_llm(fake_llm):
+    return fake_llm(lambda messages: "Counting rows.\n```sql\nSELECT COUNT(*) AS n FROM df;\n```\nDone.")
+
+
+def test_local_question_runs_generated_sql(count_llm):
+    frame = pd.DataFrame({"Rate": [0.1, 0.2, 0.3]})
+    ai_response, sql_query, result, source = ai_service.enhanced_query_handler("count rows", frame)
+
+    assert source == "local"
+    assert sql_query == "SELECT COUNT(*) AS n FROM df"
+    assert result["n"].tolist() == [3]
+    assert "Counting rows." in ai_response
+    assert count_llm.calls[0][0]["role"] == "system"
+    assert ai_service.current_model_id() == "fake:fake"
+
+
+def test_streamed_response_uses_provider(count_llm):
+    deltas = list(ai_service.get_ai_response([{"role": "user", "content": "hi"}]))
+    assert len(deltas) > 1
+    assert "".join(deltas).startswith("Counting rows.")
+
+
+def test_query_starts_before_stream_finishes(fake_llm, monkeypatch):
+    streamed = []
+    started_after = []
+    fake_llm(lambda messages: "```sql\nSELECT 1 AS x\n```\n" + "More explanation. " * 20, chunk_size=8)
+
+    def fake_execute(sql, dataframe, session_id=None, cancel_token=None):
+        started_after.append(len("".join(streamed)))
+        return pd.DataFrame({"x": [1]})
+
+    monkeypatch.setattr(ai_service, "execute_sql_query", fake_execute)
+    answer = ai_service.stream_query_handler("give me one", pd.DataFrame({"a": [1]}))
+    for delta in answer:
+        streamed.append(delta)
+        if answer.query_started:
+            answer.wait_query()
+    ai_response, sql_query, result, source = answer.result()
+
+    assert sql_query == "SELECT 1 AS x"
+    assert result["x"].tolist() == [1]
+    assert ai_response == "".join(streamed)
+    # The query ran while most of the prose was still to come
+    assert started_after[0] < len(ai_response) / 4
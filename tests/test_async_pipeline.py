@@ -0,0 +1,142 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.ai_service as ai_service
+import src.async_pipeline as async_pipeline
+import src.response_cache as response_cache
+from src.cancellation import interruption_stats
+
+
+@pytest.fixture
+def slow_llm(fake_llm):
+    return fake_llm(lambda messages: "Counting rows.\n```sql\nSELECT COUNT(*) AS n FROM df\n```\nDone.",
+                    chunk_size=8, delay=0.02)
+
+
+def test_sessions_share_the_loop_concurrently(slow_llm):
+    frame = pd.DataFrame({"Rate": [0.1, 0.2, 0.3]})
+
+    async def ask(i):
+        answer = await async_pipeline.answer_question_async(f"count rows {i}", frame, session_id=f"s{i}")
+        return await answer.result()
+
+    async def ask_all():
+        return await asyncio.gather(*(ask(i) for i in range(6)))
+
+    single_start = time.perf_counter()
+    async_pipeline.run_sync(ask(99))
+    single = time.perf_counter() - single_start
+
+    start = time.perf_counter()
+    results = async_pipeline.run_sync(ask_all())
+    elapsed = time.perf_counter() - start
+
+    assert [r[2]["n"].tolist() for r in results] == [[3]] * 6
+    assert all(r[3] == "local" for r in results)
+    # Six streamed answers overlap instead of running back to back
+    assert elapsed < single * 4
+    assert async_pipeline.pipeline_stats()["llm:fake"]["peak_active"] > 1
+
+
+def test_limiter_caps_in_flight_calls(slow_llm, monkeypatch):
+    monkeypatch.setattr(async_pipeline.pipeline_config, "llm_concurrency", 2)
+    frame = pd.DataFrame({"Rate": [0.1]})
+
+    async def ask_all():
+        answers = [await async_pipeline.answer_question_async(f"count rows {i}", frame) for i in range(5)]
+        return await asyncio.gather(*(answer.result() for answer in answers))
+
+    async_pipeline.run_sync(ask_all())
+    stats = async_pipeline.pipeline_stats()["llm:fake"]
+    assert stats["limit"] == 2
+    assert stats["peak_active"] == 2
+    assert stats["completed"] == 5
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+def test_sync_wrapper_streams_from_another_thread(slow_llm):
+    answer = ai_service.stream_query_handler("count rows", pd.DataFrame({"Rate": [1, 2]}))
+    deltas = list(answer)
+
+    assert len(deltas) > 1
+    assert answer.text == "".join(deltas)
+    ai_response, sql_query, result, source = answer.result()
+    assert sql_query == "SELECT COUNT(*) AS n FROM df"
+    assert result["n"].tolist() == [2]
+
+
+def test_provider_errors_become_the_answer(fake_llm):
+    def fail(messages):
+        raise RuntimeError("quota exceeded")
+
+    fake_llm(fail)
+    ai_response, sql_query, result, source = ai_service.enhanced_query_handler("count rows", pd.DataFrame({"a": [1]}))
+
+    assert ai_response == "Error getting AI response: quota exceeded"
+    assert sql_query is None and result is None
+
+
+def test_cancel_stops_the_stream(fake_llm):
+    fake_llm(lambda messages: "word " * 200, chunk_size=5, delay=0.05)
+    before = interruption_stats.summary().get("llm", {}).get("cancelled", 0)
+    answer = ai_service.stream_query_handler("tell me a story", pd.DataFrame({"a": [1]}))
+    start = time.perf_counter()
+    deltas = []
+    for delta in answer:
+        deltas.append(delta)
+        if len(deltas) == 3:
+            threading.Timer(0.01, answer.cancel).start()
+    ai_response, sql_query, result, source = answer.result()
+
+    assert time.perf_counter() - start < 2
+    assert ai_response.endswith("⏹ Cancelled.")
+    assert sql_query is None
+    assert interruption_stats.summary()["llm"]["cancelled"] == before + 1
+
+
+def test_cancel_interrupts_running_query(fake_llm, monkeypatch):
+    fake_llm(lambda messages: "```sql\nSELECT count(*) FROM df x, df y, df z WHERE x.a + y.a + z.a = -1\n```")
+    monkeypatch.setattr(async_pipeline, "get_sql_guard", lambda: None)
+    answer = ai_service.stream_query_handler("cross join", pd.DataFrame({"a": range(100000)}))
+    list(answer)
+    assert not answer.wait_query(timeout=0.2)
+    assert answer.cancel()
+    assert answer.wait_query(timeout=3)
+    ai_response, sql_query, result, source = answer.result()
+
+    assert result == "Query cancelled"
+    assert not answer.cancel()
+
+
+def test_answers_are_cached_only_after_their_sql_works(fake_llm, monkeypatch, tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path / "responses.sqlite"), ttl=3600, max_bytes=1 << 20)
+    replies = {"broken": "```sql\nSELECT missing_column FROM df\n```", "count": "```sql\nSELECT COUNT(*) AS n FROM df\n```"}
+    fake_llm(lambda messages: replies[messages[-1]["content"]])
+    monkeypatch.setattr(response_cache, "get_response_cache", lambda: cache)
+    frame = pd.DataFrame({"Rate": [0.1, 0.2]})
+    key = ("local", "schema-v1", "deck-v1", "fake:fake")
+
+    def ask(question, **kwargs):
+        prepared = ai_service.PreparedQuestion(question, "local", dataframe=frame, session_id="cache",
+                                               cache_key=key, **kwargs)
+        return async_pipeline.SyncAnswer(prepared).result()
+
+    ask("broken", messages=[{"role": "user", "content": "broken"}])
+    assert cache.get("broken", *key) is None
+
+    ask("count", messages=[{"role": "user", "content": "count"}])
+    cached = cache.get("count", *key)
+    assert cached is not None and cached.sql_query == "SELECT COUNT(*) AS n FROM df"
+
+    # A replayed answer whose SQL stops working is dropped, so the next ask goes back to the LLM
+    stale = "```sql\nSELECT dropped_column FROM df\n```"
+    cache.put("stale", *key, response=stale, sql_query="SELECT dropped_column FROM df")
+    ask("stale", reply=stale, cached=True)
+    assert cache.get("stale", *key) is None
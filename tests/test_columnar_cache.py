@@ -0,0 +1,100 @@
+import gc
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.columnar_cache import ColumnarCache
+
+
+def _write_csv(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Destination;Rate\n")
+        for destination, rate in rows:
+            f.write(f"{destination};{rate}\n")
+
+
+def _counting_reader(calls):
+    def reader(path):
+        calls.append(path)
+        return pa_csv.read_csv(path, parse_options=pa_csv.ParseOptions(delimiter=";"))
+    return reader
+
+
+def test_cache_rebuilds_only_when_content_changes(tmp_path):
+    csv_path = str(tmp_path / "rates.csv")
+    _write_csv(csv_path, [("Albania", 0.30), ("Estonia", 0.12)])
+    cache = ColumnarCache(str(tmp_path / "cache"))
+    calls = []
+    reader = _counting_reader(calls)
+
+    table, fingerprint, hit = cache.load(csv_path, reader)
+    assert not hit and len(calls) == 1
+    assert table.num_rows == 2
+
+    table, _, hit = cache.load(csv_path, reader)
+    assert hit and len(calls) == 1
+    assert table.column("Destination").to_pylist() == ["Albania", "Estonia"]
+
+    # Touching the file moves the mtime but not the content: still a hit
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10_000_000_000))
+    _, touched_fingerprint, hit = cache.load(csv_path, reader)
+    assert hit and len(calls) == 1
+    assert touched_fingerprint["hash"] == fingerprint["hash"]
+
+    _write_csv(csv_path, [("Albania", 0.31), ("Estonia", 0.12)])
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 20_000_000_000))
+    table, changed_fingerprint, hit = cache.load(csv_path, reader)
+    assert not hit and len(calls) == 2
+    assert changed_fingerprint["hash"] != fingerprint["hash"]
+    assert table.column("Rate").to_pylist() == [0.31, 0.12]
+
+
+def test_schema_change_invalidates_cache(tmp_path):
+    csv_path = str(tmp_path / "rates.csv")
+    _write_csv(csv_path, [("Albania", 0.30)])
+    cache = ColumnarCache(str(tmp_path / "cache"))
+    calls = []
+    reader = _counting_reader(calls)
+
+    cache.load(csv_path, reader, schema_id="v1")
+    _, _, hit = cache.load(csv_path, reader, schema_id="v2")
+    assert not hit and len(calls) == 2
+
+
+def test_cached_table_is_memory_mapped(tmp_path):
+    csv_path = str(tmp_path / "rates.csv")
+    _write_csv(csv_path, [("Albania", 0.30)])
+    cache = ColumnarCache(str(tmp_path / "cache"))
+    cache.load(csv_path, _counting_reader([]))
+
+    # Free Arrow buffers left in reference cycles by earlier tests so a collection cannot skew the count
+    gc.collect()
+    allocated_before = pa.total_allocated_bytes()
+    table, _, hit = cache.load(csv_path, _counting_reader([]))
+    assert hit
+    assert pa.total_allocated_bytes() == allocated_before
+    assert table.num_rows == 1
+
+
+def test_same_named_files_in_different_directories_do_not_collide(tmp_path):
+    first, second = tmp_path / "a", tmp_path / "b"
+    first.mkdir()
+    second.mkdir()
+    first_csv, second_csv = str(first / "rates.csv"), str(second / "rates.csv")
+    _write_csv(first_csv, [("Albania", 0.30)])
+    _write_csv(second_csv, [("Estonia", 0.12)])
+    cache = ColumnarCache(str(tmp_path / "cache"))
+    calls = []
+    reader = _counting_reader(calls)
+
+    cache.load(first_csv, reader)
+    cache.load(second_csv, reader)
+    table, _, hit = cache.load(first_csv, reader)
+    assert hit and len(calls) == 2
+    assert table.column("Destination").to_pylist() == ["Albania"]
+    table, _, hit = cache.load(second_csv, reader)
+    assert hit and table.column("Destination").to_pylist() == ["Estonia"]
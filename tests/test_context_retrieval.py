@@ -0,0 +1,84 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import PromptContextConfig
+from src.context_retrieval import BM25Index, ContextRetriever, estimate_tokens
+
+
+def _column(name, primary_key=False, foreign_key=False, referenced_table=None, referenced_column=None):
+    return {"column_name": name, "data_type": "VARCHAR2", "nullable": True, "primary_key": primary_key,
+            "foreign_key": foreign_key, "referenced_table": referenced_table,
+            "referenced_column": referenced_column, "description": None}
+
+
+SCHEMA = {
+    "tables": {
+        "WHOLESALE.CARRIER": {"description": "Carriers", "columns": [
+            _column("CARRIERID", primary_key=True), _column("NAME"), _column("COUNTRY"),
+        ]},
+        "WHOLESALE.AGREEMENT": {"description": None, "columns": [
+            _column("AGREEMENTID", primary_key=True),
+            _column("CARRIERID", foreign_key=True, referenced_table="WHOLESALE.CARRIER",
+                    referenced_column="CARRIERID"),
+            _column("VALID_FROM"), _column("VALID_UNTIL"),
+        ] + [_column(f"ATTRIBUTE_{i}") for i in range(40)]},
+        "WHOLESALE.INVOICE": {"description": "Billing invoices", "columns": [
+            _column("INVOICEID", primary_key=True), _column("AMOUNT"),
+        ]},
+    },
+    "relationships": [{
+        "constraint_name": "AGREEMENT_CARRIER_FK", "from_table": "WHOLESALE.AGREEMENT",
+        "from_column": "CARRIERID", "to_table": "WHOLESALE.CARRIER", "to_column": "CARRIERID",
+    }],
+}
+
+DICTIONARY = {"mappings": [
+    {"business_term": "carrier", "table_name": "CARRIER", "column_name": "CARRIERID",
+     "description": "Carrier information", "synonyms": ["supplier"], "filter_condition": "IS_DISABLED = 0",
+     "display_columns": ["NAME"]},
+    {"business_term": "agreement", "table_name": "AGREEMENT", "column_name": "AGREEMENTID",
+     "description": "Agreement information", "join_instructions": "JOIN CARRIER ON CARRIERID"},
+    {"business_term": "destination", "table_name": "DESTINATION", "column_name": "DESTINATIONID",
+     "description": "Destination information"},
+]}
+
+
+def test_bm25_prefers_documents_with_rare_matching_terms():
+    index = BM25Index([["carrier", "name"], ["agreement", "carrier"], ["invoice", "amount"]])
+    scores = index.scores(["agreement", "carrier"])
+    assert scores[1] > scores[0] > 0
+    assert scores[2] == 0
+
+
+def test_retrieve_keeps_only_relevant_entries():
+    retriever = ContextRetriever(SCHEMA, DICTIONARY, PromptContextConfig(max_columns_per_table=5))
+    context = retriever.retrieve("list supplier agreements valid this month")
+
+    assert context.mappings == ("agreement", "carrier")
+    assert set(context.tables) == {"WHOLESALE.AGREEMENT", "WHOLESALE.CARRIER"}
+    assert "WHOLESALE.INVOICE" not in context.text
+    assert "WHERE IS_DISABLED = 0" in context.text
+    assert "JOIN: JOIN CARRIER ON CARRIERID" in context.text
+    assert "WHOLESALE.AGREEMENT.CARRIERID = WHOLESALE.CARRIER.CARRIERID" in context.text
+    assert "Other business terms: destination" in context.text
+    # Key and query-matching columns are kept, the long tail is summarized
+    assert "VALID_FROM" in context.text and "ATTRIBUTE_39" not in context.text
+    assert "more)" in context.text
+    assert context.tokens == estimate_tokens(context.text)
+    assert context.tokens < context.full_tokens
+
+
+def test_retrieve_respects_token_budget():
+    retriever = ContextRetriever(SCHEMA, DICTIONARY)
+    context = retriever.retrieve("carrier agreement", token_budget=40)
+
+    assert context.tokens <= 40
+    assert context.mappings
+    assert not context.tables
+
+
+def test_unrelated_question_adds_no_mappings():
+    context = ContextRetriever(SCHEMA, DICTIONARY).retrieve("average rate by month")
+    assert context.mappings == ()
+    assert context.tables == ()
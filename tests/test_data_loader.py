@@ -0,0 +1,128 @@
+import gc
+import glob
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.columnar_cache import ColumnarCache
+from src.data_loader import RATES_SCHEMA, RATES_SCHEMA_ID, rates_frame, read_rates_csv
+
+HEADER = ("Destination;Supplier;Supplier Product;Product;Proportion;Sequence;Floor Price;Rate;Next Rate;"
+          "Next Rate Diff;FP Diff;NID;Next Valid From;Next Valid Until;Destination Responsible")
+ROWS = [
+    "Albania x;Pantel International AG;Standard-Refile;ISDN;100;1;0.1120;0.3040;0.3040;0.0000;0.1920;"
+    "Equal Rate;8/29/2023;12/31/9999;Contact 24 Internal",
+    "Albania x;Vodafone D2 GmbH;Premium-Refile;ISDN;;2;0.1120;0.2868;0.8016;0.5148;0.6896;"
+    "High Rate;8/29/2023;12/31/9999;Contact 24 Internal",
+]
+
+
+def _write_csv(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join([HEADER] + rows) + "\n")
+
+
+def test_declared_schema_is_applied(tmp_path):
+    csv_path = str(tmp_path / "rates.csv")
+    _write_csv(csv_path, ROWS)
+    table = read_rates_csv(csv_path)
+
+    for name, declared in RATES_SCHEMA.items():
+        assert table.schema.field(name).type == declared, name
+    assert pa.types.is_dictionary(table.schema.field("Supplier").type)
+    assert table.column("Supplier").to_pylist() == ["Pantel International AG", "Vodafone D2 GmbH"]
+    assert table.schema.field("Rate").type == pa.float32()
+    assert table.column("Rate").to_pylist() == pytest.approx([0.304, 0.2868], rel=1e-6)
+    # Empty numeric cells are nulls, not zeros
+    assert table.column("Proportion").to_pylist() == [100.0, None]
+    assert table.column("Next Valid From").to_pylist()[0] == datetime(2023, 8, 29)
+    assert table.column("Next Valid Until").to_pylist()[0] == datetime(9999, 12, 31)
+
+
+def test_dictionary_columns_convert_to_categoricals(tmp_path):
+    csv_path = str(tmp_path / "rates.csv")
+    _write_csv(csv_path, ROWS)
+    frame = rates_frame(read_rates_csv(csv_path))
+
+    assert str(frame["Destination"].dtype) == "category"
+    assert frame["Destination"].cat.categories.tolist() == ["Albania x"]
+    assert frame["Rate"].dtype == pd.ArrowDtype(pa.float32())
+    assert frame["Supplier Product"].dtype == pd.ArrowDtype(pa.string())
+    assert frame["Next Valid From"].dtype == pd.ArrowDtype(pa.timestamp("s"))
+    assert frame["Proportion"].isna().tolist() == [False, True]
+
+
+def test_malformed_rows_are_rejected(tmp_path):
+    csv_path = str(tmp_path / "rates.csv")
+    _write_csv(csv_path, ROWS + ["Estonia;Elisa;Standard;ISDN;100;1;0.1;0.2"])
+    with pytest.raises(pa.ArrowInvalid):
+        read_rates_csv(csv_path)
+
+    _write_csv(csv_path, [ROWS[0].replace("8/29/2023", "2023-08-29")])
+    with pytest.raises(pa.ArrowInvalid):
+        read_rates_csv(csv_path)
+
+
+def test_frame_shares_the_memory_mapped_cache(tmp_path):
+    csv_path = str(tmp_path / "rates.csv")
+    _write_csv(csv_path, ROWS * 500)
+    cache = ColumnarCache(str(tmp_path / "cache"))
+    cache.load(csv_path, read_rates_csv, RATES_SCHEMA_ID)
+    table, _, hit = cache.load(csv_path, read_rates_csv, RATES_SCHEMA_ID)
+    assert hit
+
+    gc.collect()
+    allocated_before = pa.total_allocated_bytes()
+    frame = rates_frame(table)
+    # Only the categorical codes are materialized; rates, text and dates stay on the mapped pages
+    assert pa.total_allocated_bytes() - allocated_before < table.nbytes / 4
+    assert str(frame["Supplier"].dtype) == "category"
+    assert frame["Rate"].dtype == pd.ArrowDtype(pa.float32())
+    assert frame["Next Valid From"].dtype == pd.ArrowDtype(pa.timestamp("s"))
+    assert frame["Rate"].sum() == pytest.approx((0.304 + 0.2868) * 500, rel=1e-4)
+
+
+def _mapped_ranges(path):
+    """Address ranges of the current process's mappings of a file (Linux only)."""
+    ranges = []
+    with open("/proc/self/maps") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 6 and os.path.realpath(fields[5]) == os.path.realpath(path):
+                start, end = (int(x, 16) for x in fields[0].split("-"))
+                ranges.append((start, end))
+    return ranges
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="needs /proc/self/maps")
+def test_loaded_deck_is_shared_and_memory_mapped(tmp_path, monkeypatch):
+    import src.data_loader as data_loader
+
+    csv_path = str(tmp_path / "rates.csv")
+    cache_dir = str(tmp_path / "cache")
+    _write_csv(csv_path, ROWS * 500)
+    monkeypatch.setattr(data_loader, "RATES_CSV_FILE", csv_path)
+    monkeypatch.setattr(data_loader, "RATES_CACHE_DIR", cache_dir)
+    data_loader.load_rates_table.clear()
+    data_loader.load_rates_data.clear()
+    try:
+        df, error = data_loader.load_rates_data()
+        assert error is None
+        # Every caller gets the same frame, not a fresh copy
+        assert data_loader.load_rates_data()[0] is df
+
+        ranges = _mapped_ranges(glob.glob(os.path.join(cache_dir, "rates-*.arrow"))[0])
+        assert ranges
+        rate_buffer = df["Rate"].array._pa_array.chunks[0].buffers()[1]
+        assert any(start <= rate_buffer.address < end for start, end in ranges)
+
+        table, _, _ = data_loader.load_rates_table(csv_path)
+        assert table.column("Rate").chunks[0].buffers()[1].address == rate_buffer.address
+    finally:
+        data_loader.load_rates_table.clear()
+        data_loader.load_rates_data.clear()
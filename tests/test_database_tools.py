@@ -0,0 +1,386 @@
+import datetime
+import os
+import sys
+import threading
+import time
+
+import oracledb
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.database_tools as database_tools
+from src.cancellation import CancelToken, QueryCancelled, QueryTimeout
+from src.database_tools import DatabaseManager
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rows = []
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self.fetch_sizes = []
+
+    def execute(self, sql, parameters=None):
+        if self.connection.fail_next:
+            self.connection.healthy = False
+            raise RuntimeError("DPY-4011: the database or network closed the connection")
+        if sql.startswith("SELECT SLOW"):
+            # Runs until cancel() breaks the call
+            if not self.connection.cancelled.wait(5):
+                raise RuntimeError("slow query was never cancelled")
+            raise RuntimeError("ORA-01013: user requested cancel of current operation")
+        if sql.startswith("SELECT N"):
+            self.description = [
+                ("N", oracledb.DB_TYPE_NUMBER, None, None, 10, 0, True),
+                ("LABEL", oracledb.DB_TYPE_VARCHAR, None, None, None, None, True),
+            ]
+            self.rows = [(i, f"row {i}") for i in range(int(sql.split()[-1]))]
+        elif sql.startswith("SELECT TYPED"):
+            self.description = [
+                ("RATE", oracledb.DB_TYPE_NUMBER, None, None, 0, -127, True),
+                ("VALID_FROM", oracledb.DB_TYPE_DATE, None, None, None, None, True),
+                ("NAME", oracledb.DB_TYPE_VARCHAR, None, None, None, None, True),
+            ]
+            self.rows = [
+                (0.25, datetime.datetime(2023, 8, 29), "Albania"),
+                (None, None, None),
+                (3, datetime.datetime(9999, 12, 31), "Estonia"),
+            ]
+        else:
+            self.description = [("STATUS", oracledb.DB_TYPE_VARCHAR, None, None, None, None, True)]
+            self.rows = [("ok",)]
+        self.connection.last_cursor = self
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        self.fetch_sizes.append(size)
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.healthy = True
+        self.fail_next = False
+        self.call_timeout = 0
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def ping(self):
+        pass
+
+    def is_healthy(self):
+        return self.healthy
+
+
+class FakePool:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.max = kwargs["max"]
+        self.idle = []
+        self.busy = 0
+        self.opened = 0
+        self.dropped = 0
+        self.closed = False
+
+    def acquire(self):
+        if not self.idle:
+            self.idle.append(FakeConnection())
+            self.opened += 1
+        self.busy += 1
+        return self.idle.pop()
+
+    def release(self, connection):
+        self.busy -= 1
+        self.idle.append(connection)
+
+    def drop(self, connection):
+        self.busy -= 1
+        self.opened -= 1
+        self.dropped += 1
+
+    def close(self, force=False):
+        self.closed = True
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(database_tools.oracle_config, "user", "scott")
+    monkeypatch.setattr(database_tools.oracle_config, "password", "tiger")
+    monkeypatch.setattr(database_tools.oracle_config, "dsn", "db.example.com/orcl")
+    monkeypatch.setattr(database_tools.oracledb, "create_pool", lambda **kwargs: FakePool(**kwargs))
+    manager = DatabaseManager()
+    assert manager.connect()
+    return manager
+
+
+def test_connect_creates_pool_once(manager):
+    pool = manager.pool
+    assert pool.kwargs["max"] == database_tools.oracle_config.pool_max
+    assert manager.connect()
+    assert manager.pool is pool
+
+
+def test_failed_verification_closes_the_new_pool(monkeypatch):
+    monkeypatch.setattr(database_tools.oracle_config, "user", "scott")
+    monkeypatch.setattr(database_tools.oracle_config, "password", "tiger")
+    monkeypatch.setattr(database_tools.oracle_config, "dsn", "db.example.com/orcl")
+    pools = []
+
+    def create_pool(**kwargs):
+        pool = FakePool(**kwargs)
+        pool.acquire = lambda: (_ for _ in ()).throw(RuntimeError("ORA-12541: no listener"))
+        pools.append(pool)
+        return pool
+
+    monkeypatch.setattr(database_tools.oracledb, "create_pool", create_pool)
+    manager = DatabaseManager()
+    assert not manager.connect()
+    assert not manager.connect()
+    assert manager.pool is None
+    assert len(pools) == 2 and all(pool.closed for pool in pools)
+
+
+def test_each_query_releases_its_connection(manager):
+    result = manager.execute_query("SELECT 'ok' AS status FROM DUAL")
+    assert result["STATUS"].tolist() == ["ok"]
+    assert manager.pool.busy == 0
+
+    metrics = manager.pool_metrics()
+    assert metrics["acquires"] == 1
+    assert metrics["utilization"] == 0.0
+
+
+def test_dead_connection_is_dropped(manager):
+    manager.pool.idle[0].fail_next = True
+    with pytest.raises(RuntimeError):
+        manager.execute_query("SELECT 1 FROM DUAL")
+    assert manager.pool.dropped == 1
+    assert manager.pool_metrics()["dropped_connections"] == 1
+
+    # The pool opens a fresh session for the next request
+    assert manager.execute_query("SELECT 'ok' FROM DUAL")["STATUS"].tolist() == ["ok"]
+
+
+def test_not_connected_raises():
+    with pytest.raises(RuntimeError):
+        DatabaseManager().execute_query("SELECT 1 FROM DUAL")
+
+
+def test_fetch_uses_arraysize_chunks(manager, monkeypatch):
+    monkeypatch.setattr(database_tools.oracle_config, "fetch_arraysize", 10)
+    result = manager.execute_query("SELECT N FROM T LIMIT 25", max_rows=0)
+    cursor = manager.pool.idle[0].last_cursor
+    assert len(result) == 25
+    assert not result.attrs["truncated"]
+    assert cursor.arraysize == 10
+    assert cursor.prefetchrows >= 11
+    assert cursor.fetch_sizes[:3] == [10, 10, 10]
+
+
+def test_row_cap_truncates(manager):
+    result = manager.execute_query("SELECT N FROM T LIMIT 50", max_rows=20)
+    assert len(result) == 20
+    assert result.attrs["truncated"]
+    assert result["N"].tolist() == list(range(20))
+
+    exact = manager.execute_query("SELECT N FROM T LIMIT 20", max_rows=20)
+    assert len(exact) == 20
+    assert not exact.attrs["truncated"]
+
+
+def test_byte_cap_truncates(manager, monkeypatch):
+    monkeypatch.setattr(database_tools.oracle_config, "fetch_arraysize", 10)
+    result = manager.execute_query("SELECT N FROM T LIMIT 1000", max_rows=0, max_bytes=1)
+    assert len(result) == 10
+    assert result.attrs["truncated"]
+
+
+def test_empty_result_keeps_columns(manager):
+    result = manager.execute_query("SELECT N FROM T LIMIT 0")
+    assert list(result.columns) == ["N", "LABEL"]
+    assert result.empty
+
+
+def test_iter_query_chunks_streams_and_releases(manager, monkeypatch):
+    monkeypatch.setattr(database_tools.oracle_config, "fetch_arraysize", 10)
+    chunks = manager.iter_query_chunks("SELECT N FROM T LIMIT 35", max_rows=0)
+    first = next(chunks)
+    assert len(first) == 10
+    assert manager.pool.busy == 1
+    sizes = [len(first)] + [len(chunk) for chunk in chunks]
+    assert sizes == [10, 10, 10, 5]
+    assert manager.pool.busy == 0
+
+
+def test_arrow_fallback_builds_typed_columns(manager):
+    result = manager.execute_query("SELECT TYPED FROM T", arrow=True)
+    assert pd.api.types.is_float_dtype(result["RATE"])
+    assert pd.api.types.is_datetime64_any_dtype(result["VALID_FROM"])
+    assert isinstance(result["NAME"].dtype, pd.ArrowDtype)
+    assert result["RATE"].isna().tolist() == [False, True, False]
+    assert result["VALID_FROM"].iloc[2].year == 9999
+
+    ints = manager.execute_query("SELECT N FROM T LIMIT 3", arrow=True)
+    assert pd.api.types.is_integer_dtype(ints["N"])
+
+
+def test_native_arrow_fetch_skips_tuples(manager):
+    batches = [
+        pa.table({"RATE": pa.array([0.1, 0.2], pa.float64()), "NAME": ["a", "b"]}),
+        pa.table({"RATE": pa.array([0.3], pa.float64()), "NAME": ["c"]}),
+    ]
+
+    class ArrowConnection(FakeConnection):
+        def fetch_df_batches(self, statement, parameters=None, size=None):
+            self.size = size
+            return iter(batches)
+
+        def cursor(self):
+            raise AssertionError("native path must not open a cursor")
+
+    manager.pool.idle = [ArrowConnection()]
+    result = manager.execute_query("SELECT RATE, NAME FROM RATES", arrow=True, max_rows=0)
+    assert result["RATE"].tolist() == [0.1, 0.2, 0.3]
+    assert isinstance(result["RATE"].dtype, pd.ArrowDtype)
+    assert not result.attrs["truncated"]
+
+    manager.pool.idle = [ArrowConnection()]
+    capped = manager.execute_query("SELECT RATE, NAME FROM RATES", arrow=True, max_rows=2)
+    assert len(capped) == 2
+    assert capped.attrs["truncated"]
+
+
+def test_native_arrow_fetch_of_empty_result_keeps_columns(manager):
+    class EmptyArrowConnection(FakeConnection):
+        def fetch_df_batches(self, statement, parameters=None, size=None):
+            return iter([])
+
+    manager.pool.idle = [EmptyArrowConnection()]
+    chunks = list(manager.iter_query_chunks("SELECT N FROM T LIMIT 0", arrow=True))
+    assert len(chunks) == 1
+    assert chunks[0].empty
+    assert list(chunks[0].columns) == ["N", "LABEL"]
+    assert manager.pool.busy == 0
+
+
+class FakeAsyncCursor(FakeCursor):
+    async def execute(self, sql, parameters=None):
+        FakeCursor.execute(self, sql, parameters)
+
+    async def fetchmany(self, size):
+        return FakeCursor.fetchmany(self, size)
+
+    async def fetchone(self):
+        rows = await self.fetchmany(1)
+        return rows[0] if rows else None
+
+
+class FakeAsyncPool:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.max = kwargs["max"]
+        self.busy = 0
+        self.opened = 1
+        self.dropped = 0
+        self.connection = FakeConnection()
+        self.connection.cursor = lambda: FakeAsyncCursor(self.connection)
+
+    async def acquire(self):
+        self.busy += 1
+        return self.connection
+
+    async def release(self, connection):
+        self.busy -= 1
+
+    async def drop(self, connection):
+        self.busy -= 1
+        self.opened -= 1
+        self.dropped += 1
+
+
+def test_async_query_uses_asyncio_pool(manager, monkeypatch):
+    import asyncio
+    monkeypatch.setattr(database_tools.oracle_config, "thick_mode", False)
+    monkeypatch.setattr(database_tools.oracle_config, "async_mode", True)
+    monkeypatch.setattr(database_tools.oracle_config, "fetch_arraysize", 10)
+    monkeypatch.setattr(database_tools.oracledb, "create_pool_async", lambda **kwargs: FakeAsyncPool(**kwargs))
+
+    result = asyncio.run(manager.execute_query_async("SELECT N FROM T LIMIT 30", max_rows=25))
+    assert len(result) == 25
+    assert result.attrs["truncated"]
+    assert manager.async_pool.busy == 0
+    assert manager.async_pool.kwargs["max"] == database_tools.oracle_config.pool_max
+    # The blocking pool was not used
+    assert manager.pool.busy == 0 and manager.pool.opened == 1
+    metrics = manager.pool_metrics()
+    assert metrics["acquires"] == 1
+    assert metrics["async_busy"] == 0 and metrics["async_opened"] == 1
+    assert metrics["max"] == database_tools.oracle_config.pool_max + database_tools.oracle_config.async_pool_max
+
+
+def test_async_dead_connection_is_dropped(manager, monkeypatch):
+    import asyncio
+    monkeypatch.setattr(database_tools.oracle_config, "thick_mode", False)
+    monkeypatch.setattr(database_tools.oracle_config, "async_mode", True)
+    monkeypatch.setattr(database_tools.oracle_config, "pool_async_max", 3)
+    monkeypatch.setattr(database_tools.oracledb, "create_pool_async", lambda **kwargs: FakeAsyncPool(**kwargs))
+
+    async def run():
+        pool = await manager._get_async_pool()
+        pool.connection.healthy = False
+        await manager.execute_query_async("SELECT 1 FROM DUAL")
+
+    asyncio.run(run())
+    assert manager.async_pool.kwargs["max"] == 3
+    assert manager.async_pool.dropped == 1 and manager.async_pool.busy == 0
+    assert manager.pool_metrics()["dropped_connections"] == 1
+    assert database_tools.oracle_config.session_limit == database_tools.oracle_config.pool_max + 3
+
+
+def test_async_query_falls_back_to_thread(manager, monkeypatch):
+    import asyncio
+    monkeypatch.setattr(database_tools.oracle_config, "async_mode", False)
+    result = asyncio.run(manager.execute_query_async("SELECT 'ok' AS status FROM DUAL"))
+    assert result["STATUS"].tolist() == ["ok"]
+    assert manager.async_pool is None
+    assert manager.pool_metrics()["acquires"] == 1
+
+
+def test_cancel_token_cancels_running_query(manager):
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    start_time = time.perf_counter()
+    with pytest.raises(QueryCancelled) as excinfo:
+        manager.execute_query("SELECT SLOW FROM DUAL", cancel_token=token)
+    assert not isinstance(excinfo.value, QueryTimeout)
+    assert time.perf_counter() - start_time < 2
+    assert manager.pool.busy == 0
+
+
+def test_query_timeout_cancels_call(manager, monkeypatch):
+    monkeypatch.setattr(database_tools.oracle_config, "query_timeout", 0.1)
+    with pytest.raises(QueryTimeout):
+        manager.execute_query("SELECT SLOW FROM DUAL")
+    connection = manager.pool.idle[0]
+    assert connection.cancelled.is_set()
+    assert connection.call_timeout == 0
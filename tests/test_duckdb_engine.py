@@ -0,0 +1,172 @@
+import os
+import sys
+import threading
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import DuckDBConfig
+from src.cancellation import CancelToken, QueryCancelled, QueryTimeout
+from src.data_loader import rates_frame
+from src.duckdb_engine import DuckDBEngine
+
+
+def _deck(version="v1"):
+    df = pd.DataFrame({
+        "Destination": ["Albania x", "Albania x", "Estonia-EMT"],
+        "Rate": [0.30, 0.28, 0.12],
+    })
+    df.attrs["data_version"] = version
+    return df
+
+
+def test_base_frame_registered_once():
+    engine = DuckDBEngine(DuckDBConfig(threads=2))
+    deck = _deck()
+    assert engine.register_base_frame(deck)
+    assert not engine.register_base_frame(deck.copy())
+    assert engine.is_base_frame(deck)
+    assert not engine.is_base_frame(deck.head(1))
+
+    result = engine.execute("SELECT COUNT(*) AS n FROM df", deck, session_id="a")
+    assert result["n"].iloc[0] == 3
+    assert engine.connection.execute("SELECT COUNT(*) FROM rates").fetchone()[0] == 3
+
+
+def test_deck_is_scanned_without_a_copy():
+    deck = rates_frame(pa.table({
+        "Destination": pa.array(["Albania x", "Estonia-EMT"] * 50000).dictionary_encode(),
+        "Rate": pa.array(np.linspace(0, 1, 100000), pa.float32()),
+    }))
+    deck.attrs["data_version"] = "v1"
+    engine = DuckDBEngine(DuckDBConfig(threads=2))
+    allocated_before = pa.total_allocated_bytes()
+    engine.register_base_frame(deck)
+    assert pa.total_allocated_bytes() - allocated_before < 1024
+    assert engine.connection.execute("SELECT count(*) FROM duckdb_tables()").fetchone()[0] == 0
+    result = engine.execute("SELECT COUNT(*) AS n, MAX(Rate) AS top FROM df", deck, session_id="a")
+    assert result["n"].iloc[0] == 100000 and result["top"].iloc[0] == 1.0
+
+
+def test_derived_frames_are_not_the_deck():
+    engine = DuckDBEngine(DuckDBConfig())
+    deck = _deck()
+    engine.register_base_frame(deck)
+    assert engine.is_base_frame(deck.copy())
+
+    # Same length, same attrs: pandas carries data_version over to derived frames
+    by_rate = deck.sort_values("Rate").reset_index(drop=True)
+    assert by_rate.attrs["data_version"] == "v1"
+    assert not engine.is_base_frame(by_rate)
+    assert not engine.is_base_frame(deck[["Rate", "Destination"]])
+    assert not engine.is_base_frame(deck[["Destination"]])
+
+    result = engine.execute("SELECT Rate FROM df LIMIT 1", by_rate, session_id="a")
+    assert result["Rate"].tolist() == [0.12]
+
+
+def test_queries_cannot_read_files(tmp_path):
+    path = tmp_path / "other.csv"
+    path.write_text("a\n1\n")
+    engine = DuckDBEngine(DuckDBConfig(threads=2))
+    deck = _deck()
+    engine.register_base_frame(deck)
+    for sql in [f"SELECT * FROM '{path}'", f"SELECT * FROM df, read_text('{path}')"]:
+        with pytest.raises(duckdb.PermissionException):
+            engine.execute(sql, deck, session_id="a")
+    assert engine.execute("SELECT COUNT(*) AS n FROM df", deck, session_id="a")["n"].iloc[0] == 3
+
+
+def test_sessions_bind_their_own_frames():
+    engine = DuckDBEngine(DuckDBConfig())
+    deck = _deck()
+    engine.register_base_frame(deck)
+
+    subset = engine.execute("SELECT * FROM df WHERE Rate > 0.2", deck, session_id="a")
+    assert len(subset) == 2
+
+    # Session "a" now queries its previous result, session "b" still the full deck
+    assert len(engine.execute("SELECT * FROM df", subset, session_id="a")) == 2
+    assert len(engine.execute("SELECT * FROM df", deck, session_id="b")) == 3
+    assert len(engine.execute("SELECT * FROM df", deck, session_id="a")) == 3
+
+
+def test_base_frame_registers_the_loaded_table():
+    engine = DuckDBEngine(DuckDBConfig())
+    table = pa.table({"Destination": ["Albania x", "Estonia-EMT"], "Rate": pa.array([0.3, 0.12], pa.float32())})
+    deck = rates_frame(table)
+    deck.attrs["data_version"] = "v1"
+    assert engine.register_base_frame(deck, table=table)
+    # The view scans the loader's table itself, not a conversion of the frame
+    assert engine._base_table is table
+    assert engine.connection.execute("SELECT COUNT(*) FROM rates").fetchone()[0] == 2
+
+    # A table that does not describe the frame is ignored
+    other = _deck("v2")
+    assert engine.register_base_frame(other, table=table)
+    assert engine._base_table is not table
+    assert engine.connection.execute("SELECT COUNT(*) FROM rates").fetchone()[0] == 3
+
+
+def test_new_deck_version_replaces_table():
+    engine = DuckDBEngine(DuckDBConfig())
+    engine.register_base_frame(_deck("v1"))
+    engine.execute("SELECT * FROM df", _deck("v1"), session_id="a")
+
+    new_deck = pd.concat([_deck("v2"), _deck("v2")], ignore_index=True)
+    new_deck.attrs["data_version"] = "v2"
+    assert engine.register_base_frame(new_deck)
+    assert len(engine.execute("SELECT * FROM df", new_deck, session_id="a")) == 6
+
+
+def test_session_cursors_are_bounded():
+    engine = DuckDBEngine(DuckDBConfig(max_sessions=2))
+    deck = _deck()
+    for session_id in ("a", "b", "c"):
+        engine.execute("SELECT 1", deck, session_id=session_id)
+    assert list(engine._sessions) == ["b", "c"]
+
+
+def test_evicted_cursor_closes_after_its_query():
+    engine = DuckDBEngine(DuckDBConfig(max_sessions=1))
+    deck = _deck()
+    engine.execute("SELECT 1", deck, session_id="a")
+    busy = engine._sessions["a"]
+    busy.lock.acquire()  # a query in flight on session "a"
+    evicting = threading.Thread(target=engine.execute, args=("SELECT 1", deck), kwargs={"session_id": "b"})
+    evicting.start()
+    time.sleep(0.2)
+    assert not busy.closed
+    assert busy.cursor.execute("SELECT 42").fetchone() == (42,)
+    busy.lock.release()
+    evicting.join(timeout=5)
+    assert busy.closed
+    # Session "a" comes back with a new cursor
+    assert engine.execute("SELECT COUNT(*) AS n FROM df", deck, session_id="a")["n"].tolist() == [3]
+
+
+def test_runaway_query_times_out():
+    engine = DuckDBEngine(DuckDBConfig(query_timeout=0.3))
+    frame = pd.DataFrame({"a": range(100000)})
+    start = time.perf_counter()
+    with pytest.raises(QueryTimeout):
+        engine.execute("SELECT count(*) FROM df x, df y, df z WHERE x.a + y.a + z.a = -1", frame, session_id="s1")
+    assert time.perf_counter() - start < 3
+    # The session cursor is still usable
+    assert engine.execute("SELECT count(*) AS n FROM df", frame, session_id="s1")["n"].tolist() == [100000]
+
+
+def test_cancel_token_interrupts_query():
+    engine = DuckDBEngine()
+    frame = pd.DataFrame({"a": range(100000)})
+    token = CancelToken()
+    threading.Timer(0.2, token.cancel).start()
+    with pytest.raises(QueryCancelled) as excinfo:
+        engine.execute("SELECT count(*) FROM df x, df y, df z WHERE x.a + y.a + z.a = -1", frame,
+                       session_id="s1", cancel_token=token)
+    assert not isinstance(excinfo.value, QueryTimeout)
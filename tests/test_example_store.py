@@ -0,0 +1,126 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import FewShotConfig
+from src.example_store import (
+    CachedEmbedder, EmbeddingCache, ExampleStore, HashingEmbedder, IVFIndex, VectorIndex,
+    TitanEmbedder, format_few_shot,
+)
+
+CONFIG = FewShotConfig(k=2, min_similarity=0.3, ivf_threshold=0)
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__(dimension=64)
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return super().embed(texts)
+
+
+def test_hashing_embedder_is_deterministic():
+    first = HashingEmbedder().embed(["top destinations by rate"])
+    second = HashingEmbedder().embed(["top destinations by rate"])
+    assert np.array_equal(first, second)
+    assert first.shape == (1, 256)
+
+
+def test_search_returns_nearest_examples_for_source(tmp_path):
+    store = ExampleStore(HashingEmbedder(), str(tmp_path / "examples.jsonl"), CONFIG)
+    assert store.add("top 10 destinations by rate", "SELECT Destination FROM df ORDER BY Rate DESC LIMIT 10", "local")
+    assert store.add("average rate per supplier", "SELECT Supplier, AVG(Rate) FROM df GROUP BY 1", "local")
+    assert store.add("list active carriers", "SELECT NAME FROM CARRIER", "oracle")
+    assert not store.add("top 10 destinations by rate", "SELECT Destination FROM df ORDER BY Rate DESC LIMIT 10", "local")
+
+    results = store.search("top 5 destinations by rate", source="local")
+    assert results[0][0].question == "top 10 destinations by rate"
+    assert all(example.source == "local" for example, _ in results)
+    assert "```sql" in format_few_shot([example for example, _ in results])
+
+    reloaded = ExampleStore(HashingEmbedder(), str(tmp_path / "examples.jsonl"), CONFIG)
+    assert len(reloaded.examples) == 3
+    assert reloaded.search("carriers that are active", source="oracle")[0][0].sql == "SELECT NAME FROM CARRIER"
+
+
+def test_outcomes_and_latency_are_reported():
+    store = ExampleStore(HashingEmbedder(), None, CONFIG)
+    store.add("q one", "SELECT 1", "local")
+    store.search("q one")
+    store.record_outcome(True, used_examples=True)
+    store.record_outcome(False, used_examples=False)
+
+    stats = store.stats()
+    assert stats["searches"] == 1 and stats["avg_search_ms"] >= 0
+    assert stats["success_rate_with_examples"] == 1.0
+    assert stats["success_rate_without_examples"] == 0.0
+
+
+def test_embeddings_are_cached_on_disk(tmp_path):
+    inner = CountingEmbedder()
+    embedder = CachedEmbedder(inner, EmbeddingCache(str(tmp_path / "embeddings.sqlite")))
+    embedder.embed(["a", "b"])
+    vectors = CachedEmbedder(inner, EmbeddingCache(str(tmp_path / "embeddings.sqlite"))).embed(["b", "c"])
+
+    assert inner.calls == [["a", "b"], ["c"]]
+    assert np.array_equal(vectors[0], HashingEmbedder(64).embed(["b"])[0])
+
+
+def test_titan_embedder_batches_requests():
+    class FakeBody:
+        def __init__(self, payload):
+            self.payload = payload
+
+        def read(self):
+            return json.dumps(self.payload)
+
+    class FakeClient:
+        def __init__(self):
+            self.texts = []
+
+        def invoke_model(self, modelId, contentType, accept, body):
+            text = json.loads(body)["inputText"]
+            self.texts.append(text)
+            return {"body": FakeBody({"embedding": [float(len(text)), 1.0]})}
+
+    client = FakeClient()
+    vectors = TitanEmbedder(model_id="amazon.titan-embed-text-v1", batch_size=2, client=client).embed(
+        ["a", "bb", "ccc"]
+    )
+    assert vectors.tolist() == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert sorted(client.texts) == ["a", "bb", "ccc"]
+
+
+def test_ivf_index_finds_exact_neighbour():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(500, 32)).astype(np.float32)
+    query = vectors[123] + 0.01
+    exact = VectorIndex(vectors).search(query, 1)
+    approximate = IVFIndex(vectors, n_lists=16, nprobe=4).search(query, 1)
+    assert exact[0][0] == approximate[0][0] == 123
+
+
+def test_new_examples_extend_the_ivf_index_until_it_grows():
+    config = FewShotConfig(k=1, min_similarity=0.0, ivf_threshold=20, ivf_lists=4, ivf_retrain_growth=0.5)
+    store = ExampleStore(HashingEmbedder(dimension=64), None, config)
+    for i in range(20):
+        store.add(f"question number {i}", f"SELECT {i}", "local")
+    assert store.stats()["index"] == "not built"
+
+    store.search("question number 3")
+    index = store._index
+    assert isinstance(index, IVFIndex) and index.trained_size == 20
+    store.add("brand new wording", "SELECT 'new'", "local")
+    assert store._index is index
+    assert store.search("brand new wording")[0][0].sql == "SELECT 'new'"
+
+    for i in range(10):
+        store.add(f"later question {i}", f"SELECT {100 + i}", "local")
+    assert store._index is None
+    store.search("later question 1")
+    assert store._index.trained_size == 31
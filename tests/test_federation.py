@@ -0,0 +1,133 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import duckdb
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.ai_service as ai_service
+import src.async_pipeline as async_pipeline
+import src.federation as federation
+import src.oracle_replica as oracle_replica
+from config.config import FederationConfig
+from src.ai_service import PreparedQuestion
+from src.federation import FederatedEngine, to_oracle_predicate
+
+ACTIVE_AGREEMENTS = (
+    'SELECT d.Supplier, d."Buy Rate", a.AGREEMENTID FROM df d '
+    "JOIN CARRIER c ON c.NAME = d.Supplier "
+    "JOIN AGREEMENT a ON a.CARRIERID = c.CARRIERID "
+    "WHERE c.IS_DISABLED = 0 AND a.IS_VALID_REVISION = 1 AND a.VALID_UNTIL >= DATE '2026-10-16' "
+    "ORDER BY d.Supplier"
+)
+
+
+class FakeOracle:
+    """Stands in for DatabaseManager.execute_query with Oracle tables held in DuckDB."""
+
+    def __init__(self):
+        self.connection = duckdb.connect()
+        self.connection.execute(
+            "CREATE TABLE CARRIER AS SELECT * FROM (VALUES (1, 'Alpha', 0, 'x'), (2, 'Beta', 0, 'y'), "
+            "(3, 'Gamma', 1, 'z'), (4, 'Delta', 0, 'w'), (5, 'Omega', 0, 'v')) t(CARRIERID, NAME, IS_DISABLED, NOTES)")
+        self.connection.execute(
+            "CREATE TABLE AGREEMENT AS SELECT * FROM (VALUES "
+            "(10, 1, 1, DATE '2027-01-01'), (11, 2, 0, DATE '2027-01-01'), "
+            "(12, 4, 1, DATE '2026-01-01'), (13, 5, 1, DATE '2027-06-01')) "
+            "t(AGREEMENTID, CARRIERID, IS_VALID_REVISION, VALID_UNTIL)")
+        self.queries = []
+
+    def execute_query(self, sql, parameters=None, max_rows=None, max_bytes=None, arrow=False, cancel_token=None):
+        self.queries.append(sql)
+        result = self.connection.cursor().execute(sql).arrow()
+        result = getattr(result, "read_all", lambda: result)()
+        frame = result.to_pandas(types_mapper=pd.ArrowDtype)
+        frame.attrs["truncated"] = False
+        if max_rows and len(frame) > max_rows:
+            frame = frame.iloc[:max_rows]
+            frame.attrs["truncated"] = True
+        return frame
+
+    def fetches(self, table):
+        return [sql for sql in self.queries if f"FROM {table}" in sql and "1 = 0" not in sql]
+
+
+@pytest.fixture
+def oracle(monkeypatch):
+    monkeypatch.setattr(oracle_replica, "get_oracle_replica", lambda: None)
+    return FakeOracle()
+
+
+@pytest.fixture
+def deck():
+    return pd.DataFrame({"Supplier": ["Alpha", "Beta", "Delta", "Zeta"], "Buy Rate": [0.1, 0.2, 0.3, 0.4]})
+
+
+def test_scan_filters_translate_to_oracle_predicates():
+    columns = ["NAME", "VALID_FROM", "CODE"]
+    assert to_oracle_predicate("NAME>='A'", columns) == "\"NAME\" >= 'A'"
+    assert to_oracle_predicate("VALID_FROM<='2026-10-16'::DATE", columns) == "\"VALID_FROM\" <= DATE '2026-10-16'"
+    assert to_oracle_predicate("optional: CODE IN ('A', 'B')", columns) == "\"CODE\" IN ('A', 'B')"
+    assert to_oracle_predicate("CODE IS NOT NULL", columns) == '"CODE" IS NOT NULL'
+    assert to_oracle_predicate("NAME!=CODE", columns) is None
+    assert to_oracle_predicate("contains(NAME, 'x')", columns) is None
+
+
+def test_federated_join_pushes_projections_and_filters(oracle, deck):
+    engine = FederatedEngine(FederationConfig(), db_manager=oracle)
+    result = engine.execute(ACTIVE_AGREEMENTS, deck)
+
+    assert result["Supplier"].tolist() == ["Alpha"]
+    assert result["AGREEMENTID"].tolist() == [10]
+
+    carrier_sql, = oracle.fetches("CARRIER")
+    assert '"NOTES"' not in carrier_sql
+    assert '"IS_DISABLED" = 0' in carrier_sql
+    # The deck's suppliers travel to Oracle as an IN list instead of the whole table coming back
+    assert "\"NAME\" IN ('Alpha', 'Beta', 'Delta', 'Zeta')" in carrier_sql
+    agreement_sql, = oracle.fetches("AGREEMENT")
+    assert '"IS_VALID_REVISION" = 1' in agreement_sql
+    assert "\"VALID_UNTIL\" >= " in agreement_sql
+
+    tables = {table["table"]: table for table in result.attrs["federated"]["tables"]}
+    assert tables["CARRIER"]["rows"] == 3
+    assert engine.stats()["join_filters"] == 1
+
+
+def test_filters_oracle_rejects_are_applied_locally(oracle, deck):
+    engine = FederatedEngine(FederationConfig(max_in_list=2), db_manager=oracle)
+    original = oracle.execute_query
+
+    def reject_pushed(sql, **kwargs):
+        if "WHERE" in sql and "1 = 0" not in sql:
+            raise RuntimeError("ORA-01722: invalid number")
+        return original(sql, **kwargs)
+
+    oracle.execute_query = reject_pushed
+    result = engine.execute(ACTIVE_AGREEMENTS, deck)
+
+    assert result["Supplier"].tolist() == ["Alpha"]
+    # Too many deck values for FEDERATION_MAX_IN_LIST: no join filter was built
+    assert all(not table["join_filters"] for table in result.attrs["federated"]["tables"])
+    assert engine.stats()["unpushed_filters"] >= 3
+
+
+def test_deck_and_oracle_questions_are_federated(deck):
+    assert ai_service.is_federated_question("Show buy rates from the database for suppliers", deck)
+    assert not ai_service.is_federated_question("Show buy rates from the database for suppliers", None)
+    assert not ai_service.is_federated_question("list database tables", deck)
+
+
+def test_pipeline_runs_federated_answers(oracle, deck, fake_llm, monkeypatch):
+    engine = FederatedEngine(FederationConfig(), db_manager=oracle)
+    monkeypatch.setattr(federation, "get_federated_engine", lambda: engine)
+    fake_llm(lambda messages: f"```sql\n{ACTIVE_AGREEMENTS}\n```")
+    question = PreparedQuestion("buy rates for suppliers with active agreements", "federated", dataframe=deck,
+                                messages=[{"role": "user", "content": "buy rates"}])
+    answer = async_pipeline.SyncAnswer(question)
+    ai_response, sql_query, query_result, source = answer.result()
+    assert source == "federated"
+    assert query_result["Buy Rate"].tolist() == [0.1]
+    assert answer.guard is None or answer.guard.reason == "federated query"
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import JobQueueConfig
+from src.cancellation import CancelToken, QueryTimeout
+from src.job_queue import CANCELLED, DONE, JobQueue, interrupt_on_cancel
+
+
+@pytest.fixture
+def slow_llm(fake_llm):
+    return fake_llm(lambda messages: "Counting rows.\n```sql\nSELECT COUNT(*) AS n FROM df\n```\nDone.",
+                    chunk_size=4, delay=0.05)
+
+
+@pytest.fixture
+def queue():
+    jobs = JobQueue(JobQueueConfig(workers=4))
+    yield jobs
+    jobs.shutdown()
+
+
+def runaway_query():
+    import duckdb
+    connection = duckdb.connect()
+    with interrupt_on_cancel(connection.interrupt):
+        return connection.execute("SELECT count(*) FROM range(100000000) a, range(100000) b").fetchall()
+
+
+def wait_for(job, timeout=10.0):
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.02)
+    return job
+
+
+def test_jobs_run_in_the_background(slow_llm, queue):
+    frame = pd.DataFrame({"Rate": [0.1, 0.2, 0.3]})
+    start = time.perf_counter()
+    job_id = queue.submit("how many records do we have", frame, "s1")
+    # Submitting returns before the answer has started streaming
+    assert time.perf_counter() - start < 0.5
+    job = queue.get(job_id)
+    assert not job.finished
+
+    wait_for(job)
+    assert job.status == DONE
+    ai_response, sql_query, query_result, source = job.result
+    assert job.partial_text == ai_response
+    assert "SELECT COUNT(*)" in job.sql_query
+    assert query_result["n"].tolist() == [3]
+    timings = job.timings()
+    assert timings["total"] >= timings["first_text"] > 0
+    assert queue.stats()["completed"] == 1
+
+    queue.forget(job_id)
+    assert queue.get(job_id) is None
+
+
+def test_several_jobs_in_flight_at_once(slow_llm, queue):
+    frame = pd.DataFrame({"Rate": [0.1, 0.2]})
+    ids = [queue.submit(f"how many records do we have {i}", frame, "s1") for i in range(3)]
+    time.sleep(0.3)
+    assert queue.stats()["running"] == 3
+    assert [job.id for job in queue.session_jobs("s1")] == ids
+    assert all(wait_for(queue.get(job_id)).status == DONE for job_id in ids)
+
+
+def test_cancel_stops_a_running_job(slow_llm, queue):
+    job_id = queue.submit("how many records do we have", pd.DataFrame({"Rate": [0.1]}), "s1")
+    time.sleep(0.2)
+    assert queue.cancel(job_id)
+    job = wait_for(queue.get(job_id))
+    assert job.status == CANCELLED
+    assert not queue.cancel(job_id)
+    assert queue.stats()["cancelled"] == 1
+
+
+def test_run_in_process_times_out_without_waiting_for_the_worker():
+    queue = JobQueue(JobQueueConfig(process_workers=1))
+    try:
+        assert queue.run_in_process(pow, 2, 10) == 1024
+        start = time.perf_counter()
+        with pytest.raises(QueryTimeout):
+            queue.run_in_process(time.sleep, 5, cancel_token=CancelToken(), timeout=0.3)
+        assert time.perf_counter() - start < 2
+    finally:
+        queue.shutdown()
+
+
+def test_timed_out_worker_query_is_interrupted():
+    queue = JobQueue(JobQueueConfig(process_workers=1))
+    try:
+        assert queue.run_in_process(pow, 2, 10) == 1024
+        with pytest.raises(QueryTimeout):
+            queue.run_in_process(runaway_query, cancel_token=CancelToken(), timeout=0.5)
+        # The only worker process is free again instead of finishing the scan
+        start = time.perf_counter()
+        assert queue.run_in_process(pow, 2, 3) == 8
+        assert time.perf_counter() - start < 5
+    finally:
+        queue.shutdown()
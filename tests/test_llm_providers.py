@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.llm_providers as llm_providers
+from src.llm_providers import BedrockProvider, FakeProvider, llm_metrics
+
+
+class FakeEventStream:
+    """Response body that keeps producing events until closed, like a long Bedrock answer."""
+
+    def __init__(self, events, endless=False):
+        self.events = events
+        self.endless = endless
+        self.read = 0
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        while self.read < len(self.events) or self.endless:
+            if self.closed.is_set():
+                raise ValueError("read from a closed stream")
+            if self.read >= len(self.events):
+                time.sleep(0.01)
+            yield self.events[min(self.read, len(self.events) - 1)]
+            self.read += 1
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeBedrockClient:
+    def __init__(self, events, endless=False):
+        self.stream = FakeEventStream(events, endless)
+        self.requests = []
+
+    def invoke_model_with_response_stream(self, modelId, contentType, accept, body):
+        self.requests.append((modelId, json.loads(body)))
+        return {"body": self.stream}
+
+
+def _event(payload):
+    return {"chunk": {"bytes": json.dumps(payload).encode()}}
+
+
+def test_bedrock_stream_yields_text_deltas():
+    client = FakeBedrockClient([
+        _event({"type": "message_start", "message": {}}),
+        _event({"type": "content_block_delta", "delta": {"type": "text_delta", "text": "SELECT "}}),
+        _event({"type": "content_block_delta", "delta": {"type": "text_delta", "text": "1"}}),
+        _event({"type": "message_stop"}),
+    ])
+    provider = BedrockProvider(model_id="claude-test")
+    provider._client = client
+    calls_before = llm_metrics.summary()["calls"]
+
+    messages = [{"role": "system", "content": "be brief"}, {"role": "user", "content": "hi"}]
+    assert list(provider.stream(messages)) == ["SELECT ", "1"]
+
+    model_id, body = client.requests[0]
+    assert model_id == "claude-test"
+    assert body["system"] == "be brief"
+    assert body["messages"] == [{"role": "user", "content": "hi"}]
+    summary = llm_metrics.summary()
+    assert summary["calls"] == calls_before + 1
+    assert summary["last_provider"] == "bedrock:claude-test"
+    assert summary["avg_ttft_seconds"] is not None
+
+
+def test_closing_the_async_stream_stops_the_bedrock_read():
+    client = FakeBedrockClient([
+        _event({"type": "content_block_delta", "delta": {"type": "text_delta", "text": "x"}}),
+    ], endless=True)
+    provider = BedrockProvider(model_id="claude-test")
+    provider._client = client
+
+    async def read_one():
+        deltas = provider._astream_deltas([{"role": "user", "content": "hi"}])
+        assert await deltas.__anext__() == "x"
+        await deltas.aclose()
+
+    asyncio.run(read_one())
+    assert client.stream.closed.wait(1)
+    read = client.stream.read
+    time.sleep(0.05)
+    assert client.stream.read == read
+
+
+def test_client_is_created_once():
+    created = []
+
+    class CountingProvider(FakeProvider):
+        def _create_client(self):
+            created.append(1)
+            return object()
+
+    provider = CountingProvider()
+    assert provider.client is provider.client
+    assert created == [1]
+
+
+def test_fake_provider_streams_canned_response():
+    provider = FakeProvider(responder=lambda messages: messages[-1]["content"].upper(), chunk_size=2)
+    assert list(provider.stream([{"role": "user", "content": "abc"}])) == ["AB", "C"]
+    assert provider.complete([{"role": "user", "content": "xyz"}]) == "XYZ"
+    assert len(provider.calls) == 2
+
+
+def test_registry_selects_provider_by_name(monkeypatch):
+    monkeypatch.setattr(llm_providers.llm_config, "provider", "fake")
+    llm_providers.set_llm_provider(None)
+    try:
+        provider = llm_providers.get_llm_provider()
+        assert isinstance(provider, FakeProvider)
+        assert llm_providers.get_llm_provider() is provider
+
+        monkeypatch.setattr(llm_providers.llm_config, "provider", "nope")
+        llm_providers.set_llm_provider(None)
+        with pytest.raises(ValueError):
+            llm_providers.get_llm_provider()
+    finally:
+        llm_providers.set_llm_provider(None)
@@ -0,0 +1,194 @@
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+import duckdb
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.ai_service as ai_service
+import src.async_pipeline as async_pipeline
+import src.oracle_replica as oracle_replica
+from config.config import ReplicaConfig
+from src.ai_service import PreparedQuestion
+from src.oracle_replica import OracleReplica, to_duckdb_sql
+from src.sql_guard import SQLGuard
+
+
+class FakeOracle:
+    """Stands in for DatabaseManager.iter_query_chunks over in-memory tables."""
+
+    connected = True
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.queries = []
+
+    def iter_query_chunks(self, sql, parameters=None, chunk_size=None, max_rows=None, max_bytes=None, arrow=False):
+        self.queries.append((sql, parameters))
+        frame = self.tables[re.search(r"FROM (\w+)", sql).group(1)]
+        if parameters:
+            column = re.search(r"WHERE (\w+) >=", sql).group(1)
+            frame = frame[frame[column] >= parameters["since"]]
+        if max_rows and len(frame) > max_rows:
+            marker = frame.iloc[:0].copy()
+            marker.attrs["truncated"] = True
+            yield frame.iloc[:max_rows]
+            yield marker
+            return
+        yield frame.reset_index(drop=True)
+
+
+@pytest.fixture
+def oracle():
+    today = datetime.now().replace(microsecond=0)
+    return FakeOracle({
+        "CARRIER": pd.DataFrame({
+            "CARRIERID": [1, 2, 3],
+            "NAME": ["Alpha", "Beta", None],
+            "IS_DISABLED": [0, 0, 1],
+            "LAST_UPDATED": [today - timedelta(days=3), today - timedelta(days=2), today - timedelta(days=1)],
+        }),
+        "AGREEMENT": pd.DataFrame({
+            "AGREEMENTID": [10, 11],
+            "CARRIERID": [1, 2],
+            "IS_VALID_REVISION": [1, 1],
+            "VALID_FROM": [today - timedelta(days=30), today + timedelta(days=5)],
+            "VALID_UNTIL": [today + timedelta(days=30), today + timedelta(days=60)],
+        }),
+        "AGR_RATE_USAGE_CHARGE": pd.DataFrame({"RATE_USAGE_CHARGEID": range(50)}),
+    })
+
+
+@pytest.fixture
+def config(tmp_path):
+    return ReplicaConfig(enabled=True, path=str(tmp_path), tables=("CARRIER", "AGREEMENT", "AGR_RATE_USAGE_CHARGE"),
+                         change_columns={"CARRIER": "LAST_UPDATED"}, max_rows=20)
+
+
+def test_oracle_words_are_rewritten_outside_literals():
+    assert to_duckdb_sql("SELECT TRUNC(SYSDATE), 'SYSDATE' FROM dual -- TRUNC") == (
+        "SELECT ora_trunc(localtimestamp), 'SYSDATE' FROM dual -- TRUNC")
+
+
+def test_snapshot_and_routed_reads(oracle, config):
+    replica = OracleReplica(config, db_manager=oracle)
+    assert replica.sync() == {"CARRIER": "snapshot", "AGREEMENT": "snapshot", "AGR_RATE_USAGE_CHARGE": "failed"}
+    assert "REPLICA_MAX_ROWS" in replica.tables["AGR_RATE_USAGE_CHARGE"].error
+    # A failed table waits for the next snapshot instead of retrying on every pass
+    assert replica.sync() == {}
+
+    sql = (
+        "SELECT c.CARRIERID, NVL(c.NAME, 'n/a') AS NAME FROM CARRIER c "
+        "JOIN AGREEMENT a ON a.CARRIERID = c.CARRIERID "
+        "WHERE c.IS_DISABLED = 0 AND a.IS_VALID_REVISION = 1 "
+        "AND TRUNC(SYSDATE) BETWEEN TRUNC(a.VALID_FROM) AND TRUNC(a.VALID_UNTIL) "
+        "ORDER BY c.CARRIERID FETCH FIRST 10 ROWS ONLY"
+    )
+    assert replica.covers(sql) == ["CARRIER", "AGREEMENT"]
+    result = replica.try_query(sql)
+    assert result["CARRIERID"].tolist() == [1]
+    assert set(result.attrs["replica"]["tables"]) == {"CARRIER", "AGREEMENT"}
+    assert result.attrs["replica"]["age_seconds"] < 60
+
+    # Unreplicated tables, oversized tables and stale copies go to Oracle
+    assert replica.covers("SELECT * FROM CARRIER c JOIN PPM_PRODUCT p ON p.CARRIERID = c.CARRIERID") is None
+    assert replica.covers("SELECT * FROM AGR_RATE_USAGE_CHARGE") is None
+    replica.tables["AGREEMENT"].synced_at -= config.max_staleness_seconds + 1
+    assert replica.covers("SELECT * FROM AGREEMENT") is None
+
+    # SQL DuckDB cannot run falls back too
+    assert replica.try_query("SELECT * FROM CARRIER WHERE ROWNUM <= 5") is None
+    assert replica.stats()["served"] == 1
+    assert replica.stats()["fallbacks"] == 1
+
+
+def test_incremental_sync_merges_changes_by_key(oracle, config):
+    replica = OracleReplica(config, db_manager=oracle)
+    replica.sync()
+    carriers = oracle.tables["CARRIER"]
+    watermark = carriers["LAST_UPDATED"].max()
+    now = datetime.now().replace(microsecond=0)
+    carriers.loc[carriers["CARRIERID"] == 2, ["NAME", "LAST_UPDATED"]] = ["Beta Telecom", now]
+    oracle.tables["CARRIER"] = pd.concat([carriers, pd.DataFrame({
+        "CARRIERID": [4], "NAME": ["Delta"], "IS_DISABLED": [0], "LAST_UPDATED": [now],
+    })], ignore_index=True)
+
+    replica.tables["CARRIER"].synced_at -= config.refresh_seconds
+    assert replica.sync() == {"CARRIER": "incremental"}
+    sql, parameters = oracle.queries[-1]
+    assert "LAST_UPDATED >= :since" in sql
+    assert parameters["since"] == watermark
+    assert replica.tables["CARRIER"].rows == 4
+    assert replica.tables["CARRIER"].watermark == now.isoformat()
+
+    # The manifest carries the sync state over to a new process
+    reopened = OracleReplica(config, db_manager=oracle)
+    result = reopened.try_query("SELECT CARRIERID, NAME FROM CARRIER ORDER BY CARRIERID")
+    assert result["NAME"].fillna("-").tolist() == ["Alpha", "Beta Telecom", "-", "Delta"]
+    assert reopened.tables["CARRIER"].watermark == now.isoformat()
+
+
+def test_comma_joined_tables_must_be_fresh_too(oracle, config):
+    replica = OracleReplica(config, db_manager=oracle)
+    replica.sync()
+    sql = ("SELECT c.NAME, a.AGREEMENTID FROM CARRIER c, AGREEMENT a "
+           "WHERE c.CARRIERID = a.CARRIERID ORDER BY a.AGREEMENTID")
+    assert replica.covers(sql) == ["CARRIER", "AGREEMENT"]
+    assert set(replica.try_query(sql).attrs["replica"]["tables"]) == {"CARRIER", "AGREEMENT"}
+
+    replica.tables["AGREEMENT"].synced_at -= config.max_staleness_seconds + 1
+    assert replica.covers(sql) is None
+    assert replica.try_query(sql) is None
+    assert replica.covers("SELECT * FROM CARRIER c, PPM_PRODUCT p WHERE p.CARRIERID = c.CARRIERID") is None
+
+
+def test_replica_keeps_oracle_null_semantics(oracle, config):
+    replica = OracleReplica(config, db_manager=oracle)
+    replica.sync()
+    # Oracle sorts NULLs first in descending order
+    result = replica.try_query("SELECT CARRIERID, NAME FROM CARRIER ORDER BY NAME DESC")
+    assert result["CARRIERID"].tolist() == [3, 2, 1]
+    result = replica.try_query("SELECT CARRIERID FROM CARRIER ORDER BY NAME")
+    assert result["CARRIERID"].tolist() == [1, 2, 3]
+    # 'a' || NULL is 'a' on Oracle but NULL on DuckDB, so || is never served locally
+    assert replica.covers("SELECT 'Carrier ' || NAME AS LABEL FROM CARRIER") is None
+    assert replica.covers("SELECT NAME FROM CARRIER WHERE NAME <> 'a||b'") == ["CARRIER"]
+
+
+def test_replica_queries_cannot_read_other_files(oracle, config, tmp_path_factory):
+    secret = tmp_path_factory.mktemp("outside") / "credentials"
+    secret.write_text("key=value")
+    replica = OracleReplica(config, db_manager=oracle)
+    replica.sync()
+    sql = f"SELECT c.*, t.content FROM CARRIER c, read_text('{secret}') t"
+    assert replica.covers(sql) is None
+    assert not SQLGuard().check_replica(sql).allowed
+    with pytest.raises(duckdb.PermissionException):
+        replica.query(sql)
+    assert replica.try_query("SELECT COUNT(*) AS N FROM CARRIER")["N"].tolist() == [3]
+
+
+def test_oracle_queries_are_served_by_the_replica(oracle, config, monkeypatch):
+    replica = OracleReplica(config, db_manager=oracle)
+    replica.sync()
+    monkeypatch.setattr(oracle_replica, "get_oracle_replica", lambda: replica)
+    result = ai_service.execute_oracle_query("SELECT COUNT(*) AS N FROM CARRIER WHERE IS_DISABLED = 0")
+    assert result["N"].tolist() == [2]
+    assert "replica" in result.attrs
+    assert ai_service.replica_covers("SELECT * FROM AGREEMENT")
+    assert not ai_service.replica_covers("SELECT * FROM DESTINATION")
+
+
+def test_pipeline_routes_oracle_answers_to_the_replica(oracle, config, fake_llm, monkeypatch):
+    replica = OracleReplica(config, db_manager=oracle)
+    replica.sync()
+    monkeypatch.setattr(oracle_replica, "get_oracle_replica", lambda: replica)
+    fake_llm(lambda messages: "```sql\nSELECT NAME FROM CARRIER WHERE IS_DISABLED = 0 ORDER BY NAME\n```")
+    question = PreparedQuestion("active carriers", "oracle",
+                                messages=[{"role": "user", "content": "active carriers"}])
+    ai_response, sql_query, query_result, source = async_pipeline.SyncAnswer(question).result()
+    assert query_result["NAME"].tolist() == ["Alpha", "Beta"]
+    assert query_result.attrs["replica"]["tables"].keys() == {"CARRIER"}
@@ -0,0 +1,117 @@
+import os
+import sys
+
+import duckdb
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.ai_service as ai_service
+from config.config import TemplateConfig
+from src.query_templates import TemplateEngine, deck_target, format_template_answer, oracle_target
+
+DICTIONARY = {"mappings": [{"business_term": "Supplier", "synonyms": ["carriers", "suppliers"],
+                            "table_name": "CARRIERS"}]}
+
+
+@pytest.fixture
+def deck():
+    return pd.DataFrame({
+        "Destination": ["Albania x", "Albania x", "Brazil y", "Chile z"],
+        "Supplier": ["Alpha", "Beta", "Alpha", "Gamma"],
+        "Rate": [0.30, 0.10, 0.50, 0.20],
+        "Floor Price": [0.25, 0.15, 0.40, 0.10],
+    })
+
+
+def run(sql, frame):
+    return duckdb.query_df(frame, "df", sql).df()
+
+
+def test_top_n_ranks_entities_by_aggregate(deck):
+    engine = TemplateEngine()
+    match, _ = engine.match("top 2 carriers by average rate", deck_target(deck, DICTIONARY))
+    assert match.intent == "top_n"
+    result = run(match.sql, deck)
+    assert list(result["Supplier"]) == ["Alpha", "Gamma"]
+
+
+def test_average_by_destination(deck):
+    engine = TemplateEngine()
+    match, _ = engine.match("what is the average rate by destination", deck_target(deck))
+    assert match.intent == "average_by"
+    result = run(match.sql, deck).set_index("Destination")
+    assert result.iloc[:, 0]["Albania x"] == pytest.approx(0.2)
+
+
+def test_threshold_with_value_filter(deck):
+    engine = TemplateEngine()
+    match, _ = engine.match("rows where rate > 0.15 for Albania", deck_target(deck))
+    assert match.intent == "threshold"
+    result = run(match.sql, deck)
+    assert list(result["Supplier"]) == ["Alpha"]
+
+
+def test_below_floor_price(deck):
+    engine = TemplateEngine()
+    match, _ = engine.match("rows below floor price", deck_target(deck))
+    assert match.intent == "compare"
+    result = run(match.sql, deck)
+    assert list(result["Supplier"]) == ["Beta"]
+
+
+def test_uncovered_questions_fall_back(deck):
+    engine = TemplateEngine()
+    target = deck_target(deck)
+    for question in ["top 10 suppliers by volume", "how many suppliers are there",
+                     "rates above 0.5 last month"]:
+        match, confidence = engine.match(question, target)
+        assert match is None
+        assert confidence < engine.config.min_confidence
+
+
+def test_negated_questions_fall_back(deck):
+    engine = TemplateEngine()
+    target = deck_target(deck, DICTIONARY)
+    for question in ["top 5 suppliers by rate not in Albania", "average rate by destination not for Albania",
+                     "average rate by destination except Albania", "rates above 0.2 excluding Alpha",
+                     "top 2 carriers by rate other than Albania", "average rate by supplier without Albania"]:
+        match, _ = engine.match(question, target)
+        assert match is None
+
+
+def test_oracle_target_renders_fetch_first():
+    schema = {"tables": {"SALES.CARRIERS": {"columns": [
+        {"column_name": "CARRIER_ID", "data_type": "NUMBER"},
+        {"column_name": "CARRIER_NAME", "data_type": "VARCHAR2"},
+        {"column_name": "RATE", "data_type": "NUMBER"},
+    ]}}}
+    target = oracle_target(DICTIONARY["mappings"][0], schema)
+    match, _ = TemplateEngine().match("top 5 suppliers by rate", target)
+    assert match.dialect == "oracle"
+    assert "SALES.CARRIERS" in match.sql
+    assert "FETCH FIRST 5 ROWS ONLY" in match.sql
+
+
+def test_stats_report_hit_rate_and_saved_time(deck):
+    engine = TemplateEngine(TemplateConfig(assumed_llm_seconds=4.0))
+    target = deck_target(deck)
+    engine.answer("top 3 suppliers by rate", [target])
+    engine.answer("explain the pricing strategy", [target])
+    summary = engine.stats.summary()
+    assert summary["questions"] == 2
+    assert summary["hits"] == 1
+    assert summary["hit_rate"] == 0.5
+    assert 3.0 < summary["saved_seconds"] <= 4.0
+
+
+def test_template_answer_skips_the_llm(deck, fake_llm):
+    provider = fake_llm(lambda messages: "should not be called")
+    ai_response, sql_query, result, source = ai_service.enhanced_query_handler(
+        "average rate by destination", deck)
+    assert provider.calls == []
+    assert source == "local"
+    assert "no LLM call" in ai_response
+    assert isinstance(result, pd.DataFrame) and len(result) == 3
+    assert sql_query in format_template_answer(ai_service.match_query_template(
+        "average rate by destination", deck, "local"))
@@ -0,0 +1,180 @@
+import asyncio
+import email.utils
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.rate_limiter as rate_limiter
+from config.config import RateLimitConfig, _parse_rate_limits
+from src.llm_providers import BedrockProvider, FakeProvider, LLMProvider, parse_retry_after
+from src.rate_limiter import AdaptiveRateLimiter, QueueDeadlineExceeded, RateLimitExceeded, TokenBucket
+
+FAST = RateLimitConfig(backoff_base=0.01, backoff_max=0.05, queue_deadline=5.0, max_retries=3)
+
+
+class Throttled(Exception):
+    def __init__(self, retry_after=0.0):
+        super().__init__("429 Too Many Requests")
+        self.retry_after = retry_after
+
+
+class ThrottlingFakeProvider(FakeProvider):
+    """Fails with a throttling error for the first `failures` calls."""
+
+    name = "throttly"
+
+    def __init__(self, failures, fail_after_chunks=0, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.fail_after_chunks = fail_after_chunks
+
+    def throttle_retry_after(self, error):
+        return error.retry_after if isinstance(error, Throttled) else None
+
+    def _stream_deltas(self, messages):
+        for index, delta in enumerate(super()._stream_deltas(messages)):
+            if self.failures and index == self.fail_after_chunks:
+                self.failures -= 1
+                raise Throttled()
+            yield delta
+
+    # Async calls pump the blocking stream from a thread, as for Bedrock
+    _astream_deltas = LLMProvider._astream_deltas
+
+
+@pytest.fixture
+def limiters(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(rate_limiter, "_limiters", registry)
+    return registry
+
+
+def test_bucket_queues_reservations():
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)
+    now = time.monotonic()
+    assert bucket.reserve(1, now) == 0.0
+    assert bucket.reserve(1, now) == 0.0
+    assert bucket.reserve(1, now) == pytest.approx(1.0)
+    assert bucket.reserve(1, now) == pytest.approx(2.0)
+
+
+def test_deadline_fails_fast_and_refunds():
+    limiter = AdaptiveRateLimiter("openai:gpt-4", requests_per_minute=6, config=FAST)
+    deadline = time.monotonic() + 1.0
+    limiter.acquire(10, deadline)
+    with pytest.raises(QueueDeadlineExceeded) as excinfo:
+        limiter.acquire(10, deadline)
+    assert excinfo.value.retry_after > 1.0
+    assert limiter.stats()["deadline_failures"] == 1
+    # The failed reservation did not push later callers further back
+    assert limiter._buckets[0].level == pytest.approx(0.0, abs=0.01)
+
+
+def test_token_budget_limits_large_prompts():
+    limiter = AdaptiveRateLimiter("bedrock:claude", tokens_per_minute=6000, config=FAST)
+    deadline = time.monotonic() + 0.5
+    limiter.acquire(1000, deadline)
+    with pytest.raises(QueueDeadlineExceeded):
+        limiter.acquire(1000, deadline)
+
+
+def test_aimd_halves_on_throttle_and_recovers_additively():
+    limiter = AdaptiveRateLimiter("openai:gpt-4", requests_per_minute=100, tokens_per_minute=10000, config=FAST)
+    limiter.on_throttle()
+    assert limiter.stats()["rpm_limit"] == 50
+    assert limiter.stats()["tpm_limit"] == 5000
+    limiter.on_success(100, 100)
+    assert limiter.stats()["rpm_limit"] == 52
+    for _ in range(100):
+        limiter.on_success(100, 100)
+    assert limiter.stats()["rpm_limit"] == 100
+    assert limiter.stats()["tpm_limit"] == 10000
+
+
+def test_unconfigured_limit_is_learned_then_lifted():
+    limiter = AdaptiveRateLimiter("bedrock:claude", config=FAST)
+    far = time.monotonic() + 60
+    for _ in range(20):
+        limiter.acquire(100, far)
+    limiter.on_throttle()
+    assert limiter.stats()["rpm_limit"] == 10  # half of the 20 requests seen in the last minute
+    for _ in range(200):
+        limiter.on_success(100, 100)
+    assert limiter.stats()["rpm_limit"] is None
+
+
+def test_backoff_honors_retry_after():
+    limiter = AdaptiveRateLimiter("openai:gpt-4", config=RateLimitConfig(backoff_base=1, backoff_max=8))
+    delays = [limiter.backoff(attempt) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= 8 for delay in delays)
+    assert limiter.backoff(0, retry_after=12.5) == 12.5
+
+
+def test_parse_retry_after_headers():
+    assert parse_retry_after({"Retry-After": "7"}) == 7.0
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    future = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= parse_retry_after({"retry-after": future}) <= 31
+    assert parse_retry_after({}) == 0.0
+
+
+def test_rate_limit_overrides_parse():
+    limits = _parse_rate_limits("openai:gpt-4=500/30000, bedrock=50")
+    assert limits == {"openai:gpt-4": (500, 30000), "bedrock": (50, 0)}
+    config = RateLimitConfig(requests_per_minute=10, model_limits=limits)
+    assert config.limits_for("openai", "gpt-4") == (500, 30000)
+    assert config.limits_for("bedrock", "any-model") == (50, 0)
+    assert config.limits_for("openai", "gpt-4o") == (10, 0)
+
+
+def test_throttled_stream_is_retried(limiters):
+    limiters["throttly:fake"] = AdaptiveRateLimiter("throttly:fake", config=FAST)
+    provider = ThrottlingFakeProvider(failures=2)
+    assert provider.complete([{"role": "user", "content": "hi"}]) == FakeProvider.DEFAULT_RESPONSE
+    stats = limiters["throttly:fake"].stats()
+    assert stats["throttles"] == 2
+    assert stats["retries"] == 2
+
+
+def test_async_stream_is_retried(limiters):
+    limiters["throttly:fake"] = AdaptiveRateLimiter("throttly:fake", config=FAST)
+    provider = ThrottlingFakeProvider(failures=1)
+
+    async def collect():
+        return "".join([delta async for delta in provider.astream([{"role": "user", "content": "hi"}])])
+
+    assert asyncio.run(collect()) == FakeProvider.DEFAULT_RESPONSE
+    assert limiters["throttly:fake"].stats()["retries"] == 1
+
+
+def test_gives_up_after_max_retries(limiters):
+    limiters["throttly:fake"] = AdaptiveRateLimiter("throttly:fake", config=FAST)
+    provider = ThrottlingFakeProvider(failures=10)
+    with pytest.raises(RateLimitExceeded):
+        provider.complete([{"role": "user", "content": "hi"}])
+    assert limiters["throttly:fake"].stats()["retries"] == FAST.max_retries
+
+
+def test_no_retry_once_text_has_streamed(limiters):
+    limiters["throttly:fake"] = AdaptiveRateLimiter("throttly:fake", config=FAST)
+    provider = ThrottlingFakeProvider(failures=1, fail_after_chunks=2)
+    with pytest.raises(RateLimitExceeded):
+        list(provider.stream([{"role": "user", "content": "hi"}]))
+    assert limiters["throttly:fake"].stats()["retries"] == 0
+
+
+def test_bedrock_throttling_is_recognized():
+    from botocore.exceptions import ClientError
+    provider = BedrockProvider(model_id="anthropic.claude")
+    throttled = ClientError(
+        {"Error": {"Code": "ThrottlingException", "Message": "Too many requests"},
+         "ResponseMetadata": {"HTTPHeaders": {"retry-after": "3"}}},
+        "InvokeModelWithResponseStream",
+    )
+    denied = ClientError({"Error": {"Code": "AccessDeniedException", "Message": "no"}}, "InvokeModel")
+    assert provider.throttle_retry_after(throttled) == 3.0
+    assert provider.throttle_retry_after(denied) is None
+    assert provider.throttle_retry_after(ValueError("boom")) is None
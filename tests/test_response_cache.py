@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.response_cache import ResponseCache, normalize_question
+
+KEY = ("local", "schema-v1", "deck-v1", "openai:gpt-4")
+
+
+def test_normalized_questions_share_an_entry(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=None, max_bytes=1 << 20)
+    cache.put("Top 5 destinations by rate?", *KEY, response="answer", sql_query="SELECT 1")
+
+    hit = cache.get("  top 5   DESTINATIONS by rate ", *KEY)
+    assert hit.response == "answer" and hit.sql_query == "SELECT 1"
+    assert normalize_question("Show rates!") == "show rates"
+    assert cache.stats()["hits"] == 1
+
+
+def test_version_changes_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=None, max_bytes=1 << 20)
+    cache.put("q", *KEY, response="answer", sql_query=None)
+
+    assert cache.get("q", "local", "schema-v2", "deck-v1", "openai:gpt-4") is None
+    assert cache.get("q", "local", "schema-v1", "deck-v2", "openai:gpt-4") is None
+    assert cache.get("q", "oracle", "schema-v1", "deck-v1", "openai:gpt-4") is None
+    assert cache.get("q", "local", "schema-v1", "deck-v1", "bedrock:claude") is None
+    assert cache.stats()["misses"] == 4
+
+
+def test_entries_persist_across_instances(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    ResponseCache(path, ttl=None, max_bytes=1 << 20).put("q", *KEY, response="answer", sql_query=None)
+    assert ResponseCache(path, ttl=None, max_bytes=1 << 20).get("q", *KEY).response == "answer"
+
+
+def test_ttl_expiry(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=0.05, max_bytes=1 << 20)
+    cache.put("q", *KEY, response="answer", sql_query=None)
+    time.sleep(0.1)
+    assert cache.get("q", *KEY) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_byte_budget_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=None, max_bytes=250)
+    cache.put("a", *KEY, response="x" * 100, sql_query=None)
+    cache.put("b", *KEY, response="x" * 100, sql_query=None)
+    assert cache.get("a", *KEY) is not None
+    cache.put("c", *KEY, response="x" * 100, sql_query=None)
+
+    assert cache.get("b", *KEY) is None
+    assert cache.get("a", *KEY) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_zero_ttl_disables_the_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=0, max_bytes=1 << 20)
+    cache.put("q", *KEY, response="answer", sql_query=None)
+    assert cache.get("q", *KEY) is None
+    assert cache.stats()["entries"] == 0
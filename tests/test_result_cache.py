@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.result_cache import MemoryBackend, ResultCache, result_size_bytes
+from src.sql_utils import normalize_sql, referenced_tables
+
+
+def _frame(rows):
+    return pd.DataFrame({"Rate": [0.1] * rows})
+
+
+def test_normalized_sql_shares_entry():
+    cache = ResultCache(MemoryBackend(max_bytes=1024 * 1024))
+    cache.put("duckdb", "v1", "SELECT *\n  FROM df;", _frame(3))
+
+    assert cache.get("duckdb", "v1", "select * from df") is not None
+    assert cache.get("duckdb", "v2", "select * from df") is None
+    assert cache.get("duckdb", "v1", "select * from df where x = 'A  B'") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_evicts_least_recently_used_by_bytes():
+    entry_bytes = result_size_bytes(_frame(100))
+    cache = ResultCache(MemoryBackend(max_bytes=entry_bytes * 2))
+    cache.put("duckdb", "v1", "q1", _frame(100))
+    cache.put("duckdb", "v1", "q2", _frame(100))
+    cache.get("duckdb", "v1", "q1")
+    cache.put("duckdb", "v1", "q3", _frame(100))
+
+    assert cache.get("duckdb", "v1", "q2") is None
+    assert cache.get("duckdb", "v1", "q1") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= entry_bytes * 2
+
+
+def test_oversized_result_is_not_cached():
+    cache = ResultCache(MemoryBackend(max_bytes=16))
+    cache.put("duckdb", "v1", "q", _frame(100))
+    assert cache.stats()["entries"] == 0
+
+
+def test_ttl_expiry():
+    cache = ResultCache(MemoryBackend(max_bytes=1024 * 1024))
+    cache.put("oracle", "ttl", "select * from carrier", _frame(1), ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("oracle", "ttl", "select * from carrier") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_zero_ttl_is_not_cached():
+    from config.config import CacheConfig
+    config = CacheConfig(oracle_result_ttl=300, oracle_table_ttls={"RATE_LIVE": 0})
+    ttl = config.oracle_ttl_for(["CARRIER", "OWNER.RATE_LIVE"])
+    assert ttl == 0
+
+    cache = ResultCache(MemoryBackend(max_bytes=1024 * 1024))
+    cache.put("oracle", "ttl", "select * from rate_live", _frame(1), ttl=ttl)
+    assert cache.get("oracle", "ttl", "select * from rate_live") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_comma_joined_tables_get_their_ttl_override():
+    from config.config import CacheConfig
+    config = CacheConfig(oracle_result_ttl=300, oracle_table_ttls={"RATE_LIVE": 0})
+    sql = "SELECT c.NAME, r.RATE FROM CARRIER c, OWNER.RATE_LIVE r WHERE r.CARRIERID = c.CARRIERID"
+    assert referenced_tables(sql) == ["CARRIER", "OWNER.RATE_LIVE"]
+
+    cache = ResultCache(MemoryBackend(max_bytes=1024 * 1024))
+    cache.put("oracle", "ttl", sql, _frame(1), ttl=config.oracle_ttl_for(referenced_tables(sql)))
+    assert cache.get("oracle", "ttl", sql) is None
+
+
+def test_sql_helpers():
+    assert normalize_sql("SELECT  a -- note\nFROM t WHERE b = 'X  Y';") == "select a from t where b = 'X  Y'"
+    assert referenced_tables(
+        "SELECT * FROM carrier c JOIN sales.agreement a ON a.id = c.id WHERE c.name = 'from x'"
+    ) == ["CARRIER", "SALES.AGREEMENT"]
+    assert referenced_tables(
+        "SELECT * FROM a, (SELECT x FROM b, c) s, d WHERE f(a.x, d.y) = 1 ORDER BY 1, 2"
+    ) == ["A", "D", "B", "C"]
@@ -0,0 +1,202 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.schema_service as schema_service
+from src.schema_service import SchemaService
+
+
+class FakeSchemaDB:
+    """Answers the bulk metadata queries from in-memory table definitions."""
+
+    def __init__(self):
+        self.ddl_times = {
+            "CARRIER": datetime(2024, 1, 1),
+            "AGREEMENT": datetime(2024, 1, 1),
+        }
+        self.columns = {
+            "CARRIER": [("CARRIERID", "NUMBER", "N", "Carrier key"), ("NAME", "VARCHAR2", "Y", None)],
+            "AGREEMENT": [("AGREEMENTID", "NUMBER", "N", None), ("CARRIERID", "NUMBER", "Y", None)],
+        }
+        self.calls = []
+
+    def _tables(self, binds):
+        names = list(binds.values()) if binds else list(self.ddl_times)
+        return [name for name in names if name in self.ddl_times]
+
+    def execute_query(self, sql, parameters=None, max_rows=None, max_bytes=None):
+        self.calls.append((sql, parameters))
+        if "FROM DUAL" in sql:
+            return pd.DataFrame([("ORCL", None, "orcl1", "WHOLESALE")],
+                                columns=["DB_NAME", "DB_DOMAIN", "INSTANCE_NAME", "SCHEMA_NAME"])
+        if "FROM USER_TABLES" in sql:
+            return pd.DataFrame(
+                [(name, 10, ddl, None) for name, ddl in self.ddl_times.items()],
+                columns=["TABLE_NAME", "NUM_ROWS", "LAST_DDL_TIME", "TABLE_COMMENT"],
+            )
+        if "FROM USER_TAB_COLUMNS" in sql:
+            rows = [
+                (table, name, data_type, 22, None, None, nullable, comment)
+                for table in self._tables(parameters)
+                for name, data_type, nullable, comment in self.columns[table]
+            ]
+            return pd.DataFrame(rows, columns=[
+                "TABLE_NAME", "COLUMN_NAME", "DATA_TYPE", "DATA_LENGTH", "DATA_PRECISION",
+                "DATA_SCALE", "NULLABLE", "COLUMN_COMMENT",
+            ])
+        if "FROM USER_CONSTRAINTS" in sql:
+            rows = []
+            tables = self._tables(parameters)
+            if "CARRIER" in tables:
+                rows.append(("CARRIER", "CARRIER_PK", "P", "CARRIERID", None, None, None))
+            if "AGREEMENT" in tables:
+                rows.append(("AGREEMENT", "AGREEMENT_PK", "P", "AGREEMENTID", None, None, None))
+                rows.append(("AGREEMENT", "AGREEMENT_CARRIER_FK", "R", "CARRIERID",
+                             "WHOLESALE", "CARRIER", "CARRIERID"))
+            return pd.DataFrame(rows, columns=[
+                "TABLE_NAME", "CONSTRAINT_NAME", "CONSTRAINT_TYPE", "COLUMN_NAME",
+                "R_OWNER", "R_TABLE_NAME", "R_COLUMN_NAME",
+            ])
+        raise AssertionError(f"unexpected query: {sql}")
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeSchemaDB()
+    monkeypatch.setattr(schema_service, "get_db_status", lambda: True)
+    monkeypatch.setattr(schema_service, "get_db_manager", lambda: db)
+    return db
+
+
+def test_full_extraction_uses_set_based_queries(fake_db):
+    schema = SchemaService().extract_oracle_schema()
+
+    assert len(fake_db.calls) == 4
+    carrier = schema["tables"]["WHOLESALE.CARRIER"]
+    assert carrier["last_ddl_time"] == "2024-01-01T00:00:00"
+    assert carrier["columns"][0]["primary_key"]
+    assert carrier["columns"][0]["description"] == "Carrier key"
+    assert carrier["columns"][1]["description"] is None
+
+    agreement_fk = schema["tables"]["WHOLESALE.AGREEMENT"]["columns"][1]
+    assert agreement_fk["foreign_key"]
+    assert agreement_fk["referenced_table"] == "WHOLESALE.CARRIER"
+    assert agreement_fk["referenced_column"] == "CARRIERID"
+    assert schema["relationships"] == [{
+        "constraint_name": "AGREEMENT_CARRIER_FK",
+        "from_table": "WHOLESALE.AGREEMENT",
+        "from_column": "CARRIERID",
+        "to_table": "WHOLESALE.CARRIER",
+        "to_column": "CARRIERID",
+    }]
+    assert schema["statistics"]["extraction_mode"] == "full"
+
+
+def test_incremental_refresh_rereads_only_changed_tables(fake_db):
+    service = SchemaService()
+    snapshot = service.extract_oracle_schema()
+
+    fake_db.calls.clear()
+    unchanged = service.extract_oracle_schema(previous=snapshot)
+    assert len(fake_db.calls) == 2
+    assert unchanged["tables"] == snapshot["tables"]
+    assert unchanged["relationships"] == snapshot["relationships"]
+
+    fake_db.calls.clear()
+    fake_db.ddl_times["CARRIER"] = datetime(2024, 6, 1)
+    fake_db.columns["CARRIER"].append(("COUNTRY", "VARCHAR2", "Y", None))
+    refreshed = service.extract_oracle_schema(previous=snapshot)
+
+    column_call = next(call for call in fake_db.calls if "USER_TAB_COLUMNS" in call[0])
+    assert list(column_call[1].values()) == ["CARRIER"]
+    assert len(refreshed["tables"]["WHOLESALE.CARRIER"]["columns"]) == 3
+    assert refreshed["tables"]["WHOLESALE.AGREEMENT"] == snapshot["tables"]["WHOLESALE.AGREEMENT"]
+    assert refreshed["relationships"] == snapshot["relationships"]
+    assert refreshed["statistics"]["refreshed_tables"] == 1
+
+
+def test_dropped_tables_disappear(fake_db):
+    service = SchemaService()
+    snapshot = service.extract_oracle_schema()
+    del fake_db.ddl_times["AGREEMENT"]
+
+    refreshed = service.extract_oracle_schema(previous=snapshot)
+    assert list(refreshed["tables"]) == ["WHOLESALE.CARRIER"]
+    assert refreshed["relationships"] == []
+
+
+def _write_dictionary(path, terms):
+    mappings = [{"business_term": term, "table_name": "CARRIER", "column_name": "NAME"} for term in terms]
+    path.write_text(json.dumps({"mappings": mappings}))
+    # Make sure the change is visible even on filesystems with coarse mtimes
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_snapshot_hot_reloads_changed_dictionary(tmp_path):
+    dictionary = tmp_path / "business_dictionary.json"
+    _write_dictionary(dictionary, ["carrier"])
+    service = SchemaService(str(tmp_path / "schema.json"), str(dictionary))
+
+    first = service.snapshot()
+    assert service.snapshot() is first
+    assert [m["business_term"] for m in service.search_business_terms("show carrier")] == ["carrier"]
+    with pytest.raises(TypeError):
+        first.business_dictionary["mappings"][0]["business_term"] = "x"
+
+    _write_dictionary(dictionary, ["carrier", "agreement"])
+    second = service.snapshot()
+    assert second.version != first.version
+    assert len(second.business_dictionary["mappings"]) == 2
+    assert service.match_business_terms("agreement")[0].business_term == "agreement"
+    # The old snapshot is untouched
+    assert len(first.business_dictionary["mappings"]) == 1
+
+
+def test_snapshot_version_follows_content(tmp_path):
+    dictionary = tmp_path / "business_dictionary.json"
+    _write_dictionary(dictionary, ["carrier"])
+    service = SchemaService(str(tmp_path / "schema.json"), str(dictionary))
+    version = service.version
+
+    # Rewriting identical content bumps the mtime but not the version
+    _write_dictionary(dictionary, ["carrier"])
+    assert service.version == version
+
+    service.save_schema({"tables": {}})
+    assert service.version != version
+    assert SchemaService(str(tmp_path / "schema.json"), str(dictionary)).version == service.version
+
+
+def test_schema_file_is_replaced_atomically(tmp_path, monkeypatch):
+    dictionary = tmp_path / "business_dictionary.json"
+    _write_dictionary(dictionary, ["carrier"])
+    schema_path = tmp_path / "schema.json"
+    service = SchemaService(str(schema_path), str(dictionary))
+    service.save_schema({"tables": {"CARRIER": {}}})
+    written = schema_path.read_bytes()
+
+    def failed_rename(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(schema_service.os, "replace", failed_rename)
+    with pytest.raises(OSError):
+        service.save_schema({"tables": {"CARRIER": {}, "AGREEMENT": {}}})
+    # Readers never see a partial file, and the temp file is cleaned up
+    assert schema_path.read_bytes() == written
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
+
+
+def test_plural_questions_find_dictionary_terms():
+    service = SchemaService(business_dict_file="data/metadata/business_dictionary.json")
+    assert "agreement" in [m["business_term"] for m in service.search_business_terms("list agreements")]
+    assert "product" in [m["business_term"] for m in service.search_business_terms("show me products")]
+
+
+def test_get_schema_service_is_shared():
+    assert schema_service.get_schema_service() is schema_service.get_schema_service()
@@ -0,0 +1,218 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.async_pipeline as async_pipeline
+import src.single_flight as single_flight
+from src.cancellation import CancelToken, QueryCancelled
+from src.single_flight import SingleFlight, flight_key
+
+
+def _run_threads(count, target):
+    results = [None] * count
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, target())) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_calls_run_once():
+    group = SingleFlight("test")
+    calls = []
+
+    def slow_query():
+        calls.append(1)
+        time.sleep(0.2)
+        return pd.DataFrame({"n": [1]})
+
+    results = _run_threads(5, lambda: group.do("same", slow_query))
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert group.stats()["executed"] == 1
+    assert group.stats()["coalesced"] == 4
+    assert group.stats()["in_flight"] == 0
+
+
+def test_sequential_calls_are_not_cached():
+    group = SingleFlight("test")
+    calls = []
+    group.do("same", calls.append, 1)
+    group.do("same", calls.append, 2)
+    assert calls == [1, 2]
+    assert group.stats()["coalesced"] == 0
+
+
+def test_errors_are_shared():
+    group = SingleFlight("test")
+
+    def failing():
+        time.sleep(0.1)
+        raise RuntimeError("ORA-00942")
+
+    def call():
+        try:
+            group.do("same", failing)
+        except RuntimeError as e:
+            return str(e)
+
+    assert _run_threads(3, call) == ["ORA-00942"] * 3
+    assert group.stats()["executed"] == 1
+
+
+def test_async_callers_share_one_call():
+    group = SingleFlight("test")
+    calls = []
+
+    async def query():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "rows"
+
+    async def main():
+        return await asyncio.gather(*(group.ado("same", query) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["rows"] * 4
+    assert len(calls) == 1
+
+
+def test_streams_are_replayed_to_late_joiners():
+    group = SingleFlight("test")
+    started = []
+
+    async def upstream():
+        started.append(1)
+        for part in ["SELECT ", "1 ", "FROM dual"]:
+            await asyncio.sleep(0.01)
+            yield part
+
+    async def read(delay):
+        await asyncio.sleep(delay)
+        return "".join([delta async for delta in group.stream("same", upstream)])
+
+    async def main():
+        return await asyncio.gather(read(0), read(0.015))
+
+    assert asyncio.run(main()) == ["SELECT 1 FROM dual"] * 2
+    assert len(started) == 1
+    assert group.stats()["coalesced"] == 1
+
+
+def test_follower_cancel_ends_its_wait_but_not_the_call():
+    group = SingleFlight("duckdb")
+    started, release = threading.Event(), threading.Event()
+    interrupted = []
+
+    def slow_query(cancel_token):
+        started.set()
+        with cancel_token.on_cancel(lambda: interrupted.append(1)):
+            release.wait(5)
+        return "rows"
+
+    results = {}
+    leader = threading.Thread(target=lambda: results.setdefault(
+        "leader", group.do("same", slow_query, cancel_token=CancelToken())))
+    leader.start()
+    assert started.wait(2)
+
+    follower_token = CancelToken()
+    threading.Timer(0.05, follower_token.cancel).start()
+    start_time = time.perf_counter()
+    with pytest.raises(QueryCancelled):
+        group.do("same", slow_query, cancel_token=follower_token)
+    # The follower stopped waiting while the leader's query was still running
+    assert time.perf_counter() - start_time < 1
+    assert not interrupted and leader.is_alive()
+
+    release.set()
+    leader.join(2)
+    assert results["leader"] == "rows"
+    assert group.stats()["coalesced"] == 1 and group.stats()["in_flight"] == 0
+
+
+def test_call_is_interrupted_once_every_waiter_cancels():
+    group = SingleFlight("duckdb")
+    started = threading.Event()
+
+    def slow_query(cancel_token):
+        started.set()
+        interrupted = threading.Event()
+        with cancel_token.on_cancel(interrupted.set):
+            if not interrupted.wait(5):
+                return "rows"
+        raise cancel_token.error("duckdb")
+
+    tokens = [CancelToken(), CancelToken()]
+    errors = []
+
+    def wait(token):
+        try:
+            group.do("same", slow_query, cancel_token=token)
+        except QueryCancelled as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wait, args=(token,)) for token in tokens]
+    threads[0].start()
+    assert started.wait(2)
+    threads[1].start()
+    time.sleep(0.05)
+    for token in tokens:
+        token.cancel()
+    for thread in threads:
+        thread.join(2)
+    assert len(errors) == 2
+    assert group.stats()["in_flight"] == 0
+
+
+def test_async_follower_cancel_ends_its_wait():
+    group = SingleFlight("oracle")
+
+    async def slow_query(cancel_token):
+        await asyncio.sleep(0.3)
+        return "rows"
+
+    async def main():
+        follower_token = CancelToken()
+        leader = asyncio.ensure_future(group.ado("same", slow_query, cancel_token=CancelToken()))
+        await asyncio.sleep(0.01)
+        asyncio.get_running_loop().call_later(0.02, follower_token.cancel)
+        with pytest.raises(QueryCancelled):
+            await group.ado("same", slow_query, cancel_token=follower_token)
+        assert not leader.done()
+        return await leader
+
+    assert asyncio.run(main()) == "rows"
+
+
+def test_flight_key_is_stable():
+    assert flight_key("v1", "select 1", {"a": 1, "b": 2}) == flight_key("v1", "select 1", {"b": 2, "a": 1})
+    assert flight_key("v1", "select 1") != flight_key("v2", "select 1")
+
+
+def test_identical_questions_share_one_llm_stream(fake_llm, monkeypatch):
+    provider = fake_llm(lambda messages: "Counting rows.\n```sql\nSELECT COUNT(*) AS n FROM df\n```\nDone.",
+                        chunk_size=8, delay=0.02)
+    monkeypatch.setattr(single_flight, "_groups", {})
+    frame = pd.DataFrame({"Rate": [0.1, 0.2]})
+
+    async def ask(question):
+        answer = await async_pipeline.answer_question_async(question, frame)
+        return await answer.result()
+
+    async def ask_all():
+        return await asyncio.gather(ask("Count rows?"), ask("count   rows"), ask("count rows"))
+
+    results = async_pipeline.run_sync(ask_all())
+
+    assert len(provider.calls) == 1
+    assert [r[2]["n"].tolist() for r in results] == [[2]] * 3
+    stats = single_flight.coalescing_stats()
+    assert stats["llm"]["coalesced"] == 2
@@ -0,0 +1,98 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.async_pipeline as async_pipeline
+from config.config import SQLGuardConfig
+from src.ai_service import PreparedQuestion
+from src.sql_guard import (
+    SQLGuard, apply_row_limit, check_read_only, summarize_duckdb_plan, summarize_oracle_plan,
+)
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({"a": range(1000), "b": range(1000)})
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM df",
+    "WITH t AS (SELECT a FROM df) SELECT * FROM t;",
+    "SELECT 'drop table x; delete' AS note, \"Update\" FROM df",
+    "SELECT a FROM df WHERE b IN (SELECT b FROM df) AND note = 'FROM'",
+])
+def test_read_only_queries_pass(sql):
+    assert check_read_only(sql, "duckdb") is None
+
+
+@pytest.mark.parametrize("sql, dialect", [
+    ("DELETE FROM df", "duckdb"),
+    ("SELECT * FROM df; DROP TABLE rates", "duckdb"),
+    ("SELECT * FROM read_csv('/etc/passwd')", "duckdb"),
+    ("SELECT * FROM 'data/csv/Buy Rates Analysis_old.csv' LIMIT 2", "duckdb"),
+    ("SELECT * FROM df JOIN \"cache/rates.parquet\" r USING (a)", "duckdb"),
+    ("ATTACH 'other.db'", "duckdb"),
+    ("SELECT * FROM carriers FOR UPDATE", "oracle"),
+    ("SELECT UTL_HTTP.REQUEST('http://example.com') FROM dual", "oracle"),
+    ("", "oracle"),
+])
+def test_non_read_only_queries_are_refused(sql, dialect):
+    assert check_read_only(sql, dialect) is not None
+
+
+def test_row_limit_injection():
+    assert apply_row_limit("SELECT * FROM df ORDER BY a -- sorted\n;", "duckdb", 100) == (
+        "SELECT * FROM df ORDER BY a\nLIMIT 100", True)
+    assert apply_row_limit("SELECT * FROM t ORDER BY a", "oracle", 100) == (
+        "SELECT * FROM t ORDER BY a\nFETCH FIRST 100 ROWS ONLY", True)
+    assert apply_row_limit("SELECT * FROM df LIMIT 5000", "duckdb", 100) == ("SELECT * FROM df LIMIT 100", True)
+    assert apply_row_limit("SELECT * FROM t FETCH FIRST 10 ROWS ONLY", "oracle", 100)[1] is False
+
+
+def test_duckdb_plan_summary(frame):
+    from src.duckdb_engine import DuckDBEngine
+    plan = DuckDBEngine().explain("SELECT * FROM df x, df y WHERE x.a > 5", frame, session_id="guard")
+    summary = summarize_duckdb_plan(plan)
+    assert summary["peak"] >= summary["rows"] > 1000
+    assert "CROSS_PRODUCT" in summary["operators"]
+
+
+def test_oracle_plan_summary():
+    rows = [
+        {"id": 0, "parent_id": None, "operation": "SELECT STATEMENT", "options": None, "cardinality": 5e9, "cost": 2e6},
+        {"id": 1, "parent_id": 0, "operation": "MERGE JOIN", "options": "CARTESIAN", "cardinality": 5e9, "cost": 2e6},
+        {"id": 2, "parent_id": 1, "operation": "TABLE ACCESS", "options": "FULL", "cardinality": 70000, "cost": 300},
+    ]
+    summary = summarize_oracle_plan(rows)
+    assert summary == {"rows": 5e9, "peak": 5e9, "cost": 2e6, "operators": ("MERGE JOIN CARTESIAN",)}
+    decision = SQLGuard(SQLGuardConfig(max_peak_rows=0, max_cost=1000000)).decide("SELECT 1 FROM t", "oracle", summary)
+    assert decision.action == "reject"
+    assert "cost" in decision.reason
+
+
+def test_guard_decisions_on_duckdb(frame):
+    guard = SQLGuard(SQLGuardConfig(row_limit=500, max_peak_rows=100000))
+    assert guard.check_duckdb("SELECT * FROM df WHERE a < 10", frame, "guard").action == "allow"
+
+    limited = guard.check_duckdb("SELECT * FROM df ORDER BY a DESC", frame, "guard")
+    assert limited.action == "limit"
+    assert limited.sql.endswith("LIMIT 500")
+
+    refused = guard.check_duckdb("SELECT * FROM df x, df y", frame, "guard")
+    assert refused.action == "reject"
+    assert "peak" in refused.reason
+    assert guard.stats()["rejected"] == 1
+
+
+def test_pipeline_applies_the_guard(frame, fake_llm, monkeypatch):
+    fake_llm(lambda messages: "```sql\nSELECT * FROM df x, df y\n```")
+    monkeypatch.setattr(async_pipeline, "get_sql_guard", lambda: SQLGuard(SQLGuardConfig(max_peak_rows=100000)))
+    question = PreparedQuestion("cross join everything", "local", dataframe=frame, session_id="guard",
+                                messages=[{"role": "user", "content": "cross join everything"}])
+    answer = async_pipeline.SyncAnswer(question)
+    ai_response, sql_query, query_result, source = answer.result()
+    assert answer.guard.action == "reject"
+    assert query_result.startswith("Query refused by the SQL guard")
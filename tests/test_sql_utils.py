@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.sql_utils import SQLBlockExtractor
+
+RESPONSE = "Sure!\n```SQL\nSELECT *\nFROM df;\n```\nThat returns everything. ```sql\nSELECT 2\n```"
+
+
+def test_extractor_finds_first_block_for_any_chunking():
+    for size in (1, 2, 3, 5, 8, len(RESPONSE)):
+        extractor = SQLBlockExtractor()
+        found = []
+        for start in range(0, len(RESPONSE), size):
+            sql = extractor.feed(RESPONSE[start:start + size])
+            if sql:
+                found.append((start + size, sql))
+        assert [sql for _, sql in found] == ["SELECT *\nFROM df"]
+        # Reported as soon as the closing fence is complete, before the prose ends
+        assert found[0][0] < RESPONSE.index("That returns") + size
+
+
+def test_extractor_waits_for_closing_fence():
+    extractor = SQLBlockExtractor()
+    assert extractor.feed("```sql\nSELECT 1") is None
+    assert extractor.feed("\n``") is None
+    assert extractor.feed("`") == "SELECT 1"
+    assert extractor.feed("more") is None
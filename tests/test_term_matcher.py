@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.term_matcher import TermMatcher
+
+MAPPINGS = [
+    {"business_term": "carrier", "synonyms": ["carriers", "supplier", "suppliers"],
+     "description": "Carrier information and details", "confidence": 1.0},
+    {"business_term": "product", "synonyms": ["supplier product", "carrier product"],
+     "description": "Product information and details", "confidence": 1.0},
+    {"business_term": "routing destination", "synonyms": ["routing destinations"],
+     "description": "Destination information and details", "confidence": 0.8},
+]
+
+QUESTION = "Show me the top 10 suppliers by volume and their supplier product for each routing destination"
+
+
+def _synthetic_mappings(count):
+    return MAPPINGS + [
+        {"business_term": f"metric {i}", "synonyms": [f"kpi {i}", f"measure {i} total"],
+         "description": f"Synthetic metric number {i}", "confidence": 1.0}
+        for i in range(count)
+    ]
+
+
+def _time_per_query(matcher, repeats=200):
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        matcher.find(QUESTION)
+    return (time.perf_counter() - start_time) / repeats
+
+
+def test_word_boundaries():
+    matcher = TermMatcher(MAPPINGS)
+    assert [m.business_term for m in matcher.find("multicarrier routing")] == []
+    assert [m.business_term for m in matcher.find("list all carriers")] == ["carrier"]
+    # Old bidirectional substring search matched any question contained in a term
+    assert matcher.find("rout") == []
+
+
+def test_plural_questions_match_singular_terms():
+    matcher = TermMatcher([
+        {"business_term": "agreement", "description": "Agreement records"},
+        {"business_term": "product", "synonyms": ["carrier product"]},
+        {"business_term": "routing destination"},
+    ])
+    assert [m.business_term for m in matcher.find("list agreements")] == ["agreement"]
+    assert [m.business_term for m in matcher.find("show me products")] == ["product"]
+    assert [m.business_term for m in matcher.find("carrier products by routing destinations")] == [
+        "product", "routing destination"]
+    match = matcher.find("show me products")[0]
+    assert "show me products"[match.start:match.end] == "products"
+    # Folding is only plural stripping: "class" is not "clas"
+    assert matcher.find("class") == []
+
+
+def test_longest_phrase_wins_with_spans():
+    matcher = TermMatcher(MAPPINGS)
+    matches = matcher.find(QUESTION)
+    assert [(m.business_term, m.kind) for m in matches] == [
+        ("carrier", "synonym"),
+        ("product", "synonym"),
+        ("routing destination", "term"),
+    ]
+    product = matches[1]
+    assert QUESTION[product.start:product.end] == "supplier product"
+    assert matches[2].score == 0.8
+
+
+def test_best_matches_orders_by_score():
+    matcher = TermMatcher(MAPPINGS)
+    best = matcher.best_matches("carrier and carrier product for routing destination")
+    assert [m.business_term for m in best] == ["carrier", "product", "routing destination"]
+
+
+def test_matching_cost_is_flat_in_dictionary_size():
+    small = TermMatcher(_synthetic_mappings(100))
+    large = TermMatcher(_synthetic_mappings(20000))
+    assert large.phrase_count > 60000
+    small_time = min(_time_per_query(small) for _ in range(3))
+    large_time = min(_time_per_query(large) for _ in range(3))
+    # Generous bound to stay stable on noisy CI machines; typically ~1x
+    assert large_time < small_time * 3 + 1e-4
+
+
+def main():
+    """Print matcher build and per-question timings for growing dictionaries"""
+    parser = argparse.ArgumentParser(description='Benchmark the compiled business-term matcher')
+    parser.add_argument('--sizes', default='100,1000,10000,50000', help='Comma-separated mapping counts')
+    args = parser.parse_args()
+
+    print(f'{"mappings":>10} {"phrases":>10} {"build ms":>10} {"match us":>10}')
+    for size in (int(value) for value in args.sizes.split(',')):
+        start_time = time.perf_counter()
+        matcher = TermMatcher(_synthetic_mappings(size))
+        build_ms = (time.perf_counter() - start_time) * 1000
+        match_us = min(_time_per_query(matcher) for _ in range(3)) * 1e6
+        print(f'{size:>10} {matcher.phrase_count:>10} {build_ms:>10.1f} {match_us:>10.1f}')
+
+
+if __name__ == "__main__":
+    main()